@@ -0,0 +1,96 @@
+-- =====================================================
+-- CONSULTA SQL SOMENTE-LEITURA (MCP Server - consulta_sql)
+-- Timeout, teto de linhas, rejeição por custo (EXPLAIN) e paginação
+-- =====================================================
+
+-- Remove a versão antiga (sem limites) que agregava o resultado inteiro
+DROP FUNCTION IF EXISTS execute_readonly_query(TEXT);
+
+CREATE OR REPLACE FUNCTION execute_readonly_query(
+  query_text TEXT,
+  max_linhas INTEGER DEFAULT 200,
+  pagina_offset INTEGER DEFAULT 0,
+  timeout_ms INTEGER DEFAULT 5000,
+  custo_maximo NUMERIC DEFAULT 100000
+)
+RETURNS JSON AS $$
+DECLARE
+  v_query TEXT;
+  v_paginada TEXT;
+  v_plano JSON;
+  v_custo NUMERIC;
+  v_inicio TIMESTAMPTZ := clock_timestamp();
+  v_cursor REFCURSOR;
+  v_linha JSON;
+  v_linhas JSON[] := '{}';
+  v_qtd INTEGER := 0;
+  v_truncado BOOLEAN := false;
+BEGIN
+  v_query := regexp_replace(query_text, ';\s*$', '');
+
+  IF v_query !~* '^\s*(SELECT|WITH)\s' THEN
+    RAISE EXCEPTION 'Apenas SELECT permitido';
+  END IF;
+  IF position(';' IN v_query) > 0 THEN
+    RAISE EXCEPTION 'Apenas uma instrução por consulta';
+  END IF;
+
+  max_linhas := LEAST(GREATEST(max_linhas, 1), 5000);
+  pagina_offset := GREATEST(pagina_offset, 0);
+
+  -- Sem ORDER BY a ordem das linhas não é garantida entre execuções e as páginas se sobrepõem
+  IF pagina_offset > 0 AND v_query !~* '\morder\s+by\M' THEN
+    RAISE EXCEPTION 'Paginação com offset exige ORDER BY na consulta';
+  END IF;
+
+  -- Qualquer escrita (inclusive em CTEs) falha dentro da transação somente-leitura
+  PERFORM set_config('transaction_read_only', 'on', true);
+
+  -- Busca uma linha a mais para saber se há próxima página.
+  -- A quebra de linha antes do ")" encerra um comentário "--" no fim da consulta.
+  v_paginada := format(
+    E'SELECT row_to_json(q) FROM (%s\n) q OFFSET %s LIMIT %s',
+    v_query, pagina_offset, max_linhas + 1
+  );
+
+  EXECUTE 'EXPLAIN (FORMAT JSON) ' || v_paginada INTO v_plano;
+  v_custo := (v_plano -> 0 -> 'Plan' ->> 'Total Cost')::NUMERIC;
+  IF v_custo > custo_maximo THEN
+    RAISE EXCEPTION 'Consulta rejeitada: custo estimado % acima do limite %', round(v_custo), custo_maximo
+      USING HINT = 'Adicione filtros (WHERE) ou agregue os dados antes de consultar';
+  END IF;
+
+  OPEN v_cursor FOR EXECUTE v_paginada;
+  LOOP
+    FETCH v_cursor INTO v_linha;
+    EXIT WHEN NOT FOUND;
+
+    IF v_qtd = max_linhas THEN
+      v_truncado := true;
+      EXIT;
+    END IF;
+    v_linhas := array_append(v_linhas, v_linha);
+    v_qtd := v_qtd + 1;
+
+    IF clock_timestamp() - v_inicio > make_interval(secs => timeout_ms / 1000.0) THEN
+      RAISE EXCEPTION 'Tempo limite de % ms excedido', timeout_ms;
+    END IF;
+  END LOOP;
+  CLOSE v_cursor;
+
+  RETURN json_build_object(
+    'linhas', COALESCE(array_to_json(v_linhas), '[]'::JSON),
+    'quantidade', v_qtd,
+    'offset', pagina_offset,
+    'truncado', v_truncado,
+    'proximo_offset', CASE WHEN v_truncado THEN pagina_offset + v_qtd END,
+    'custo_estimado', round(v_custo)
+  );
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER
+SET search_path = public
+-- Limite rígido: o PostgREST aplica o statement_timeout declarado na função
+SET statement_timeout = '15s';
+
+REVOKE ALL ON FUNCTION execute_readonly_query(TEXT, INTEGER, INTEGER, INTEGER, NUMERIC) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION execute_readonly_query(TEXT, INTEGER, INTEGER, INTEGER, NUMERIC) TO service_role;
@@ -0,0 +1,145 @@
+-- =====================================================
+-- RELATÓRIOS PARAMETRIZADOS (MCP Server - executar_relatorio)
+-- Consultas analíticas frequentes como functions PL/pgSQL: o SQL estático
+-- é preparado uma vez por conexão e o plano fica em cache, em vez de ser
+-- reinterpretado a cada chamada da consulta_sql.
+-- =====================================================
+
+-- Receita por mês de referência (previsto x recebido)
+CREATE OR REPLACE FUNCTION relatorio_receita_mensal(p_meses INTEGER DEFAULT 12)
+RETURNS TABLE (
+  referencia TEXT,
+  mensalidades BIGINT,
+  pagas BIGINT,
+  previsto NUMERIC,
+  recebido NUMERIC,
+  em_aberto NUMERIC,
+  taxa_recebimento NUMERIC
+) AS $$
+#variable_conflict use_column
+BEGIN
+  RETURN QUERY
+  SELECT
+    m.referencia::TEXT,
+    COUNT(*),
+    COUNT(*) FILTER (WHERE m.status::TEXT = 'pago'),
+    COALESCE(SUM(m.valor), 0),
+    COALESCE(SUM(COALESCE(m.valor_pago, m.valor)) FILTER (WHERE m.status::TEXT = 'pago'), 0),
+    COALESCE(SUM(m.valor) FILTER (WHERE m.status::TEXT IN ('pendente', 'atrasado')), 0),
+    round(100.0 * COUNT(*) FILTER (WHERE m.status::TEXT = 'pago') / COUNT(*), 1)
+  FROM mensalidades m
+  WHERE m.referencia >= to_char(
+          date_trunc('month', CURRENT_DATE) - make_interval(months => GREATEST(p_meses, 1) - 1),
+          'YYYY-MM')
+    AND m.status::TEXT <> 'cancelado'
+  GROUP BY m.referencia
+  ORDER BY m.referencia DESC;
+END;
+$$ LANGUAGE plpgsql STABLE SECURITY DEFINER SET search_path = public;
+
+-- Movimento da portaria por ponto de acesso no período
+CREATE OR REPLACE FUNCTION relatorio_entradas_por_local(
+  p_data_inicio DATE DEFAULT CURRENT_DATE,
+  p_data_fim DATE DEFAULT CURRENT_DATE
+)
+RETURNS TABLE (
+  local TEXT,
+  ponto_acesso TEXT,
+  entradas BIGINT,
+  saidas BIGINT,
+  pessoas_distintas BIGINT
+) AS $$
+#variable_conflict use_column
+BEGIN
+  RETURN QUERY
+  SELECT
+    p.tipo::TEXT,
+    p.nome::TEXT,
+    COUNT(*) FILTER (WHERE r.tipo::TEXT = 'entrada'),
+    COUNT(*) FILTER (WHERE r.tipo::TEXT = 'saida'),
+    COUNT(DISTINCT COALESCE(r.associado_id, r.dependente_id, r.convidado_id))
+  FROM registros_acesso r
+  JOIN pontos_acesso p ON p.id = r.ponto_acesso_id
+  WHERE r.created_at >= p_data_inicio
+    AND r.created_at < p_data_fim + 1
+  GROUP BY p.tipo, p.nome
+  ORDER BY 3 DESC;
+END;
+$$ LANGUAGE plpgsql STABLE SECURITY DEFINER SET search_path = public;
+
+-- Inadimplência (mensalidades atrasadas) por plano dos associados ativos
+CREATE OR REPLACE FUNCTION relatorio_inadimplencia_por_plano()
+RETURNS TABLE (
+  plano TEXT,
+  associados_ativos BIGINT,
+  inadimplentes BIGINT,
+  percentual NUMERIC,
+  mensalidades_atrasadas BIGINT,
+  valor_em_aberto NUMERIC
+) AS $$
+#variable_conflict use_column
+BEGIN
+  RETURN QUERY
+  WITH atrasadas AS (
+    SELECT m.associado_id, COUNT(*) AS qtd, SUM(m.valor) AS valor
+    FROM mensalidades m
+    WHERE m.status::TEXT = 'atrasado'
+    GROUP BY m.associado_id
+  )
+  SELECT
+    a.plano::TEXT,
+    COUNT(*),
+    COUNT(at.associado_id),
+    round(100.0 * COUNT(at.associado_id) / COUNT(*), 1),
+    COALESCE(SUM(at.qtd), 0)::BIGINT,
+    COALESCE(SUM(at.valor), 0)
+  FROM associados a
+  LEFT JOIN atrasadas at ON at.associado_id = a.id
+  WHERE a.status::TEXT = 'ativo'
+  GROUP BY a.plano
+  ORDER BY 6 DESC;
+END;
+$$ LANGUAGE plpgsql STABLE SECURITY DEFINER SET search_path = public;
+
+-- Associados que mais frequentaram o clube nos últimos dias
+CREATE OR REPLACE FUNCTION relatorio_frequencia_associados(
+  p_dias INTEGER DEFAULT 30,
+  p_limite INTEGER DEFAULT 20
+)
+RETURNS TABLE (
+  associado_id UUID,
+  nome TEXT,
+  numero_titulo INTEGER,
+  entradas BIGINT,
+  dias_distintos BIGINT,
+  ultima_entrada TIMESTAMPTZ
+) AS $$
+#variable_conflict use_column
+BEGIN
+  RETURN QUERY
+  SELECT
+    a.id,
+    a.nome::TEXT,
+    a.numero_titulo::INTEGER,
+    COUNT(*),
+    COUNT(DISTINCT r.created_at::DATE),
+    MAX(r.created_at)
+  FROM registros_acesso r
+  JOIN associados a ON a.id = r.associado_id
+  WHERE r.tipo::TEXT = 'entrada'
+    AND r.created_at >= CURRENT_DATE - GREATEST(p_dias, 1)
+  GROUP BY a.id, a.nome, a.numero_titulo
+  ORDER BY 4 DESC, 6 DESC
+  LIMIT LEAST(GREATEST(p_limite, 1), 500);
+END;
+$$ LANGUAGE plpgsql STABLE SECURITY DEFINER SET search_path = public;
+
+-- Somente o MCP Server (service_role) executa os relatórios
+REVOKE ALL ON FUNCTION relatorio_receita_mensal(INTEGER) FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION relatorio_entradas_por_local(DATE, DATE) FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION relatorio_inadimplencia_por_plano() FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION relatorio_frequencia_associados(INTEGER, INTEGER) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION relatorio_receita_mensal(INTEGER) TO service_role;
+GRANT EXECUTE ON FUNCTION relatorio_entradas_por_local(DATE, DATE) TO service_role;
+GRANT EXECUTE ON FUNCTION relatorio_inadimplencia_por_plano() TO service_role;
+GRANT EXECUTE ON FUNCTION relatorio_frequencia_associados(INTEGER, INTEGER) TO service_role;
@@ -0,0 +1,17 @@
+-- =====================================================
+-- BUCKET DE EXPORTAÇÕES (MCP Server - exportar_dados)
+-- Arquivos CSV/Parquet gerados pelo MCP; acesso por URL assinada
+-- =====================================================
+
+INSERT INTO storage.buckets (id, name, public) VALUES
+  ('exportacoes', 'exportacoes', false)
+ON CONFLICT (id) DO NOTHING;
+
+-- O MCP grava com a service_role; pelo app, só a diretoria lê
+DROP POLICY IF EXISTS "exportacoes_diretoria_read" ON storage.objects;
+CREATE POLICY "exportacoes_diretoria_read"
+ON storage.objects FOR SELECT
+USING (
+  bucket_id = 'exportacoes' AND
+  (SELECT tipo FROM usuarios WHERE id = auth.uid()) IN ('admin', 'presidente', 'vice_presidente')
+);
@@ -0,0 +1,44 @@
+-- =====================================================
+-- EXAMES MÉDICOS POR PESSOA (MCP Server - validar_acesso, buscar_exames)
+-- Exames de dependentes ficam em dependente_id (antes o MCP gravava tudo em
+-- associado_id). A consulta "último exame válido da pessoa" passa a ser
+-- um único index-only scan: índice parcial por tipo de pessoa, ordenado
+-- por data_validade DESC e cobrindo as colunas lidas.
+-- =====================================================
+
+-- Colunas usadas pelo MCP que nem toda versão do schema tem
+ALTER TABLE exames_medicos ADD COLUMN IF NOT EXISTS dependente_id UUID REFERENCES dependentes(id) ON DELETE CASCADE;
+ALTER TABLE exames_medicos ADD COLUMN IF NOT EXISTS resultado VARCHAR(50) DEFAULT 'apto';
+ALTER TABLE exames_medicos ALTER COLUMN associado_id DROP NOT NULL;
+
+-- Corrige exames de dependentes gravados em associado_id (só possível onde a FK não existia)
+UPDATE exames_medicos e
+SET dependente_id = e.associado_id, associado_id = NULL
+WHERE e.dependente_id IS NULL
+  AND NOT EXISTS (SELECT 1 FROM associados a WHERE a.id = e.associado_id)
+  AND EXISTS (SELECT 1 FROM dependentes d WHERE d.id = e.associado_id);
+
+-- Cada exame pertence a uma só pessoa
+DO $$
+BEGIN
+  IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'exames_uma_pessoa') THEN
+    ALTER TABLE exames_medicos
+      ADD CONSTRAINT exames_uma_pessoa CHECK (associado_id IS NULL OR dependente_id IS NULL) NOT VALID;
+    ALTER TABLE exames_medicos VALIDATE CONSTRAINT exames_uma_pessoa;
+  END IF;
+END $$;
+
+-- (tipo de pessoa, pessoa, data_validade DESC) INCLUDE (colunas lidas pela portaria)
+CREATE INDEX IF NOT EXISTS idx_exames_associado_validade
+  ON exames_medicos (associado_id, data_validade DESC) INCLUDE (resultado, data_exame)
+  WHERE associado_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_exames_dependente_validade
+  ON exames_medicos (dependente_id, data_validade DESC) INCLUDE (resultado, data_exame)
+  WHERE dependente_id IS NOT NULL;
+
+-- Coberto pelos índices acima (mesmo prefixo)
+DROP INDEX IF EXISTS idx_exames_associado;
+
+-- Index-only scan depende do visibility map em dia
+ALTER TABLE exames_medicos SET (autovacuum_vacuum_scale_factor = 0.05);
+ANALYZE exames_medicos;
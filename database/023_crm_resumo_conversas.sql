@@ -0,0 +1,124 @@
+-- =====================================================
+-- RESUMO DAS CONVERSAS DO CRM (MCP Server - caixa_entrada_crm, buscar_mensagens_crm)
+-- O total de mensagens e a última mensagem ficam na própria conversa,
+-- mantidos por triggers. A caixa de entrada vira uma leitura indexada de
+-- conversas_whatsapp, sem contar mensagens a cada chamada.
+-- Os triggers são por comando (transition tables): uma importação de
+-- milhares de mensagens faz um UPDATE por conversa, não um por mensagem.
+-- nao_lidas fica fora dos triggers: quem mantém o contador é o web app (o
+-- webhook soma, a tela do CRM zera ao abrir a conversa). Os triggers só usam
+-- colunas comuns a sql/crm_whatsapp.sql e database/EXECUTAR_SUPABASE.sql.
+-- =====================================================
+
+ALTER TABLE conversas_whatsapp
+  ADD COLUMN IF NOT EXISTS total_mensagens INTEGER NOT NULL DEFAULT 0,
+  ADD COLUMN IF NOT EXISTS nao_lidas INTEGER NOT NULL DEFAULT 0,
+  ADD COLUMN IF NOT EXISTS ultima_mensagem_em TIMESTAMPTZ,
+  ADD COLUMN IF NOT EXISTS ultima_mensagem TEXT,
+  ADD COLUMN IF NOT EXISTS ultima_direcao VARCHAR(10);
+
+-- Mensagens novas: soma por conversa e avança a última mensagem
+CREATE OR REPLACE FUNCTION crm_resumo_inserir()
+RETURNS TRIGGER AS $$
+BEGIN
+  UPDATE conversas_whatsapp c
+  SET total_mensagens = c.total_mensagens + n.qtd,
+      ultima_mensagem_em = CASE WHEN n.ultima_em >= COALESCE(c.ultima_mensagem_em, '-infinity')
+                                THEN n.ultima_em ELSE c.ultima_mensagem_em END,
+      ultima_mensagem = CASE WHEN n.ultima_em >= COALESCE(c.ultima_mensagem_em, '-infinity')
+                             THEN n.conteudo ELSE c.ultima_mensagem END,
+      ultima_direcao = CASE WHEN n.ultima_em >= COALESCE(c.ultima_mensagem_em, '-infinity')
+                            THEN n.direcao ELSE c.ultima_direcao END,
+      ultimo_contato = GREATEST(c.ultimo_contato, n.ultima_em)
+  FROM (
+    SELECT conversa_id,
+           COUNT(*) AS qtd,
+           MAX(created_at) AS ultima_em,
+           (array_agg(left(conteudo, 280) ORDER BY created_at DESC, id DESC))[1] AS conteudo,
+           (array_agg(direcao::TEXT ORDER BY created_at DESC, id DESC))[1] AS direcao
+    FROM novas
+    GROUP BY conversa_id
+  ) n
+  WHERE c.id = n.conversa_id;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Versão anterior desta migração mantinha nao_lidas por UPDATE de mensagens
+DROP TRIGGER IF EXISTS trg_crm_resumo_atualizar ON mensagens_whatsapp;
+DROP FUNCTION IF EXISTS crm_resumo_atualizar();
+
+-- Mensagens apagadas: desconta e, se a última saiu, recalcula a partir do índice da timeline
+CREATE OR REPLACE FUNCTION crm_resumo_apagar()
+RETURNS TRIGGER AS $$
+BEGIN
+  UPDATE conversas_whatsapp c
+  SET total_mensagens = GREATEST(c.total_mensagens - a.qtd, 0)
+  FROM (
+    SELECT conversa_id, COUNT(*) AS qtd
+    FROM antigas
+    GROUP BY conversa_id
+  ) a
+  WHERE c.id = a.conversa_id;
+
+  UPDATE conversas_whatsapp c
+  SET ultima_mensagem_em = u.created_at,
+      ultima_mensagem = left(u.conteudo, 280),
+      ultima_direcao = u.direcao
+  FROM (SELECT DISTINCT conversa_id FROM antigas) a
+  LEFT JOIN LATERAL (
+    SELECT m.created_at, m.conteudo, m.direcao::TEXT AS direcao
+    FROM mensagens_whatsapp m
+    WHERE m.conversa_id = a.conversa_id
+    ORDER BY m.created_at DESC, m.id DESC
+    LIMIT 1
+  ) u ON true
+  WHERE c.id = a.conversa_id
+    AND (c.ultima_mensagem_em IS DISTINCT FROM u.created_at
+         OR c.ultima_mensagem IS DISTINCT FROM left(u.conteudo, 280));
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_crm_resumo_inserir ON mensagens_whatsapp;
+CREATE TRIGGER trg_crm_resumo_inserir
+  AFTER INSERT ON mensagens_whatsapp
+  REFERENCING NEW TABLE AS novas
+  FOR EACH STATEMENT EXECUTE FUNCTION crm_resumo_inserir();
+
+DROP TRIGGER IF EXISTS trg_crm_resumo_apagar ON mensagens_whatsapp;
+CREATE TRIGGER trg_crm_resumo_apagar
+  AFTER DELETE ON mensagens_whatsapp
+  REFERENCING OLD TABLE AS antigas
+  FOR EACH STATEMENT EXECUTE FUNCTION crm_resumo_apagar();
+
+-- Carga inicial do resumo a partir do histórico
+UPDATE conversas_whatsapp c
+SET total_mensagens = r.qtd,
+    ultima_mensagem_em = r.ultima_em,
+    ultima_mensagem = r.conteudo,
+    ultima_direcao = r.direcao
+FROM (
+  SELECT conversa_id,
+         COUNT(*) AS qtd,
+         MAX(created_at) AS ultima_em,
+         (array_agg(left(conteudo, 280) ORDER BY created_at DESC, id DESC))[1] AS conteudo,
+         (array_agg(direcao::TEXT ORDER BY created_at DESC, id DESC))[1] AS direcao
+  FROM mensagens_whatsapp
+  GROUP BY conversa_id
+) r
+WHERE c.id = r.conversa_id;
+
+-- Timeline: (conversa, created_at, id) atende a paginação por cursor nos dois sentidos
+CREATE INDEX IF NOT EXISTS idx_mensagens_conversa_timeline
+  ON mensagens_whatsapp (conversa_id, created_at DESC, id DESC);
+DROP INDEX IF EXISTS idx_mensagens_conversa;
+
+-- Caixa de entrada: conversas mais recentes (com ou sem filtro de status) e só as com não lidas
+CREATE INDEX IF NOT EXISTS idx_conversas_caixa_entrada
+  ON conversas_whatsapp (ultima_mensagem_em DESC NULLS LAST, id DESC);
+CREATE INDEX IF NOT EXISTS idx_conversas_status_caixa_entrada
+  ON conversas_whatsapp (status, ultima_mensagem_em DESC NULLS LAST, id DESC);
+CREATE INDEX IF NOT EXISTS idx_conversas_nao_lidas
+  ON conversas_whatsapp (ultima_mensagem_em DESC NULLS LAST, id DESC)
+  WHERE nao_lidas > 0;
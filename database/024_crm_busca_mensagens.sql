@@ -0,0 +1,78 @@
+-- =====================================================
+-- BUSCA TEXTUAL NAS MENSAGENS DO CRM (MCP Server - buscar_texto_mensagens)
+-- O texto de cada mensagem vira um tsvector (configuração 'portuguese':
+-- minúsculas, stopwords e radicais, então "reabriu" acha "reabertura")
+-- guardado numa coluna gerada e indexado por GIN. A busca, o ranking e o
+-- trecho destacado rodam numa function, em uma chamada só.
+-- Atenção: adicionar a coluna gerada reescreve mensagens_whatsapp; rode
+-- fora do horário de atendimento em bases grandes.
+-- =====================================================
+
+ALTER TABLE mensagens_whatsapp
+  ADD COLUMN IF NOT EXISTS busca TSVECTOR
+  GENERATED ALWAYS AS (to_tsvector('portuguese'::regconfig, COALESCE(conteudo, ''))) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_mensagens_busca ON mensagens_whatsapp USING GIN (busca);
+
+-- Mensagens que casam com os termos (sintaxe de buscador: "frase exata", or, -palavra),
+-- da mais relevante para a menos, com a conversa e um trecho com os termos em **negrito**.
+-- O ts_headline (a parte cara) só roda nas linhas da página.
+CREATE OR REPLACE FUNCTION buscar_texto_mensagens(
+  p_termos TEXT,
+  p_direcao TEXT DEFAULT NULL,
+  p_desde TIMESTAMPTZ DEFAULT NULL,
+  p_limite INTEGER DEFAULT 20,
+  p_offset INTEGER DEFAULT 0
+)
+RETURNS TABLE (
+  mensagem_id UUID,
+  conversa_id UUID,
+  telefone TEXT,
+  nome_contato TEXT,
+  associado_id UUID,
+  direcao TEXT,
+  created_at TIMESTAMPTZ,
+  relevancia REAL,
+  trecho TEXT,
+  total BIGINT
+) AS $$
+#variable_conflict use_column
+DECLARE
+  v_consulta TSQUERY := websearch_to_tsquery('portuguese', p_termos);
+BEGIN
+  RETURN QUERY
+  WITH achados AS (
+    SELECT m.id, m.conversa_id, m.direcao, m.created_at, m.conteudo,
+           ts_rank(m.busca, v_consulta) AS relevancia,
+           COUNT(*) OVER () AS total
+    FROM mensagens_whatsapp m
+    WHERE m.busca @@ v_consulta
+      AND (p_direcao IS NULL OR m.direcao::TEXT = p_direcao)
+      AND (p_desde IS NULL OR m.created_at >= p_desde)
+    ORDER BY relevancia DESC, m.created_at DESC, m.id DESC
+    LIMIT LEAST(GREATEST(p_limite, 1), 100)
+    OFFSET GREATEST(p_offset, 0)
+  )
+  SELECT
+    a.id,
+    a.conversa_id,
+    c.telefone::TEXT,
+    c.nome_contato::TEXT,
+    c.associado_id,
+    a.direcao::TEXT,
+    a.created_at,
+    a.relevancia,
+    ts_headline('portuguese', a.conteudo, v_consulta,
+                'StartSel=**, StopSel=**, MaxWords=25, MinWords=10, MaxFragments=2'),
+    a.total
+  FROM achados a
+  JOIN conversas_whatsapp c ON c.id = a.conversa_id
+  ORDER BY a.relevancia DESC, a.created_at DESC, a.id DESC;
+END;
+$$ LANGUAGE plpgsql STABLE SECURITY DEFINER SET search_path = public;
+
+-- Somente o MCP Server (service_role) executa a busca
+REVOKE ALL ON FUNCTION buscar_texto_mensagens(TEXT, TEXT, TIMESTAMPTZ, INTEGER, INTEGER) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION buscar_texto_mensagens(TEXT, TEXT, TIMESTAMPTZ, INTEGER, INTEGER) TO service_role;
+
+ANALYZE mensagens_whatsapp;
@@ -0,0 +1,308 @@
+-- =====================================================
+-- REGISTROS DE ACESSO PARTICIONADOS POR MÊS + ARQUIVO
+-- (MCP Server - registros_acesso, estatisticas_portaria, arquivar_registros_acesso)
+-- registros_acesso passa a ser particionada por created_at, uma partição
+-- por mês (registros_acesso_AAAA_MM) e uma default para o que cair fora
+-- delas. Consultas por período só leem as partições do período, e tirar um
+-- mês antigo da tabela é um DETACH + DROP em vez de um DELETE de milhões de
+-- linhas. Meses além da retenção vão para registros_acesso_arquivo, em
+-- blocos de 5 mil registros em JSONB comprimidos pelo TOAST, e continuam
+-- consultáveis por buscar_registros_arquivados.
+-- A chave primária passa a ser (id, created_at): upserts por id usam
+-- on_conflict=id,created_at.
+-- Atenção: a conversão copia a tabela inteira (cerca de 50s para 10M de
+-- registros num Postgres local) com a tabela bloqueada; rode fora do
+-- horário da portaria. O primeiro arquivamento de anos de histórico também
+-- é demorado (~1,5 min para 6,5M de registros): rode-o pelo SQL Editor.
+-- =====================================================
+
+-- Cria as partições mensais de p_desde até p_ate (as que já existem são puladas).
+-- Registros que caíram na default antes de a partição do mês existir são movidos para ela.
+CREATE OR REPLACE FUNCTION criar_particoes_registros_acesso(
+  p_desde DATE DEFAULT CURRENT_DATE,
+  p_ate DATE DEFAULT (CURRENT_DATE + INTERVAL '3 months')::DATE
+)
+RETURNS INTEGER AS $$
+DECLARE
+  v_mes DATE := date_trunc('month', p_desde)::DATE;
+  v_fim DATE;
+  v_nome TEXT;
+  v_criadas INTEGER := 0;
+BEGIN
+  WHILE v_mes <= p_ate LOOP
+    v_fim := (v_mes + INTERVAL '1 month')::DATE;
+    v_nome := 'registros_acesso_' || to_char(v_mes, 'YYYY_MM');
+    IF to_regclass(v_nome) IS NULL THEN
+      EXECUTE format('CREATE TABLE %I (LIKE registros_acesso INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', v_nome);
+      IF to_regclass('registros_acesso_default') IS NOT NULL THEN
+        EXECUTE format(
+          'WITH movidos AS (DELETE FROM registros_acesso_default WHERE created_at >= %L AND created_at < %L RETURNING *)
+           INSERT INTO %I SELECT * FROM movidos', v_mes, v_fim, v_nome);
+      END IF;
+      EXECUTE format('ALTER TABLE registros_acesso ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                     v_nome, v_mes, v_fim);
+      v_criadas := v_criadas + 1;
+    END IF;
+    v_mes := v_fim;
+  END LOOP;
+  RETURN v_criadas;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Conversão da tabela (só na primeira execução)
+DO $$
+DECLARE
+  v_inicio DATE;
+  v_indices TEXT[];
+  v_fks TEXT[];
+  v_def TEXT;
+  v_pol RECORD;
+BEGIN
+  IF (SELECT relkind FROM pg_class WHERE oid = 'registros_acesso'::regclass) = 'p' THEN
+    RAISE NOTICE 'registros_acesso já é particionada';
+    RETURN;
+  END IF;
+
+  LOCK TABLE registros_acesso IN ACCESS EXCLUSIVE MODE;
+  -- created_at entra na chave primária; registros sem data (não deveria haver) vão para a default
+  UPDATE registros_acesso SET created_at = 'epoch' WHERE created_at IS NULL;
+
+  -- Índices (menos o da chave primária) e FKs são recriados na tabela nova depois da carga
+  SELECT array_agg(indexdef) INTO v_indices
+  FROM pg_indexes i
+  WHERE i.schemaname = 'public' AND i.tablename = 'registros_acesso'
+    AND i.indexname NOT IN (SELECT conname FROM pg_constraint WHERE conrelid = 'registros_acesso'::regclass);
+  SELECT array_agg(format('ALTER TABLE registros_acesso ADD CONSTRAINT %I %s', conname, pg_get_constraintdef(oid)))
+  INTO v_fks
+  FROM pg_constraint WHERE conrelid = 'registros_acesso'::regclass AND contype = 'f';
+
+  ALTER TABLE registros_acesso RENAME TO registros_acesso_legado;
+  CREATE TABLE registros_acesso (LIKE registros_acesso_legado INCLUDING DEFAULTS INCLUDING CONSTRAINTS)
+    PARTITION BY RANGE (created_at);
+  ALTER TABLE registros_acesso ALTER COLUMN created_at SET NOT NULL;
+  CREATE TABLE registros_acesso_default PARTITION OF registros_acesso DEFAULT;
+
+  SELECT COALESCE(min(created_at), NOW())::DATE INTO v_inicio
+  FROM registros_acesso_legado WHERE created_at > 'epoch';
+  PERFORM criar_particoes_registros_acesso(v_inicio);
+
+  INSERT INTO registros_acesso SELECT * FROM registros_acesso_legado;
+
+  -- Policies de RLS da tabela antiga
+  IF (SELECT relrowsecurity FROM pg_class WHERE oid = 'registros_acesso_legado'::regclass) THEN
+    ALTER TABLE registros_acesso ENABLE ROW LEVEL SECURITY;
+  END IF;
+  FOR v_pol IN SELECT * FROM pg_policies WHERE schemaname = 'public' AND tablename = 'registros_acesso_legado' LOOP
+    EXECUTE format('CREATE POLICY %I ON registros_acesso AS %s FOR %s TO %s%s%s',
+      v_pol.policyname, v_pol.permissive, v_pol.cmd,
+      array_to_string(ARRAY(SELECT quote_ident(r) FROM unnest(v_pol.roles) r), ', '),
+      CASE WHEN v_pol.qual IS NOT NULL THEN ' USING (' || v_pol.qual || ')' ELSE '' END,
+      CASE WHEN v_pol.with_check IS NOT NULL THEN ' WITH CHECK (' || v_pol.with_check || ')' ELSE '' END);
+  END LOOP;
+
+  DROP TABLE registros_acesso_legado;
+
+  ALTER TABLE registros_acesso ADD PRIMARY KEY (id, created_at);
+  FOREACH v_def IN ARRAY COALESCE(v_indices, '{}') LOOP
+    IF v_def LIKE 'CREATE UNIQUE%' THEN
+      -- Unicidade em tabela particionada precisa incluir created_at
+      RAISE NOTICE 'Índice único não recriado: %', v_def;
+    ELSE
+      EXECUTE v_def;
+    END IF;
+  END LOOP;
+  FOREACH v_def IN ARRAY COALESCE(v_fks, '{}') LOOP
+    EXECUTE v_def;
+  END LOOP;
+END $$;
+
+-- Meses arquivados: blocos de até 5 mil registros (ordem de created_at), com
+-- o período de cada bloco para só descomprimir os que interessam
+CREATE TABLE IF NOT EXISTS registros_acesso_arquivo (
+  mes DATE NOT NULL,
+  bloco INTEGER NOT NULL,
+  registros INTEGER NOT NULL,
+  primeiro TIMESTAMPTZ NOT NULL,
+  ultimo TIMESTAMPTZ NOT NULL,
+  dados JSONB NOT NULL,
+  arquivado_em TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  PRIMARY KEY (mes, bloco)
+);
+
+-- lz4 comprime e descomprime mais rápido que o pglz padrão, quando o servidor tem suporte
+DO $$
+BEGIN
+  ALTER TABLE registros_acesso_arquivo ALTER COLUMN dados SET COMPRESSION lz4;
+EXCEPTION WHEN feature_not_supported THEN
+  RAISE NOTICE 'lz4 indisponível; registros_acesso_arquivo usa pglz';
+END $$;
+
+-- Sem policies: só o service_role (MCP Server) lê o arquivo
+ALTER TABLE registros_acesso_arquivo ENABLE ROW LEVEL SECURITY;
+
+-- Arquiva os meses anteriores à retenção: cada partição vira blocos em
+-- registros_acesso_arquivo e é removida da tabela. Também cria as partições
+-- dos próximos meses. Com p_simular, só diz o que seria arquivado.
+CREATE OR REPLACE FUNCTION arquivar_registros_acesso(
+  p_meses_retencao INTEGER DEFAULT 12,
+  p_simular BOOLEAN DEFAULT false
+)
+RETURNS JSONB AS $$
+DECLARE
+  v_limite DATE := (date_trunc('month', CURRENT_DATE) - make_interval(months => GREATEST(p_meses_retencao, 1)))::DATE;
+  v_particoes TEXT[] := '{}';
+  v_nome TEXT;
+  v_registros BIGINT;
+  v_arquivados BIGINT;
+  v_resultado JSONB := '[]';
+BEGIN
+  IF NOT p_simular THEN
+    PERFORM criar_particoes_registros_acesso();
+  END IF;
+
+  FOR v_nome IN
+    SELECT c.relname
+    FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = 'registros_acesso'::regclass
+      AND c.relname ~ '^registros_acesso_[0-9]{4}_[0-9]{2}$'
+      AND to_date(right(c.relname, 7), 'YYYY_MM') < v_limite
+    ORDER BY c.relname
+  LOOP
+    EXECUTE format('SELECT count(*) FROM %I', v_nome) INTO v_registros;
+    v_resultado := v_resultado || jsonb_build_object(
+      'mes', to_date(right(v_nome, 7), 'YYYY_MM'), 'particao', v_nome, 'registros', v_registros);
+    CONTINUE WHEN p_simular;
+
+    -- Nenhum registro atrasado entra no mês enquanto ele é copiado
+    EXECUTE format('LOCK TABLE %I IN SHARE MODE', v_nome);
+    EXECUTE format(
+      'INSERT INTO registros_acesso_arquivo (mes, bloco, registros, primeiro, ultimo, dados)
+       SELECT %L, bloco, count(*), min(created_at), max(created_at), jsonb_agg(linha ORDER BY created_at, id)
+       FROM (SELECT to_jsonb(r) AS linha, r.created_at, r.id,
+                    (row_number() OVER (ORDER BY r.created_at, r.id) - 1) / 5000 AS bloco
+             FROM %I r) b
+       GROUP BY bloco', to_date(right(v_nome, 7), 'YYYY_MM'), v_nome);
+    v_particoes := v_particoes || v_nome;
+  END LOOP;
+
+  -- Registros de meses já arquivados que chegaram depois (foram para a default)
+  IF NOT p_simular THEN
+    WITH movidos AS (
+      DELETE FROM registros_acesso_default WHERE created_at < v_limite RETURNING *
+    ), numerados AS (
+      SELECT to_jsonb(m) AS linha, m.created_at, m.id, date_trunc('month', m.created_at)::DATE AS mes,
+             (row_number() OVER (PARTITION BY date_trunc('month', m.created_at) ORDER BY m.created_at, m.id) - 1)
+               / 5000 AS bloco
+      FROM movidos m
+    )
+    INSERT INTO registros_acesso_arquivo (mes, bloco, registros, primeiro, ultimo, dados)
+    SELECT n.mes, COALESCE((SELECT max(a.bloco) + 1 FROM registros_acesso_arquivo a WHERE a.mes = n.mes), 0) + n.bloco,
+           count(*), min(n.created_at), max(n.created_at), jsonb_agg(n.linha ORDER BY n.created_at, n.id)
+    FROM numerados n
+    GROUP BY n.mes, n.bloco;
+    GET DIAGNOSTICS v_arquivados = ROW_COUNT;
+    IF v_arquivados > 0 THEN
+      v_resultado := v_resultado || jsonb_build_object('particao', 'registros_acesso_default', 'blocos', v_arquivados);
+    END IF;
+  END IF;
+
+  -- Só no fim: o DETACH bloqueia registros_acesso até o commit
+  FOREACH v_nome IN ARRAY v_particoes LOOP
+    EXECUTE format('SELECT count(*) FROM %I', v_nome) INTO v_registros;
+    SELECT COALESCE(sum(registros), 0) INTO v_arquivados
+    FROM registros_acesso_arquivo WHERE mes = to_date(right(v_nome, 7), 'YYYY_MM');
+    IF v_arquivados < v_registros THEN
+      RAISE EXCEPTION 'Partição % mudou durante o arquivamento (% registros, % arquivados)',
+        v_nome, v_registros, v_arquivados;
+    END IF;
+    EXECUTE format('ALTER TABLE registros_acesso DETACH PARTITION %I', v_nome);
+    EXECUTE format('DROP TABLE %I', v_nome);
+  END LOOP;
+
+  RETURN v_resultado;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Registros dos meses arquivados, no mesmo formato da tool registros_acesso
+-- (com ponto de acesso, associado e dependente), do mais recente para o mais
+-- antigo. Percorre os blocos do mais novo para o mais velho e para assim que
+-- os blocos restantes não podem mais entrar entre os p_limite mais recentes.
+CREATE OR REPLACE FUNCTION buscar_registros_arquivados(
+  p_inicio TIMESTAMPTZ DEFAULT NULL,
+  p_fim TIMESTAMPTZ DEFAULT NULL,
+  p_tipo TEXT DEFAULT NULL,
+  p_associado_id UUID DEFAULT NULL,
+  p_local TEXT DEFAULT NULL,
+  p_limite INTEGER DEFAULT 50
+)
+RETURNS JSONB AS $$
+DECLARE
+  v_limite INTEGER := LEAST(GREATEST(p_limite, 1), 1000);
+  v_bloco RECORD;
+  v_achados registros_acesso[] := '{}';
+  v_corte TIMESTAMPTZ;
+BEGIN
+  FOR v_bloco IN
+    SELECT mes, bloco, ultimo FROM registros_acesso_arquivo
+    WHERE (p_inicio IS NULL OR ultimo >= p_inicio) AND (p_fim IS NULL OR primeiro <= p_fim)
+    ORDER BY ultimo DESC
+  LOOP
+    EXIT WHEN v_corte IS NOT NULL AND v_bloco.ultimo < v_corte;
+    SELECT COALESCE(array_agg(ROW(t.*)::registros_acesso ORDER BY t.created_at DESC, t.id DESC), '{}')
+    INTO v_achados
+    FROM (
+      SELECT * FROM unnest(v_achados)
+      UNION ALL
+      SELECT r.*
+      FROM registros_acesso_arquivo b
+      CROSS JOIN LATERAL jsonb_populate_recordset(NULL::registros_acesso, b.dados) r
+      WHERE b.mes = v_bloco.mes AND b.bloco = v_bloco.bloco
+        AND (p_inicio IS NULL OR r.created_at >= p_inicio)
+        AND (p_fim IS NULL OR r.created_at <= p_fim)
+        AND (p_tipo IS NULL OR r.tipo::TEXT = p_tipo)
+        AND (p_associado_id IS NULL OR r.associado_id = p_associado_id)
+        AND (p_local IS NULL OR r.ponto_acesso_id IN (SELECT id FROM pontos_acesso WHERE tipo::TEXT = p_local))
+      ORDER BY created_at DESC, id DESC
+      LIMIT v_limite
+    ) t;
+    IF cardinality(v_achados) >= v_limite THEN
+      v_corte := v_achados[v_limite].created_at;
+    END IF;
+  END LOOP;
+
+  RETURN (
+    SELECT COALESCE(jsonb_agg(to_jsonb(r) || jsonb_build_object(
+             'pontos_acesso', jsonb_build_object('nome', p.nome, 'tipo', p.tipo),
+             'associados', CASE WHEN a.id IS NOT NULL
+                                THEN jsonb_build_object('nome', a.nome, 'numero_titulo', a.numero_titulo) END,
+             'dependentes', CASE WHEN d.id IS NOT NULL THEN jsonb_build_object('nome', d.nome) END,
+             'arquivado', true
+           ) ORDER BY r.created_at DESC, r.id DESC), '[]'::JSONB)
+    FROM unnest(v_achados) r
+    LEFT JOIN pontos_acesso p ON p.id = r.ponto_acesso_id
+    LEFT JOIN associados a ON a.id = r.associado_id
+    LEFT JOIN dependentes d ON d.id = r.dependente_id
+  );
+END;
+$$ LANGUAGE plpgsql STABLE SECURITY DEFINER SET search_path = public;
+
+-- Somente o MCP Server (service_role) arquiva e lê o arquivo
+REVOKE ALL ON FUNCTION criar_particoes_registros_acesso(DATE, DATE) FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION arquivar_registros_acesso(INTEGER, BOOLEAN) FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION buscar_registros_arquivados(TIMESTAMPTZ, TIMESTAMPTZ, TEXT, UUID, TEXT, INTEGER)
+  FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION criar_particoes_registros_acesso(DATE, DATE) TO service_role;
+GRANT EXECUTE ON FUNCTION arquivar_registros_acesso(INTEGER, BOOLEAN) TO service_role;
+GRANT EXECUTE ON FUNCTION buscar_registros_arquivados(TIMESTAMPTZ, TIMESTAMPTZ, TEXT, UUID, TEXT, INTEGER)
+  TO service_role;
+
+-- Com pg_cron: partições novas toda semana e arquivamento mensal (retenção de 12 meses)
+DO $$
+BEGIN
+  IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron') THEN
+    PERFORM cron.schedule('registros-acesso-particoes', '0 3 * * 0', 'SELECT criar_particoes_registros_acesso()');
+    PERFORM cron.schedule('registros-acesso-arquivo', '30 3 2 * *', 'SELECT arquivar_registros_acesso(12)');
+  END IF;
+END $$;
+
+ANALYZE registros_acesso;
@@ -0,0 +1,25 @@
+-- =====================================================
+-- EMISSÃO DE CARTEIRINHAS EM LOTE
+-- (MCP Server - emitir_carteirinhas_lote)
+-- O MCP gera o qrcode_hash de cada carteirinha (é o que vai impresso no QR
+-- code), então o trigger de 011 só calcula um hash quando nenhum foi enviado.
+-- A versão anterior sobrescrevia o hash enviado e, como concatena colunas
+-- que são sempre NULL em parte (a carteirinha é de um associado OU de um
+-- dependente OU de um agregado), gerava hash NULL e o insert falhava.
+-- =====================================================
+
+CREATE OR REPLACE FUNCTION gerar_qrcode_hash()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.qrcode_hash IS NULL THEN
+        NEW.qrcode_hash := encode(sha256(convert_to(concat_ws(':',
+            NEW.id, NEW.associado_id, NEW.dependente_id, NEW.agregado_id, clock_timestamp(), random()
+        ), 'UTF8')), 'hex');
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- A renovação busca as carteirinhas ativas de cada dependente (as de associado já têm índice)
+CREATE INDEX IF NOT EXISTS idx_carteirinhas_dependente ON carteirinhas(dependente_id);
+CREATE INDEX IF NOT EXISTS idx_carteirinhas_ativas ON carteirinhas(id) WHERE ativa;
@@ -0,0 +1,163 @@
+-- =====================================================
+-- EMISSÃO E VALIDAÇÃO DE CONVITES
+-- (MCP Server - emitir_convites, buscar_convites, validar_convite)
+-- Cada convite ganha um código (qr_code, no formato CONV-XXXXXXXXXXXX que a
+-- portaria do painel já reconhece) e um updated_at, para o MCP manter em
+-- memória os convites válidos e renová-los só com o que mudou.
+-- A cota mensal de cada associado vira um contador (convites_cota),
+-- mantido por trigger: conferir a cota não conta mais as linhas de convites.
+-- =====================================================
+
+ALTER TABLE convites ADD COLUMN IF NOT EXISTS qr_code VARCHAR(50);
+ALTER TABLE convites ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ DEFAULT NOW();
+
+UPDATE convites SET qr_code = 'CONV-' || upper(left(replace(id::TEXT, '-', ''), 12)) WHERE qr_code IS NULL;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_convites_qr_code ON convites(qr_code);
+-- Renovação incremental do índice em memória: o que mudou desde a última leitura
+CREATE INDEX IF NOT EXISTS idx_convites_updated_at ON convites(updated_at);
+
+CREATE OR REPLACE FUNCTION preparar_convite()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' AND NEW.qr_code IS NULL THEN
+        NEW.qr_code := 'CONV-' || upper(left(md5(random()::TEXT || clock_timestamp()::TEXT), 12));
+    END IF;
+    NEW.updated_at := NOW();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS convites_preparar ON convites;
+CREATE TRIGGER convites_preparar
+    BEFORE INSERT OR UPDATE ON convites
+    FOR EACH ROW EXECUTE FUNCTION preparar_convite();
+
+-- =====================================================
+-- COTA MENSAL
+-- =====================================================
+
+CREATE TABLE IF NOT EXISTS convites_cota (
+    associado_id UUID NOT NULL REFERENCES associados(id) ON DELETE CASCADE,
+    mes_referencia VARCHAR(7) NOT NULL, -- formato: 2024-01
+    emitidos INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (associado_id, mes_referencia)
+);
+
+-- Mesmo acesso de convites (010_rls_policies); quem grava é só o trigger
+ALTER TABLE convites_cota ENABLE ROW LEVEL SECURITY;
+DROP POLICY IF EXISTS convites_cota_leitura ON convites_cota;
+CREATE POLICY convites_cota_leitura ON convites_cota FOR SELECT
+    USING (is_admin_or_diretoria() OR is_secretaria() OR is_portaria());
+
+CREATE OR REPLACE FUNCTION contar_convite_cota()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.associado_id IS NOT NULL THEN
+        UPDATE convites_cota SET emitidos = emitidos - 1
+        WHERE associado_id = OLD.associado_id AND mes_referencia = OLD.mes_referencia;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.associado_id IS NOT NULL THEN
+        INSERT INTO convites_cota (associado_id, mes_referencia, emitidos)
+        VALUES (NEW.associado_id, NEW.mes_referencia, 1)
+        ON CONFLICT (associado_id, mes_referencia) DO UPDATE SET emitidos = convites_cota.emitidos + 1;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+DROP TRIGGER IF EXISTS convites_cota_contar ON convites;
+CREATE TRIGGER convites_cota_contar
+    AFTER INSERT OR DELETE OR UPDATE OF associado_id, mes_referencia ON convites
+    FOR EACH ROW EXECUTE FUNCTION contar_convite_cota();
+
+-- Contagem inicial, sem deixar um convite entrar entre a contagem e o trigger
+DO $$
+BEGIN
+  LOCK TABLE convites IN SHARE ROW EXCLUSIVE MODE;
+  INSERT INTO convites_cota (associado_id, mes_referencia, emitidos)
+  SELECT associado_id, mes_referencia, COUNT(*)
+  FROM convites
+  WHERE associado_id IS NOT NULL
+  GROUP BY associado_id, mes_referencia
+  ON CONFLICT (associado_id, mes_referencia) DO UPDATE SET emitidos = EXCLUDED.emitidos;
+END $$;
+
+-- Convites por mês: configuração convites_<plano>_mes (padrão: 2 no patrimonial,
+-- nenhum nos outros planos) + os convites extras dos cargos ativos da diretoria
+CREATE OR REPLACE FUNCTION limite_convites_mes(p_associado_id UUID)
+RETURNS INTEGER AS $$
+    SELECT COALESCE(
+               (SELECT NULLIF(c.valor, '')::INTEGER FROM configuracoes c
+                WHERE c.chave = 'convites_' || a.plano::TEXT || '_mes'),
+               CASE WHEN a.plano = 'patrimonial' THEN 2 ELSE 0 END)
+         + COALESCE((SELECT SUM(d.qtd_convites_mes) FROM diretoria d
+                     WHERE d.associado_id = a.id AND d.ativo
+                       AND CURRENT_DATE BETWEEN d.data_inicio AND d.data_fim), 0)::INTEGER
+    FROM associados a
+    WHERE a.id = p_associado_id;
+$$ LANGUAGE sql STABLE;
+
+-- Mesma assinatura de 011, agora lendo o contador
+CREATE OR REPLACE FUNCTION convites_disponiveis_mes(p_associado_id UUID, p_mes VARCHAR(7))
+RETURNS INTEGER AS $$
+    SELECT COALESCE(limite_convites_mes(p_associado_id), 0) - COALESCE(
+        (SELECT emitidos FROM convites_cota WHERE associado_id = p_associado_id AND mes_referencia = p_mes), 0);
+$$ LANGUAGE sql STABLE;
+
+-- Emite os convites de um associado, todos ou nenhum: a linha do contador fica
+-- travada até o fim da transação, então emissões simultâneas para o mesmo
+-- associado (pelo MCP ou pelo painel) não passam da cota.
+CREATE OR REPLACE FUNCTION emitir_convites(
+  p_associado_id UUID,
+  p_convidados JSONB,
+  p_data_validade DATE
+)
+RETURNS JSONB AS $$
+DECLARE
+  v_mes VARCHAR(7) := to_char(CURRENT_DATE, 'YYYY-MM');
+  v_quantidade INTEGER := jsonb_array_length(p_convidados);
+  v_status status_associado;
+  v_limite INTEGER;
+  v_emitidos INTEGER;
+  v_convites JSONB;
+BEGIN
+  SELECT status INTO v_status FROM associados WHERE id = p_associado_id;
+  IF NOT FOUND THEN
+    RAISE EXCEPTION 'Associado % não encontrado', p_associado_id;
+  END IF;
+  IF v_status <> 'ativo' THEN
+    RAISE EXCEPTION 'Associado com status %: só associados ativos emitem convites', v_status;
+  END IF;
+
+  v_limite := limite_convites_mes(p_associado_id);
+  INSERT INTO convites_cota (associado_id, mes_referencia) VALUES (p_associado_id, v_mes)
+  ON CONFLICT (associado_id, mes_referencia) DO NOTHING;
+  SELECT emitidos INTO v_emitidos FROM convites_cota
+  WHERE associado_id = p_associado_id AND mes_referencia = v_mes
+  FOR UPDATE;
+
+  IF v_emitidos + v_quantidade > v_limite THEN
+    RETURN jsonb_build_object('mes_referencia', v_mes, 'limite', v_limite, 'emitidos_mes', v_emitidos,
+                              'convites', '[]'::JSONB);
+  END IF;
+
+  WITH novos AS (
+    INSERT INTO convites (associado_id, nome_convidado, cpf_convidado, telefone_convidado,
+                          data_validade, mes_referencia)
+    SELECT p_associado_id, COALESCE(c->>'nome', ''), c->>'cpf', c->>'telefone', p_data_validade, v_mes
+    FROM jsonb_array_elements(p_convidados) c
+    RETURNING id, qr_code, nome_convidado, cpf_convidado, data_validade, status
+  )
+  SELECT COALESCE(jsonb_agg(to_jsonb(novos)), '[]'::JSONB) INTO v_convites FROM novos;
+
+  RETURN jsonb_build_object('mes_referencia', v_mes, 'limite', v_limite,
+                            'emitidos_mes', v_emitidos + v_quantidade, 'convites', v_convites);
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Somente o MCP Server (service_role) emite pela function
+REVOKE ALL ON FUNCTION emitir_convites(UUID, JSONB, DATE) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION emitir_convites(UUID, JSONB, DATE) TO service_role;
+
+ANALYZE convites;
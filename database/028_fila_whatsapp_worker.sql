@@ -0,0 +1,90 @@
+-- =====================================================
+-- WORKER DA FILA DO WHATSAPP
+-- (MCP Server - WHATSAPP_FILA_WORKER / --fila-whatsapp)
+-- O MCP passa a enviar o que é gravado em fila_whatsapp. Cada worker reserva
+-- um lote com FOR UPDATE SKIP LOCKED, então vários servidores podem consumir
+-- a fila ao mesmo tempo sem pegar a mesma mensagem. A reserva vence em
+-- p_reserva_segundos: se o worker cair no meio do lote, as mensagens voltam
+-- para a fila. O resultado do lote volta num único UPDATE.
+--
+-- Pendente = enviado = false e data_envio vazia. As linhas que
+-- notificar_exames_vencendo grava depois de tentar enviar já têm data_envio
+-- e não são reenviadas.
+-- =====================================================
+
+ALTER TABLE fila_whatsapp ADD COLUMN IF NOT EXISTS provider_id UUID REFERENCES whatsapp_providers(id) ON DELETE SET NULL;
+ALTER TABLE fila_whatsapp ADD COLUMN IF NOT EXISTS tentativas INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE fila_whatsapp ADD COLUMN IF NOT EXISTS reservado_por VARCHAR(100);
+ALTER TABLE fila_whatsapp ADD COLUMN IF NOT EXISTS reservado_ate TIMESTAMPTZ;
+
+-- Só as pendentes, na ordem em que saem
+CREATE INDEX IF NOT EXISTS idx_fila_whatsapp_pendentes ON fila_whatsapp ((COALESCE(agendado_para, created_at)))
+    WHERE enviado = false AND data_envio IS NULL;
+
+-- Reserva até p_limite mensagens vencidas para o worker p_worker
+CREATE OR REPLACE FUNCTION reservar_fila_whatsapp(
+  p_worker TEXT,
+  p_limite INTEGER DEFAULT 50,
+  p_reserva_segundos INTEGER DEFAULT 300
+)
+RETURNS SETOF fila_whatsapp AS $$
+  UPDATE fila_whatsapp f
+  SET reservado_por = p_worker,
+      reservado_ate = NOW() + make_interval(secs => p_reserva_segundos),
+      tentativas = f.tentativas + 1
+  FROM (
+    SELECT id FROM fila_whatsapp
+    WHERE enviado = false AND data_envio IS NULL
+      AND COALESCE(agendado_para, created_at) <= NOW()
+      AND (reservado_ate IS NULL OR reservado_ate < NOW())
+    ORDER BY COALESCE(agendado_para, created_at)
+    LIMIT p_limite
+    FOR UPDATE SKIP LOCKED
+  ) livres
+  WHERE f.id = livres.id
+  RETURNING f.*;
+$$ LANGUAGE sql VOLATILE SECURITY DEFINER SET search_path = public;
+
+-- Grava o resultado de um lote: p_resultados = [{id, enviado, erro, definitivo, devolvida}]
+-- - enviado: concluída;
+-- - falha definitiva (ex.: número inválido) ou na última tentativa: concluída com erro;
+-- - outra falha: volta para a fila depois de p_espera_segundos * 2^(tentativas - 1);
+-- - devolvida (o worker parou antes de enviar): volta para a fila sem contar tentativa.
+-- Só atualiza as linhas ainda reservadas para p_worker; devolve quantas foram.
+CREATE OR REPLACE FUNCTION concluir_fila_whatsapp(
+  p_worker TEXT,
+  p_resultados JSONB,
+  p_max_tentativas INTEGER DEFAULT 3,
+  p_espera_segundos INTEGER DEFAULT 60
+)
+RETURNS INTEGER AS $$
+  WITH r AS (
+    SELECT * FROM jsonb_to_recordset(p_resultados)
+      AS x(id UUID, enviado BOOLEAN, erro TEXT, definitivo BOOLEAN, devolvida BOOLEAN)
+  ), atualizadas AS (
+    UPDATE fila_whatsapp f
+    SET enviado = COALESCE(r.enviado, false),
+        erro = CASE WHEN r.enviado THEN NULL WHEN r.devolvida THEN f.erro ELSE left(r.erro, 500) END,
+        data_envio = CASE
+          WHEN r.enviado OR (NOT COALESCE(r.devolvida, false)
+                             AND (r.definitivo OR f.tentativas >= p_max_tentativas)) THEN NOW()
+        END,
+        agendado_para = CASE
+          WHEN r.enviado OR r.devolvida OR r.definitivo OR f.tentativas >= p_max_tentativas THEN f.agendado_para
+          ELSE NOW() + make_interval(secs => p_espera_segundos * power(2, f.tentativas - 1))
+        END,
+        tentativas = f.tentativas - CASE WHEN r.devolvida THEN 1 ELSE 0 END,
+        reservado_por = NULL,
+        reservado_ate = NULL
+    FROM r
+    WHERE f.id = r.id AND f.reservado_por = p_worker
+    RETURNING 1
+  )
+  SELECT COUNT(*)::INTEGER FROM atualizadas;
+$$ LANGUAGE sql VOLATILE SECURITY DEFINER SET search_path = public;
+
+-- Somente o MCP Server (service_role) consome a fila
+REVOKE ALL ON FUNCTION reservar_fila_whatsapp(TEXT, INTEGER, INTEGER) FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION concluir_fila_whatsapp(TEXT, JSONB, INTEGER, INTEGER) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION reservar_fila_whatsapp(TEXT, INTEGER, INTEGER) TO service_role;
+GRANT EXECUTE ON FUNCTION concluir_fila_whatsapp(TEXT, JSONB, INTEGER, INTEGER) TO service_role;
@@ -0,0 +1,98 @@
+-- =====================================================
+-- PROJEÇÃO DE FLUXO DE CAIXA
+-- (MCP Server - projecao_fluxo_caixa)
+-- Duas functions de agregação: o MCP recebe algumas centenas de linhas
+-- (valores por dia) em vez dos títulos e projeta o caixa em memória.
+-- contas_receber só existe em parte das instalações (database/007); sem a
+-- tabela, as functions a ignoram.
+-- =====================================================
+
+-- O último faturamento e os títulos em aberto por status
+CREATE INDEX IF NOT EXISTS idx_mensalidades_referencia ON mensalidades(referencia);
+CREATE INDEX IF NOT EXISTS idx_contas_pagar_status ON contas_pagar(status);
+
+-- Atraso dos pagamentos (data do pagamento - vencimento, em dias) dos títulos
+-- que venceram entre p_desde e hoje - p_max_dias, ou seja, que já tiveram a
+-- janela inteira para serem pagos. dias NULL: não pago em até p_max_dias.
+-- Pagamentos adiantados mais de p_max_dias contam como p_max_dias antes.
+CREATE OR REPLACE FUNCTION distribuicao_atrasos(p_desde DATE, p_max_dias INTEGER DEFAULT 180)
+RETURNS TABLE (origem TEXT, dias INTEGER, quantidade BIGINT, valor NUMERIC) AS $$
+#variable_conflict use_column
+BEGIN
+  RETURN QUERY
+  SELECT 'mensalidades'::TEXT, a.dias, COUNT(*), SUM(a.valor)
+  FROM (
+    SELECT CASE WHEN m.status::TEXT = 'pago'
+                 AND COALESCE(m.data_pagamento::DATE, m.data_vencimento) - m.data_vencimento <= p_max_dias
+                THEN GREATEST(COALESCE(m.data_pagamento::DATE, m.data_vencimento) - m.data_vencimento, -p_max_dias)
+           END AS dias,
+           m.valor
+    FROM mensalidades m
+    WHERE m.data_vencimento >= p_desde AND m.data_vencimento < CURRENT_DATE - p_max_dias
+      AND m.status::TEXT <> 'cancelado'
+  ) a
+  GROUP BY a.dias;
+
+  IF to_regclass('contas_receber') IS NOT NULL THEN
+    RETURN QUERY EXECUTE $q$
+      SELECT 'contas_receber'::TEXT, a.dias, COUNT(*), SUM(a.valor)
+      FROM (
+        SELECT CASE WHEN c.status::TEXT = 'pago'
+                     AND COALESCE(c.data_recebimento::DATE, c.data_vencimento) - c.data_vencimento <= $2
+                    THEN GREATEST(COALESCE(c.data_recebimento::DATE, c.data_vencimento) - c.data_vencimento, -$2)
+               END AS dias,
+               c.valor
+        FROM contas_receber c
+        WHERE c.data_vencimento >= $1 AND c.data_vencimento < CURRENT_DATE - $2
+          AND c.status::TEXT <> 'cancelado'
+      ) a
+      GROUP BY a.dias
+    $q$ USING p_desde, p_max_dias;
+  END IF;
+END;
+$$ LANGUAGE plpgsql STABLE SECURITY DEFINER SET search_path = public;
+
+-- Títulos em aberto por dia de vencimento (dias = vencimento - hoje; negativo:
+-- vencido) e o último faturamento de mensalidades (dias = dia do vencimento),
+-- base dos meses que ainda não foram gerados
+CREATE OR REPLACE FUNCTION titulos_em_aberto()
+RETURNS TABLE (origem TEXT, dias INTEGER, quantidade BIGINT, valor NUMERIC, referencia TEXT) AS $$
+#variable_conflict use_column
+BEGIN
+  RETURN QUERY
+  SELECT 'mensalidades'::TEXT, m.data_vencimento - CURRENT_DATE, COUNT(*), SUM(m.valor), NULL::TEXT
+  FROM mensalidades m
+  WHERE m.status IN ('pendente', 'atrasado')
+  GROUP BY m.data_vencimento;
+
+  RETURN QUERY
+  SELECT 'contas_pagar'::TEXT, c.data_vencimento - CURRENT_DATE, COUNT(*), SUM(c.valor), NULL::TEXT
+  FROM contas_pagar c
+  WHERE c.status IN ('pendente', 'atrasado')
+  GROUP BY c.data_vencimento;
+
+  IF to_regclass('contas_receber') IS NOT NULL THEN
+    RETURN QUERY EXECUTE $q$
+      SELECT 'contas_receber'::TEXT, c.data_vencimento - CURRENT_DATE, COUNT(*), SUM(c.valor), NULL::TEXT
+      FROM contas_receber c
+      WHERE c.status IN ('pendente', 'atrasado')
+      GROUP BY c.data_vencimento
+    $q$;
+  END IF;
+
+  RETURN QUERY
+  SELECT 'faturamento'::TEXT,
+         EXTRACT(DAY FROM mode() WITHIN GROUP (ORDER BY m.data_vencimento))::INTEGER,
+         COUNT(*), SUM(m.valor), m.referencia::TEXT
+  FROM mensalidades m
+  WHERE m.referencia = (SELECT max(referencia) FROM mensalidades)
+    AND m.status::TEXT <> 'cancelado'
+  GROUP BY m.referencia;
+END;
+$$ LANGUAGE plpgsql STABLE SECURITY DEFINER SET search_path = public;
+
+-- Somente o MCP Server (service_role) chama as functions
+REVOKE ALL ON FUNCTION distribuicao_atrasos(DATE, INTEGER) FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION titulos_em_aberto() FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION distribuicao_atrasos(DATE, INTEGER) TO service_role;
+GRANT EXECUTE ON FUNCTION titulos_em_aberto() TO service_role;
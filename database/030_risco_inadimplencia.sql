@@ -0,0 +1,11 @@
+-- =====================================================
+-- RISCO DE INADIMPLÊNCIA
+-- (MCP Server - risco_inadimplencia)
+-- O MCP guarda as notas de risco até a próxima alteração em mensalidades ou
+-- associados e confere isso a cada chamada pelo maior updated_at das duas
+-- tabelas. Com os índices, a conferência lê uma entrada de índice em vez da
+-- tabela inteira. updated_at já é mantido pelos triggers update_updated_at.
+-- =====================================================
+
+CREATE INDEX IF NOT EXISTS idx_mensalidades_updated_at ON mensalidades(updated_at);
+CREATE INDEX IF NOT EXISTS idx_associados_updated_at ON associados(updated_at);
@@ -0,0 +1,221 @@
+-- =====================================================
+-- COMPARAÇÃO DE COTAÇÕES
+-- (MCP Server - comparar_cotacoes)
+-- cotacoes_para_comparacao devolve, numa única consulta, as propostas de
+-- vários pedidos junto com o histórico de preços de cada fornecedor.
+-- O histórico vem de historico_precos_fornecedores, uma tabela de resumo
+-- (uma linha por fornecedor e item) recalculada por
+-- atualizar_historico_precos. A comparação lê esse resumo em vez de agregar
+-- todas as cotações antigas a cada chamada.
+-- Funciona com os dois modelos de compras: solicitacoes_compra → cotacoes
+-- (database/005, 008) e compras → orcamentos (database/02). Um modelo
+-- ausente é ignorado.
+-- =====================================================
+
+-- Preço por item das cotações (opcional): sem itens, a comparação é só pelo total
+DO $$
+BEGIN
+  IF to_regclass('cotacoes') IS NOT NULL AND to_regclass('cotacao_itens') IS NULL THEN
+    CREATE TABLE cotacao_itens (
+      id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+      cotacao_id UUID NOT NULL REFERENCES cotacoes(id) ON DELETE CASCADE,
+      item TEXT NOT NULL,
+      quantidade DECIMAL(12,3) NOT NULL DEFAULT 1,
+      unidade VARCHAR(10),
+      valor_unitario DECIMAL(12,2) NOT NULL,
+      created_at TIMESTAMPTZ DEFAULT NOW()
+    );
+    CREATE INDEX idx_cotacao_itens_cotacao ON cotacao_itens(cotacao_id);
+    ALTER TABLE cotacao_itens ENABLE ROW LEVEL SECURITY;
+  END IF;
+END $$;
+
+-- Item normalizado: mesma chave para "Cloro  granulado" e "cloro granulado"
+CREATE OR REPLACE FUNCTION chave_item(p_item TEXT)
+RETURNS TEXT AS $$
+  SELECT regexp_replace(lower(btrim(p_item)), '\s+', ' ', 'g');
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Resumo por fornecedor. item = '' é a proposta inteira; nas demais linhas,
+-- item é a chave_item e os valores são unitários. preco_relativo_medio é o
+-- preço dividido pelo menor do mesmo pedido (1 = sempre o mais barato) e só
+-- conta pedidos com mais de uma proposta.
+CREATE TABLE IF NOT EXISTS historico_precos_fornecedores (
+  fornecedor_id UUID NOT NULL,
+  item TEXT NOT NULL,
+  cotacoes INTEGER NOT NULL,
+  vencedoras INTEGER NOT NULL,
+  preco_relativo_medio DECIMAL(10,4),
+  prazo_medio DECIMAL(10,1),
+  valor_unitario_medio DECIMAL(12,2),
+  valor_unitario_minimo DECIMAL(12,2),
+  valor_unitario_maximo DECIMAL(12,2),
+  ultimo_valor_unitario DECIMAL(12,2),
+  ultima_cotacao TIMESTAMPTZ,
+  atualizado_em TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  PRIMARY KEY (fornecedor_id, item)
+);
+
+ALTER TABLE historico_precos_fornecedores ENABLE ROW LEVEL SECURITY;
+
+-- Propostas dos pedidos (solicitação ou compra) de cada modelo presente no banco
+CREATE OR REPLACE FUNCTION fontes_cotacoes()
+RETURNS TEXT AS $$
+DECLARE
+  v_fontes TEXT[] := '{}';
+BEGIN
+  IF to_regclass('cotacoes') IS NOT NULL THEN
+    v_fontes := array_append(v_fontes, $q$
+      SELECT c.id, c.solicitacao_id AS pedido_id, c.fornecedor_id, c.valor, c.prazo_entrega,
+             COALESCE(c.selecionada, false) AS selecionada, c.created_at,
+             s.status IN ('solicitado', 'em_cotacao') AS aberto
+      FROM cotacoes c JOIN solicitacoes_compra s ON s.id = c.solicitacao_id
+    $q$);
+  END IF;
+  IF to_regclass('orcamentos') IS NOT NULL THEN
+    v_fontes := array_append(v_fontes, $q$
+      SELECT o.id, o.compra_id AS pedido_id, o.fornecedor_id, o.valor, NULL::INTEGER AS prazo_entrega,
+             COALESCE(o.selecionado, false) AS selecionada, o.created_at,
+             p.status IN ('solicitada', 'cotacao') AS aberto
+      FROM orcamentos o JOIN compras p ON p.id = o.compra_id
+    $q$);
+  END IF;
+  IF cardinality(v_fontes) = 0 THEN
+    RETURN NULL;
+  END IF;
+  RETURN array_to_string(v_fontes, ' UNION ALL ');
+END;
+$$ LANGUAGE plpgsql STABLE SET search_path = public;
+
+-- Recalcula o resumo se ele tiver mais de p_intervalo_segundos (0: sempre).
+-- Entram só pedidos já decididos: as propostas em aberto são as que estão
+-- sendo comparadas. Quem lê durante o recálculo continua vendo o resumo
+-- anterior até o COMMIT.
+CREATE OR REPLACE FUNCTION atualizar_historico_precos(p_intervalo_segundos INTEGER DEFAULT 0)
+RETURNS TABLE (atualizado_em TIMESTAMPTZ, linhas BIGINT, recalculado BOOLEAN) AS $$
+#variable_conflict use_column
+DECLARE
+  v_fontes TEXT := fontes_cotacoes();
+  v_atualizado TIMESTAMPTZ;
+BEGIN
+  -- Duas chamadas ao mesmo tempo: a segunda espera e reaproveita o resultado
+  PERFORM pg_advisory_xact_lock(hashtext('historico_precos_fornecedores'));
+  SELECT max(h.atualizado_em) INTO v_atualizado FROM historico_precos_fornecedores h;
+  IF v_atualizado > clock_timestamp() - make_interval(secs => p_intervalo_segundos) THEN
+    RETURN QUERY SELECT v_atualizado, COUNT(*), false FROM historico_precos_fornecedores;
+    RETURN;
+  END IF;
+
+  DELETE FROM historico_precos_fornecedores;
+  IF v_fontes IS NOT NULL THEN
+    EXECUTE format($q$
+      INSERT INTO historico_precos_fornecedores
+        (fornecedor_id, item, cotacoes, vencedoras, preco_relativo_medio, prazo_medio, ultima_cotacao)
+      SELECT p.fornecedor_id, '', COUNT(*), COUNT(*) FILTER (WHERE p.selecionada),
+             AVG(p.valor / NULLIF(p.menor, 0)) FILTER (WHERE p.propostas > 1),
+             AVG(p.prazo_entrega), MAX(p.created_at)
+      FROM (
+        SELECT f.*, MIN(f.valor) OVER w AS menor, COUNT(*) OVER w AS propostas
+        FROM (%s) f
+        WHERE NOT f.aberto AND f.fornecedor_id IS NOT NULL
+        WINDOW w AS (PARTITION BY f.pedido_id)
+      ) p
+      GROUP BY p.fornecedor_id
+    $q$, v_fontes);
+  END IF;
+
+  IF to_regclass('cotacao_itens') IS NOT NULL THEN
+    INSERT INTO historico_precos_fornecedores
+      (fornecedor_id, item, cotacoes, vencedoras, preco_relativo_medio, prazo_medio,
+       valor_unitario_medio, valor_unitario_minimo, valor_unitario_maximo, ultimo_valor_unitario, ultima_cotacao)
+    SELECT p.fornecedor_id, p.chave, COUNT(*), COUNT(*) FILTER (WHERE p.selecionada),
+           AVG(p.valor_unitario / NULLIF(p.menor, 0)) FILTER (WHERE p.propostas > 1),
+           AVG(p.prazo_entrega), AVG(p.valor_unitario), MIN(p.valor_unitario), MAX(p.valor_unitario),
+           (array_agg(p.valor_unitario ORDER BY p.created_at DESC))[1], MAX(p.created_at)
+    FROM (
+      SELECT c.fornecedor_id, c.selecionada, c.prazo_entrega, c.created_at, i.chave, i.valor_unitario,
+             MIN(i.valor_unitario) OVER w AS menor, COUNT(*) OVER w AS propostas
+      FROM (SELECT ci.cotacao_id, chave_item(ci.item) AS chave, ci.valor_unitario FROM cotacao_itens ci) i
+      JOIN cotacoes c ON c.id = i.cotacao_id
+      JOIN solicitacoes_compra s ON s.id = c.solicitacao_id
+      WHERE s.status NOT IN ('solicitado', 'em_cotacao')
+      WINDOW w AS (PARTITION BY c.solicitacao_id, i.chave)
+    ) p
+    GROUP BY p.fornecedor_id, p.chave;
+  END IF;
+
+  RETURN QUERY SELECT now(), COUNT(*), true FROM historico_precos_fornecedores;
+END;
+$$ LANGUAGE plpgsql VOLATILE SECURITY DEFINER SET search_path = public;
+
+-- Propostas dos pedidos p_pedidos (UUIDs de solicitacoes_compra ou de compras)
+-- com os itens e o histórico do fornecedor. Sem p_pedidos: os p_limite pedidos
+-- em cotação mais antigos. Uma linha por proposta.
+CREATE OR REPLACE FUNCTION cotacoes_para_comparacao(p_pedidos UUID[] DEFAULT NULL, p_limite INTEGER DEFAULT 20)
+RETURNS TABLE (
+  origem TEXT, pedido_id UUID, pedido_numero INTEGER, pedido_descricao TEXT, pedido_status TEXT,
+  valor_estimado NUMERIC, cotacao_id UUID, fornecedor_id UUID, fornecedor TEXT, valor NUMERIC,
+  prazo_entrega INTEGER, condicao_pagamento TEXT, validade_proposta DATE, selecionada BOOLEAN,
+  itens JSONB, historico JSONB
+) AS $$
+#variable_conflict use_column
+DECLARE
+  v_itens TEXT := 'NULL::JSONB';
+  -- Filtros separados (e não um CASE) para o planner usar o índice de cada um
+  v_solicitacoes TEXT := CASE WHEN p_pedidos IS NULL
+    THEN $q$s.status IN ('solicitado', 'em_cotacao') ORDER BY s.numero LIMIT $2$q$ ELSE 's.id = ANY($1)' END;
+  v_compras TEXT := CASE WHEN p_pedidos IS NULL
+    THEN $q$p.status IN ('solicitada', 'cotacao') ORDER BY p.created_at LIMIT $2$q$ ELSE 'p.id = ANY($1)' END;
+BEGIN
+  IF to_regclass('cotacao_itens') IS NOT NULL THEN
+    v_itens := $q$(
+      SELECT jsonb_agg(jsonb_build_object(
+               'item', ci.item, 'chave', chave_item(ci.item), 'quantidade', ci.quantidade,
+               'unidade', ci.unidade, 'valor_unitario', ci.valor_unitario,
+               'historico', to_jsonb(hi) - 'fornecedor_id' - 'item' - 'atualizado_em') ORDER BY ci.item)
+      FROM cotacao_itens ci
+      LEFT JOIN historico_precos_fornecedores hi
+        ON hi.fornecedor_id = c.fornecedor_id AND hi.item = chave_item(ci.item)
+      WHERE ci.cotacao_id = c.id
+    )$q$;
+  END IF;
+
+  IF to_regclass('cotacoes') IS NOT NULL THEN
+    RETURN QUERY EXECUTE format($q$
+      WITH pedidos AS (
+        SELECT s.* FROM solicitacoes_compra s WHERE %s
+      )
+      SELECT 'cotacoes'::TEXT, s.id, s.numero, s.descricao::TEXT, s.status::TEXT, s.valor_estimado,
+             c.id, c.fornecedor_id, COALESCE(f.nome_fantasia, f.razao_social)::TEXT, c.valor,
+             c.prazo_entrega, c.condicao_pagamento, c.validade_proposta, COALESCE(c.selecionada, false),
+             %s, to_jsonb(h) - 'fornecedor_id' - 'item' - 'atualizado_em'
+      FROM pedidos s
+      JOIN cotacoes c ON c.solicitacao_id = s.id
+      LEFT JOIN fornecedores f ON f.id = c.fornecedor_id
+      LEFT JOIN historico_precos_fornecedores h ON h.fornecedor_id = c.fornecedor_id AND h.item = ''
+    $q$, v_solicitacoes, v_itens) USING p_pedidos, p_limite;
+  END IF;
+
+  IF to_regclass('orcamentos') IS NOT NULL THEN
+    RETURN QUERY EXECUTE format($q$
+      WITH pedidos AS (
+        SELECT p.* FROM compras p WHERE %s
+      )
+      SELECT 'orcamentos'::TEXT, p.id, NULL::INTEGER, p.descricao::TEXT, p.status::TEXT, p.valor_estimado,
+             o.id, o.fornecedor_id, COALESCE(f.nome_fantasia, f.razao_social, o.fornecedor_nome)::TEXT, o.valor,
+             NULL::INTEGER, NULL::TEXT, NULL::DATE, COALESCE(o.selecionado, false),
+             NULL::JSONB, to_jsonb(h) - 'fornecedor_id' - 'item' - 'atualizado_em'
+      FROM pedidos p
+      JOIN orcamentos o ON o.compra_id = p.id
+      LEFT JOIN fornecedores f ON f.id = o.fornecedor_id
+      LEFT JOIN historico_precos_fornecedores h ON h.fornecedor_id = o.fornecedor_id AND h.item = ''
+    $q$, v_compras) USING p_pedidos, p_limite;
+  END IF;
+END;
+$$ LANGUAGE plpgsql STABLE SECURITY DEFINER SET search_path = public;
+
+-- Somente o MCP Server (service_role) chama as functions
+REVOKE ALL ON FUNCTION atualizar_historico_precos(INTEGER) FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION cotacoes_para_comparacao(UUID[], INTEGER) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION atualizar_historico_precos(INTEGER) TO service_role;
+GRANT EXECUTE ON FUNCTION cotacoes_para_comparacao(UUID[], INTEGER) TO service_role;
@@ -0,0 +1,203 @@
+"""
+Benchmark - busca textual nas mensagens do CRM
+==============================================
+Carrega um histórico sintético de WhatsApp (1M de mensagens por padrão) num
+schema descartável de um Postgres real, aplica a database/024_crm_busca_mensagens.sql
+e mede `buscar_texto_mensagens` (caminho asyncpg) para termos raros, médios
+e frequentes, com frase exata e exclusão. Para comparação, mede também o
+que se faria sem o índice: `conteudo ILIKE '%termo%'`.
+
+Confere que o índice GIN é usado e que toda página devolvida destaca os termos.
+Os GRANT/REVOKE da migração são ignorados (os papéis do Supabase não existem
+num Postgres local) e a function passa a procurar as tabelas no schema do benchmark.
+
+Requer: pip install -e ".[postgres]" e um Postgres acessível (não use o de produção).
+
+Uso:
+    python benchmarks/bench_busca_mensagens.py --database-url postgresql://postgres@localhost/postgres
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlencode, urlparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import asyncpg  # noqa: E402
+
+from benchmarks.bench_postgres_direto import medir  # noqa: E402
+from benchmarks.dados import NOMES, SOBRENOMES  # noqa: E402
+from benchmarks.fake_postgrest import FakeDB  # noqa: E402
+from benchmarks.standin import conectar  # noqa: E402
+
+MIGRACAO = os.path.join(os.path.dirname(__file__), "..", "..", "database", "024_crm_busca_mensagens.sql")
+
+# Assuntos com frequências bem diferentes, para termos raros, médios e frequentes
+ASSUNTOS = [
+    (30, ["Qual o valor da mensalidade deste mês?", "Preciso da segunda via do boleto",
+          "O boleto venceu, posso pagar no pix?", "Já paguei a mensalidade, podem dar baixa?"]),
+    (20, ["Bom dia, a piscina já reabriu?", "Qual o horário da piscina no fim de semana?",
+          "A piscina aquecida está funcionando?"]),
+    (15, ["Como agendo o exame médico?", "Meu exame venceu, onde renovo?",
+          "O exame do meu filho vale para a piscina?"]),
+    (10, ["Quero reservar a churrasqueira para sábado", "O salão de festas está livre dia 20?"]),
+    (10, ["Posso levar um convidado no domingo?", "Quantos convites tenho por mês?"]),
+    (8, ["Perdi minha carteirinha, como faço outra?", "A carteirinha do meu dependente chegou?"]),
+    (5, ["Quando é a eleição da diretoria?", "Como voto na assembleia?"]),
+    (2, ["A quadra de tênis foi reformada?", "Tem aula de natação para adultos?"]),
+]
+RESPOSTAS = ["Obrigado!", "Bom dia!", "Vou verificar e já retorno.", "Certo, obrigado pela informação.",
+             "Pode enviar o comprovante por aqui.", "Atendimento de segunda a sábado, das 8h às 18h."]
+CONSULTAS = [
+    ("raro", "tênis"),
+    ("médio", "churrasqueira sábado"),
+    ("frase", '"segunda via"'),
+    ("frequente", "piscina"),
+    ("exclusão", "exame -piscina"),
+    ("alternativa", "convidado or convites"),
+]
+
+
+def gerar_historico(mensagens: int, semente: int):
+    """Conversas e mensagens como tuplas prontas para COPY (~20 mensagens por conversa)."""
+    rng = random.Random(semente)
+    pesos, frases = zip(*ASSUNTOS)
+    agora = datetime.now(timezone.utc)
+    conversas, linhas = [], []
+    while len(linhas) < mensagens:
+        conversa_id = uuid.UUID(int=rng.getrandbits(128), version=4)
+        nome = f"{rng.choice(NOMES)} {rng.choice(SOBRENOMES)}"
+        conversas.append((conversa_id, f"55169{rng.randint(10**7, 10**8 - 1)}", nome, "aberta"))
+        quando = agora - timedelta(days=rng.uniform(0, 730))
+        for k in range(min(rng.randint(5, 35), mensagens - len(linhas))):
+            entrada = k % 2 == 0
+            texto = rng.choice(rng.choices(frases, pesos)[0]) if entrada else rng.choice(RESPOSTAS)
+            linhas.append((uuid.UUID(int=rng.getrandbits(128), version=4), conversa_id,
+                           "entrada" if entrada else "saida", texto, "texto", entrada and rng.random() < 0.1,
+                           quando))
+            quando += timedelta(minutes=rng.randint(1, 240))
+    return conversas, linhas
+
+
+async def carregar_postgres(conn: asyncpg.Connection, schema: str, conversas: list, mensagens: list) -> float:
+    await conn.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE; CREATE SCHEMA {schema}")
+    await conn.execute(f"SET search_path = {schema}")
+    await conn.execute("""
+        CREATE TABLE conversas_whatsapp (
+          id UUID PRIMARY KEY, telefone VARCHAR(20), nome_contato VARCHAR(255),
+          status VARCHAR(20), associado_id UUID);
+        CREATE TABLE mensagens_whatsapp (
+          id UUID PRIMARY KEY, conversa_id UUID NOT NULL REFERENCES conversas_whatsapp(id),
+          direcao VARCHAR(10) NOT NULL, conteudo TEXT NOT NULL, tipo VARCHAR(50),
+          lida BOOLEAN DEFAULT false, created_at TIMESTAMPTZ DEFAULT NOW());
+    """)
+    await conn.copy_records_to_table("conversas_whatsapp", records=conversas, schema_name=schema,
+                                     columns=["id", "telefone", "nome_contato", "status"])
+    await conn.copy_records_to_table("mensagens_whatsapp", records=mensagens, schema_name=schema,
+                                     columns=["id", "conversa_id", "direcao", "conteudo", "tipo", "lida", "created_at"])
+
+    sql = open(MIGRACAO, encoding="utf-8").read().replace("search_path = public", f"search_path = {schema}")
+    sql = "\n".join(l for l in sql.splitlines() if not l.startswith(("GRANT", "REVOKE")))
+    inicio = time.perf_counter()
+    await conn.execute(sql)
+    return time.perf_counter() - inicio
+
+
+async def baseline_ilike(conn: asyncpg.Connection, termo: str, iteracoes: int) -> float:
+    latencias = []
+    for _ in range(iteracoes):
+        inicio = time.perf_counter()
+        await conn.fetch(
+            "SELECT id, conversa_id, conteudo, count(*) OVER () FROM mensagens_whatsapp "
+            "WHERE conteudo ILIKE '%' || $1 || '%' ORDER BY created_at DESC LIMIT 20", termo,
+        )
+        latencias.append((time.perf_counter() - inicio) * 1000)
+    return round(sorted(latencias)[len(latencias) // 2], 2)
+
+
+def _json(resposta: str):
+    return json.loads(resposta.split("\n\n", 1)[1])
+
+
+async def main(args):
+    inicio = time.perf_counter()
+    conversas, mensagens = gerar_historico(args.mensagens, args.semente)
+    geracao = time.perf_counter() - inicio
+
+    conn = await asyncpg.connect(args.database_url)
+    try:
+        inicio = time.perf_counter()
+        migracao = await carregar_postgres(conn, args.schema, conversas, mensagens)
+        carga = time.perf_counter() - inicio - migracao
+        plano = "\n".join(r[0] for r in await conn.fetch(
+            "EXPLAIN SELECT id FROM mensagens_whatsapp WHERE busca @@ websearch_to_tsquery('portuguese', 'tênis')"
+        ))
+        assert "idx_mensagens_busca" in plano, plano
+        tamanho_indice = await conn.fetchval("SELECT pg_size_pretty(pg_relation_size('idx_mensagens_busca'))")
+        ilike = {termo: await baseline_ilike(conn, termo, 5) for termo in ("tênis", "piscina")}
+    finally:
+        await conn.close()
+
+    server, _ = conectar(FakeDB())
+    logging.getLogger("sistema-clube-mcp").setLevel(logging.CRITICAL)
+    separador = "&" if urlparse(args.database_url).query else "?"
+    server.DATABASE_URL = f"{args.database_url}{separador}{urlencode({'search_path': args.schema})}"
+
+    resultado = {
+        "mensagens": len(mensagens),
+        "conversas": len(conversas),
+        "geracao_segundos": round(geracao, 1),
+        "carga_segundos": round(carga, 1),
+        "migracao_024_segundos": round(migracao, 1),
+        "indice_gin": tamanho_indice,
+        "iteracoes": args.iteracoes,
+        "concorrencia": args.concorrencia,
+        "consultas": {},
+        "ilike_sem_indice_p50_ms": ilike,
+    }
+    await server.abrir_pg_pool()
+    try:
+        for rotulo, termos in CONSULTAS:
+            primeira = _json(await server.buscar_texto_mensagens(termos))
+            segunda = _json(await server.buscar_texto_mensagens(termos, offset=20))
+            assert primeira["total"] > 0, termos
+            assert all("**" in r["trecho"] for r in primeira["resultados"] + segunda["resultados"]), termos
+            assert not {r["mensagem_id"] for r in primeira["resultados"]} & \
+                {r["mensagem_id"] for r in segunda["resultados"]}, "páginas repetidas"
+            alem_do_fim = _json(await server.buscar_texto_mensagens(termos, offset=primeira["total"] + 20))
+            assert alem_do_fim["total"] == primeira["total"] and not alem_do_fim["resultados"], termos
+            desde = _json(await server.buscar_texto_mensagens(termos, desde="2000-01-01"))
+            assert desde["total"] == primeira["total"], termos
+            medidas = await medir(
+                lambda i, t=termos: server.buscar_texto_mensagens(t, offset=20 * (i % 3)),
+                args.iteracoes, args.concorrencia,
+            )
+            resultado["consultas"][f"{rotulo}: {termos}"] = {"encontradas": primeira["total"], **medidas}
+    finally:
+        await server.fechar_pg_pool()
+        if not args.manter:
+            conn = await asyncpg.connect(args.database_url)
+            await conn.execute(f"DROP SCHEMA IF EXISTS {args.schema} CASCADE")
+            await conn.close()
+
+    print(json.dumps(resultado, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"), required=not os.getenv("DATABASE_URL"))
+    parser.add_argument("--mensagens", type=int, default=1_000_000)
+    parser.add_argument("--iteracoes", type=int, default=30)
+    parser.add_argument("--concorrencia", type=int, default=4)
+    parser.add_argument("--schema", default="bench_busca", help="Schema descartável onde o histórico é carregado")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--manter", action="store_true", help="Não remove o schema ao final")
+    asyncio.run(main(parser.parse_args()))
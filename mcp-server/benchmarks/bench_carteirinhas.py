@@ -0,0 +1,141 @@
+"""
+Benchmark - emitir_carteirinhas_lote (renovação anual das carteirinhas)
+=======================================================================
+No stand-in, com latência simulada por requisição:
+
+1. só banco: emite a carteirinha do clube inteiro sem imagens (leituras
+   paginadas, inserts em lote, desativação das anteriores);
+2. completo: emite de novo, agora desenhando os PNGs no pool de processos.
+   Mede carteirinhas por segundo e ms de CPU por carteirinha em cada
+   processo, que é o número para estimar máquinas com mais núcleos.
+
+Depois de cada emissão confere: uma única carteirinha ativa por pessoa emitida,
+hashes novos únicos, validar_carteirinha aceita o hash novo e recusa o da via
+anterior, e há um PNG por carteirinha emitida. Com zxing-cpp instalado, lê
+o QR code de uma amostra de PNGs e compara com o hash gravado.
+
+Uso:
+    python benchmarks/bench_carteirinhas.py --tamanho 10k --processos 8 --latencia-ms 5
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from benchmarks.dados import TAMANHOS, gerar_clube  # noqa: E402
+from benchmarks.standin import carregar, conectar  # noqa: E402
+
+
+def _json(resposta: str):
+    assert not resposta.startswith("❌"), resposta
+    return json.loads(resposta.split("\n\n", 1)[1] if "\n\n" in resposta else resposta)
+
+
+async def conferir(server, transporte, esperadas: int, validade: str, anteriores: dict[str, str],
+                   rng: random.Random) -> dict:
+    """Confere o estado de carteirinhas depois de uma emissão; devolve o hash ativo de cada pessoa emitida.
+
+    Inativos não recebem carteirinha nova e a que já tinham fica como está.
+    """
+    ativas = [c for c in transporte.db.linhas("carteirinhas") if c.get("ativa")]
+    emitidos = {c["associado_id"] or c["dependente_id"] for c in ativas if c["data_validade"] == validade}
+    assert len(emitidos) == esperadas, f"{len(emitidos)} pessoas com carteirinha nova, esperado {esperadas}"
+    donos = Counter(c["associado_id"] or c["dependente_id"] for c in ativas)
+    assert all(donos[p] == 1 for p in emitidos), "pessoa com mais de uma carteirinha ativa"
+    hashes = {c["associado_id"] or c["dependente_id"]: c["qrcode_hash"]
+              for c in ativas if c["data_validade"] == validade}
+    assert len(set(hashes.values())) == len(hashes), "qrcode_hash repetido"
+    assert not set(hashes.values()) & set(anteriores.values()), "hash novo igual ao de uma via anterior"
+
+    for pessoa in rng.sample(sorted(set(hashes) & set(anteriores)), 20):
+        nova = _json(await server.validar_carteirinha(hashes[pessoa]))
+        assert nova["permitido"] or "Carteirinha" not in nova.get("motivo", ""), nova
+        velha = _json(await server.validar_carteirinha(anteriores[pessoa]))
+        assert not velha["permitido"] and "cancelada" in velha["motivo"], velha
+    return hashes
+
+
+def ler_qrcodes(pasta: str, hashes: set[str], amostra: int, rng: random.Random) -> int:
+    """Decodifica o QR code de uma amostra de PNGs (precisa de zxing-cpp); devolve quantos foram lidos."""
+    try:
+        import zxingcpp
+        from PIL import Image
+    except ImportError:
+        return 0
+    arquivos = glob.glob(os.path.join(pasta, "*.png"))
+    for arquivo in rng.sample(arquivos, min(amostra, len(arquivos))):
+        lidos = zxingcpp.read_barcodes(Image.open(arquivo))
+        assert len(lidos) == 1 and lidos[0].text in hashes, f"QR code ilegível ou errado em {arquivo}"
+    return min(amostra, len(arquivos))
+
+
+async def main(args):
+    dados = gerar_clube(TAMANHOS[args.tamanho], semente=args.semente)
+    server, transporte = conectar(carregar(dados), latencia_ms=args.latencia_ms)
+    logging.getLogger("sistema-clube-mcp").setLevel(logging.CRITICAL)
+    server.CARTEIRINHA_DIR = tempfile.mkdtemp(prefix="carteirinhas-")
+    server.CARTEIRINHA_PROCESSOS = args.processos
+    rng = random.Random(args.semente)
+
+    inicial = {c["associado_id"] or c["dependente_id"]: c["qrcode_hash"]
+               for c in transporte.db.linhas("carteirinhas") if c.get("ativa")}
+    previsto = _json(await server.emitir_carteirinhas_lote(simular=True))
+    esperadas = previsto["carteirinhas"]
+    resultado = {
+        "tamanho": args.tamanho,
+        "carteirinhas": esperadas,
+        "a_desativar": previsto["a_desativar"],
+        "latencia_ms": args.latencia_ms,
+        "processos": args.processos or os.cpu_count(),
+    }
+
+    antes = transporte.requisicoes
+    inicio = time.perf_counter()
+    emitido = _json(await server.emitir_carteirinhas_lote(imagens=False))
+    so_banco = time.perf_counter() - inicio
+    assert emitido["carteirinhas"] == esperadas and not emitido["erros"], emitido
+    hashes = await conferir(server, transporte, esperadas, previsto["data_validade"], inicial, rng)
+    resultado["so_banco"] = {
+        "segundos": round(so_banco, 2),
+        "requisicoes": transporte.requisicoes - antes,
+        "desativadas": emitido["desativadas"],
+    }
+
+    inicio = time.perf_counter()
+    emitido = _json(await server.emitir_carteirinhas_lote())
+    completo = time.perf_counter() - inicio
+    assert emitido["carteirinhas"] == esperadas and not emitido["erros"], emitido
+    novos = await conferir(server, transporte, esperadas, previsto["data_validade"], hashes, rng)
+    pasta = emitido["imagens"]["pasta"]
+    assert len(glob.glob(os.path.join(pasta, "*.png"))) == esperadas, "falta PNG de carteirinha emitida"
+    processos = resultado["processos"]
+    resultado["completo"] = {
+        "segundos": round(completo, 2),
+        "carteirinhas_por_segundo": round(esperadas / completo),
+        # Desenho = total - parte de banco; cada processo desenha esperadas / processos carteirinhas
+        "ms_cpu_por_carteirinha": round(max(completo - so_banco, 0) * 1000 * processos / esperadas, 1),
+        "imagens_mb": emitido["imagens"]["mb"],
+        "kb_por_imagem": round(emitido["imagens"]["mb"] * 1024 / esperadas, 1),
+        "qrcodes_lidos": ler_qrcodes(pasta, set(novos.values()), args.amostra_qr, rng),
+    }
+    print(json.dumps(resultado, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tamanho", choices=list(TAMANHOS), default="10k")
+    parser.add_argument("--processos", type=int, default=0, help="CARTEIRINHA_PROCESSOS (0 = um por CPU)")
+    parser.add_argument("--latencia-ms", type=float, default=5.0, help="Latência simulada por requisição")
+    parser.add_argument("--amostra-qr", type=int, default=200, help="PNGs decodificados com zxing-cpp")
+    parser.add_argument("--semente", type=int, default=42)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,62 @@
+"""
+Benchmark - Coalescência de leituras (single-flight)
+====================================================
+Dispara N chamadas concorrentes idênticas de `resumo_geral`,
+`estatisticas_financeiro` e `listar_planos` contra o PostgREST falso em
+memória (com latência simulada) e conta as requisições que chegam nele.
+
+Verifica que cada tool executa o backend uma única vez por rajada.
+
+Uso:
+    python benchmarks/bench_coalescencia.py --chamadas 50
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from benchmarks.dados import gerar_clube  # noqa: E402
+from benchmarks.standin import carregar, conectar  # noqa: E402
+
+
+async def main(chamadas: int, latencia_ms: float):
+    server, transporte = conectar(carregar(gerar_clube(200)), latencia_ms)
+    resultado = {"chamadas_concorrentes": chamadas, "latencia_ms": latencia_ms, "tools": {}}
+
+    for tool, queries_por_execucao in (
+        (server.resumo_geral, 7),
+        (server.estatisticas_financeiro, 3),
+        (server.listar_planos, 1),
+    ):
+        server._micro_cache.limpar()
+        antes = transporte.requisicoes
+        inicio = time.perf_counter()
+        respostas = await asyncio.gather(*(tool() for _ in range(chamadas)))
+        tempo = time.perf_counter() - inicio
+
+        queries = transporte.requisicoes - antes
+
+        assert len(set(respostas)) == 1, "respostas divergentes entre chamadas coalescidas"
+        assert queries == queries_por_execucao, (
+            f"{tool.__name__}: esperado {queries_por_execucao} queries, executou {queries}"
+        )
+        resultado["tools"][tool.__name__] = {
+            "queries_backend": queries,
+            "segundos": round(tempo, 3),
+        }
+
+    resultado["metricas"] = server.metricas_coalescencia
+    print(json.dumps(resultado, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chamadas", type=int, default=50)
+    parser.add_argument("--latencia-ms", type=float, default=20.0)
+    args = parser.parse_args()
+    asyncio.run(main(args.chamadas, args.latencia_ms))
@@ -0,0 +1,298 @@
+"""
+Benchmark - comparar_cotacoes
+=============================
+Gera num schema descartável de um Postgres real históricos de compras de
+tamanhos crescentes. Cada histórico tem solicitações com 2 a 5 cotações
+itemizadas de 50 fornecedores, as 20 mais recentes ainda em cotação, e
+algumas compras com orçamentos (o modelo de database/02). Aplica a
+database/031_comparacao_cotacoes.sql e mede, para cada tamanho:
+
+1. o recálculo do resumo historico_precos_fornecedores;
+2. a comparação dos pedidos em cotação pela tool (uma consulta, lendo o resumo);
+3. o custo de agregar o histórico desses fornecedores na hora, a cada chamada,
+   que é o que a tabela de resumo evita.
+
+No menor tamanho, confere o resumo contra o cálculo em Python das RPCs do
+stand-in (benchmarks/rpcs.py) e a comparação de uma compra com orçamentos.
+
+Requer: pip install -e ".[postgres]" e um Postgres acessível (não use o de produção).
+
+Uso:
+    python benchmarks/bench_comparar_cotacoes.py --database-url postgresql://postgres@localhost/postgres --solicitacoes 10000,100000
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+from datetime import datetime
+from decimal import Decimal
+from urllib.parse import urlencode, urlparse
+from uuid import UUID
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import asyncpg  # noqa: E402
+
+from benchmarks import rpcs  # noqa: E402
+from benchmarks.fake_postgrest import FakeDB  # noqa: E402
+from benchmarks.standin import conectar  # noqa: E402
+
+MIGRACAO = os.path.join(os.path.dirname(__file__), "..", "..", "database", "031_comparacao_cotacoes.sql")
+
+# O histórico dos fornecedores dos pedidos em cotação, agregado a cada chamada
+HISTORICO_NA_HORA = """
+    WITH pedidos AS (
+      SELECT DISTINCT c.solicitacao_id FROM cotacoes c JOIN solicitacoes_compra s ON s.id = c.solicitacao_id
+      WHERE c.fornecedor_id = ANY($1) AND s.status NOT IN ('solicitado', 'em_cotacao')
+    ), propostas AS (
+      SELECT c.*, MIN(c.valor) OVER w AS menor, COUNT(*) OVER w AS n
+      FROM cotacoes c JOIN pedidos USING (solicitacao_id) WINDOW w AS (PARTITION BY c.solicitacao_id)
+    ), itens AS (
+      SELECT c.fornecedor_id, chave_item(i.item) AS chave, i.valor_unitario, c.created_at,
+             MIN(i.valor_unitario) OVER w AS menor, COUNT(*) OVER w AS n
+      FROM cotacao_itens i JOIN cotacoes c ON c.id = i.cotacao_id JOIN pedidos USING (solicitacao_id)
+      WINDOW w AS (PARTITION BY c.solicitacao_id, chave_item(i.item))
+    )
+    SELECT fornecedor_id, '' AS item, COUNT(*), AVG(valor / menor) FILTER (WHERE n > 1), NULL::NUMERIC, NULL::NUMERIC
+    FROM propostas WHERE fornecedor_id = ANY($1) GROUP BY fornecedor_id
+    UNION ALL
+    SELECT fornecedor_id, chave, COUNT(*), AVG(valor_unitario / menor) FILTER (WHERE n > 1), AVG(valor_unitario),
+           (array_agg(valor_unitario ORDER BY created_at DESC))[1]
+    FROM itens WHERE fornecedor_id = ANY($1) AND chave = ANY($2) GROUP BY fornecedor_id, chave
+"""
+
+
+def _json(resposta: str):
+    assert not resposta.startswith("❌"), resposta
+    return json.loads(resposta.split("\n\n", 1)[1] if "\n\n" in resposta else resposta)
+
+
+async def carregar_postgres(conn: asyncpg.Connection, schema: str, solicitacoes: int, semente: int) -> dict:
+    """Cria as tabelas dos dois modelos de compras e gera o histórico no próprio banco."""
+    await conn.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE; CREATE SCHEMA {schema}")
+    await conn.execute(f"SET search_path = {schema}")
+    await conn.execute("SELECT setseed($1)", (semente % 1000) / 1000)
+    await conn.execute("""
+        CREATE FUNCTION uuid_generate_v4() RETURNS UUID AS 'SELECT gen_random_uuid()' LANGUAGE sql;
+        CREATE TYPE status_compra AS ENUM ('solicitado', 'em_cotacao', 'aprovado', 'comprado', 'cancelado');
+        CREATE TYPE compra_status AS ENUM ('solicitada', 'cotacao', 'aprovada', 'rejeitada', 'finalizada');
+        CREATE TABLE fornecedores (
+          id UUID PRIMARY KEY DEFAULT gen_random_uuid(), razao_social VARCHAR(255) NOT NULL,
+          nome_fantasia VARCHAR(255), fator FLOAT8, ativo BOOLEAN DEFAULT true);
+        CREATE TABLE solicitacoes_compra (
+          id UUID PRIMARY KEY DEFAULT gen_random_uuid(), numero INTEGER UNIQUE NOT NULL, descricao TEXT NOT NULL,
+          valor_estimado DECIMAL(10,2), status status_compra DEFAULT 'solicitado', created_at TIMESTAMPTZ DEFAULT NOW());
+        CREATE INDEX idx_solicitacoes_status ON solicitacoes_compra(status);
+        CREATE TABLE cotacoes (
+          id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+          solicitacao_id UUID NOT NULL REFERENCES solicitacoes_compra(id) ON DELETE CASCADE,
+          fornecedor_id UUID NOT NULL REFERENCES fornecedores(id), valor DECIMAL(10,2) NOT NULL,
+          prazo_entrega INTEGER, condicao_pagamento TEXT, validade_proposta DATE, arquivo_url TEXT,
+          observacoes TEXT, selecionada BOOLEAN DEFAULT false, created_at TIMESTAMPTZ DEFAULT NOW());
+        CREATE INDEX idx_cotacoes_solicitacao ON cotacoes(solicitacao_id);
+        CREATE TABLE compras (
+          id UUID PRIMARY KEY DEFAULT gen_random_uuid(), descricao TEXT NOT NULL, valor_estimado DECIMAL(10,2),
+          status compra_status DEFAULT 'solicitada', created_at TIMESTAMPTZ DEFAULT NOW());
+        CREATE TABLE orcamentos (
+          id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+          compra_id UUID NOT NULL REFERENCES compras(id) ON DELETE CASCADE,
+          fornecedor_id UUID REFERENCES fornecedores(id), fornecedor_nome VARCHAR(255),
+          valor DECIMAL(10,2) NOT NULL, arquivo_url TEXT NOT NULL, selecionado BOOLEAN DEFAULT false,
+          created_at TIMESTAMPTZ DEFAULT NOW());
+    """)
+    sql = open(MIGRACAO, encoding="utf-8").read().replace("search_path = public", f"search_path = {schema}")
+    await conn.execute("\n".join(l for l in sql.splitlines() if not l.startswith(("GRANT", "REVOKE"))))
+
+    await conn.execute("""
+        INSERT INTO fornecedores (razao_social, nome_fantasia, fator)
+        SELECT 'Fornecedor ' || i || ' Ltda', CASE WHEN i % 3 = 0 THEN 'Loja ' || i END, 0.85 + random() * 0.4
+        FROM generate_series(1, 50) i;
+        CREATE TEMP TABLE catalogo AS
+        SELECT n, 'Item ' || n AS nome, (ARRAY['un', 'kg', 'l', 'cx'])[1 + n % 4] AS unidade,
+               round((5 + random() * 495)::NUMERIC, 2) AS preco
+        FROM generate_series(1, 200) n;
+    """)
+    # Uma solicitação a cada ~hora nos últimos anos; as 20 mais recentes ainda em cotação
+    await conn.execute("""
+        INSERT INTO solicitacoes_compra (numero, descricao, status, created_at)
+        SELECT i, 'Solicitação ' || i,
+               (CASE WHEN i > $1 - 20 THEN 'em_cotacao'
+                     ELSE (ARRAY['comprado', 'comprado', 'aprovado', 'cancelado'])[1 + floor(random() * 4)::INT]
+                END)::status_compra,
+               NOW() - make_interval(hours => $1 - i)
+        FROM generate_series(1, $1) i
+    """, solicitacoes)
+    await conn.execute("""
+        CREATE TEMP TABLE pedido_itens AS
+        SELECT s.id AS solicitacao_id, c.nome, c.unidade, c.preco, (ARRAY[1, 2, 5, 10, 20])[1 + s.numero % 5] AS quantidade
+        FROM solicitacoes_compra s
+        CROSS JOIN LATERAL (SELECT * FROM catalogo ORDER BY random() + s.numero * 0 LIMIT 1 + s.numero % 6) c;
+        INSERT INTO cotacoes (solicitacao_id, fornecedor_id, valor, prazo_entrega, condicao_pagamento,
+                              validade_proposta, created_at)
+        SELECT s.id, f.id, 0, 2 + floor(random() * 29)::INT, '30 dias', (s.created_at + interval '30 days')::DATE,
+               s.created_at + make_interval(mins => f.ordem::INT)
+        FROM solicitacoes_compra s
+        CROSS JOIN LATERAL (
+          SELECT id, row_number() OVER () AS ordem
+          FROM (SELECT id FROM fornecedores ORDER BY random() + s.numero * 0 LIMIT 2 + s.numero % 4) x
+        ) f;
+        -- Grafia variando entre propostas: a chave do item é a mesma
+        INSERT INTO cotacao_itens (cotacao_id, item, quantidade, unidade, valor_unitario)
+        SELECT c.id, CASE WHEN random() < 0.1 THEN upper(p.nome) || ' ' ELSE p.nome END, p.quantidade, p.unidade,
+               round((p.preco * f.fator * (0.92 + random() * 0.16))::NUMERIC, 2)
+        FROM cotacoes c JOIN pedido_itens p USING (solicitacao_id) JOIN fornecedores f ON f.id = c.fornecedor_id;
+        UPDATE cotacoes c SET valor = t.valor
+        FROM (SELECT cotacao_id, SUM(quantidade * valor_unitario) AS valor FROM cotacao_itens GROUP BY 1) t
+        WHERE t.cotacao_id = c.id;
+        UPDATE solicitacoes_compra s SET valor_estimado = t.valor
+        FROM (SELECT solicitacao_id, SUM(quantidade * preco) AS valor FROM pedido_itens GROUP BY 1) t
+        WHERE t.solicitacao_id = s.id;
+        -- Nos pedidos decididos, quase sempre vence a menor proposta
+        UPDATE cotacoes c SET selecionada = true
+        FROM (SELECT c.id, row_number() OVER (PARTITION BY c.solicitacao_id ORDER BY c.valor) AS posicao
+              FROM cotacoes c JOIN solicitacoes_compra s ON s.id = c.solicitacao_id
+              WHERE s.status IN ('comprado', 'aprovado')) r
+        WHERE r.id = c.id AND r.posicao = CASE WHEN random() < 0.85 THEN 1 ELSE 2 END;
+    """)
+    # Compras com orçamentos de fornecedores sem cadastro (só fornecedor_nome)
+    await conn.execute("""
+        INSERT INTO compras (descricao, valor_estimado, status, created_at)
+        SELECT 'Compra ' || i, 1000, (CASE WHEN i > 95 THEN 'cotacao' ELSE 'finalizada' END)::compra_status,
+               NOW() - make_interval(days => 100 - i)
+        FROM generate_series(1, 100) i;
+        INSERT INTO orcamentos (compra_id, fornecedor_nome, valor, arquivo_url)
+        SELECT p.id, 'Orçamento ' || o, round((800 + random() * 400)::NUMERIC, 2), 'orcamento.pdf'
+        FROM compras p, generate_series(1, 3) o;
+        DROP TABLE catalogo, pedido_itens;
+    """)
+    await conn.execute("ANALYZE")
+    return {t: await conn.fetchval(f"SELECT count(*) FROM {t}")
+            for t in ("solicitacoes_compra", "cotacoes", "cotacao_itens", "orcamentos")}
+
+
+def _linha(registro) -> dict:
+    convertido = {}
+    for k, v in dict(registro).items():
+        if isinstance(v, UUID):
+            v = str(v)
+        elif isinstance(v, Decimal):
+            v = float(v)
+        elif isinstance(v, datetime):
+            v = v.isoformat()
+        convertido[k] = v
+    return convertido
+
+
+async def conferir_resumo(conn: asyncpg.Connection) -> dict:
+    """Compara historico_precos_fornecedores com o mesmo resumo calculado em Python (benchmarks/rpcs.py)."""
+    db = FakeDB()
+    for tabela, sql in (
+        ("solicitacoes_compra", "SELECT id, numero, status::text AS status FROM solicitacoes_compra"),
+        ("cotacoes", "SELECT id, solicitacao_id, fornecedor_id, valor, prazo_entrega, selecionada, created_at "
+                     "FROM cotacoes"),
+        ("cotacao_itens", "SELECT cotacao_id, item, valor_unitario FROM cotacao_itens"),
+    ):
+        db.carregar(tabela, [_linha(r) for r in await conn.fetch(sql)])
+    rpcs.atualizar_historico_precos(db, {"p_intervalo_segundos": 0})
+    esperado = {(h["fornecedor_id"], h["item"]): h for h in db.linhas("historico_precos_fornecedores")}
+    obtido = {(h["fornecedor_id"], h["item"]): h
+              for h in map(_linha, await conn.fetch("SELECT * FROM historico_precos_fornecedores"))}
+    assert esperado.keys() == obtido.keys(), (len(esperado), len(obtido))
+
+    # Diferenças de até um centésimo (ou um décimo no prazo): arredondamento do NUMERIC x round() do Python
+    maior_erro = {"preco_relativo_medio": 0.0, "valor_unitario_medio": 0.0, "prazo_medio": 0.0}
+    for chave, e in esperado.items():
+        o = obtido[chave]
+        assert (o["cotacoes"], o["vencedoras"], o["ultimo_valor_unitario"]) == \
+            (e["cotacoes"], e["vencedoras"], e["ultimo_valor_unitario"]), (chave, o, e)
+        for campo in maior_erro:
+            if e[campo] is None or o[campo] is None:
+                assert e[campo] is None and o[campo] is None, (chave, campo, o, e)
+                continue
+            maior_erro[campo] = max(maior_erro[campo], abs(e[campo] - o[campo]))
+    assert maior_erro["preco_relativo_medio"] <= 1e-4 and maior_erro["valor_unitario_medio"] <= 0.011, maior_erro
+    return {"linhas": len(esperado), "maior_diferenca": maior_erro}
+
+
+async def medir(conn: asyncpg.Connection, server, repeticoes: int) -> dict:
+    inicio = time.perf_counter()
+    atualizacao = await conn.fetchrow("SELECT * FROM atualizar_historico_precos(0)")
+    recalculo = time.perf_counter() - inicio
+
+    # O resumo acabou de ser calculado: a tool só confere o intervalo dentro do banco
+    server._historico_precos.update(conferido=None, atualizado_em=None)
+    comparacao = _json(await server.comparar_cotacoes(limite=20))
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        _json(await server.comparar_cotacoes(limite=20))
+        tempos.append(time.perf_counter() - inicio)
+
+    fornecedores = list({r["fornecedor_id"] for p in comparacao["pedidos"] for r in p["ranking"] if r["fornecedor_id"]})
+    chaves = list({rpcs._chave_item(i["item"]) for p in comparacao["pedidos"] for i in p["itens"]})
+    na_hora = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        await conn.fetch(HISTORICO_NA_HORA, fornecedores, chaves)
+        na_hora.append(time.perf_counter() - inicio)
+
+    cotacoes = [p for p in comparacao["pedidos"] if p["origem"] == "cotacoes"]
+    return {
+        "resumo": {"linhas": atualizacao["linhas"], "recalculo_ms": round(recalculo * 1000)},
+        "pedidos_comparados": len(comparacao["pedidos"]),
+        "propostas": sum(p["propostas"] for p in comparacao["pedidos"]),
+        "comparacao_ms": round(statistics.median(tempos) * 1000, 1),
+        "historico_na_hora_ms": round(statistics.median(na_hora) * 1000, 1),
+        "com_historico": sum(r["historico"] is not None for p in cotacoes for r in p["ranking"]),
+        "exemplo": {k: cotacoes[0][k] for k in ("numero", "propostas", "menor_valor", "divisao_por_item", "alertas")},
+    }
+
+
+async def main(args):
+    conn = await asyncpg.connect(args.database_url)
+    server, _ = conectar(FakeDB())
+    logging.getLogger("sistema-clube-mcp").setLevel(logging.CRITICAL)
+    separador = "&" if urlparse(args.database_url).query else "?"
+    server.DATABASE_URL = f"{args.database_url}{separador}{urlencode({'search_path': args.schema})}"
+
+    resultado = {"tamanhos": []}
+    try:
+        for i, solicitacoes in enumerate(int(n) for n in args.solicitacoes.split(",")):
+            inicio = time.perf_counter()
+            linhas = await carregar_postgres(conn, args.schema, solicitacoes, args.semente)
+            medida = {"linhas": linhas, "geracao_segundos": round(time.perf_counter() - inicio, 1)}
+            await server.abrir_pg_pool()
+            try:
+                medida.update(await medir(conn, server, args.repeticoes))
+                if i == 0:
+                    medida["conferencia"] = await conferir_resumo(conn)
+                    compra = await conn.fetchval("SELECT id::text FROM compras WHERE status = 'cotacao' LIMIT 1")
+                    pedido = _json(await server.comparar_cotacoes([compra]))["pedidos"][0]
+                    assert pedido["origem"] == "orcamentos" and pedido["propostas"] == 3, pedido
+                    medida["orcamentos"] = {k: pedido[k] for k in ("propostas", "menor_valor", "alertas")}
+            finally:
+                await server.fechar_pg_pool()
+            resultado["tamanhos"].append(medida)
+        comparacoes = [t["comparacao_ms"] for t in resultado["tamanhos"]]
+        assert max(comparacoes) < 200, comparacoes
+    finally:
+        if not args.manter:
+            await conn.execute(f"DROP SCHEMA IF EXISTS {args.schema} CASCADE")
+        await conn.close()
+    print(json.dumps(resultado, indent=2, ensure_ascii=False, default=str))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"), required=not os.getenv("DATABASE_URL"))
+    parser.add_argument("--solicitacoes", default="10000,100000", help="Tamanhos do histórico, separados por vírgula")
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--schema", default="bench_cotacoes")
+    parser.add_argument("--manter", action="store_true", help="Não apagar o schema no fim")
+    parser.add_argument("--semente", type=int, default=42)
+    asyncio.run(main(parser.parse_args()))
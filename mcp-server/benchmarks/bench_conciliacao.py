@@ -0,0 +1,143 @@
+"""
+Benchmark - Conciliação de extrato bancário
+===========================================
+Gera um extrato (OFX ou CSV) com N lançamentos a partir das mensalidades em
+aberto do clube sintético e concilia com `conciliar_pagamentos` no stand-in
+do PostgREST. O extrato mistura:
+
+- PIX com CPF e mês de referência na descrição
+- PIX com CPF formatado, sem referência
+- pagamentos de duas mensalidades atrasadas num só crédito
+- créditos sem CPF (ambíguos: ficam pendentes)
+- débitos (ignorados)
+
+Verifica que cada grupo cai na regra esperada, que as mensalidades são
+baixadas e que 10k lançamentos conciliam em poucos segundos.
+
+Uso:
+    python benchmarks/bench_conciliacao.py --lancamentos 10000 --formato ofx --latencia-ms 5
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from benchmarks.dados import gerar_clube  # noqa: E402
+from benchmarks.standin import carregar, conectar  # noqa: E402
+
+
+def montar_lancamentos(dados: dict, total: int, semente: int = 11) -> tuple[list[dict], dict]:
+    """Escolhe mensalidades em aberto e descreve os créditos como um banco faria."""
+    rng = random.Random(semente)
+    cpf = {a["id"]: a["cpf"] for a in dados["associados"]}
+    abertas = defaultdict(list)
+    for m in sorted(dados["mensalidades"], key=lambda m: m["data_vencimento"]):
+        if m["status"] in ("pendente", "atrasado"):
+            abertas[m["associado_id"]].append(m)
+    associados = list(abertas)
+    rng.shuffle(associados)
+
+    lancamentos, esperado = [], defaultdict(int)
+    for i, aid in enumerate(associados):
+        if len(lancamentos) >= total:
+            break
+        c, mens = cpf[aid], abertas[aid]
+        fmt = f"{c[:3]}.{c[3:6]}.{c[6:9]}-{c[9:]}"
+        tipo = i % 20
+        if tipo < 12:
+            m = mens[-1]
+            ano, mes = m["referencia"].split("-")
+            lancamentos.append({"valor": m["valor"], "descricao": f"PIX RECEBIDO {c} MENSALIDADE {mes}/{ano}"})
+            esperado["cpf_referencia"] += 1
+        elif tipo < 16:
+            lancamentos.append({"valor": mens[0]["valor"], "descricao": f"PIX RECEBIDO - CPF {fmt} - ASSOCIADO"})
+            esperado["cpf_valor"] += 1
+        elif tipo < 17 and len(mens) >= 2:
+            lancamentos.append({"valor": mens[0]["valor"] + mens[1]["valor"], "descricao": f"TED RECEBIDA {fmt}"})
+            esperado["cpf_soma"] += 1
+        elif tipo < 19:
+            lancamentos.append({"valor": mens[0]["valor"], "descricao": "DEPOSITO EM DINHEIRO"})
+            esperado["pendentes"] += 1
+        else:
+            lancamentos.append({"valor": -rng.choice([35.9, 120.0, 980.5]), "descricao": "PAGTO FORNECEDOR"})
+            esperado["debitos"] += 1
+    for n, lanc in enumerate(lancamentos):
+        lanc["identificador"] = f"FIT{n:08d}"
+        lanc["data"] = f"2026-10-{1 + n % 28:02d}"
+    return lancamentos, dict(esperado)
+
+
+def escrever_ofx(caminho: str, lancamentos: list[dict]) -> None:
+    with open(caminho, "w", encoding="latin-1") as f:
+        f.write("OFXHEADER:100\nDATA:OFXSGML\nVERSION:102\n\n<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>\n")
+        for l in lancamentos:
+            f.write(
+                f"<STMTTRN>\n<TRNTYPE>{'CREDIT' if l['valor'] > 0 else 'DEBIT'}\n"
+                f"<DTPOSTED>{l['data'].replace('-', '')}120000[-3:BRT]\n<TRNAMT>{l['valor']:.2f}\n"
+                f"<FITID>{l['identificador']}\n<MEMO>{l['descricao']}\n</STMTTRN>\n"
+            )
+        f.write("</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>\n")
+
+
+def escrever_csv(caminho: str, lancamentos: list[dict]) -> None:
+    with open(caminho, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.writer(f, delimiter=";")
+        writer.writerow(["Data", "Histórico", "Valor (R$)", "Documento"])
+        for l in lancamentos:
+            ano, mes, dia = l["data"].split("-")
+            writer.writerow([f"{dia}/{mes}/{ano}", l["descricao"], f"{l['valor']:.2f}".replace(".", ","), l["identificador"]])
+
+
+async def main(args):
+    dados = gerar_clube(args.associados, meses=12)
+    lancamentos, esperado = montar_lancamentos(dados, args.lancamentos)
+    server, transporte = conectar(carregar(dados), args.latencia_ms)
+    logging.getLogger("sistema-clube-mcp").setLevel(logging.CRITICAL)
+    server.IMPORT_DIR = tempfile.mkdtemp(prefix="bench-conciliacao-")
+    server.EXPORT_DIR = server.IMPORT_DIR
+    arquivo = f"extrato.{args.formato}"
+    (escrever_ofx if args.formato == "ofx" else escrever_csv)(os.path.join(server.IMPORT_DIR, arquivo), lancamentos)
+
+    antes = transporte.requisicoes
+    inicio = time.perf_counter()
+    resposta = await server.conciliar_pagamentos(arquivo)
+    segundos = time.perf_counter() - inicio
+    resultado = json.loads(resposta.split("\n\n", 1)[1])
+
+    assert resultado["por_regra"] == {k: v for k, v in esperado.items() if k.startswith("cpf_")}, resultado["por_regra"]
+    assert resultado["nao_conciliados"] == esperado["pendentes"], resultado["nao_conciliados"]
+    assert resultado["debitos_ignorados"] == esperado["debitos"]
+    assert resultado["mensalidades_baixadas"] == resultado["mensalidades_a_baixar"], resposta[:500]
+    print(json.dumps({
+        "lancamentos": len(lancamentos),
+        "formato": args.formato,
+        "latencia_ms": args.latencia_ms,
+        "segundos": round(segundos, 2),
+        "lancamentos_por_segundo": round(len(lancamentos) / segundos),
+        "requisicoes_postgrest": transporte.requisicoes - antes,
+        "mensalidades_em_aberto": resultado["mensalidades_em_aberto"],
+        "por_regra": resultado["por_regra"],
+        "mensalidades_baixadas": resultado["mensalidades_baixadas"],
+        "pendentes": resultado["nao_conciliados"],
+    }, indent=2, ensure_ascii=False))
+    if len(lancamentos) >= 10_000:
+        assert segundos < 10, f"{len(lancamentos)} lançamentos levaram {segundos:.1f}s (meta: < 10s)"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lancamentos", type=int, default=10_000)
+    parser.add_argument("--associados", type=int, default=15_000, help="Tamanho do clube sintético")
+    parser.add_argument("--formato", choices=["ofx", "csv"], default="ofx")
+    parser.add_argument("--latencia-ms", type=float, default=5.0)
+    asyncio.run(main(parser.parse_args()))
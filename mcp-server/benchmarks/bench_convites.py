@@ -0,0 +1,206 @@
+"""
+Benchmark - convites na portaria (validar_convite, emitir_convites)
+===================================================================
+No stand-in, com latência simulada por requisição:
+
+1. fim de semana: várias portarias lendo convites ao mesmo tempo (válidos,
+   já usados, vencidos e códigos inexistentes), com registro da entrada.
+   Compara a consulta direta ao banco a cada leitura (o que o painel faz),
+   o índice em memória e o índice com a gravação em lote dos acessos
+   (ACESSO_LOTE_MS) em leituras/s e requisições por leitura;
+2. mesmo convite lido em duas portarias ao mesmo tempo: só uma libera;
+3. atualização incremental: convites usados e emitidos por fora (painel)
+   aparecem no índice na próxima atualização, que lê só o que mudou;
+4. cota: emissões simultâneas para os mesmos associados nunca passam do
+   limite do mês, e o contador bate com as linhas de convites.
+
+Uso:
+    python benchmarks/bench_convites.py --tamanho 10k --leituras 600 --portarias 8 --latencia-ms 5
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import time
+import uuid
+from collections import Counter
+from datetime import date, datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from benchmarks.dados import TAMANHOS, gerar_clube  # noqa: E402
+from benchmarks.standin import carregar, conectar  # noqa: E402
+
+
+def _json(resposta: str):
+    assert not resposta.startswith("❌"), resposta
+    return json.loads(resposta.split("\n\n", 1)[1] if "\n\n" in resposta else resposta)
+
+
+def sem_indice(server):
+    """Índice que nunca acerta: toda leitura vai ao banco."""
+    class SemIndice(server.IndiceConvites):
+        async def atualizar(self) -> None:
+            return None
+
+    return SemIndice()
+
+
+def codigos_de_leitura(transporte, leituras: int, rng: random.Random) -> list[str]:
+    """Mistura de um sábado: 80% válidos, 15% usados/vencidos e 5% códigos digitados errado.
+
+    Limitada pelos convites disponíveis no clube gerado.
+    """
+    por_status = {"disponivel": [], "outros": []}
+    for c in transporte.db.linhas("convites"):
+        por_status["disponivel" if c["status"] == "disponivel" else "outros"].append(c["qr_code"])
+    validos = rng.sample(por_status["disponivel"], min(len(por_status["disponivel"]), int(leituras * 0.8)))
+    codigos = validos + rng.choices(por_status["outros"], k=len(validos) * 15 // 80)
+    codigos += [f"CONV-{rng.getrandbits(48):012X}" for _ in range(len(validos) * 5 // 80)]
+    rng.shuffle(codigos)
+    return codigos
+
+
+async def fim_de_semana(server, transporte, codigos: list[str], portarias: int, com_indice: bool,
+                        em_lote: bool) -> dict:
+    server.indice_convites = server.IndiceConvites() if com_indice else sem_indice(server)
+    if com_indice:
+        await server.indice_convites.atualizar()  # a carga do dia acontece na primeira leitura da manhã
+    if em_lote:
+        # Lotes de 1s: no stand-in cada insert em lote reindexa registros_acesso inteira, segurando o "banco"
+        server.fila_acessos = server.FilaAcessos(1000, 500)
+        server.fila_acessos.iniciar()
+    fila = list(codigos)
+    decisoes = Counter()
+    antes = transporte.requisicoes
+
+    async def portaria():
+        while fila:
+            r = _json(await server.validar_convite(fila.pop(), "clube"))
+            decisoes["liberados" if r["permitido"] else "recusados"] += 1
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(portaria() for _ in range(portarias)))
+    segundos = time.perf_counter() - inicio
+    if em_lote:
+        await server.fila_acessos.parar()
+    return {
+        "leituras_por_segundo": round(len(codigos) / segundos),
+        "requisicoes_por_leitura": round((transporte.requisicoes - antes) / len(codigos), 2),
+        **decisoes,
+    }
+
+
+async def leitura_dupla(server, transporte, rng: random.Random, pares: int) -> dict:
+    """O mesmo convite apresentado em duas portarias ao mesmo tempo."""
+    livres = [c["qr_code"] for c in transporte.db.linhas("convites") if c["status"] == "disponivel"]
+    liberacoes = Counter()
+    for codigo in rng.sample(livres, min(pares, len(livres))):
+        respostas = await asyncio.gather(server.validar_convite(codigo, "clube"), server.validar_convite(codigo, "piscina"))
+        liberacoes[sum(_json(r)["permitido"] for r in respostas)] += 1
+    assert set(liberacoes) == {1}, f"convite liberado {dict(liberacoes)} vezes"
+    return {"pares": sum(liberacoes.values()), "liberados_uma_vez": liberacoes[1]}
+
+
+async def atualizacao_incremental(server, transporte, rng: random.Random, alterados: int) -> dict:
+    """Usa e emite convites por fora do MCP e confere o índice depois da atualização."""
+    indice = server.IndiceConvites()
+    server.indice_convites = indice
+    inicio = time.perf_counter()
+    await indice.atualizar()
+    carga = {"segundos": round(time.perf_counter() - inicio, 3), "convites": len(indice.por_codigo)}
+
+    agora = datetime.now().isoformat()
+    usados = rng.sample(list(indice.por_codigo), min(alterados, len(indice.por_codigo)))
+    marcados = set(usados)
+    with transporte.db._lock:
+        for c in transporte.db.linhas("convites"):
+            if c["qr_code"] in marcados:
+                c.update({"status": "usado", "data_uso": agora, "updated_at": agora})
+    associado = next(a for a in transporte.db.linhas("associados") if a["status"] == "ativo")
+    novos = []
+    for _ in range(alterados):
+        convite_id = str(uuid.uuid4())
+        novos.append({"id": convite_id, "associado_id": associado["id"], "nome_convidado": "PAINEL",
+                      "data_validade": date.today().isoformat(), "status": "disponivel", "data_uso": None,
+                      "qr_code": "CONV-" + convite_id.replace("-", "")[:12].upper(),
+                      "mes_referencia": date.today().strftime("%Y-%m"), "created_at": agora, "updated_at": agora})
+    transporte.db.carregar("convites", novos)
+
+    indice.atualizado_em = 0.0  # vence o intervalo de CONVITES_ATUALIZAR_S
+    antes = transporte.requisicoes
+    inicio = time.perf_counter()
+    await indice.atualizar()
+    segundos = time.perf_counter() - inicio
+    requisicoes = transporte.requisicoes - antes
+    assert not set(usados) & set(indice.por_codigo), "convite usado no painel continua no índice"
+    assert {n["qr_code"] for n in novos} <= set(indice.por_codigo), "convite emitido no painel fora do índice"
+    for codigo in usados[:20]:
+        r = _json(await server.validar_convite(codigo, registrar_entrada=False))
+        assert not r["permitido"] and "utilizado" in r["motivo"], r
+    return {
+        "carga_do_dia": carga,
+        "alterados_por_fora": len(usados) + len(novos),
+        "atualizacao_segundos": round(segundos, 3),
+        "atualizacao_requisicoes": requisicoes,
+        "linhas_relidas": indice.metricas["alterados"],
+    }
+
+
+async def cota(server, transporte, rng: random.Random, associados: int, tentativas: int) -> dict:
+    """Emissões simultâneas de um convite cada para poucos associados."""
+    mes = date.today().strftime("%Y-%m")
+    alvos = rng.sample([a for a in transporte.db.linhas("associados")
+                        if a["status"] == "ativo" and a["plano"] == "patrimonial"], associados)
+    respostas = await asyncio.gather(*(
+        server.emitir_convites(a["id"], convidados=[f"Convidado {i}"])
+        for a in alvos for i in range(tentativas)
+    ))
+    emitidos = sum(not r.startswith("❌") for r in respostas)
+
+    por_associado = Counter(c["associado_id"] for c in transporte.db.linhas("convites") if c["mes_referencia"] == mes)
+    contador = {c["associado_id"]: c["emitidos"] for c in transporte.db.linhas("convites_cota")
+                if c["mes_referencia"] == mes}
+    for a in alvos:
+        assert por_associado[a["id"]] <= 2, f"{a['id']} passou da cota: {por_associado[a['id']]}"
+        assert contador.get(a["id"], 0) == por_associado[a["id"]], "contador diferente das linhas de convites"
+    return {"pedidos": len(respostas), "emitidos": emitidos, "recusados_por_cota": len(respostas) - emitidos}
+
+
+async def main(args):
+    dados = gerar_clube(TAMANHOS[args.tamanho], semente=args.semente)
+    rng = random.Random(args.semente)
+    logging.getLogger("sistema-clube-mcp").setLevel(logging.CRITICAL)
+    resultado = {"tamanho": args.tamanho, "convites": len(dados["convites"]), "leituras": args.leituras,
+                 "portarias": args.portarias, "latencia_ms": args.latencia_ms, "fim_de_semana": {}}
+
+    # Cada modo num clube novo: as leituras gastam os convites
+    modos = (("banco a cada leitura", False, False), ("índice em memória", True, False),
+             ("índice + gravação em lote", True, True))
+    for modo, com_indice, em_lote in modos:
+        server, transporte = conectar(carregar(gerar_clube(TAMANHOS[args.tamanho], semente=args.semente)),
+                                      latencia_ms=args.latencia_ms)
+        codigos = codigos_de_leitura(transporte, args.leituras, random.Random(args.semente))
+        resultado["leituras"] = len(codigos)
+        resultado["fim_de_semana"][modo] = await fim_de_semana(server, transporte, codigos, args.portarias,
+                                                         com_indice, em_lote)
+
+    server, transporte = conectar(carregar(dados), latencia_ms=args.latencia_ms)
+    resultado["leitura_dupla"] = await leitura_dupla(server, transporte, rng, 200)
+    resultado["atualizacao_incremental"] = await atualizacao_incremental(server, transporte, rng, 100)
+    resultado["cota"] = await cota(server, transporte, rng, 50, 5)
+    print(json.dumps(resultado, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tamanho", choices=list(TAMANHOS), default="10k")
+    parser.add_argument("--leituras", type=int, default=600, help="Convites lidos no fim de semana (até os disponíveis)")
+    parser.add_argument("--portarias", type=int, default=8, help="Leituras simultâneas")
+    parser.add_argument("--latencia-ms", type=float, default=5.0, help="Latência simulada por requisição")
+    parser.add_argument("--semente", type=int, default=42)
+    asyncio.run(main(parser.parse_args()))
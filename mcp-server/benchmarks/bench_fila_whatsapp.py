@@ -0,0 +1,280 @@
+"""
+Benchmark - worker da fila_whatsapp
+===================================
+Carrega uma fila de mensagens num schema descartável de um Postgres real,
+aplica a database/028_fila_whatsapp_worker.sql e consome a fila com vários
+workers (`RemetenteFilaWhatsapp`) ao mesmo tempo, enviando para um stub HTTP
+que imita /api/whatsapp/send com dois providers (WaSender e Meta) e o padrão:
+
+- parte das mensagens falha algumas vezes antes de sair (erro 500) e parte
+  é recusada de vez (erro 400, número inválido);
+- um worker "morre" com um lote reservado: as mensagens voltam para a fila
+  quando a reserva vence;
+- um worker é parado no meio (deploy): o que ele ainda não enviou volta para
+  a fila sem contar tentativa.
+
+Confere que nenhuma mensagem sai duas vezes, que toda mensagem termina enviada
+ou com erro, que as recusadas não são reenviadas e que nenhum provider passa do
+limite de taxa. Como cada worker limita a própria taxa, o limite de cada
+provider é dividido entre os workers. Os GRANT/REVOKE da migração são
+ignorados (os papéis do Supabase não existem num Postgres local).
+
+Requer: pip install -e ".[postgres]" e um Postgres acessível (não use o de produção).
+
+Uso:
+    python benchmarks/bench_fila_whatsapp.py --database-url postgresql://postgres@localhost/postgres --mensagens 3000 --workers 4
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import time
+import uuid
+from collections import Counter, defaultdict
+from urllib.parse import urlencode, urlparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import asyncpg  # noqa: E402
+
+from benchmarks.fake_postgrest import FakeDB  # noqa: E402
+from benchmarks.standin import conectar  # noqa: E402
+
+MIGRACAO = os.path.join(os.path.dirname(__file__), "..", "..", "database", "028_fila_whatsapp_worker.sql")
+RESERVA_MORTO_S = 3
+
+
+class StubProviders:
+    """Imita /api/whatsapp/send: registra cada envio por provider e falha conforme o roteiro da mensagem."""
+
+    def __init__(self, roteiro: dict[str, int], latencia_ms: float):
+        self.roteiro = roteiro  # mensagem -> falhas 500 antes de sair (-1: recusada com 400)
+        self.latencia = latencia_ms / 1000
+        self.tentativas: Counter = Counter()
+        self.entregues: dict[str, list[float]] = defaultdict(list)  # provider -> instantes de cada envio
+        self.entregas: Counter = Counter()
+        self._server = None
+
+    def _responder(self, corpo: dict) -> tuple[int, bytes]:
+        mensagem = corpo["mensagem"]
+        self.tentativas[mensagem] += 1
+        falhas = self.roteiro.get(mensagem, 0)
+        if falhas < 0:
+            return 400, b'{"error": "numero invalido"}'
+        if self.tentativas[mensagem] <= falhas:
+            return 500, b'{"error": "provider fora do ar"}'
+        self.entregas[mensagem] += 1
+        self.entregues[corpo.get("providerId") or "padrao"].append(time.monotonic())
+        return 200, b'{"success": true}'
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                tamanho = 0
+                for linha in head.split(b"\r\n"):
+                    if linha.lower().startswith(b"content-length:"):
+                        tamanho = int(linha.split(b":", 1)[1])
+                corpo = json.loads(await reader.readexactly(tamanho))
+                await asyncio.sleep(self.latencia)
+                status, body = self._responder(corpo)
+                writer.write(
+                    f"HTTP/1.1 {status} X\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(body)}\r\nConnection: keep-alive\r\n\r\n".encode() + body
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self) -> str:
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        return f"http://127.0.0.1:{self._server.sockets[0].getsockname()[1]}"
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    def pico(self, provider: str, janela_s: float) -> int:
+        """Maior número de envios do provider numa janela deslizante de `janela_s`."""
+        instantes, maior, inicio = self.entregues[provider], 0, 0
+        for fim, t in enumerate(instantes):
+            while t - instantes[inicio] > janela_s:
+                inicio += 1
+            maior = max(maior, fim - inicio + 1)
+        return maior
+
+
+async def carregar_postgres(conn: asyncpg.Connection, schema: str, mensagens: int, rng: random.Random):
+    """Cria as tabelas e a fila; devolve os providers e o roteiro de falhas de cada mensagem."""
+    await conn.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE; CREATE SCHEMA {schema}")
+    await conn.execute(f"SET search_path = {schema}")
+    await conn.execute("""
+        CREATE TABLE whatsapp_providers (
+          id UUID PRIMARY KEY DEFAULT gen_random_uuid(), nome VARCHAR(100) NOT NULL, tipo VARCHAR(20) NOT NULL);
+        CREATE TABLE fila_whatsapp (
+          id UUID PRIMARY KEY DEFAULT gen_random_uuid(), telefone VARCHAR(20) NOT NULL, mensagem TEXT NOT NULL,
+          tipo VARCHAR(50) DEFAULT 'texto', arquivo_url TEXT, agendado_para TIMESTAMPTZ,
+          enviado BOOLEAN DEFAULT false, data_envio TIMESTAMPTZ, erro TEXT, automacao_id UUID,
+          created_at TIMESTAMPTZ DEFAULT NOW());
+    """)
+    wasender, meta = str(uuid.uuid4()), str(uuid.uuid4())
+    await conn.executemany("INSERT INTO whatsapp_providers (id, nome, tipo) VALUES ($1, $2, $3)",
+                           [(wasender, "WaSender", "wasender"), (meta, "Meta", "meta")])
+    sql = open(MIGRACAO, encoding="utf-8").read().replace("search_path = public", f"search_path = {schema}")
+    await conn.execute("\n".join(l for l in sql.splitlines() if not l.startswith(("GRANT", "REVOKE"))))
+
+    roteiro, linhas = {}, []
+    for i in range(mensagens):
+        texto = f"Mensagem {i}"
+        sorteio = rng.random()
+        # 1% recusadas, 1% falham nas 3 tentativas, 6% falham 1 ou 2 vezes antes de sair
+        roteiro[texto] = -1 if sorteio < 0.01 else 3 if sorteio < 0.02 else rng.randint(1, 2) if sorteio < 0.08 else 0
+        provider = rng.choices([wasender, meta, None], [0.1, 0.7, 0.2])[0]
+        linhas.append((f"55169{rng.randint(10**7, 10**8 - 1)}", texto, uuid.UUID(provider) if provider else None))
+    # Uma mensagem agendada para depois do benchmark não pode sair
+    linhas.append(("5516999999999", "Agendada para amanhã", None))
+    await conn.copy_records_to_table("fila_whatsapp", records=linhas, schema_name=schema,
+                                     columns=["telefone", "mensagem", "provider_id"])
+    await conn.execute("UPDATE fila_whatsapp SET agendado_para = NOW() + interval '1 day' "
+                       "WHERE mensagem = 'Agendada para amanhã'")
+    await conn.execute("ANALYZE fila_whatsapp")
+    return {"wasender": wasender, "meta": meta}, roteiro
+
+
+async def pendentes(conn: asyncpg.Connection) -> int:
+    """Mensagens ainda não concluídas, incluindo os reenvios agendados (exceto a agendada para amanhã)."""
+    return await conn.fetchval("SELECT count(*) FROM fila_whatsapp WHERE enviado = false AND data_envio IS NULL "
+                               "AND mensagem <> 'Agendada para amanhã'")
+
+
+async def main(args):
+    rng = random.Random(args.semente)
+    conn = await asyncpg.connect(args.database_url)
+    providers, roteiro = await carregar_postgres(conn, args.schema, args.mensagens, rng)
+    await conn.execute(f"SET search_path = {args.schema}")
+
+    stub = StubProviders(roteiro, args.latencia_ms)
+    server, _ = conectar(FakeDB())
+    logging.getLogger("sistema-clube-mcp").setLevel(logging.CRITICAL)
+    server.CLUBE_API_URL = await stub.start()
+    separador = "&" if urlparse(args.database_url).query else "?"
+    server.DATABASE_URL = f"{args.database_url}{separador}{urlencode({'search_path': args.schema})}"
+    server.WHATSAPP_FILA_ESPERA_S = 1  # reenvios em 1s, 2s, 4s
+    limites = {"wasender": args.taxa_wasender, "meta": args.taxa_meta, "padrao": args.taxa_padrao}
+
+    def novo_worker():
+        # Cada worker com a sua parte do limite de cada provider, como em processos separados
+        w = server.RemetenteFilaWhatsapp(lote=args.lote, intervalo=0.5,
+                                         taxas={t: limites[t] / args.workers for t in ("wasender", "meta")})
+        w.limitadores[None] = server.LimitadorTaxa(limites["padrao"] / args.workers)
+        return w
+
+    chamadas = Counter()
+    consultar_pg = server.consultar_pg
+
+    async def contar(descricao, sql, *params):
+        chamadas[sql.split("(")[0].split()[-1]] += 1
+        return await consultar_pg(descricao, sql, *params)
+
+    server.consultar_pg = contar
+    await server.abrir_pg_pool()
+    resultado = {"mensagens": args.mensagens, "workers": args.workers, "lote": args.lote,
+                 "taxas_por_minuto": limites}
+    try:
+        # Um worker reserva um lote e morre sem enviar nada
+        # (a reserva conta como tentativa)
+        mortas = {r["mensagem"] for r in await conn.fetch(
+            "SELECT mensagem FROM reservar_fila_whatsapp('morto', $1, $2)", args.lote, RESERVA_MORTO_S)}
+        workers = [novo_worker() for _ in range(args.workers)]
+        inicio = time.perf_counter()
+        for w in workers:
+            w.iniciar()
+
+        # Deploy no meio: o primeiro worker para e outro entra no lugar
+        while len(stub.entregas) < args.mensagens // 2:
+            await asyncio.sleep(0.1)
+        parado = workers[0]
+        await parado.parar()
+        devolvidas = await conn.fetchval("SELECT count(*) FROM fila_whatsapp WHERE reservado_por = $1", parado.id)
+        assert devolvidas == 0, f"{devolvidas} mensagem(ns) presas na reserva do worker parado"
+        workers.append(novo_worker())
+        workers[-1].iniciar()
+
+        while await pendentes(conn) or any(w.em_envio or w.resultados for w in workers[1:]):
+            if time.perf_counter() - inicio > args.timeout:
+                raise TimeoutError(f"{await pendentes(conn)} mensagem(ns) ainda na fila")
+            await asyncio.sleep(0.5)
+        segundos = time.perf_counter() - inicio
+        for w in workers[1:]:
+            await w.parar()
+    finally:
+        await server.fechar_pg_pool()
+        await server.fechar_http_client()
+        await stub.stop()
+
+    linhas = {r["mensagem"]: dict(r) for r in await conn.fetch(
+        "SELECT mensagem, enviado, data_envio, erro, tentativas, reservado_por FROM fila_whatsapp")}
+    duplicadas = [m for m, n in stub.entregas.items() if n > 1]
+    assert not duplicadas, f"{len(duplicadas)} mensagem(ns) enviadas mais de uma vez"
+    assert linhas["Agendada para amanhã"]["data_envio"] is None, "mensagem agendada saiu antes da hora"
+    desfechos = Counter()
+    for texto, falhas in roteiro.items():
+        linha = linhas[texto]
+        falhas += falhas >= 0 and texto in mortas
+        assert linha["reservado_por"] is None, linha
+        assert linha["enviado"] == (stub.entregas[texto] == 1), (texto, linha)
+        if falhas < 0:
+            assert not linha["enviado"] and linha["data_envio"] and stub.tentativas[texto] == 1, (texto, linha)
+            desfechos["recusadas"] += 1
+        elif falhas >= 3:
+            assert not linha["enviado"] and linha["data_envio"] and linha["tentativas"] >= 3, (texto, linha)
+            desfechos["falharam_3_vezes"] += 1
+        else:
+            assert linha["enviado"], (texto, linha)
+            desfechos["enviadas_depois_de_falhar" if falhas else "enviadas"] += 1
+
+    picos = {}
+    for tipo, provider in (("wasender", providers["wasender"]), ("meta", providers["meta"]), ("padrao", "padrao")):
+        pico = stub.pico(provider, 10)
+        # Em 10s cabe 1/6 do limite por minuto, mais a rajada de 1 envio de cada worker
+        permitido = limites[tipo] / 6 + len(workers)
+        assert pico <= permitido, f"{tipo}: {pico} envios em 10s (limite {permitido:.0f})"
+        picos[tipo] = {"pico_10s": pico, "limite_10s": round(permitido)}
+    resultado.update(
+        segundos=round(segundos, 1),
+        mensagens_por_segundo=round(args.mensagens / segundos),
+        desfechos=dict(desfechos),
+        tentativas_no_provider=sum(stub.tentativas.values()),
+        duplicadas=len(duplicadas),
+        picos_por_provider=picos,
+        chamadas_ao_banco=dict(chamadas),
+        chamadas_ao_banco_por_mensagem=round(sum(chamadas.values()) / args.mensagens, 3),
+        metricas_workers=[{k: v for k, v in w.estado().items() if k not in ("worker", "ativo")} for w in workers],
+    )
+    if not args.manter:
+        await conn.execute(f"DROP SCHEMA IF EXISTS {args.schema} CASCADE")
+    await conn.close()
+    print(json.dumps(resultado, indent=2, ensure_ascii=False, default=str))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"), required=not os.getenv("DATABASE_URL"))
+    parser.add_argument("--mensagens", type=int, default=3000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--lote", type=int, default=50, help="WHATSAPP_FILA_LOTE de cada worker")
+    parser.add_argument("--taxa-wasender", type=float, default=600, help="Envios por minuto no WaSender")
+    parser.add_argument("--taxa-meta", type=float, default=6000, help="Envios por minuto na Meta")
+    parser.add_argument("--taxa-padrao", type=float, default=1200, help="Envios por minuto sem provider_id")
+    parser.add_argument("--latencia-ms", type=float, default=20.0, help="Latência do stub por envio")
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--schema", default="bench_fila", help="Schema descartável onde a fila é carregada")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--manter", action="store_true", help="Não remove o schema ao final")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,244 @@
+"""
+Benchmark - projecao_fluxo_caixa
+================================
+Gera num schema descartável de um Postgres real o histórico de um clube
+(10 anos de mensalidades de 10k associados = 1,2 milhão de linhas, mais
+contas a pagar e a receber), aplica a database/029_fluxo_caixa.sql e mede:
+
+1. a projeção fria (distribuição dos atrasos e títulos em aberto lidos do
+   banco) e a quente (distribuição em cache, só os títulos em aberto), para
+   as granularidades mensal e diária;
+2. quanto custaria trazer os títulos para o MCP em vez das agregações
+   (leitura das linhas brutas dos anos de histórico usados);
+3. a conferência da projeção vetorizada contra um laço em Python puro, título
+   a título e dia a dia, sobre as mesmas agregações.
+
+Os GRANT/REVOKE da migração são ignorados (os papéis do Supabase não existem
+num Postgres local).
+
+Requer: pip install -e ".[postgres,analise]" e um Postgres acessível (não use o de produção).
+
+Uso:
+    python benchmarks/bench_fluxo_caixa.py --database-url postgresql://postgres@localhost/postgres --associados 10000 --anos 10
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+from urllib.parse import urlencode, urlparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import asyncpg  # noqa: E402
+
+from benchmarks.fake_postgrest import FakeDB  # noqa: E402
+from benchmarks.standin import conectar  # noqa: E402
+
+MIGRACAO = os.path.join(os.path.dirname(__file__), "..", "..", "database", "029_fluxo_caixa.sql")
+
+
+def _json(resposta: str):
+    assert not resposta.startswith("❌"), resposta
+    return json.loads(resposta.split("\n\n", 1)[1] if "\n\n" in resposta else resposta)
+
+
+async def carregar_postgres(conn: asyncpg.Connection, schema: str, associados: int, anos: int, semente: int):
+    """Cria as tabelas e gera o histórico inteiro no próprio banco."""
+    await conn.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE; CREATE SCHEMA {schema}")
+    await conn.execute(f"SET search_path = {schema}")
+    await conn.execute("SELECT setseed($1)", (semente % 1000) / 1000)
+    await conn.execute("""
+        CREATE TYPE status_pagamento AS ENUM ('pendente', 'pago', 'atrasado', 'cancelado');
+        CREATE TABLE mensalidades (
+          id BIGSERIAL PRIMARY KEY, associado_id INTEGER NOT NULL, referencia VARCHAR(7) NOT NULL,
+          valor DECIMAL(10,2) NOT NULL, valor_pago DECIMAL(10,2), data_vencimento DATE NOT NULL,
+          data_pagamento TIMESTAMPTZ, status status_pagamento DEFAULT 'pendente');
+        CREATE TABLE contas_pagar (
+          id BIGSERIAL PRIMARY KEY, descricao TEXT NOT NULL, valor DECIMAL(10,2) NOT NULL,
+          data_vencimento DATE NOT NULL, data_pagamento TIMESTAMPTZ, status status_pagamento DEFAULT 'pendente');
+        CREATE TABLE contas_receber (
+          id BIGSERIAL PRIMARY KEY, descricao TEXT NOT NULL, valor DECIMAL(10,2) NOT NULL,
+          data_vencimento DATE NOT NULL, data_recebimento DATE, status status_pagamento DEFAULT 'pendente');
+    """)
+    # Atraso de cada mensalidade: 45% antes do vencimento, 35% até 10 dias depois,
+    # 12% até 90 dias e 8% nunca pagas (as de meses recentes ainda em aberto)
+    await conn.execute("""
+        INSERT INTO mensalidades (associado_id, referencia, valor, data_vencimento, data_pagamento, status)
+        SELECT a, to_char(mes, 'YYYY-MM'), valor, vencimento,
+               CASE WHEN vencimento + atraso <= CURRENT_DATE THEN vencimento + atraso END,
+               (CASE WHEN vencimento + atraso <= CURRENT_DATE THEN 'pago'
+                     WHEN vencimento < CURRENT_DATE THEN 'atrasado' ELSE 'pendente' END)::status_pagamento
+        FROM (
+          SELECT a, mes, (mes + interval '9 days')::DATE AS vencimento,
+                 (ARRAY[180, 250, 390])[1 + a % 3]::NUMERIC AS valor,
+                 CASE WHEN s < 0.45 THEN -floor(random() * 8)::INT
+                      WHEN s < 0.80 THEN floor(random() * 11)::INT
+                      WHEN s < 0.92 THEN 11 + floor(random() * 80)::INT
+                      ELSE 100000 END AS atraso
+          FROM generate_series(1, $1) a,
+               generate_series(date_trunc('month', CURRENT_DATE) - make_interval(years => $2),
+                               date_trunc('month', CURRENT_DATE), interval '1 month') mes,
+               LATERAL (SELECT random() + a * 0 AS s) sorteio
+        ) m
+    """, associados, anos)
+    # Contas a pagar: folha, fornecedores e consumo, vencendo ao longo do mês, até 3 meses à frente
+    await conn.execute("""
+        INSERT INTO contas_pagar (descricao, valor, data_vencimento, data_pagamento, status)
+        SELECT 'Conta ' || i, round((500 + random() * 20000)::NUMERIC, 2), vencimento,
+               CASE WHEN vencimento < CURRENT_DATE - 5 THEN vencimento END,
+               (CASE WHEN vencimento < CURRENT_DATE - 5 THEN 'pago' ELSE 'pendente' END)::status_pagamento
+        FROM generate_series(1, 40) i,
+             generate_series(date_trunc('month', CURRENT_DATE) - make_interval(years => $1),
+                             date_trunc('month', CURRENT_DATE) + interval '3 months', interval '1 month') mes,
+             LATERAL (SELECT (mes + make_interval(days => (i * 7) % 28))::DATE AS vencimento) v
+    """, anos)
+    # Contas a receber: aluguéis de espaço e eventos, pagos com atraso maior que as mensalidades
+    await conn.execute("""
+        INSERT INTO contas_receber (descricao, valor, data_vencimento, data_recebimento, status)
+        SELECT 'Recebível ' || i, round((200 + random() * 3000)::NUMERIC, 2), vencimento,
+               CASE WHEN vencimento + atraso <= CURRENT_DATE THEN vencimento + atraso END,
+               (CASE WHEN vencimento + atraso <= CURRENT_DATE THEN 'pago' ELSE 'pendente' END)::status_pagamento
+        FROM generate_series(1, 15) i,
+             generate_series(date_trunc('month', CURRENT_DATE) - make_interval(years => $1),
+                             date_trunc('month', CURRENT_DATE) + interval '2 months', interval '1 month') mes,
+             LATERAL (SELECT (mes + make_interval(days => (i * 11) % 28))::DATE AS vencimento,
+                             CASE WHEN random() < 0.9 THEN floor(random() * 45)::INT ELSE 100000 END AS atraso) v
+    """, anos)
+    sql = open(MIGRACAO, encoding="utf-8").read().replace("search_path = public", f"search_path = {schema}")
+    await conn.execute("\n".join(l for l in sql.splitlines() if not l.startswith(("GRANT", "REVOKE"))))
+    await conn.execute("ANALYZE")
+    return {t: await conn.fetchval(f"SELECT count(*) FROM {t}")
+            for t in ("mensalidades", "contas_pagar", "contas_receber")}
+
+
+def projecao_em_laco(server, atrasos: list[dict], abertos: list[dict], hoje: date, fim: date, max_dias: int) -> dict:
+    """A mesma projeção título a título e dia a dia, sem NumPy (referência para conferência)."""
+    dias = (fim - hoje).days + 1
+    distribuicoes = {}
+    for origem in server.ORIGENS_RECEBIMENTO:
+        linhas = [l for l in atrasos if l["origem"] == origem]
+        total = sum(float(l["valor"]) for l in linhas)
+        if not total:
+            continue
+        pmf = {l["dias"]: float(l["valor"]) / total for l in linhas if l["dias"] is not None}
+        titulos = sum(l["quantidade"] for l in linhas)
+        distribuicoes[origem] = (pmf, titulos)
+    if distribuicoes.get("contas_receber", (None, 0))[1] < server.MINIMO_HISTORICO:
+        distribuicoes["contas_receber"] = distribuicoes["mensalidades"]
+
+    faturamento = next(l for l in abertos if l["origem"] == "faturamento")
+    ano, mes = map(int, faturamento["referencia"].split("-"))
+    a_faturar = []
+    while True:
+        mes += 1
+        primeiro = date(ano + (mes - 1) // 12, (mes - 1) % 12 + 1, 1)
+        if primeiro > fim:
+            break
+        vencimento = min(server._fim_do_mes(primeiro.year, primeiro.month),
+                         primeiro + timedelta(days=faturamento["dias"] - 1))
+        a_faturar.append({"origem": "mensalidades", "dias": (vencimento - hoje).days, "valor": faturamento["valor"]})
+
+    series = {o: [0.0] * dias for o in (*server.ORIGENS_RECEBIMENTO, "contas_pagar")}
+    for titulo in [l for l in abertos if l["origem"] != "faturamento"] + a_faturar:
+        if titulo["origem"] == "contas_pagar":
+            dia = max(titulo["dias"], 0)
+            if dia < dias:
+                series["contas_pagar"][dia] += float(titulo["valor"])
+            continue
+        pmf, _ = distribuicoes[titulo["origem"]]
+        # Só os atrasos que ainda podem acontecer (o título não foi pago até hoje)
+        possiveis = {d: p for d, p in pmf.items() if titulo["dias"] + d >= 0}
+        restante = sum(possiveis.values()) + (1 - sum(pmf.values()))
+        if titulo["dias"] < -max_dias or not restante:
+            continue
+        for d, p in possiveis.items():
+            dia = titulo["dias"] + d
+            if dia < dias:
+                series[titulo["origem"]][dia] += float(titulo["valor"]) * p / restante
+    return series
+
+
+async def main(args):
+    conn = await asyncpg.connect(args.database_url)
+    inicio = time.perf_counter()
+    linhas = await carregar_postgres(conn, args.schema, args.associados, args.anos, args.semente)
+    resultado = {"associados": args.associados, "anos": args.anos, "linhas": linhas,
+                 "geracao_segundos": round(time.perf_counter() - inicio, 1)}
+
+    server, _ = conectar(FakeDB())
+    logging.getLogger("sistema-clube-mcp").setLevel(logging.CRITICAL)
+    separador = "&" if urlparse(args.database_url).query else "?"
+    server.DATABASE_URL = f"{args.database_url}{separador}{urlencode({'search_path': args.schema})}"
+    await server.abrir_pg_pool()
+    try:
+        tempos = {}
+        for granularidade in ("mensal", "diaria"):
+            frias, quentes = [], []
+            for _ in range(args.repeticoes):
+                server.cache_atrasos.limpar()
+                inicio = time.perf_counter()
+                projecao = _json(await server.projecao_fluxo_caixa(args.meses, granularidade, usar_cache=False))
+                frias.append(time.perf_counter() - inicio)
+                inicio = time.perf_counter()
+                await server.projecao_fluxo_caixa(args.meses, granularidade, usar_cache=False)
+                quentes.append(time.perf_counter() - inicio)
+            tempos[granularidade] = {"fria_ms": round(statistics.median(frias) * 1000),
+                                     "quente_ms": round(statistics.median(quentes) * 1000),
+                                     "periodos": len(projecao["periodos"])}
+            if granularidade == "mensal":
+                resultado["projecao_mensal"] = {k: projecao[k] for k in (
+                    "periodos", "entradas_mensalidades", "entradas_contas_receber", "saidas_contas_pagar",
+                    "totais", "em_aberto", "nao_recebido_no_periodo", "premissas")}
+        assert all(t["fria_ms"] < 1000 for t in tempos.values()), tempos
+        resultado["tempos"] = tempos
+
+        # Alternativa: trazer as linhas dos títulos para o MCP
+        desde = date(date.today().year - 3, date.today().month, 1)
+        inicio = time.perf_counter()
+        brutas = await conn.fetch("SELECT valor, data_vencimento, data_pagamento, status FROM mensalidades "
+                                  "WHERE data_vencimento >= $1", desde)
+        resultado["linhas_brutas"] = {"linhas": len(brutas), "so_a_leitura_ms": round((time.perf_counter() - inicio) * 1000)}
+
+        # Conferência contra o laço, com as mesmas agregações
+        hoje = date.today()
+        fim = server._fim_do_mes(hoje.year, hoje.month + args.meses - 1)
+        max_dias = server.FLUXO_CAIXA_ATRASO_MAX_DIAS
+        atrasos = [dict(r) for r in await conn.fetch("SELECT * FROM distribuicao_atrasos($1, $2)", desde, max_dias)]
+        abertos = [dict(r) for r in await conn.fetch("SELECT * FROM titulos_em_aberto()")]
+        inicio = time.perf_counter()
+        vetorizada = server._projetar_fluxo(atrasos, abertos, hoje, fim, max_dias)["series"]
+        segundos_vetorizada = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        laco = projecao_em_laco(server, atrasos, abertos, hoje, fim, max_dias)
+        segundos_laco = time.perf_counter() - inicio
+        diferenca = max(abs(a - b) for o in laco for a, b in zip(vetorizada[o].tolist(), laco[o]))
+        assert diferenca < 0.01, f"projeção vetorizada difere do laço em R$ {diferenca:.4f}"
+        resultado["conferencia"] = {"maior_diferenca_diaria": round(diferenca, 6),
+                                    "vetorizada_ms": round(segundos_vetorizada * 1000, 1),
+                                    "laco_ms": round(segundos_laco * 1000, 1)}
+    finally:
+        await server.fechar_pg_pool()
+
+    if not args.manter:
+        await conn.execute(f"DROP SCHEMA IF EXISTS {args.schema} CASCADE")
+    await conn.close()
+    print(json.dumps(resultado, indent=2, ensure_ascii=False, default=str))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"), required=not os.getenv("DATABASE_URL"))
+    parser.add_argument("--associados", type=int, default=10000)
+    parser.add_argument("--anos", type=int, default=10)
+    parser.add_argument("--meses", type=int, default=6, help="Meses projetados")
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--schema", default="bench_fluxo_caixa")
+    parser.add_argument("--manter", action="store_true", help="Não apagar o schema no fim")
+    parser.add_argument("--semente", type=int, default=42)
+    asyncio.run(main(parser.parse_args()))
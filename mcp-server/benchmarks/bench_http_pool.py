@@ -0,0 +1,130 @@
+"""
+Benchmark - Pool HTTP da API Next.js
+====================================
+Sobe um stub HTTP local que imita /api/whatsapp/send, dispara N envios
+concorrentes via `enviar_whatsapp` e mede quantas conexões TCP foram abertas.
+
+Compara o cliente configurado pelo servidor (pool + keep-alive ajustados) com
+o cliente antigo `httpx.AsyncClient(base_url=..., timeout=30.0)`, que usa os
+limites padrão do httpx (100 conexões, só 20 mantidas em keep-alive).
+
+Uso:
+    python benchmarks/bench_http_pool.py --envios 500
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:54321")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "bench.bench.bench")
+
+
+class StubNextApi:
+    """Servidor HTTP/1.1 mínimo com keep-alive que conta conexões abertas."""
+
+    def __init__(self, latencia_ms: float = 2.0):
+        self.latencia = latencia_ms / 1000
+        self.conexoes = 0
+        self.requisicoes = 0
+        self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.conexoes += 1
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                tamanho = 0
+                for linha in head.split(b"\r\n"):
+                    if linha.lower().startswith(b"content-length:"):
+                        tamanho = int(linha.split(b":", 1)[1])
+                if tamanho:
+                    await reader.readexactly(tamanho)
+                self.requisicoes += 1
+                await asyncio.sleep(self.latencia)
+                body = b'{"success": true}'
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    b"Content-Length: " + str(len(body)).encode() + b"\r\n"
+                    b"Connection: keep-alive\r\n\r\n" + body
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self) -> str:
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        porta = self._server.sockets[0].getsockname()[1]
+        return f"http://127.0.0.1:{porta}"
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+
+async def _rodada_pool(server, envios: int) -> float:
+    inicio = time.perf_counter()
+    await asyncio.gather(*(
+        server.enviar_whatsapp(telefone=f"55169{i:08d}", mensagem="bench")
+        for i in range(envios)
+    ))
+    return time.perf_counter() - inicio
+
+
+async def _rodada_cliente_padrao(httpx, base_url: str, envios: int) -> float:
+    async with httpx.AsyncClient(base_url=base_url, timeout=30.0) as client:
+        inicio = time.perf_counter()
+        await asyncio.gather(*(
+            client.post("/api/whatsapp/send", json={"telefone": f"55169{i:08d}", "mensagem": "bench"})
+            for i in range(envios)
+        ))
+        return time.perf_counter() - inicio
+
+
+async def main(envios: int, latencia_ms: float):
+    stub = StubNextApi(latencia_ms)
+    base_url = await stub.start()
+    os.environ["CLUBE_API_URL"] = base_url
+
+    import httpx
+    import server
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    server.CLUBE_API_URL = base_url
+    resultado = {"envios": envios, "latencia_stub_ms": latencia_ms}
+
+    async with server.lifespan(server.mcp):
+        tempo = await _rodada_pool(server, envios)
+    resultado["pool"] = {
+        "segundos": round(tempo, 3),
+        "envios_por_segundo": round(envios / tempo, 1),
+        "conexoes_tcp": stub.conexoes,
+        "max_connections": server.HTTP_MAX_CONNECTIONS,
+    }
+
+    stub.conexoes = 0
+    tempo = await _rodada_cliente_padrao(httpx, base_url, envios)
+    resultado["cliente_padrao_httpx"] = {
+        "segundos": round(tempo, 3),
+        "envios_por_segundo": round(envios / tempo, 1),
+        "conexoes_tcp": stub.conexoes,
+    }
+
+    await stub.stop()
+    print(json.dumps(resultado, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--envios", type=int, default=500)
+    parser.add_argument("--latencia-ms", type=float, default=2.0)
+    args = parser.parse_args()
+    asyncio.run(main(args.envios, args.latencia_ms))
@@ -0,0 +1,91 @@
+"""
+Benchmark - Importação em lote de associados
+============================================
+Gera um CSV no formato de planilha (separador ;, CPF formatado, datas
+DD/MM/AAAA, cabeçalhos com acento) com N associados e algumas linhas
+inválidas, e importa com `importar_associados` no stand-in do PostgREST.
+
+Verifica que as linhas inválidas são apontadas uma a uma, que as válidas
+são gravadas e que 20k linhas importam em menos de um minuto.
+
+Uso:
+    python benchmarks/bench_importacao.py --linhas 20000 --latencia-ms 5
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from benchmarks.dados import gerar_clube, gerar_cpf  # noqa: E402
+from benchmarks.standin import carregar, conectar  # noqa: E402
+
+
+def gerar_planilha(caminho: str, linhas: int, titulo_inicial: int, semente: int = 7) -> int:
+    """Escreve a planilha e retorna quantas linhas foram geradas inválidas de propósito."""
+    rng = random.Random(semente)
+    invalidas = 0
+    usados = set()
+    with open(caminho, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.writer(f, delimiter=";")
+        writer.writerow(["Nome", "CPF", "Plano", "Título", "Nascimento", "Celular", "E-mail"])
+        for i in range(linhas):
+            cpf = gerar_cpf(rng)
+            while cpf in usados:
+                cpf = gerar_cpf(rng)
+            usados.add(cpf)
+            if i % 1000 == 999:
+                cpf = cpf[:10] + str((int(cpf[10]) + 1) % 10)  # dígito verificador errado
+                invalidas += 1
+            writer.writerow([
+                f"Importado {i}", f"{cpf[:3]}.{cpf[3:6]}.{cpf[6:9]}-{cpf[9:]}",
+                rng.choice(["Individual", "familiar", "patrimonial"]), titulo_inicial + i,
+                f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/{rng.randint(1950, 2005)}",
+                f"55169{rng.randint(10_000_000, 99_999_999)}", f"importado{i}@exemplo.com",
+            ])
+    return invalidas
+
+
+async def main(linhas: int, latencia_ms: float):
+    dados = gerar_clube(1000)
+    server, transporte = conectar(carregar(dados), latencia_ms)
+    logging.getLogger("sistema-clube-mcp").setLevel(logging.CRITICAL)
+    server.IMPORT_DIR = tempfile.mkdtemp(prefix="bench-importacao-")
+    server.EXPORT_DIR = server.IMPORT_DIR
+
+    invalidas = gerar_planilha(os.path.join(server.IMPORT_DIR, "planilha.csv"), linhas, 100_000)
+    antes = transporte.requisicoes
+    inicio = time.perf_counter()
+    resposta = await server.importar_associados("planilha.csv")
+    segundos = time.perf_counter() - inicio
+
+    resultado = json.loads(resposta.split("\n\n", 1)[1])
+    assert resultado["com_erro"] == invalidas, resposta[:500]
+    assert resultado["inseridos"] == linhas - invalidas, resposta[:500]
+    print(json.dumps({
+        "linhas": linhas,
+        "latencia_ms": latencia_ms,
+        "segundos": round(segundos, 2),
+        "linhas_por_segundo": round(linhas / segundos),
+        "requisicoes_postgrest": transporte.requisicoes - antes,
+        "inseridos": resultado["inseridos"],
+        "com_erro": resultado["com_erro"],
+    }, indent=2, ensure_ascii=False))
+    if linhas >= 20_000:
+        assert segundos < 60, f"{linhas} linhas levaram {segundos:.1f}s (meta: < 60s)"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--linhas", type=int, default=20_000)
+    parser.add_argument("--latencia-ms", type=float, default=5.0)
+    args = parser.parse_args()
+    asyncio.run(main(args.linhas, args.latencia_ms))
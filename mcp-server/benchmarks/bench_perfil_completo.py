@@ -0,0 +1,132 @@
+"""
+Benchmark - perfil_completo x cadeia de tools do prompt verificar_acesso_completo
+================================================================================
+Para uma amostra de associados do clube sintético (incluindo inadimplentes,
+inativos, planos familiares e exames inaptos), confere que `perfil_completo`
+diz o mesmo que as tools individuais:
+
+- acesso de titular e dependentes em cada local = `validar_acesso`
+- último exame válido = o que `validar_acesso` usa (`ultimo_exame_valido`)
+- mensalidades em aberto = `buscar_mensalidades` (pendente + atrasado)
+- punições e reclamações = `buscar_infracoes`
+
+Depois mede as duas formas de montar o perfil no stand-in, com latência
+simulada por requisição: a cadeia sequencial de tools que o prompt pedia e
+uma chamada a `perfil_completo`.
+
+Uso:
+    python benchmarks/bench_perfil_completo.py --tamanho 10k --amostra 200 --latencia-ms 20
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from benchmarks.dados import TAMANHOS, gerar_clube  # noqa: E402
+from benchmarks.standin import carregar, conectar  # noqa: E402
+
+
+def _json(resposta: str):
+    assert not resposta.startswith("❌"), resposta
+    return json.loads(resposta.split("\n\n", 1)[1] if "\n\n" in resposta else resposta)
+
+
+def amostrar(dados: dict, tamanho: int, semente: int) -> list[dict]:
+    """Associados variados: metade ao acaso, metade com algo a dizer (dívida, inativo, dependentes)."""
+    rng = random.Random(semente)
+    atrasados = {m["associado_id"] for m in dados["mensalidades"] if m["status"] == "atrasado"}
+    com_dependentes = {d["associado_id"] for d in dados["dependentes"]}
+    interessantes = [a for a in dados["associados"]
+                     if a["id"] in atrasados or a["id"] in com_dependentes or a["status"] != "ativo"]
+    amostra = rng.sample(dados["associados"], tamanho // 2) + rng.sample(interessantes, tamanho - tamanho // 2)
+    return list({a["id"]: a for a in amostra}.values())
+
+
+async def cadeia_do_prompt(server, associado: dict) -> dict:
+    """O que o prompt verificar_acesso_completo pedia ao LLM, uma tool de cada vez."""
+    encontrado = _json(await server.buscar_associados(busca=associado["cpf"]))[0]
+    dependentes = _json(await server.buscar_dependentes(associado_id=encontrado["id"]))
+    pessoas = [(encontrado["id"], "associado")] + [(d["id"], "dependente") for d in dependentes]
+    acesso = {}
+    for pessoa_id, tipo in pessoas:
+        acesso[pessoa_id] = {}
+        for local in ("clube", "piscina", "academia"):
+            acesso[pessoa_id][local] = _json(await server.validar_acesso(pessoa_id, tipo, local))
+    for pessoa_id, tipo in pessoas:
+        await server.buscar_exames(pessoa_id=pessoa_id, tipo_pessoa=tipo)
+    pendentes = _json(await server.buscar_mensalidades(associado_id=encontrado["id"], status="pendente", limite=500))
+    atrasadas = _json(await server.buscar_mensalidades(associado_id=encontrado["id"], status="atrasado", limite=500))
+    infracoes = _json(await server.buscar_infracoes(associado_id=encontrado["id"], limite=10))
+    return {"acesso": acesso, "em_aberto": pendentes + atrasadas, "infracoes": infracoes}
+
+
+def conferir(perfil: dict, cadeia: dict) -> None:
+    pessoas = [perfil["associado"]] + perfil["dependentes"]
+    assert {p["id"] for p in pessoas} == set(cadeia["acesso"]), "dependentes divergentes"
+    for p in pessoas:
+        for local, veredito in p["acesso"].items():
+            individual = cadeia["acesso"][p["id"]][local]
+            assert (veredito["permitido"], veredito.get("motivo")) == \
+                (individual["permitido"], individual.get("motivo")), (p["nome"], local, veredito, individual)
+            assert veredito.get("alertas", []) == individual.get("alertas", []), (p["nome"], local)
+    ids_abertos = {m["id"] for m in perfil["financeiro"]["mensalidades_em_aberto"]}
+    assert ids_abertos == {m["id"] for m in cadeia["em_aberto"]}, "mensalidades em aberto divergentes"
+    assert {x["id"] for x in perfil["punicoes"]} == {x["id"] for x in cadeia["infracoes"]["punicoes"]}
+    assert {x["id"] for x in perfil["reclamacoes"]} == {x["id"] for x in cadeia["infracoes"]["reclamacoes"]}
+
+
+async def main(args):
+    dados = gerar_clube(TAMANHOS[args.tamanho], semente=args.semente)
+    server, transporte = conectar(carregar(dados))
+    logging.getLogger("sistema-clube-mcp").setLevel(logging.CRITICAL)
+    amostra = amostrar(dados, args.amostra, args.semente)
+
+    negados = 0
+    for associado in amostra:
+        perfil = _json(await server.perfil_completo(associado["id"]))
+        conferir(perfil, await cadeia_do_prompt(server, associado))
+        negados += sum(not v["permitido"] for p in [perfil["associado"]] + perfil["dependentes"]
+                       for v in p["acesso"].values())
+    # Os outros jeitos de achar a pessoa caem no mesmo perfil
+    a = amostra[0]
+    for chave in (a["cpf"], str(a["numero_titulo"])):
+        assert _json(await server.perfil_completo(chave))["associado"]["id"] == a["id"], chave
+
+    transporte.latencia = args.latencia_ms / 1000
+    medidas = {}
+    for nome, chamada in (
+        ("cadeia_do_prompt", lambda a: cadeia_do_prompt(server, a)),
+        ("perfil_completo", lambda a: server.perfil_completo(a["id"])),
+    ):
+        antes, inicio = transporte.requisicoes, time.perf_counter()
+        for associado in amostra[:args.medir]:
+            await chamada(associado)
+        medidas[nome] = {
+            "ms_por_perfil": round((time.perf_counter() - inicio) * 1000 / args.medir, 1),
+            "requisicoes_por_perfil": round((transporte.requisicoes - antes) / args.medir, 1),
+        }
+
+    print(json.dumps({
+        "tamanho": args.tamanho,
+        "perfis_conferidos": len(amostra),
+        "vereditos_negados": negados,
+        "latencia_ms": args.latencia_ms,
+        **medidas,
+    }, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tamanho", choices=list(TAMANHOS), default="10k")
+    parser.add_argument("--amostra", type=int, default=200, help="Associados conferidos contra as tools individuais")
+    parser.add_argument("--medir", type=int, default=30, help="Associados usados na medição de tempo")
+    parser.add_argument("--latencia-ms", type=float, default=20.0, help="Latência simulada por requisição")
+    parser.add_argument("--semente", type=int, default=42)
+    asyncio.run(main(parser.parse_args()))
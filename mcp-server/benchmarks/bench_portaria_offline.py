@@ -0,0 +1,178 @@
+"""
+Benchmark - portaria offline (réplica SQLite + diário)
+======================================================
+Exercita a portaria com o Supabase fora do ar, no stand-in:
+
+1. sincroniza a réplica e confere, para uma amostra de pessoas, locais e
+   carteirinhas, que a réplica decide igual às consultas ao Supabase, e que
+   um registro online com a confirmação perdida não é gravado duas vezes;
+2. derruba o stand-in (toda requisição falha com erro de conexão) e mede
+   `validar_carteirinha` e `registrar_acesso` respondendo pela réplica; com a
+   gravação em lote ligada, confere que os pontos de acesso vêm da réplica e
+   que, acima de ACESSO_FILA_MAX, os registros vão para o diário;
+3. reinicia a réplica a partir do arquivo (os registros do diário continuam lá);
+4. volta a conexão, mas perde a resposta do primeiro lote enviado (o insert
+   acontece, a confirmação não chega), e reenvia o diário até esvaziar.
+
+No final, cada acesso registrado offline precisa estar uma única vez em
+registros_acesso, com o horário da leitura.
+
+Uso:
+    python benchmarks/bench_portaria_offline.py --tamanho 10k --leituras 2000
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from benchmarks.bench_postgres_direto import _percentil  # noqa: E402
+from benchmarks.dados import TAMANHOS, gerar_clube  # noqa: E402
+from benchmarks.standin import carregar, conectar  # noqa: E402
+
+LOCAIS = ("clube", "piscina", "academia")
+
+
+def _json(resposta: str):
+    assert not resposta.startswith("❌"), resposta
+    return json.loads(resposta.split("\n\n", 1)[1] if "\n\n" in resposta else resposta)
+
+
+async def conferir_replica(server, dados: dict, amostra: int, rng: random.Random) -> int:
+    """Mesma decisão (permitido + motivo) online e na réplica."""
+    replica = server.replica_portaria
+    pessoas = [(a["id"], "associado") for a in rng.sample(dados["associados"], amostra)] + \
+        [(d["id"], "dependente") for d in rng.sample(dados["dependentes"], min(amostra, len(dados["dependentes"])))]
+    conferidos = 0
+    for pessoa_id, tipo in pessoas:
+        for local in LOCAIS:
+            online = await server._validar_acesso_remoto(pessoa_id, tipo, local)
+            offline = replica.validar(pessoa_id, tipo, local)
+            assert (online["permitido"], online.get("motivo")) == (offline["permitido"], offline.get("motivo")), \
+                (pessoa_id, tipo, local, online, offline)
+            conferidos += 1
+    for c in rng.sample(dados["carteirinhas"], amostra):
+        online = await server._validar_carteirinha_remoto(c["qrcode_hash"], "clube")
+        offline = replica.validar_carteirinha(c["qrcode_hash"], "clube")
+        assert (online["permitido"], online.get("motivo")) == (offline["permitido"], offline.get("motivo")), \
+            (c, online, offline)
+        conferidos += 1
+    return conferidos
+
+
+async def main(args):
+    rng = random.Random(args.semente)
+    dados = gerar_clube(TAMANHOS[args.tamanho], semente=args.semente)
+    server, transporte = conectar(carregar(dados))
+    logging.getLogger("sistema-clube-mcp").setLevel(logging.CRITICAL)
+    caminho = os.path.join(tempfile.mkdtemp(prefix="portaria-"), "portaria.sqlite3")
+    server.replica_portaria = server.ReplicaPortaria(caminho)
+    resultado = {"tamanho": args.tamanho, "leituras_offline": args.leituras}
+
+    inicio = time.perf_counter()
+    resultado["replica"] = await asyncio.to_thread(server.replica_portaria.sincronizar)
+    resultado["sincronizacao_segundos"] = round(time.perf_counter() - inicio, 2)
+    resultado["replica_mb"] = round(os.path.getsize(caminho) / 2**20, 1)
+    resultado["decisoes_conferidas"] = await conferir_replica(server, dados, args.amostra, rng)
+
+    # 1b. Registro online cuja confirmação se perde: o insert acontece, a resposta não chega,
+    # o acesso vai para o diário com o mesmo id e o reenvio não duplica
+    handle_original = transporte.handle_request
+    c = next(c for c in dados["carteirinhas"] if c["ativa"] and c["associado_id"])
+
+    def resposta_perdida(request):
+        resposta = handle_original(request)
+        if request.method == "POST" and request.url.path.endswith("/registros_acesso"):
+            raise httpx.ReadTimeout("resposta perdida", request=request)
+        return resposta
+
+    transporte.handle_request = resposta_perdida
+    registro = _json(await server.registrar_acesso(c["associado_id"], "associado", "entrada"))
+    assert registro["offline"], registro
+    transporte.handle_request = handle_original
+    _json(await server.sincronizar_portaria())
+    gravados = [r for r in transporte.db.linhas("registros_acesso") if r["id"] == registro["id"]]
+    assert len(gravados) == 1, f"{len(gravados)} linhas para um acesso com a confirmação perdida"
+    resultado["confirmacao_online_perdida"] = {"linhas_gravadas": len(gravados)}
+
+    # 2. Supabase fora do ar
+
+    def fora_do_ar(request):
+        raise httpx.ConnectError("stand-in desligado", request=request)
+
+    transporte.handle_request = fora_do_ar
+    ativas = [c for c in dados["carteirinhas"] if c["ativa"]]
+    leituras, latencias = [], []
+    for i in range(args.leituras):
+        c = rng.choice(ativas)
+        tipo_pessoa = "associado" if c["associado_id"] else "dependente"
+        pessoa_id = c["associado_id"] or c["dependente_id"]
+        inicio = time.perf_counter()
+        validacao = _json(await server.validar_carteirinha(c["qrcode_hash"], LOCAIS[i % 3]))
+        registro = _json(await server.registrar_acesso(pessoa_id, tipo_pessoa, "entrada", LOCAIS[i % 3]))
+        latencias.append((time.perf_counter() - inicio) * 1000)
+        assert validacao["offline"] and registro["offline"]
+        leituras.append(registro)
+    ordenadas = sorted(latencias)
+    resultado["offline_validar_e_registrar_ms"] = {"p50": _percentil(ordenadas, 50), "p95": _percentil(ordenadas, 95)}
+
+    # 2b. Gravação em lote na queda, sem cache de pontos: eles vêm da réplica, e acima
+    # do teto da fila os registros vão para o diário em disco
+    server.fila_acessos = server.FilaAcessos(60_000, 1000)
+    teto, server.ACESSO_FILA_MAX = server.ACESSO_FILA_MAX, 5
+    for i in range(10):
+        registro = _json(await server.registrar_acesso(pessoa_id, tipo_pessoa, "entrada", LOCAIS[i % 3]))
+        if registro.get("offline"):
+            leituras.append(registro)
+    assert len(server.fila_acessos.pendentes) == 5 and server.fila_acessos.metricas["desviados"] == 5
+    resultado["fila_em_lote_na_queda"] = {"na_fila": 5, "desviados_para_o_diario": 5}
+    server.fila_acessos, server.ACESSO_FILA_MAX = None, teto
+
+    # 3. Reinício do servidor: o diário está em disco
+    server.replica_portaria = server.ReplicaPortaria(caminho)
+    assert server.replica_portaria.estado()["acessos_pendentes"] == len(leituras)
+
+    # 4. Conexão de volta, mas a confirmação do primeiro lote se perde
+    perdas = {"restantes": 1}
+
+    def confirmacao_perdida(request):
+        resposta = handle_original(request)
+        if request.method == "POST" and request.url.path.endswith("/registros_acesso") and perdas["restantes"]:
+            perdas["restantes"] -= 1
+            raise httpx.ReadTimeout("resposta perdida", request=request)
+        return resposta
+
+    transporte.handle_request = confirmacao_perdida
+    antes = len(transporte.db.linhas("registros_acesso"))
+    falhou = await server.sincronizar_portaria()
+    assert falhou.startswith("❌"), falhou
+    tentativas = 1
+    while server.replica_portaria.estado()["acessos_pendentes"]:
+        _json(await server.sincronizar_portaria())
+        tentativas += 1
+
+    registros = transporte.db.linhas("registros_acesso")
+    por_id = {r["id"]: r for r in registros}
+    assert len(registros) - antes == len(leituras), f"{len(registros) - antes} registros para {len(leituras)} leituras"
+    assert all(por_id[r["id"]]["created_at"] == r["created_at"] for r in leituras), "horário da leitura alterado"
+    resultado["envio_do_diario"] = {"tentativas": tentativas, "registros_novos": len(registros) - antes,
+                                    "duplicados": 0}
+    print(json.dumps(resultado, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tamanho", choices=list(TAMANHOS), default="10k")
+    parser.add_argument("--amostra", type=int, default=200, help="Pessoas e carteirinhas conferidas contra o Supabase")
+    parser.add_argument("--leituras", type=int, default=2000, help="Leituras de carteirinha com o Supabase fora do ar")
+    parser.add_argument("--semente", type=int, default=42)
+    asyncio.run(main(parser.parse_args()))
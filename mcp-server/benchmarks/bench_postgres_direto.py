@@ -0,0 +1,209 @@
+"""
+Benchmark - PostgREST x conexão direta (asyncpg)
+================================================
+Mede `listar_inadimplentes`, `resultado_eleicao` e `consulta_sql` pelos dois
+caminhos sobre o mesmo clube sintético:
+
+- PostgREST: o stand-in em memória (benchmarks/standin.py)
+- Direto: pool asyncpg num Postgres real, com o clube carregado num schema
+  descartável (removido ao final, a menos que se passe --manter)
+
+Também confere que os dois caminhos devolvem os mesmos totais. A
+`consulta_sql` só é medida no caminho direto, já que o stand-in não executa SQL.
+
+Requer: pip install -e ".[postgres]" e um Postgres acessível (não use o de produção).
+
+Uso:
+    python benchmarks/bench_postgres_direto.py --database-url postgresql://postgres@localhost/postgres --tamanho 10k
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from datetime import date, datetime
+from urllib.parse import urlencode, urlparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import asyncpg  # noqa: E402
+
+from benchmarks.dados import TAMANHOS, gerar_clube  # noqa: E402
+from benchmarks.standin import carregar, conectar  # noqa: E402
+
+# Só as tabelas lidas pelas tools medidas, com os tipos usados pelo server.py
+TABELAS = {
+    "associados": {
+        "id": "uuid PRIMARY KEY", "numero_titulo": "integer", "nome": "text", "cpf": "text",
+        "email": "text", "telefone": "text", "plano": "text", "status": "text",
+        "data_associacao": "date", "data_nascimento": "date", "created_at": "timestamptz",
+    },
+    "mensalidades": {
+        "id": "uuid PRIMARY KEY", "associado_id": "uuid REFERENCES associados(id)", "referencia": "text",
+        "valor": "numeric", "valor_pago": "numeric", "data_vencimento": "date",
+        "data_pagamento": "date", "status": "text", "forma_pagamento": "text",
+    },
+    "eleicoes": {
+        "id": "uuid PRIMARY KEY", "titulo": "text", "descricao": "text", "data_inicio": "timestamptz",
+        "data_fim": "timestamptz", "status": "text", "mandato_inicio": "date", "mandato_fim": "date",
+    },
+    "chapas": {
+        "id": "uuid PRIMARY KEY", "eleicao_id": "uuid REFERENCES eleicoes(id)", "numero": "integer",
+        "nome": "text", "proposta": "text",
+    },
+    "candidatos": {
+        "id": "uuid PRIMARY KEY", "chapa_id": "uuid REFERENCES chapas(id)",
+        "associado_id": "uuid REFERENCES associados(id)", "cargo": "text",
+    },
+    "votos": {
+        "id": "uuid PRIMARY KEY", "eleicao_id": "uuid REFERENCES eleicoes(id)",
+        "chapa_id": "uuid REFERENCES chapas(id)", "associado_id": "uuid REFERENCES associados(id)",
+    },
+}
+INDICES = [
+    "CREATE INDEX ON mensalidades (status, data_vencimento)",
+    "CREATE INDEX ON votos (eleicao_id, chapa_id)",
+    "CREATE INDEX ON chapas (eleicao_id)",
+    "CREATE INDEX ON candidatos (chapa_id)",
+]
+
+CONSULTAS_SQL = [
+    "SELECT referencia, status, count(*) AS qtd, sum(valor) AS total FROM mensalidades GROUP BY 1, 2 ORDER BY 1, 2",
+    "SELECT numero_titulo, nome, plano, status FROM associados ORDER BY numero_titulo",
+]
+
+
+def _converter(valor, tipo: str):
+    if valor is None:
+        return None
+    if tipo.startswith("date"):
+        return date.fromisoformat(valor[:10])
+    if tipo.startswith("timestamptz"):
+        return datetime.fromisoformat(valor).astimezone()
+    return valor
+
+
+async def carregar_postgres(conn: asyncpg.Connection, schema: str, dados: dict) -> None:
+    await conn.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE; CREATE SCHEMA {schema}")
+    await conn.execute(f"SET search_path = {schema}")
+    for tabela, colunas in TABELAS.items():
+        definicao = ", ".join(f"{c} {t}" for c, t in colunas.items())
+        await conn.execute(f"CREATE TABLE {tabela} ({definicao})")
+        registros = [
+            tuple(_converter(linha.get(c), t) for c, t in colunas.items())
+            for linha in dados[tabela]
+        ]
+        await conn.copy_records_to_table(tabela, records=registros, columns=list(colunas), schema_name=schema)
+    for indice in INDICES:
+        await conn.execute(indice)
+    await conn.execute("ANALYZE")
+
+
+def _percentil(ordenadas: list[float], p: float) -> float:
+    return round(ordenadas[min(len(ordenadas) - 1, int(round(p / 100 * (len(ordenadas) - 1))))], 2)
+
+
+async def medir(chamada, iteracoes: int, concorrencia: int) -> dict:
+    semaforo = asyncio.Semaphore(concorrencia)
+    latencias: list[float] = []
+
+    async def uma(i: int):
+        async with semaforo:
+            inicio = time.perf_counter()
+            resposta = await chamada(i)
+            latencias.append((time.perf_counter() - inicio) * 1000)
+            assert not resposta.startswith("❌"), resposta
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(uma(i) for i in range(iteracoes)))
+    total = time.perf_counter() - inicio
+    ordenadas = sorted(latencias)
+    return {
+        "p50_ms": _percentil(ordenadas, 50),
+        "p95_ms": _percentil(ordenadas, 95),
+        "chamadas_por_segundo": round(iteracoes / total, 1),
+    }
+
+
+def _json(resposta: str):
+    return json.loads(resposta.split("\n\n", 1)[1])
+
+
+async def main(args):
+    dados = gerar_clube(TAMANHOS[args.tamanho], semente=args.semente)
+    eleicao_id = dados["eleicoes"][0]["id"]
+
+    conn = await asyncpg.connect(args.database_url)
+    try:
+        inicio = time.perf_counter()
+        await carregar_postgres(conn, args.schema, dados)
+        carga = time.perf_counter() - inicio
+    finally:
+        await conn.close()
+
+    server, _ = conectar(carregar(dados), args.latencia_ms)
+    logging.getLogger("sistema-clube-mcp").setLevel(logging.CRITICAL)
+    separador = "&" if urlparse(args.database_url).query else "?"
+    server.DATABASE_URL = f"{args.database_url}{separador}{urlencode({'search_path': args.schema})}"
+
+    chamadas = {
+        "listar_inadimplentes": lambda i: server.listar_inadimplentes(meses_atrasados=1 + i % 2),
+        "resultado_eleicao": lambda i: server.resultado_eleicao(eleicao_id),
+        "consulta_sql": lambda i: server.consulta_sql(
+            CONSULTAS_SQL[i % 2], limite=200, offset=(i % 5) * 200, usar_cache=False,
+        ),
+    }
+
+    resultado = {
+        "tamanho": args.tamanho,
+        "linhas": {t: len(dados[t]) for t in TABELAS},
+        "carga_postgres_segundos": round(carga, 2),
+        "latencia_stand_in_ms": args.latencia_ms,
+        "iteracoes": args.iteracoes,
+        "concorrencia": args.concorrencia,
+        "tools": {},
+    }
+
+    postgrest = {}
+    for nome, chamada in chamadas.items():
+        if nome == "consulta_sql":
+            continue
+        postgrest[nome] = _json(await chamada(0))
+        resultado["tools"][nome] = {"postgrest": await medir(chamada, args.iteracoes, args.concorrencia)}
+
+    await server.abrir_pg_pool()
+    try:
+        direto = {nome: _json(await chamada(0)) for nome, chamada in chamadas.items()}
+        for nome, chamada in chamadas.items():
+            resultado["tools"].setdefault(nome, {})["direto"] = await medir(chamada, args.iteracoes, args.concorrencia)
+    finally:
+        await server.fechar_pg_pool()
+        if not args.manter:
+            conn = await asyncpg.connect(args.database_url)
+            await conn.execute(f"DROP SCHEMA IF EXISTS {args.schema} CASCADE")
+            await conn.close()
+
+    assert len(postgrest["listar_inadimplentes"]) == len(direto["listar_inadimplentes"]), "inadimplentes divergentes"
+    assert postgrest["resultado_eleicao"]["total_votos"] == direto["resultado_eleicao"]["total_votos"], \
+        "total de votos divergente"
+
+    for medidas in resultado["tools"].values():
+        if "postgrest" in medidas:
+            medidas["ganho_p50"] = round(medidas["postgrest"]["p50_ms"] / max(medidas["direto"]["p50_ms"], 0.01), 1)
+    print(json.dumps(resultado, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"), required=not os.getenv("DATABASE_URL"))
+    parser.add_argument("--tamanho", choices=list(TAMANHOS), default="10k")
+    parser.add_argument("--iteracoes", type=int, default=50)
+    parser.add_argument("--concorrencia", type=int, default=8)
+    parser.add_argument("--latencia-ms", type=float, default=0.0, help="Latência simulada no stand-in do PostgREST")
+    parser.add_argument("--schema", default="bench_clube", help="Schema descartável onde o clube é carregado")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--manter", action="store_true", help="Não remove o schema ao final")
+    asyncio.run(main(parser.parse_args()))
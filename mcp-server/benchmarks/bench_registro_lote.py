@@ -0,0 +1,220 @@
+"""
+Benchmark - registrar_acesso com gravação em lote (write-behind)
+================================================================
+No stand-in, com latência simulada por requisição:
+
+1. vazão: catracas simultâneas registrando entradas, com o insert direto
+   (um SELECT de ponto + um INSERT por leitura), com a fila em lote e com a
+   fila + spool SQLite. Mede leituras confirmadas por segundo, o tempo até
+   tudo estar em registros_acesso e as requisições por leitura;
+2. queda sem spool: com as catracas lendo a cada --ritmo-ms, o processo
+   "morre" no meio do pico (tarefas canceladas,
+   fila em memória perdida). Todo registro confirmado até o último lote
+   gravado está no banco; os perdidos são só os que chegaram depois dele;
+3. queda com spool: idem, e o servidor reinicia a partir do spool;
+4. kill -9 com spool: um processo filho registra acessos com o Supabase
+   fora do ar e é morto com SIGKILL; todo acesso que ele confirmou é
+   gravado, uma única vez, quando o spool é reenviado.
+
+Uso:
+    python benchmarks/bench_registro_lote.py --tamanho 10k --leituras 3000 --catracas 16 --latencia-ms 5
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from benchmarks.dados import TAMANHOS, gerar_clube  # noqa: E402
+from benchmarks.standin import carregar, conectar  # noqa: E402
+
+LOCAIS = ("clube", "piscina", "academia")
+
+
+def _json(resposta: str):
+    assert not resposta.startswith("❌"), resposta
+    return json.loads(resposta.split("\n\n", 1)[1] if "\n\n" in resposta else resposta)
+
+
+async def catraca(server, pessoas: list[str], rng: random.Random, confirmados: list, leituras: int,
+                  intervalo: float = 0.0) -> None:
+    """Uma catraca lendo carteirinhas em sequência, `intervalo` segundos entre uma leitura e outra."""
+    while len(confirmados) < leituras:
+        resposta = await server.registrar_acesso(rng.choice(pessoas), "associado", "entrada", rng.choice(LOCAIS))
+        confirmados.append(_json(resposta))
+        await asyncio.sleep(intervalo)  # com a fila a confirmação não espera I/O: cede a vez às outras catracas
+
+
+async def medir_vazao(server, transporte, pessoas, args, modo: str) -> dict:
+    spool = None
+    if modo == "lote + spool":
+        spool = server.DiarioAcessos(os.path.join(tempfile.mkdtemp(prefix="spool-"), "acessos.sqlite3"))
+    server.fila_acessos = None if modo == "direto" else server.FilaAcessos(args.lote_ms, args.lote_max, spool)
+    if server.fila_acessos:
+        server.fila_acessos.iniciar()
+    rng = random.Random(args.semente)
+    antes_req, antes_linhas = transporte.requisicoes, len(transporte.db.linhas("registros_acesso"))
+    confirmados = []
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(catraca(server, pessoas, rng, confirmados, args.leituras)
+                           for _ in range(args.catracas)))
+    confirmacao = time.perf_counter() - inicio
+    if server.fila_acessos:
+        await server.fila_acessos.parar()
+    total = time.perf_counter() - inicio
+
+    ids = {r["id"] for r in transporte.db.linhas("registros_acesso")}
+    assert len(ids) - antes_linhas == len(confirmados), f"{modo}: {len(ids) - antes_linhas} de {len(confirmados)}"
+    assert all(r["id"] in ids for r in confirmados)
+    return {
+        "leituras_por_segundo": round(len(confirmados) / confirmacao, 1),
+        "segundos_ate_gravar_tudo": round(total, 2),
+        "requisicoes_por_leitura": round((transporte.requisicoes - antes_req) / len(confirmados), 3),
+    }
+
+
+async def queda(server, transporte, pessoas, args, com_spool: bool) -> dict:
+    """Derruba o servidor no meio do pico e confere o que sobreviveu."""
+    caminho = os.path.join(tempfile.mkdtemp(prefix="spool-"), "acessos.sqlite3")
+    fila = server.FilaAcessos(args.lote_ms, args.lote_max, server.DiarioAcessos(caminho) if com_spool else None)
+    server.fila_acessos = fila
+    fila.iniciar()
+    handle_original = transporte.handle_request
+    rng = random.Random(args.semente + 1)
+    confirmados = []
+    catracas = [asyncio.create_task(catraca(server, pessoas, rng, confirmados, 10**9, args.ritmo_ms / 1000))
+                for _ in range(args.catracas)]
+    await asyncio.sleep(rng.uniform(1.0, 2.0))
+
+    # Queda: tudo para de uma vez, sem o flush do lifespan
+    def morto(request):
+        raise httpx.ConnectError("processo morto", request=request)
+
+    transporte.handle_request = morto
+    for tarefa in catracas + [fila._tarefa]:
+        tarefa.cancel()
+    await asyncio.gather(*catracas, fila._tarefa, return_exceptions=True)
+    await asyncio.sleep(0.2)  # o lote que já estava no ar termina de chegar ao banco
+    gravado_ate, na_fila = fila.gravado_ate, len(fila.pendentes)
+    transporte.handle_request = handle_original
+
+    ids = {r["id"] for r in transporte.db.linhas("registros_acesso")}
+    perdidos = [r for r in confirmados if r["id"] not in ids]
+    assert gravado_ate is not None, "nenhum lote gravado antes da queda"
+    assert all(r["created_at"] > gravado_ate for r in perdidos), "registro de lote já gravado sumiu"
+    assert len(perdidos) <= na_fila
+    resultado = {"leituras_por_segundo": round(args.catracas * 1000 / args.ritmo_ms),
+                 "confirmados": len(confirmados), "perdidos": len(perdidos)}
+
+    if com_spool:
+        reiniciada = server.FilaAcessos(args.lote_ms, args.lote_max, server.DiarioAcessos(caminho))
+        resultado["recuperados_do_spool"] = len(reiniciada.pendentes)
+        await reiniciada.descarregar()
+        registros = transporte.db.linhas("registros_acesso")
+        ids = [r["id"] for r in registros]
+        assert len(ids) == len(set(ids)), "registro duplicado no reenvio"
+        assert {r["id"] for r in confirmados} <= set(ids), "acesso confirmado perdido com spool"
+        resultado["perdidos_apos_reinicio"] = 0
+    return resultado
+
+
+async def kill_com_spool(args) -> dict:
+    """Filho registra com o Supabase fora do ar e leva SIGKILL; o pai reenvia o spool."""
+    caminho = os.path.join(tempfile.mkdtemp(prefix="spool-"), "acessos.sqlite3")
+    filho = subprocess.Popen(
+        [sys.executable, __file__, "--tamanho", args.tamanho, "--semente", str(args.semente), "--filho", caminho],
+        stdout=subprocess.PIPE, text=True,
+    )
+    confirmados = []
+    for linha in filho.stdout:
+        confirmados.append(linha.strip())
+        if len(confirmados) >= args.leituras_kill:
+            break
+    filho.send_signal(signal.SIGKILL)
+    filho.wait()
+    confirmados += [linha.strip() for linha in filho.stdout]  # confirmações já impressas antes do kill
+
+    dados = gerar_clube(TAMANHOS[args.tamanho], semente=args.semente)
+    server, transporte = conectar(carregar(dados))
+    antes = len(transporte.db.linhas("registros_acesso"))
+    fila = server.FilaAcessos(args.lote_ms, args.lote_max, server.DiarioAcessos(caminho))
+    recuperados = len(fila.pendentes)
+    await fila.descarregar()
+    ids = [r["id"] for r in transporte.db.linhas("registros_acesso")]
+    assert len(ids) == len(set(ids)), "registro duplicado no reenvio"
+    assert set(confirmados) <= set(ids), "acesso confirmado antes do kill não foi gravado"
+    return {"confirmados_antes_do_kill": len(confirmados), "recuperados_do_spool": recuperados,
+            "gravados": len(ids) - antes}
+
+
+async def filho(args) -> None:
+    """Processo morto pelo pai: Supabase fora do ar para gravações, cada confirmação vai para o stdout."""
+    dados = gerar_clube(TAMANHOS[args.tamanho], semente=args.semente)
+    server, transporte = conectar(carregar(dados))
+    logging.getLogger("sistema-clube-mcp").setLevel(logging.CRITICAL)
+    handle_original = transporte.handle_request
+
+    def sem_gravacao(request):
+        if request.method == "POST":
+            raise httpx.ConnectError("Supabase fora do ar", request=request)
+        return handle_original(request)
+
+    transporte.handle_request = sem_gravacao
+    server.fila_acessos = server.FilaAcessos(args.lote_ms, args.lote_max, server.DiarioAcessos(args.filho))
+    server.fila_acessos.iniciar()
+    pessoas = [a["id"] for a in dados["associados"]]
+    rng = random.Random(args.semente)
+    while True:
+        registro = _json(await server.registrar_acesso(rng.choice(pessoas), "associado", "entrada", "clube"))
+        print(registro["id"], flush=True)
+
+
+async def main(args):
+    dados = gerar_clube(TAMANHOS[args.tamanho], semente=args.semente)
+    server, transporte = conectar(carregar(dados), latencia_ms=args.latencia_ms)
+    logging.getLogger("sistema-clube-mcp").setLevel(logging.CRITICAL)
+    pessoas = [a["id"] for a in dados["associados"]]
+
+    resultado = {
+        "tamanho": args.tamanho,
+        "leituras": args.leituras,
+        "catracas": args.catracas,
+        "latencia_ms": args.latencia_ms,
+        "lote_ms": args.lote_ms,
+        "lote_max": args.lote_max,
+        "vazao": {},
+    }
+    for modo in ("direto", "lote", "lote + spool"):
+        resultado["vazao"][modo] = await medir_vazao(server, transporte, pessoas, args, modo)
+    resultado["queda_sem_spool"] = await queda(server, transporte, pessoas, args, com_spool=False)
+    resultado["queda_com_spool"] = await queda(server, transporte, pessoas, args, com_spool=True)
+    resultado["kill_9_com_spool"] = await kill_com_spool(args)
+    print(json.dumps(resultado, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tamanho", choices=list(TAMANHOS), default="10k")
+    parser.add_argument("--leituras", type=int, default=3000, help="Leituras por modo na medição de vazão")
+    parser.add_argument("--catracas", type=int, default=16, help="Leituras simultâneas")
+    parser.add_argument("--latencia-ms", type=float, default=5.0, help="Latência simulada por requisição")
+    parser.add_argument("--lote-ms", type=float, default=200.0, help="ACESSO_LOTE_MS")
+    parser.add_argument("--lote-max", type=int, default=100, help="ACESSO_LOTE_MAX")
+    parser.add_argument("--ritmo-ms", type=float, default=10.0, help="Intervalo entre leituras de cada catraca nas quedas")
+    parser.add_argument("--leituras-kill", type=int, default=500, help="Confirmações lidas antes do SIGKILL")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--filho", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    asyncio.run(filho(args) if args.filho else main(args))
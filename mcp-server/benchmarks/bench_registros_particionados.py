@@ -0,0 +1,268 @@
+"""
+Benchmark - registros_acesso particionada por mês + arquivo
+===========================================================
+Carrega registros de acesso sintéticos (10M por padrão, ~3 anos) num schema
+descartável de um Postgres real, com a tabela e os índices da
+database/006_acesso_eleicoes.sql, e mede as consultas da portaria:
+
+1. antes: a tabela única de hoje;
+2. particionada: depois da database/025_registros_acesso_particionado.sql
+   (conversão cronometrada);
+3. arquivada: depois de arquivar_registros_acesso(12); o dia antigo passa a
+   ser lido por buscar_registros_arquivados.
+
+As consultas são as que o PostgREST monta para as tools (contagens de
+estatisticas_portaria, a listagem de registros_acesso, o histórico de um
+associado e o relatório do mês), preparadas com parâmetros como o PostgREST
+faz. Para comparação, mede também o DELETE dos meses fora da retenção na
+tabela única (desfeito com ROLLBACK).
+
+Confere que nenhum registro se perde na conversão e no arquivamento, que o
+dia arquivado devolve os mesmos registros que a tabela única devolvia e que
+as contagens do dia não leem as partições dos meses anteriores.
+
+Os GRANT/REVOKE da migração são ignorados (os papéis do Supabase não existem
+num Postgres local) e as functions passam a procurar as tabelas no schema do
+benchmark.
+
+Requer: pip install -e ".[postgres]" e um Postgres acessível (não use o de produção).
+
+Uso:
+    python benchmarks/bench_registros_particionados.py --database-url postgresql://postgres@localhost/postgres
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import asyncpg  # noqa: E402
+
+from benchmarks.bench_postgres_direto import _percentil  # noqa: E402
+
+MIGRACAO = os.path.join(os.path.dirname(__file__), "..", "..", "database", "025_registros_acesso_particionado.sql")
+
+SCHEMA_006 = """
+CREATE TABLE pontos_acesso (
+  id UUID PRIMARY KEY DEFAULT gen_random_uuid(), nome VARCHAR(100) NOT NULL,
+  tipo VARCHAR(50) NOT NULL, ativo BOOLEAN DEFAULT true);
+CREATE TABLE associados (id UUID PRIMARY KEY, nome VARCHAR(255), numero_titulo INTEGER);
+CREATE TABLE dependentes (id UUID PRIMARY KEY, associado_id UUID REFERENCES associados(id), nome VARCHAR(255));
+CREATE TABLE agregados (id UUID PRIMARY KEY);
+CREATE TABLE convites (id UUID PRIMARY KEY);
+CREATE TABLE usuarios (id UUID PRIMARY KEY);
+CREATE FUNCTION is_portaria() RETURNS BOOLEAN AS 'SELECT true' LANGUAGE sql;
+
+CREATE TABLE registros_acesso (
+  id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+  ponto_acesso_id UUID NOT NULL REFERENCES pontos_acesso(id),
+  associado_id UUID REFERENCES associados(id),
+  dependente_id UUID REFERENCES dependentes(id),
+  agregado_id UUID REFERENCES agregados(id),
+  convidado_id UUID REFERENCES convites(id),
+  tipo VARCHAR(10) NOT NULL CHECK (tipo IN ('entrada', 'saida')),
+  forma_identificacao VARCHAR(50),
+  operador_id UUID REFERENCES usuarios(id),
+  observacoes TEXT,
+  created_at TIMESTAMPTZ DEFAULT NOW()
+);
+ALTER TABLE registros_acesso ENABLE ROW LEVEL SECURITY;
+CREATE POLICY registros_acesso_portaria ON registros_acesso FOR ALL USING (is_portaria());
+"""
+
+INDICES_006 = """
+CREATE INDEX idx_registros_ponto ON registros_acesso(ponto_acesso_id);
+CREATE INDEX idx_registros_data ON registros_acesso(created_at);
+CREATE INDEX idx_registros_associado ON registros_acesso(associado_id);
+"""
+
+# Entradas e saídas espalhadas por --dias, das 6h às 22h; 1 em 5 é de dependente
+CARGA = """
+INSERT INTO registros_acesso (ponto_acesso_id, associado_id, dependente_id, tipo, forma_identificacao, created_at)
+SELECT p.ids[1 + (g % 3)],
+       CASE WHEN g % 5 <> 0 THEN a.ids[1 + (hashint4(g::INT) & 2147483647) % cardinality(a.ids)] END,
+       CASE WHEN g % 5 = 0 THEN d.ids[1 + (hashint4(g::INT) & 2147483647) % cardinality(d.ids)] END,
+       CASE WHEN g % 2 = 0 THEN 'entrada' ELSE 'saida' END,
+       'qrcode',
+       date_trunc('day', NOW()) - make_interval(days => ((hashint4(-g::INT) & 2147483647) % $3)::INT)
+         + make_interval(secs => 21600 + (hashint4(g::INT * 7) & 2147483647) % 57600)
+FROM generate_series($1::BIGINT, $2::BIGINT) g,
+     (SELECT array_agg(id ORDER BY nome) ids FROM pontos_acesso) p,
+     (SELECT array_agg(id) ids FROM associados) a,
+     (SELECT array_agg(id) ids FROM dependentes) d
+"""
+
+COLUNAS = "id, ponto_acesso_id, associado_id, dependente_id, tipo, created_at"
+
+
+def consultas(hoje: datetime, ponto_id, associado_id, dia_antigo: datetime) -> dict:
+    """SQL e parâmetros de cada consulta, como o PostgREST as monta para as tools."""
+    mes_passado = (hoje.replace(day=1) - timedelta(days=1)).replace(day=1)
+    return {
+        "estatisticas_portaria: entradas de hoje": (
+            "SELECT count(*) FROM registros_acesso WHERE tipo = $1 AND created_at >= $2", ("entrada", hoje)),
+        "estatisticas_portaria: entradas de hoje no local": (
+            "SELECT count(*) FROM registros_acesso WHERE tipo = $1 AND created_at >= $2 AND ponto_acesso_id = $3",
+            ("entrada", hoje, ponto_id)),
+        "registros_acesso: 50 mais recentes de hoje": (
+            f"SELECT {COLUNAS} FROM registros_acesso WHERE created_at >= $1 ORDER BY created_at DESC LIMIT 50",
+            (hoje,)),
+        "registros_acesso: histórico de um associado": (
+            f"SELECT {COLUNAS} FROM registros_acesso WHERE associado_id = $1 ORDER BY created_at DESC LIMIT 50",
+            (associado_id,)),
+        "relatório do mês passado por local": (
+            "SELECT ponto_acesso_id, tipo, count(*) FROM registros_acesso "
+            "WHERE created_at >= $1 AND created_at < $2 GROUP BY 1, 2", (mes_passado, hoje.replace(day=1))),
+        "registros_acesso: um dia de 2 anos atrás": (
+            f"SELECT {COLUNAS} FROM registros_acesso WHERE created_at >= $1 AND created_at < $2 "
+            "ORDER BY created_at DESC, id DESC LIMIT 50", (dia_antigo, dia_antigo + timedelta(days=1))),
+    }
+
+
+async def medir_consultas(conn: asyncpg.Connection, lista: dict, iteracoes: int) -> dict:
+    medidas = {}
+    for nome, (sql, parametros) in lista.items():
+        preparada = await conn.prepare(sql)
+        await preparada.fetch(*parametros)  # aquece o cache
+        latencias = []
+        for _ in range(iteracoes):
+            inicio = time.perf_counter()
+            await preparada.fetch(*parametros)
+            latencias.append((time.perf_counter() - inicio) * 1000)
+        ordenadas = sorted(latencias)
+        medidas[nome] = {"p50_ms": _percentil(ordenadas, 50), "p95_ms": _percentil(ordenadas, 95)}
+    return medidas
+
+
+async def tamanho_mb(conn: asyncpg.Connection, tabela: str) -> float:
+    return round(await conn.fetchval(
+        "SELECT COALESCE((SELECT sum(pg_total_relation_size(relid)) FROM pg_partition_tree($1::regclass)),"
+        " pg_total_relation_size($1::regclass))::BIGINT", tabela,
+    ) / 2**20, 1)
+
+
+async def main(args):
+    schema = args.schema
+    agora = datetime.now(timezone.utc)
+    hoje = agora.replace(hour=0, minute=0, second=0, microsecond=0)
+    dia_antigo = hoje - timedelta(days=730)
+    resultado = {"registros": args.registros, "dias": args.dias, "iteracoes": args.iteracoes}
+
+    conn = await asyncpg.connect(args.database_url)
+    try:
+        await conn.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE; CREATE SCHEMA {schema}")
+        await conn.execute(f"SET search_path = {schema}; SET maintenance_work_mem = '512MB'")
+        await conn.execute(SCHEMA_006)
+        await conn.execute(f"""
+            INSERT INTO pontos_acesso (nome, tipo) VALUES
+              ('Academia', 'academia'), ('Piscina', 'piscina'), ('Portaria principal', 'clube');
+            INSERT INTO associados
+            SELECT gen_random_uuid(), 'Associado ' || i, i FROM generate_series(1, {args.associados:d}) i;
+        """)
+        await conn.execute("""
+            INSERT INTO dependentes
+            SELECT gen_random_uuid(), a.id, 'Dependente de ' || a.nome FROM associados a WHERE a.numero_titulo % 2 = 0
+        """)
+
+        inicio = time.perf_counter()
+        for desde in range(1, args.registros + 1, 1_000_000):
+            await conn.execute(CARGA, desde, min(desde + 999_999, args.registros), args.dias)
+        await conn.execute(INDICES_006)
+        await conn.execute("VACUUM ANALYZE registros_acesso")
+        resultado["carga_segundos"] = round(time.perf_counter() - inicio, 1)
+
+        ponto_id = await conn.fetchval("SELECT id FROM pontos_acesso WHERE tipo = 'piscina'")
+        associado_id = await conn.fetchval("SELECT id FROM associados WHERE numero_titulo = 1")
+        lista = consultas(hoje, ponto_id, associado_id, dia_antigo)
+        sql_antigo, parametros_antigo = lista["registros_acesso: um dia de 2 anos atrás"]
+        dia_antigo_ids = [r["id"] for r in await conn.fetch(sql_antigo, *parametros_antigo)]
+        total = await conn.fetchval("SELECT count(*) FROM registros_acesso")
+        hoje_antes = await conn.fetchval("SELECT count(*) FROM registros_acesso WHERE created_at >= $1", hoje)
+
+        resultado["tabela_unica"] = {
+            "tamanho_mb": await tamanho_mb(conn, "registros_acesso"),
+            "consultas": await medir_consultas(conn, lista, args.iteracoes),
+        }
+        limite = (hoje.replace(day=1) - timedelta(days=365)).replace(day=1)
+        if not args.sem_delete:
+            # desfeito no fim: a tabela segue para a conversão com todos os registros
+            transacao = conn.transaction()
+            await transacao.start()
+            inicio = time.perf_counter()
+            apagados = await conn.execute("DELETE FROM registros_acesso WHERE created_at < $1", limite)
+            resultado["tabela_unica"]["delete_fora_da_retencao"] = {
+                "registros": int(apagados.split()[-1]), "segundos": round(time.perf_counter() - inicio, 1)}
+            await transacao.rollback()
+
+        sql = open(MIGRACAO, encoding="utf-8").read()
+        sql = sql.replace("search_path = public", f"search_path = {schema}")
+        sql = sql.replace("schemaname = 'public'", f"schemaname = '{schema}'")
+        sql = re.sub(r"^(GRANT|REVOKE)\b[^;]*;", "", sql, flags=re.M)
+        inicio = time.perf_counter()
+        await conn.execute(sql)
+        resultado["conversao_segundos"] = round(time.perf_counter() - inicio, 1)
+    finally:
+        await conn.close()
+
+    # Conexão nova: os planos preparados da tabela única não servem mais
+    conn = await asyncpg.connect(args.database_url, server_settings={"search_path": schema})
+    try:
+        assert await conn.fetchval("SELECT count(*) FROM registros_acesso") == total, "registros perdidos na conversão"
+        particoes = await conn.fetchval("SELECT count(*) FROM pg_inherits WHERE inhparent = 'registros_acesso'::regclass")
+        assert await conn.fetchval("SELECT count(*) FROM pg_policies WHERE tablename = 'registros_acesso'") == 1
+        plano = "\n".join(r[0] for r in await conn.fetch(
+            "EXPLAIN SELECT count(*) FROM registros_acesso WHERE tipo = 'entrada' AND created_at >= $1", hoje))
+        mes_atual = f"registros_acesso_{hoje:%Y_%m}"
+        lidas = set(re.findall(r"registros_acesso_\d{4}_\d{2}", plano))
+        assert mes_atual in lidas and min(lidas) == mes_atual, plano  # só o mês atual e os (vazios) seguintes
+        resultado["particionada"] = {
+            "particoes": particoes,
+            "tamanho_mb": await tamanho_mb(conn, "registros_acesso"),
+            "consultas": await medir_consultas(conn, lista, args.iteracoes),
+        }
+
+        inicio = time.perf_counter()
+        arquivados = json.loads(await conn.fetchval("SELECT arquivar_registros_acesso(12)"))
+        resultado["arquivamento_segundos"] = round(time.perf_counter() - inicio, 1)
+        vivos = await conn.fetchval("SELECT count(*) FROM registros_acesso")
+        no_arquivo = await conn.fetchval("SELECT COALESCE(sum(registros), 0)::BIGINT FROM registros_acesso_arquivo")
+        assert vivos + no_arquivo == total, f"{vivos} + {no_arquivo} != {total}"
+        assert await conn.fetchval("SELECT count(*) FROM registros_acesso WHERE created_at >= $1", hoje) == hoje_antes
+
+        lista["registros_acesso: um dia de 2 anos atrás"] = (
+            "SELECT buscar_registros_arquivados($1, $2, NULL, NULL, NULL, 50)", parametros_antigo)
+        do_arquivo = json.loads(await conn.fetchval("SELECT buscar_registros_arquivados($1, $2, NULL, NULL, NULL, 50)",
+                                                    *parametros_antigo))
+        assert [r["id"] for r in do_arquivo] == [str(i) for i in dia_antigo_ids], "dia arquivado diverge"
+        assert all(r["arquivado"] and r["pontos_acesso"]["nome"] for r in do_arquivo)
+        resultado["arquivada"] = {
+            "meses_arquivados": len(arquivados),
+            "registros_vivos": vivos,
+            "registros_no_arquivo": no_arquivo,
+            "tamanho_mb": await tamanho_mb(conn, "registros_acesso"),
+            "arquivo_mb": round(await conn.fetchval(
+                "SELECT pg_total_relation_size('registros_acesso_arquivo')") / 2**20, 1),
+            "consultas": await medir_consultas(conn, lista, args.iteracoes),
+        }
+    finally:
+        await conn.close()
+
+    print(json.dumps(resultado, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"), required=not os.getenv("DATABASE_URL"))
+    parser.add_argument("--schema", default="bench_particionado")
+    parser.add_argument("--registros", type=int, default=10_000_000)
+    parser.add_argument("--dias", type=int, default=1095, help="Período coberto pelos registros")
+    parser.add_argument("--associados", type=int, default=10_000)
+    parser.add_argument("--iteracoes", type=int, default=30)
+    parser.add_argument("--sem-delete", action="store_true", help="Não mede o DELETE na tabela única")
+    asyncio.run(main(parser.parse_args()))
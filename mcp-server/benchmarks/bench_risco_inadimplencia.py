@@ -0,0 +1,242 @@
+"""
+Benchmark - risco_inadimplencia
+===============================
+Gera num schema descartável de um Postgres real um clube com 100k
+associados e 3 anos de mensalidades (cada associado com a sua propensão a
+atrasar), aplica a database/030_risco_inadimplencia.sql e mede:
+
+1. o cálculo das notas (leitura em lotes + NumPy) e o pico de memória do
+   Python, comparado com o pico de trazer o histórico inteiro de uma vez;
+2. a chamada com as notas em cache (só a conferência do updated_at);
+3. o recálculo depois de um pagamento registrado;
+4. a conferência dos indicadores contra um cálculo em Python puro, associado
+   a associado, numa amostra;
+5. se as maiores notas ficam com os associados gerados com maior propensão
+   a atrasar (que o modelo não vê).
+
+Requer: pip install -e ".[postgres,analise]" e um Postgres acessível (não use o de produção).
+
+Uso:
+    python benchmarks/bench_risco_inadimplencia.py --database-url postgresql://postgres@localhost/postgres --associados 100000
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import date
+from urllib.parse import urlencode, urlparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import asyncpg  # noqa: E402
+import numpy as np  # noqa: E402
+
+from benchmarks.fake_postgrest import FakeDB  # noqa: E402
+from benchmarks.standin import conectar  # noqa: E402
+
+MIGRACAO = os.path.join(os.path.dirname(__file__), "..", "..", "database", "030_risco_inadimplencia.sql")
+
+
+def _json(resposta: str):
+    assert not resposta.startswith("❌"), resposta
+    return json.loads(resposta.split("\n\n", 1)[1] if "\n\n" in resposta else resposta)
+
+
+async def carregar_postgres(conn: asyncpg.Connection, schema: str, associados: int, meses: int, semente: int):
+    """Cria as tabelas e gera associados e mensalidades no próprio banco."""
+    await conn.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE; CREATE SCHEMA {schema}")
+    await conn.execute(f"SET search_path = {schema}")
+    await conn.execute("SELECT setseed($1)", (semente % 1000) / 1000)
+    await conn.execute("""
+        CREATE TYPE tipo_plano AS ENUM ('individual', 'familiar', 'patrimonial');
+        CREATE TYPE status_associado AS ENUM ('ativo', 'inativo', 'suspenso', 'expulso');
+        CREATE TYPE status_pagamento AS ENUM ('pendente', 'pago', 'atrasado', 'cancelado');
+        CREATE TABLE associados (
+          id UUID PRIMARY KEY DEFAULT gen_random_uuid(), numero_titulo INTEGER, nome VARCHAR(255) NOT NULL,
+          telefone VARCHAR(20), plano tipo_plano NOT NULL DEFAULT 'individual', status status_associado DEFAULT 'ativo',
+          data_associacao DATE, propensao FLOAT8, created_at TIMESTAMPTZ DEFAULT NOW(),
+          updated_at TIMESTAMPTZ DEFAULT NOW());
+        CREATE TABLE mensalidades (
+          id UUID PRIMARY KEY DEFAULT gen_random_uuid(), associado_id UUID NOT NULL, referencia VARCHAR(7) NOT NULL,
+          valor DECIMAL(10,2) NOT NULL, data_vencimento DATE NOT NULL, data_pagamento TIMESTAMPTZ,
+          status status_pagamento DEFAULT 'pendente', created_at TIMESTAMPTZ DEFAULT NOW(),
+          updated_at TIMESTAMPTZ DEFAULT NOW());
+        CREATE INDEX idx_mensalidades_associado ON mensalidades(associado_id);
+        CREATE INDEX idx_mensalidades_vencimento ON mensalidades(data_vencimento);
+        CREATE FUNCTION update_updated_at() RETURNS TRIGGER AS $$
+        BEGIN NEW.updated_at = NOW(); RETURN NEW; END; $$ LANGUAGE plpgsql;
+        CREATE TRIGGER update_mensalidades_updated_at BEFORE UPDATE ON mensalidades
+          FOR EACH ROW EXECUTE FUNCTION update_updated_at();
+    """)
+    # Propensão a atrasar concentrada em poucos associados (u³); no plano individual um pouco maior
+    await conn.execute("""
+        INSERT INTO associados (numero_titulo, nome, telefone, plano, status, data_associacao, propensao)
+        SELECT i, 'Associado ' || i, '55169' || (10000000 + i),
+               (ARRAY['individual', 'familiar', 'patrimonial'])[1 + i % 3]::tipo_plano,
+               (CASE WHEN random() < 0.9 THEN 'ativo' ELSE 'inativo' END)::status_associado,
+               CURRENT_DATE - (30 + floor(random() * 3650))::INT,
+               power(random(), 3) * CASE WHEN i % 3 = 0 THEN 1.3 ELSE 1 END
+        FROM generate_series(1, $1) i
+    """, associados)
+    # Atraso de cada mensalidade conforme a propensão: nunca paga, paga com 5 a 65 dias ou perto do vencimento
+    await conn.execute("""
+        INSERT INTO mensalidades (associado_id, referencia, valor, data_vencimento, data_pagamento, status)
+        SELECT id, to_char(vencimento, 'YYYY-MM'), valor, vencimento,
+               CASE WHEN vencimento + atraso <= CURRENT_DATE THEN vencimento + atraso END,
+               (CASE WHEN vencimento + atraso <= CURRENT_DATE THEN 'pago'
+                     WHEN vencimento < CURRENT_DATE THEN 'atrasado' ELSE 'pendente' END)::status_pagamento
+        FROM (
+          SELECT a.id, (mes + interval '9 days')::DATE AS vencimento,
+                 (ARRAY[180, 250, 390])[1 + a.numero_titulo % 3]::NUMERIC AS valor,
+                 CASE WHEN s < a.propensao * 0.25 THEN 100000
+                      WHEN s < a.propensao THEN 5 + floor(random() * 60)::INT
+                      ELSE floor(random() * 8)::INT - 5 END AS atraso
+          FROM associados a,
+               generate_series(date_trunc('month', CURRENT_DATE) - make_interval(months => $1),
+                               date_trunc('month', CURRENT_DATE), interval '1 month') mes,
+               LATERAL (SELECT random() + a.numero_titulo * 0 AS s) sorteio
+          WHERE mes >= date_trunc('month', a.data_associacao)
+        ) m
+    """, meses)
+    sql = open(MIGRACAO, encoding="utf-8").read()
+    await conn.execute(sql)
+    await conn.execute("ANALYZE")
+    return {t: await conn.fetchval(f"SELECT count(*) FROM {t}") for t in ("associados", "mensalidades")}
+
+
+async def pico_memoria(coro) -> tuple[object, float, float]:
+    """Executa `coro` e devolve o resultado, os segundos e o pico de memória alocada pelo Python (MB)."""
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    resultado = await coro
+    segundos = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return resultado, segundos, pico / 2**20
+
+
+async def indicadores_em_python(conn: asyncpg.Connection, ids: list[str], desde: date, server) -> dict:
+    """Indicadores de cada associado da amostra, mensalidade a mensalidade, sem NumPy."""
+    linhas = await conn.fetch("""
+        SELECT associado_id::text AS id, data_vencimento, data_pagamento::date AS pagamento, status::text AS status, valor
+        FROM mensalidades
+        WHERE associado_id = ANY($1::uuid[]) AND data_vencimento >= $2 AND data_vencimento < CURRENT_DATE
+          AND status::text <> 'cancelado'
+    """, ids, desde)
+    hoje = date.today()
+    por_associado = {i: [] for i in ids}
+    for l in linhas:
+        por_associado[l["id"]].append(l)
+    resultado = {}
+    for aid, mensalidades in por_associado.items():
+        pagos = [m for m in mensalidades if m["status"] == "pago"]
+        atrasos = [max((m["pagamento"] - m["data_vencimento"]).days, 0) for m in pagos]
+        recentes = [m for m in mensalidades if (hoje - m["data_vencimento"]).days <= server.RISCO_JANELA_RECENTE]
+        efetivos = [max((m["pagamento"] - m["data_vencimento"]).days, 0) if m["status"] == "pago"
+                    else (hoje - m["data_vencimento"]).days for m in recentes]
+        resultado[aid] = {
+            "meses_em_aberto": len(mensalidades) - len(pagos),
+            "valor_em_aberto": float(sum(m["valor"] for m in mensalidades if m["status"] != "pago")),
+            "atraso_medio_dias": sum(atrasos) / len(atrasos) if atrasos else 0.0,
+            "pagos_com_atraso_pct": 100 * sum(a > server.RISCO_TOLERANCIA_DIAS for a in atrasos) / len(atrasos)
+            if atrasos else 0.0,
+            "atraso_recente_dias": sum(efetivos) / len(efetivos) if efetivos else 0.0,
+        }
+    return resultado
+
+
+async def main(args):
+    conn = await asyncpg.connect(args.database_url)
+    inicio = time.perf_counter()
+    linhas = await carregar_postgres(conn, args.schema, args.associados, args.meses, args.semente)
+    resultado = {"linhas": linhas, "historico_meses": args.historico_meses,
+                 "geracao_segundos": round(time.perf_counter() - inicio, 1)}
+
+    server, _ = conectar(FakeDB())
+    logging.getLogger("sistema-clube-mcp").setLevel(logging.CRITICAL)
+    separador = "&" if urlparse(args.database_url).query else "?"
+    server.DATABASE_URL = f"{args.database_url}{separador}{urlencode({'search_path': args.schema})}"
+    await server.abrir_pg_pool()
+    try:
+        inicio = time.perf_counter()
+        ranking = _json(await server.risco_inadimplencia(20, historico_meses=args.historico_meses))
+        segundos = time.perf_counter() - inicio
+        # De novo, sem cache, medindo a memória (o tracemalloc deixa a chamada mais lenta)
+        server.cache_risco.limpar()
+        _, _, pico = await pico_memoria(server.risco_inadimplencia(20, historico_meses=args.historico_meses))
+        resultado["calculo"] = {"segundos": round(segundos, 2), "pico_memoria_mb": round(pico, 1),
+                                "associados_avaliados": ranking["associados_avaliados"], "faixas": ranking["faixas"],
+                                "maior_nota": ranking["associados"][0]["nota"]}
+
+        # Alternativa: o histórico inteiro de uma vez na memória (só a leitura, sem calcular nada)
+        desde = date.fromisoformat(ranking["historico_desde"])
+        async with server.pg_pool.acquire() as c:
+            _, _, pico = await pico_memoria(c.fetch(server.SQL_RISCO_HISTORICO, desde))
+        resultado["historico_inteiro_na_memoria"] = {"pico_memoria_mb": round(pico, 1)}
+
+        tempos = []
+        for _ in range(args.repeticoes):
+            inicio = time.perf_counter()
+            _json(await server.risco_inadimplencia(20, historico_meses=args.historico_meses))
+            tempos.append(time.perf_counter() - inicio)
+        resultado["em_cache_ms"] = round(sorted(tempos)[len(tempos) // 2] * 1000, 1)
+
+        # Um pagamento invalida as notas
+        await conn.execute("UPDATE mensalidades SET status = 'pago', data_pagamento = NOW() WHERE id = "
+                           "(SELECT id FROM mensalidades WHERE status = 'atrasado' LIMIT 1)")
+        perdas = server.cache_risco.misses
+        inicio = time.perf_counter()
+        _json(await server.risco_inadimplencia(20, historico_meses=args.historico_meses))
+        resultado["recalculo_apos_pagamento_s"] = round(time.perf_counter() - inicio, 2)
+        assert server.cache_risco.misses > perdas, "o pagamento não invalidou as notas"
+
+        # Conferência numa amostra
+        notas = next(v for _, v in server.cache_risco._entradas.values())
+        rng = random.Random(args.semente)
+        amostra = rng.sample(range(len(notas["ids"])), min(args.amostra, len(notas["ids"])))
+        esperado = await indicadores_em_python(conn, [notas["ids"][i] for i in amostra], desde, server)
+        maior = 0.0
+        for i in amostra:
+            for chave, valor in esperado[notas["ids"][i]].items():
+                maior = max(maior, abs(float(notas["indicadores"][chave][i]) - valor))
+        assert maior < 1e-6, f"indicadores diferem do cálculo em Python em {maior}"
+        resultado["conferencia"] = {"associados": len(amostra), "maior_diferenca": maior}
+
+        # As notas contra a propensão a atrasar com que os dados foram gerados (o modelo não a vê)
+        propensao = np.array([r["propensao"] for r in await conn.fetch(
+            "SELECT id::text AS id, propensao FROM associados WHERE status::text = 'ativo' ORDER BY id")])
+        decimo = len(propensao) // 10
+        por_nota = set(np.argsort(-notas["nota"])[:decimo].tolist())
+        por_propensao = set(np.argsort(-propensao)[:decimo].tolist())
+        resultado["propensao_real"] = {
+            "media_10pct_maiores_notas": round(float(propensao[list(por_nota)].mean()), 3),
+            "media_geral": round(float(propensao.mean()), 3),
+            "10pct_mais_propensos_entre_as_maiores_notas_pct": round(100 * len(por_nota & por_propensao) / decimo, 1),
+        }
+    finally:
+        await server.fechar_pg_pool()
+
+    if not args.manter:
+        await conn.execute(f"DROP SCHEMA IF EXISTS {args.schema} CASCADE")
+    await conn.close()
+    print(json.dumps(resultado, indent=2, ensure_ascii=False, default=str))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"), required=not os.getenv("DATABASE_URL"))
+    parser.add_argument("--associados", type=int, default=100_000)
+    parser.add_argument("--meses", type=int, default=36, help="Meses de mensalidades gerados")
+    parser.add_argument("--historico-meses", type=int, default=24)
+    parser.add_argument("--amostra", type=int, default=300, help="Associados conferidos contra o cálculo em Python")
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--schema", default="bench_risco")
+    parser.add_argument("--manter", action="store_true", help="Não apagar o schema no fim")
+    parser.add_argument("--semente", type=int, default=42)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,168 @@
+"""
+Cenários de carga por tool
+==========================
+Cada cenário recebe o clube gerado e o índice da chamada e devolve os
+argumentos da tool. Tools sem cenário aparecem no relatório como
+"sem_cenario", para que tools novas não passem despercebidas.
+"""
+
+import csv
+import os
+from datetime import date, timedelta
+from typing import Callable
+
+
+class Contexto:
+    """Atalhos sobre o clube sintético usados pelos cenários."""
+
+    def __init__(self, dados: dict[str, list[dict]]):
+        self.dados = dados
+        self.ativos = [a for a in dados["associados"] if a["status"] == "ativo"]
+        self.dependentes = dados["dependentes"] or [{"id": None}]
+        self.mensalidades_abertas = [m for m in dados["mensalidades"] if m["status"] != "pago"]
+        self.conversas = dados["conversas_whatsapp"]
+        self.carteirinhas = dados["carteirinhas"]
+        self.patrimoniais = [a for a in self.ativos if a["plano"] == "patrimonial"] or self.ativos
+        self.convites = [c for c in dados["convites"] if c["status"] == "disponivel"] or [{"qr_code": "CONV-0"}]
+        self.eleicao_id = dados["eleicoes"][0]["id"]
+        self.solicitacoes = dados["solicitacoes_compra"]
+
+    def associado(self, i: int) -> dict:
+        return self.ativos[(i * 7919) % len(self.ativos)]
+
+    def dependente(self, i: int) -> dict:
+        return self.dependentes[(i * 7919) % len(self.dependentes)]
+
+    def patrimonial(self, i: int) -> dict:
+        return self.patrimoniais[(i * 7919) % len(self.patrimoniais)]
+
+    def convite(self, i: int) -> dict:
+        return self.convites[(i * 7919) % len(self.convites)]
+
+
+LOCAIS = ("clube", "piscina", "academia")
+ARQUIVO_IMPORTACAO = "bench-importacao.csv"
+ARQUIVO_EXTRATO = "bench-extrato.csv"
+
+
+def preparar_arquivos(diretorio: str, ctx: Contexto) -> None:
+    """Cria os arquivos de entrada usados pelos cenários de importação."""
+    with open(os.path.join(diretorio, ARQUIVO_IMPORTACAO), "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["nome", "cpf", "plano", "numero_titulo"])
+        for a in ctx.ativos[:200]:
+            writer.writerow([a["nome"], a["cpf"], a["plano"], a["numero_titulo"]])
+
+    cpf = {a["id"]: a["cpf"] for a in ctx.ativos}
+    with open(os.path.join(diretorio, ARQUIVO_EXTRATO), "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f, delimiter=";")
+        writer.writerow(["data", "historico", "valor"])
+        for m in ctx.mensalidades_abertas[:200]:
+            writer.writerow([date.today().strftime("%d/%m/%Y"), f"PIX RECEBIDO {cpf.get(m['associado_id'], '')}",
+                             f"{m['valor']:.2f}".replace(".", ",")])
+
+CENARIOS: dict[str, Callable[[Contexto, int], dict]] = {
+    # Associados
+    "buscar_associados": lambda c, i: {"busca": c.associado(i)["nome"].split()[0]},
+    "obter_associado": lambda c, i: {"associado_id": c.associado(i)["id"]},
+    "obter_associado_por_cpf": lambda c, i: {"cpf": c.associado(i)["cpf"]},
+    "perfil_completo": lambda c, i: {"associado": c.associado(i)["id"]},
+    "criar_associado": lambda c, i: {
+        "nome": f"Bench {i}", "cpf": f"{90_000_000_000 + i}", "plano": "individual",
+        "numero_titulo": 10_000_000 + i,
+    },
+    "importar_associados": lambda c, i: {"arquivo": ARQUIVO_IMPORTACAO, "simular": True},
+    "atualizar_associado": lambda c, i: {"associado_id": c.associado(i)["id"], "telefone": "5516999999999"},
+    "estatisticas_associados": lambda c, i: {},
+    # Dependentes
+    "buscar_dependentes": lambda c, i: {"associado_id": c.dependente(i).get("associado_id")},
+    "criar_dependente": lambda c, i: {"associado_id": c.associado(i)["id"], "nome": f"Dep {i}", "parentesco": "filho"},
+    # Financeiro
+    "buscar_mensalidades": lambda c, i: {"associado_id": c.associado(i)["id"]},
+    "registrar_pagamento": lambda c, i: {
+        "mensalidade_id": c.mensalidades_abertas[i % len(c.mensalidades_abertas)]["id"],
+        "valor_pago": 120.0, "forma_pagamento": "pix",
+    },
+    "gerar_mensalidades": lambda c, i: {
+        "referencia": f"2099-{(i % 12) + 1:02d}", "valor": 120.0, "data_vencimento": "2099-01-10",
+        "plano": "patrimonial",
+    },
+    "estatisticas_financeiro": lambda c, i: {},
+    "listar_inadimplentes": lambda c, i: {"meses_atrasados": 1},
+    "conciliar_pagamentos": lambda c, i: {"arquivo": ARQUIVO_EXTRATO, "simular": True},
+    # Depois da primeira chamada as notas vêm do cache (só a conferência do updated_at)
+    "risco_inadimplencia": lambda c, i: {"limite": 20, "incluir_inadimplentes": i % 2 == 0},
+    # Sem cache da resposta: mede a projeção a cada chamada (a distribuição dos atrasos fica em cache)
+    "projecao_fluxo_caixa": lambda c, i: {"meses": 6, "granularidade": ("mensal", "diaria")[i % 2], "usar_cache": False},
+    # Portaria
+    "registros_acesso": lambda c, i: {"local": LOCAIS[i % 3], "data_inicio": date.today().isoformat()},
+    "validar_acesso": lambda c, i: (
+        {"pessoa_id": c.associado(i)["id"], "tipo_pessoa": "associado", "local": LOCAIS[i % 3]}
+        if i % 2 == 0 else
+        {"pessoa_id": c.dependente(i)["id"], "tipo_pessoa": "dependente", "local": LOCAIS[i % 3]}
+    ),
+    "registrar_acesso": lambda c, i: {
+        "pessoa_id": c.associado(i)["id"], "tipo_pessoa": "associado", "tipo": "entrada", "local": LOCAIS[i % 3],
+    },
+    "validar_carteirinha": lambda c, i: {
+        "qrcode_hash": c.carteirinhas[(i * 7919) % len(c.carteirinhas)]["qrcode_hash"], "local": LOCAIS[i % 3],
+    },
+    "estatisticas_portaria": lambda c, i: {"local": LOCAIS[i % 3]},
+    # Simulado: arquivar de verdade tiraria da tabela os registros das outras tools
+    "arquivar_registros_acesso": lambda c, i: {"meses_retencao": 1, "simular": True},
+    # Sem PORTARIA_OFFLINE no stand-in, mede só a recusa (conta como erro no relatório)
+    "sincronizar_portaria": lambda c, i: {},
+    # Reemite a carteirinha de um titular e dos dependentes; sem imagens mede só o banco
+    "emitir_carteirinhas_lote": lambda c, i: {"associado_ids": [c.associado(i)["id"]], "imagens": False},
+    # Convites: cada chamada emite um; associado com a cota do mês esgotada conta como erro
+    "emitir_convites": lambda c, i: {"associado_id": c.patrimonial(i)["id"], "convidados": [f"Convidado {i}"]},
+    "buscar_convites": lambda c, i: {"associado_id": c.patrimonial(i)["id"]},
+    # Só consulta: registrar a entrada gastaria o convite e as chamadas seguintes seriam recusas
+    "validar_convite": lambda c, i: {"codigo": c.convite(i)["qr_code"], "registrar_entrada": False},
+    # CRM
+    "buscar_contatos_crm": lambda c, i: {"status": "aberta"},
+    "buscar_mensagens_crm": lambda c, i: {"contato_id": c.conversas[i % len(c.conversas)]["id"]},
+    "caixa_entrada_crm": lambda c, i: {"apenas_nao_lidas": i % 2 == 1},
+    "buscar_texto_mensagens": lambda c, i: {"termos": ["piscina reabriu", "segunda via boleto", "exame"][i % 3]},
+    "enviar_whatsapp": lambda c, i: {"telefone": c.associado(i)["telefone"], "mensagem": "Benchmark"},
+    "estatisticas_crm": lambda c, i: {},
+    # Compras
+    "buscar_compras": lambda c, i: {"status": "pendente"},
+    "buscar_fornecedores": lambda c, i: {"busca": "Fornecedor"},
+    "criar_compra": lambda c, i: {"descricao": f"Compra bench {i}", "valor_total": 100.0},
+    # Alterna os pedidos em cotação com 10 solicitações já decididas (uma chamada à function em ambos)
+    "comparar_cotacoes": lambda c, i: (
+        {} if i % 2 == 0 else {"solicitacao_ids": [s["id"] for s in c.solicitacoes[i % 50:i % 50 + 10]]}
+    ),
+    # Eleições
+    "buscar_eleicoes": lambda c, i: {},
+    "resultado_eleicao": lambda c, i: {"eleicao_id": c.eleicao_id},
+    # Exames
+    "buscar_exames": lambda c, i: {"a_vencer_dias": 30},
+    "notificar_exames_vencendo": lambda c, i: {"dias": 30, "simular": True},
+    "registrar_exame": lambda c, i: {
+        "pessoa_id": c.associado(i)["id"], "tipo_pessoa": "associado",
+        "data_exame": date.today().isoformat(),
+        "data_validade": (date.today() + timedelta(days=365)).isoformat(),
+    },
+    # Infrações
+    "buscar_infracoes": lambda c, i: {"associado_id": c.associado(i)["id"]},
+    "registrar_infracao": lambda c, i: {
+        "associado_id": c.associado(i)["id"], "descricao": "Benchmark", "gravidade": "leve",
+    },
+    # Configurações / dashboard
+    "listar_planos": lambda c, i: {},
+    "listar_usuarios_sistema": lambda c, i: {},
+    "resumo_geral": lambda c, i: {},
+    "metricas_servidor": lambda c, i: {},
+    # Relatórios (RPCs do database/020 simuladas em benchmarks/rpcs.py)
+    "executar_relatorio": lambda c, i: [
+        {"nome": "receita_mensal", "parametros": {"meses": 6}},
+        {"nome": "entradas_por_local", "parametros": {"data_inicio": (date.today() - timedelta(days=7)).isoformat()}},
+        {"nome": "inadimplencia_por_plano"},
+        {"nome": "frequencia_associados", "parametros": {"dias": 30, "limite": 10}},
+    ][i % 4],
+    # Exportação (run.py aponta EXPORT_DIR para um diretório temporário)
+    "exportar_dados": lambda c, i: {"tabela": "fornecedores", "formato": "csv"},
+    # consulta_sql depende da RPC execute_readonly_query num Postgres real
+}
@@ -0,0 +1,65 @@
+"""
+Comparação de relatórios de benchmark
+=====================================
+Compara dois relatórios gerados por `benchmarks.run` e aponta regressões de
+p95 acima da tolerância. Sai com código 1 se houver regressão (útil em CI).
+
+Uso:
+    python -m benchmarks.comparar base.json novo.json --tolerancia 15
+"""
+
+import argparse
+import json
+import sys
+
+
+def _delta(base: float, novo: float) -> float:
+    if not base:
+        return 0.0
+    return (novo - base) / base * 100
+
+
+def comparar(base: dict, novo: dict, tolerancia: float) -> list[str]:
+    """Imprime a tabela comparativa e retorna as tools com regressão."""
+    print(f"base: {base['meta']['commit']} ({base['meta']['tamanho']})  "
+          f"novo: {novo['meta']['commit']} ({novo['meta']['tamanho']})\n")
+    print(f"{'tool':32s} {'p50 base':>10s} {'p50 novo':>10s} {'p95 base':>10s} {'p95 novo':>10s} {'Δp95':>8s} {'rt':>11s}")
+
+    regressoes = []
+    for nome in sorted(set(base["tools"]) | set(novo["tools"])):
+        b, n = base["tools"].get(nome), novo["tools"].get(nome)
+        if not b or not n:
+            print(f"{nome:32s} {'(só no ' + ('novo' if n else 'base') + ')':>10s}")
+            continue
+        delta = _delta(b["p95_ms"], n["p95_ms"])
+        marca = ""
+        if delta > tolerancia:
+            marca = " ⚠️"
+            regressoes.append(nome)
+        rt = f"{b['roundtrips_por_chamada']:g}→{n['roundtrips_por_chamada']:g}"
+        print(f"{nome:32s} {b['p50_ms']:>10.2f} {n['p50_ms']:>10.2f} {b['p95_ms']:>10.2f} "
+              f"{n['p95_ms']:>10.2f} {delta:>+7.1f}% {rt:>11s}{marca}")
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base")
+    parser.add_argument("novo")
+    parser.add_argument("--tolerancia", type=float, default=15.0, help="Regressão máxima aceita no p95 (%%)")
+    args = parser.parse_args()
+
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.novo, encoding="utf-8") as f:
+        novo = json.load(f)
+
+    regressoes = comparar(base, novo, args.tolerancia)
+    if regressoes:
+        print(f"\n❌ Regressão de p95 acima de {args.tolerancia}%: {', '.join(regressoes)}")
+        sys.exit(1)
+    print("\n✅ Sem regressões")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,390 @@
+"""
+Gerador de clubes sintéticos
+============================
+Produz um clube determinístico (mesma semente → mesmos dados) com associados,
+dependentes, mensalidades, registros de acesso, exames, eleição com votos,
+CRM, compras, cotações, carteirinhas, convites e contas a pagar e a receber, nos formatos das tabelas do Supabase.
+"""
+
+import random
+import uuid
+from datetime import date, datetime, timedelta
+
+TAMANHOS = {"1k": 1_000, "10k": 10_000, "100k": 100_000}
+
+NOMES = ["Ana", "Bruno", "Carla", "Daniel", "Eduarda", "Felipe", "Gabriela", "Henrique",
+         "Isabela", "João", "Larissa", "Marcos", "Natália", "Otávio", "Paula", "Rafael",
+         "Sofia", "Thiago", "Vanessa", "William"]
+SOBRENOMES = ["Silva", "Santos", "Oliveira", "Souza", "Lima", "Pereira", "Costa", "Almeida",
+              "Ferreira", "Rodrigues", "Gomes", "Martins", "Araújo", "Ribeiro", "Carvalho"]
+PLANOS = {"individual": 120.0, "familiar": 180.0, "patrimonial": 90.0}
+# Itens das cotações: (nome, unidade, preço de referência)
+ITENS_COMPRA = [("Cloro granulado", "kg", 28.0), ("Algicida", "l", 19.5), ("Papel toalha", "fd", 42.0),
+                ("Detergente neutro", "l", 6.8), ("Lâmpada LED 12W", "un", 14.9), ("Bola de vôlei", "un", 119.0),
+                ("Rede de tênis", "un", 380.0), ("Uniforme funcionário", "un", 75.0),
+                ("Saco de lixo 100L", "pct", 31.0), ("Tinta acrílica 18L", "gl", 410.0)]
+FORMAS = ["pix", "boleto", "dinheiro", "cartao_credito", "cartao_debito", "transferencia"]
+
+
+def gerar_cpf(rng: random.Random) -> str:
+    """Gera um CPF (11 dígitos) com dígitos verificadores válidos."""
+    base = [rng.randint(0, 9) for _ in range(9)]
+    for _ in range(2):
+        soma = sum(d * p for d, p in zip(base, range(len(base) + 1, 1, -1)))
+        resto = soma % 11
+        base.append(0 if resto < 2 else 11 - resto)
+    return "".join(map(str, base))
+
+
+def _uuid(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def _nome(rng: random.Random) -> str:
+    return f"{rng.choice(NOMES)} {rng.choice(SOBRENOMES)} {rng.choice(SOBRENOMES)}"
+
+
+def gerar_clube(
+    associados: int,
+    meses: int = 6,
+    acessos_por_associado: int = 3,
+    semente: int = 42,
+    hoje: date | None = None,
+) -> dict[str, list[dict]]:
+    """Gera todas as tabelas de um clube sintético.
+
+    Args:
+        associados: Quantidade de associados titulares
+        meses: Meses de mensalidades por associado ativo (até o mês atual)
+        acessos_por_associado: Registros de portaria por associado (últimos 30 dias)
+        semente: Semente do gerador aleatório
+        hoje: Data de referência (padrão: hoje)
+    """
+    rng = random.Random(semente)
+    hoje = hoje or date.today()
+    agora = datetime.combine(hoje, datetime.min.time()) + timedelta(hours=12)
+    t: dict[str, list[dict]] = {}
+
+    t["planos_valores"] = [
+        {"id": _uuid(rng), "tipo": tipo, "valor_mensal": valor, "taxa_dependente_extra": 30.0,
+         "vigencia_inicio": "2024-01-01", "vigencia_fim": None, "ativo": True}
+        for tipo, valor in PLANOS.items()
+    ]
+    t["pontos_acesso"] = [
+        {"id": _uuid(rng), "nome": f"Portaria {tipo}", "tipo": tipo, "ativo": True}
+        for tipo in ("clube", "piscina", "academia")
+    ]
+    t["usuarios"] = [
+        {"id": _uuid(rng), "nome": _nome(rng), "email": f"func{i}@clube.local",
+         "setor": setor, "ativo": True}
+        for i, setor in enumerate(["admin", "financeiro", "portaria_clube", "atendimento", "compras"])
+    ]
+
+    t["associados"] = []
+    for i in range(associados):
+        plano = rng.choices(list(PLANOS), weights=[5, 4, 1])[0]
+        t["associados"].append({
+            "id": _uuid(rng),
+            "numero_titulo": i + 1,
+            "nome": _nome(rng),
+            "cpf": gerar_cpf(rng),
+            "email": f"socio{i + 1}@exemplo.com",
+            "telefone": f"55169{rng.randint(10_000_000, 99_999_999)}",
+            "plano": plano,
+            "status": rng.choices(["ativo", "inativo", "suspenso"], weights=[90, 7, 3])[0],
+            "data_associacao": (hoje - timedelta(days=rng.randint(30, 3650))).isoformat(),
+            "data_nascimento": (hoje - timedelta(days=rng.randint(18 * 365, 80 * 365))).isoformat(),
+            "created_at": agora.isoformat(),
+            "updated_at": agora.isoformat(),
+        })
+
+    t["dependentes"] = []
+    for a in t["associados"]:
+        if a["plano"] != "familiar":
+            continue
+        for _ in range(rng.randint(1, 3)):
+            t["dependentes"].append({
+                "id": _uuid(rng),
+                "associado_id": a["id"],
+                "nome": _nome(rng),
+                "cpf": gerar_cpf(rng),
+                "parentesco": rng.choice(["conjuge", "filho", "filha"]),
+                "telefone": f"55169{rng.randint(10_000_000, 99_999_999)}",
+                "status": "ativo",
+                "data_nascimento": (hoje - timedelta(days=rng.randint(365, 60 * 365))).isoformat(),
+            })
+
+    t["mensalidades"] = []
+    referencias = []
+    for m in range(meses):
+        ano, mes = hoje.year, hoje.month - m
+        while mes <= 0:
+            ano, mes = ano - 1, mes + 12
+        referencias.append((f"{ano}-{mes:02d}", date(ano, mes, 10)))
+    for a in t["associados"]:
+        if a["status"] != "ativo":
+            continue
+        valor = PLANOS[a["plano"]]
+        for ref, venc in referencias:
+            if venc > hoje:
+                status = "pendente"
+            else:
+                status = rng.choices(["pago", "atrasado", "pendente"], weights=[88, 8, 4])[0]
+            pago = status == "pago"
+            t["mensalidades"].append({
+                "id": _uuid(rng),
+                "associado_id": a["id"],
+                "referencia": ref,
+                "valor": valor,
+                "valor_pago": valor if pago else None,
+                "data_vencimento": venc.isoformat(),
+                "data_pagamento": (venc + timedelta(days=rng.randint(-5, 20))).isoformat() if pago else None,
+                "status": status,
+                "forma_pagamento": rng.choice(FORMAS) if pago else None,
+                "updated_at": agora.isoformat(),
+            })
+
+    pontos = [p["id"] for p in t["pontos_acesso"]]
+    t["registros_acesso"] = []
+    for a in t["associados"]:
+        for _ in range(acessos_por_associado):
+            quando = agora - timedelta(minutes=rng.randint(0, 30 * 24 * 60))
+            t["registros_acesso"].append({
+                "id": _uuid(rng),
+                "ponto_acesso_id": rng.choice(pontos),
+                "associado_id": a["id"],
+                "dependente_id": None,
+                "convidado_id": None,
+                "tipo": rng.choice(["entrada", "saida"]),
+                "forma_identificacao": "qrcode",
+                "observacoes": None,
+                "created_at": quando.isoformat(),
+            })
+
+    t["exames_medicos"] = []
+    pessoas = [("associado_id", a["id"]) for a in t["associados"] if rng.random() < 0.5]
+    pessoas += [("dependente_id", d["id"]) for d in t["dependentes"] if rng.random() < 0.3]
+    for campo, pid in pessoas:
+        exame = hoje - timedelta(days=rng.randint(0, 540))
+        t["exames_medicos"].append({
+            "id": _uuid(rng),
+            "associado_id": pid if campo == "associado_id" else None,
+            "dependente_id": pid if campo == "dependente_id" else None,
+            "tipo_exame": "admissional",
+            "data_exame": exame.isoformat(),
+            "data_validade": (exame + timedelta(days=365)).isoformat(),
+            "resultado": rng.choices(["apto", "inapto"], weights=[95, 5])[0],
+            "medico_nome": f"Dr. {_nome(rng)}",
+        })
+
+    eleicao_id = _uuid(rng)
+    t["eleicoes"] = [{
+        "id": eleicao_id, "titulo": "Eleição da Diretoria", "descricao": None,
+        "data_inicio": (agora - timedelta(days=40)).isoformat(),
+        "data_fim": (agora - timedelta(days=39)).isoformat(),
+        "status": "encerrada", "mandato_inicio": hoje.isoformat(),
+        "mandato_fim": (hoje + timedelta(days=730)).isoformat(),
+    }]
+    t["chapas"] = [
+        {"id": _uuid(rng), "eleicao_id": eleicao_id, "numero": n, "nome": f"Chapa {n}", "proposta": None}
+        for n in (1, 2, 3)
+    ]
+    t["candidatos"] = [
+        {"id": _uuid(rng), "chapa_id": c["id"], "associado_id": rng.choice(t["associados"])["id"],
+         "cargo": cargo}
+        for c in t["chapas"]
+        for cargo in ("presidente", "vice_presidente", "tesoureiro", "secretario", "diretor_social")
+    ]
+    chapa_ids = [c["id"] for c in t["chapas"]] + [None]
+    t["votos"] = [
+        {"id": _uuid(rng), "eleicao_id": eleicao_id, "associado_id": a["id"],
+         "chapa_id": rng.choices(chapa_ids, weights=[45, 35, 15, 5])[0]}
+        for a in t["associados"] if a["status"] == "ativo" and rng.random() < 0.6
+    ]
+
+    atendentes = [u["id"] for u in t["usuarios"]]
+    t["conversas_whatsapp"] = []
+    t["mensagens_whatsapp"] = []
+    for a in rng.sample(t["associados"], k=max(1, associados // 10)):
+        conversa_id = _uuid(rng)
+        ultimo = agora - timedelta(minutes=rng.randint(0, 60 * 24 * 14))
+        t["conversas_whatsapp"].append({
+            "id": conversa_id, "associado_id": a["id"], "telefone": a["telefone"],
+            "nome_contato": a["nome"], "ultimo_contato": ultimo.isoformat(),
+            "atendente_id": rng.choice(atendentes),
+            "status": rng.choice(["aberta", "aguardando", "resolvida", "arquivada"]), "tags": [],
+        })
+        for k in range(5):
+            t["mensagens_whatsapp"].append({
+                "id": _uuid(rng), "conversa_id": conversa_id,
+                "direcao": "entrada" if k % 2 == 0 else "saida",
+                "conteudo": rng.choice([
+                    "Bom dia, a piscina já reabriu?", "Qual o valor da mensalidade?",
+                    "Preciso da segunda via do boleto", "Obrigado!", "Como agendo o exame médico?",
+                ]),
+                "tipo": "texto", "lida": rng.random() < 0.7,
+                "created_at": (ultimo - timedelta(minutes=5 * (5 - k))).isoformat(),
+            })
+        # Resumo que os triggers de database/023 mantêm em conversas_whatsapp
+        mensagens = t["mensagens_whatsapp"][-5:]
+        t["conversas_whatsapp"][-1].update({
+            "total_mensagens": len(mensagens),
+            "nao_lidas": sum(m["direcao"] == "entrada" and not m["lida"] for m in mensagens),
+            "ultima_mensagem_em": mensagens[-1]["created_at"],
+            "ultima_mensagem": mensagens[-1]["conteudo"],
+            "ultima_direcao": mensagens[-1]["direcao"],
+        })
+
+    t["reclamacoes"] = []
+    t["punicoes"] = []
+    for a in rng.sample(t["associados"], k=max(1, associados // 100)):
+        reclamacao_id = _uuid(rng)
+        t["reclamacoes"].append({
+            "id": reclamacao_id, "reclamado_id": a["id"], "descricao": "Comportamento inadequado",
+            "local_ocorrencia": rng.choice(["piscina", "bar", "quadra"]),
+            "data_ocorrencia": (hoje - timedelta(days=rng.randint(0, 365))).isoformat(),
+            "status": rng.choice(["aberta", "em_analise", "resolvida"]),
+            "created_at": agora.isoformat(),
+        })
+        if rng.random() < 0.3:
+            t["punicoes"].append({
+                "id": _uuid(rng), "associado_id": a["id"], "reclamacao_id": reclamacao_id,
+                "tipo": rng.choice(["advertencia", "suspensao"]), "created_at": agora.isoformat(),
+            })
+
+    t["fornecedores"] = [
+        {"id": _uuid(rng), "nome": f"Fornecedor {i}", "razao_social": f"Fornecedor {i} Ltda",
+         "cnpj": f"{rng.randint(10**13, 10**14 - 1)}", "ativo": True}
+        for i in range(20)
+    ]
+    t["compras"] = [
+        {"id": _uuid(rng), "descricao": f"Compra {i}", "valor_total": round(rng.uniform(50, 5000), 2),
+         "valor_pago": 0, "fornecedor_id": rng.choice(t["fornecedores"])["id"],
+         "status": rng.choice(["pendente", "aprovada", "finalizada"]), "status_pagamento": "pendente",
+         "data_compra": (hoje - timedelta(days=rng.randint(0, 365))).isoformat()}
+        for i in range(200)
+    ]
+
+    # Gerador próprio: incluir carteirinhas não muda os dados das tabelas acima
+    rng_cart = random.Random(semente + 1)
+    t["carteirinhas"] = []
+    pessoas = [("associado_id", a["id"]) for a in t["associados"]] + \
+        [("dependente_id", d["id"]) for d in t["dependentes"]]
+    for campo, pid in pessoas:
+        vias = 2 if rng_cart.random() < 0.05 else 1
+        for via in range(1, vias + 1):
+            emissao = hoje - timedelta(days=rng_cart.randint(0, 700))
+            t["carteirinhas"].append({
+                "id": _uuid(rng_cart),
+                "associado_id": pid if campo == "associado_id" else None,
+                "dependente_id": pid if campo == "dependente_id" else None,
+                "qrcode_hash": f"{rng_cart.getrandbits(256):064x}",
+                "data_emissao": emissao.isoformat(),
+                "data_validade": (emissao + timedelta(days=730)).isoformat(),
+                "via": via,
+                "ativa": via == vias and rng_cart.random() < 0.97,
+            })
+
+    # Convites dos patrimoniais ativos nos últimos `meses` meses (até 2 por mês), com o contador da cota
+    rng_conv = random.Random(semente + 2)
+    t["convites"] = []
+    cota: dict[tuple[str, str], int] = {}
+    for a in t["associados"]:
+        if a["plano"] != "patrimonial" or a["status"] != "ativo":
+            continue
+        for referencia, _ in referencias:
+            ano, mes = map(int, referencia.split("-"))
+            inicio = date(ano, mes, 1)
+            fim = (inicio + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+            for _ in range(rng_conv.choice((0, 1, 1, 2))):
+                emitido = min(datetime.combine(inicio, datetime.min.time()) + timedelta(
+                    days=rng_conv.randint(0, (min(fim, hoje) - inicio).days), hours=rng_conv.randint(8, 20)), agora)
+                uso = min(emitido + timedelta(days=1), agora)
+                usado = rng_conv.random() < 0.5
+                convite_id = _uuid(rng_conv)
+                t["convites"].append({
+                    "id": convite_id,
+                    "associado_id": a["id"],
+                    "diretor_id": None,
+                    "nome_convidado": _nome(rng_conv).upper(),
+                    "cpf_convidado": gerar_cpf(rng_conv),
+                    "telefone_convidado": None,
+                    "data_validade": fim.isoformat(),
+                    "status": "usado" if usado else ("disponivel" if fim >= hoje else "expirado"),
+                    "data_uso": uso.isoformat() if usado else None,
+                    "mes_referencia": referencia,
+                    "qr_code": "CONV-" + convite_id.replace("-", "")[:12].upper(),
+                    "created_at": emitido.isoformat(),
+                    "updated_at": (uso if usado else emitido).isoformat(),
+                })
+                cota[(a["id"], referencia)] = cota.get((a["id"], referencia), 0) + 1
+    t["convites_cota"] = [{"associado_id": a, "mes_referencia": m, "emitidos": n} for (a, m), n in cota.items()]
+
+    # Contas a pagar e a receber dos mesmos meses e de 2 meses à frente (gerador próprio)
+    rng_contas = random.Random(semente + 3)
+    t["contas_pagar"], t["contas_receber"] = [], []
+    for m in range(-2, meses):
+        ano, mes = hoje.year, hoje.month - m
+        ano, mes = ano + (mes - 1) // 12, (mes - 1) % 12 + 1
+        for i in range(40):
+            venc = date(ano, mes, 1 + (i * 7) % 28)
+            pago = venc < hoje - timedelta(days=5)
+            t["contas_pagar"].append({
+                "id": _uuid(rng_contas), "descricao": f"Conta {i}",
+                "fornecedor_id": rng_contas.choice(t["fornecedores"])["id"],
+                "valor": round(rng_contas.uniform(500, 20000), 2), "data_vencimento": venc.isoformat(),
+                "data_pagamento": venc.isoformat() if pago else None, "status": "pago" if pago else "pendente",
+            })
+        for i in range(15):
+            venc = date(ano, mes, 1 + (i * 11) % 28)
+            recebido = venc + timedelta(days=rng_contas.randint(0, 45))
+            pago = recebido <= hoje and rng_contas.random() < 0.9
+            t["contas_receber"].append({
+                "id": _uuid(rng_contas), "descricao": f"Recebível {i}", "associado_id": None,
+                "valor": round(rng_contas.uniform(200, 3000), 2), "data_vencimento": venc.isoformat(),
+                "data_recebimento": recebido.isoformat() if pago else None, "status": "pago" if pago else "pendente",
+            })
+
+    # Solicitações de compra dos últimos 2 anos com 2 a 5 cotações itemizadas; as 15 mais
+    # recentes ainda em cotação (gerador próprio)
+    rng_compras = random.Random(semente + 4)
+    fator = {f["id"]: rng_compras.uniform(0.85, 1.25) for f in t["fornecedores"]}
+    t["solicitacoes_compra"], t["cotacoes"], t["cotacao_itens"] = [], [], []
+    total = 300
+    for n in range(total):
+        criada = agora - timedelta(days=730 * (total - n) / total)
+        aberta = n >= total - 15
+        itens = rng_compras.sample(ITENS_COMPRA, rng_compras.randint(1, 6))
+        quantidades = [rng_compras.choice([1, 2, 5, 10, 20, 50]) for _ in itens]
+        solicitacao = {
+            "id": _uuid(rng_compras), "numero": n + 1, "descricao": ", ".join(i[0] for i in itens),
+            "valor_estimado": round(sum(q * i[2] for q, i in zip(quantidades, itens)), 2),
+            "status": "em_cotacao" if aberta else rng_compras.choice(["comprado", "comprado", "aprovado", "cancelado"]),
+            "created_at": criada.isoformat(), "updated_at": criada.isoformat(),
+        }
+        t["solicitacoes_compra"].append(solicitacao)
+        cotacoes = []
+        for fornecedor in rng_compras.sample(t["fornecedores"], rng_compras.randint(2, 5)):
+            enviada = criada + timedelta(days=rng_compras.randint(1, 10))
+            cotacao = {
+                "id": _uuid(rng_compras), "solicitacao_id": solicitacao["id"], "fornecedor_id": fornecedor["id"],
+                "prazo_entrega": rng_compras.randint(2, 30),
+                "condicao_pagamento": rng_compras.choice(["à vista", "30 dias", "30/60 dias"]),
+                "validade_proposta": (enviada + timedelta(days=30)).date().isoformat(),
+                "selecionada": False, "created_at": enviada.isoformat(),
+            }
+            valor = 0.0
+            for quantidade, (nome, unidade, referencia) in zip(quantidades, itens):
+                unitario = round(referencia * fator[fornecedor["id"]] * rng_compras.uniform(0.92, 1.08), 2)
+                valor += quantidade * unitario
+                t["cotacao_itens"].append({
+                    "id": _uuid(rng_compras), "cotacao_id": cotacao["id"], "item": nome, "quantidade": quantidade,
+                    "unidade": unidade, "valor_unitario": unitario, "created_at": enviada.isoformat(),
+                })
+            cotacao["valor"] = round(valor, 2)
+            cotacoes.append(cotacao)
+        if solicitacao["status"] in ("comprado", "aprovado"):
+            cotacoes.sort(key=lambda c: c["valor"])
+            cotacoes[0 if rng_compras.random() < 0.85 else 1]["selecionada"] = True
+        t["cotacoes"] += cotacoes
+    return t
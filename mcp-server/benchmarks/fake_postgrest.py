@@ -0,0 +1,451 @@
+"""
+PostgREST falso em memória
+==========================
+Transporte httpx que implementa o subconjunto da API PostgREST usado pelo
+server.py: select com embeds, filtros (eq, neq, gt, gte, lt, lte, like, ilike,
+is, in, or), order, limit/offset, count=exact, HEAD, single(), insert, upsert,
+update, delete e rpc.
+
+Como fica atrás do cliente supabase real, os hooks de instrumentação e
+tracing do servidor continuam funcionando normalmente.
+"""
+
+import json
+import re
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Optional
+
+import httpx
+
+# Nome da coluna FK usada por cada tabela quando referenciada (associados -> associado_id)
+SINGULAR = {
+    "associados": "associado",
+    "dependentes": "dependente",
+    "pontos_acesso": "ponto_acesso",
+    "chapas": "chapa",
+    "candidatos": "candidato",
+    "eleicoes": "eleicao",
+    "usuarios": "usuario",
+    "reclamacoes": "reclamacao",
+    "conversas_whatsapp": "conversa",
+    "mensalidades": "mensalidade",
+    "fornecedores": "fornecedor",
+    "solicitacoes_compra": "solicitacao",
+    "convites": "convidado",
+    "carteirinhas": "carteirinha",
+}
+
+# Colunas com UNIQUE no schema real (violação → 409 / 23505, como no Postgres)
+UNICOS = {
+    "associados": ("cpf", "numero_titulo"),
+}
+
+# Tabelas com updated_at mantido por trigger (update_updated_at) no schema real
+COM_UPDATED_AT = {"associados", "dependentes", "mensalidades", "convites"}
+
+OPERADORES = ("eq", "neq", "gt", "gte", "lt", "lte", "like", "ilike", "is", "in")
+PARAMS_RESERVADOS = {"select", "order", "limit", "offset", "on_conflict", "columns"}
+
+
+class FakeDB:
+    """Tabelas em memória com índices de igualdade construídos sob demanda."""
+
+    def __init__(self):
+        self.tabelas: dict[str, list[dict]] = {}
+        self.rpcs: dict[str, Callable[["FakeDB", dict], Any]] = {}
+        self._indices: dict[tuple[str, str], dict] = {}
+        self._lock = threading.RLock()
+
+    def carregar(self, tabela: str, linhas: list[dict]) -> None:
+        with self._lock:
+            self.tabelas.setdefault(tabela, []).extend(linhas)
+            self._invalidar(tabela)
+
+    def linhas(self, tabela: str) -> list[dict]:
+        return self.tabelas.get(tabela, [])
+
+    def indice(self, tabela: str, coluna: str) -> dict:
+        chave = (tabela, coluna)
+        idx = self._indices.get(chave)
+        if idx is None:
+            idx = {}
+            for linha in self.linhas(tabela):
+                idx.setdefault(_texto(linha.get(coluna)), []).append(linha)
+            self._indices[chave] = idx
+        return idx
+
+    def por_id(self, tabela: str, valor: Any) -> Optional[dict]:
+        achados = self.indice(tabela, "id").get(_texto(valor))
+        return achados[0] if achados else None
+
+    def _invalidar(self, tabela: str, colunas: Optional[set] = None) -> None:
+        """Descarta os índices da tabela (ou só os das colunas alteradas)."""
+        for chave in [k for k in self._indices if k[0] == tabela and (colunas is None or k[1] in colunas)]:
+            del self._indices[chave]
+
+
+def _texto(valor: Any) -> str:
+    if valor is None:
+        return "null"
+    if isinstance(valor, bool):
+        return "true" if valor else "false"
+    return str(valor)
+
+
+# ------------------------------------------------------------
+# Filtros
+# ------------------------------------------------------------
+
+def _converter(bruto: str, referencia: Any) -> Any:
+    """Converte o valor textual do filtro para o tipo do valor da linha."""
+    if isinstance(referencia, bool):
+        return bruto.lower() == "true"
+    if isinstance(referencia, (int, float)):
+        try:
+            return float(bruto)
+        except ValueError:
+            return bruto
+    return bruto
+
+
+def _like(padrao: str, ignorar_caixa: bool) -> re.Pattern:
+    regex = "".join(
+        ".*" if c in "%*" else "." if c == "_" else re.escape(c)
+        for c in padrao
+    )
+    return re.compile(regex, re.IGNORECASE | re.DOTALL if ignorar_caixa else re.DOTALL)
+
+
+def _compilar_filtro(coluna: str, expr: str) -> Callable[[dict], bool]:
+    negar = False
+    if expr.startswith("not."):
+        negar, expr = True, expr[4:]
+    op, _, bruto = expr.partition(".")
+    if op not in OPERADORES:
+        raise ValueError(f"operador não suportado: {op}")
+
+    if op in ("like", "ilike"):
+        padrao = _like(bruto, op == "ilike")
+
+        def teste(linha):
+            v = linha.get(coluna)
+            return v is not None and padrao.fullmatch(str(v)) is not None
+    elif op == "is":
+        alvo = {"null": None, "true": True, "false": False}[bruto.lower()]
+
+        def teste(linha):
+            return linha.get(coluna) is alvo
+    elif op == "in":
+        itens = {i.strip().strip('"') for i in bruto.strip("()").split(",") if i.strip()}
+
+        def teste(linha):
+            return _texto(linha.get(coluna)) in itens
+    else:
+        def teste(linha):
+            v = linha.get(coluna)
+            if v is None:
+                return False
+            alvo = _converter(bruto, v)
+            if isinstance(alvo, float) and not isinstance(v, bool):
+                v = float(v)
+            elif not isinstance(alvo, (float, bool)):
+                v = str(v)
+            if op == "eq":
+                return v == alvo
+            if op == "neq":
+                return v != alvo
+            if op == "gt":
+                return v > alvo
+            if op == "gte":
+                return v >= alvo
+            if op == "lt":
+                return v < alvo
+            return v <= alvo
+
+    if negar:
+        return lambda linha: not teste(linha)
+    return teste
+
+
+def _dividir(texto: str) -> list[str]:
+    """Divide por vírgulas de nível superior (respeitando parênteses)."""
+    partes, nivel, atual = [], 0, ""
+    for c in texto:
+        if c == "(":
+            nivel += 1
+        elif c == ")":
+            nivel -= 1
+        if c == "," and nivel == 0:
+            partes.append(atual.strip())
+            atual = ""
+        else:
+            atual += c
+    if atual.strip():
+        partes.append(atual.strip())
+    return partes
+
+
+def _compilar_logico(expr: str, todos: bool) -> Callable[[dict], bool]:
+    testes = []
+    for parte in _dividir(expr.strip()[1:-1]):
+        if parte.startswith(("or(", "and(")):
+            nome, _, resto = parte.partition("(")
+            testes.append(_compilar_logico("(" + resto, nome == "and"))
+        else:
+            coluna, _, cond = parte.partition(".")
+            # Dentro de or/and o PostgREST aceita valores entre aspas (ex.: timestamps)
+            testes.append(_compilar_filtro(coluna, re.sub(r'\."(.*)"$', r".\1", cond)))
+    if todos:
+        return lambda linha: all(t(linha) for t in testes)
+    return lambda linha: any(t(linha) for t in testes)
+
+
+# ------------------------------------------------------------
+# Select com embeds
+# ------------------------------------------------------------
+
+def _parse_select(texto: str) -> list[tuple]:
+    """Retorna itens (alias, nome, hint, sub_select|None)."""
+    itens = []
+    for parte in _dividir(texto or "*"):
+        alias = None
+        if ":" in parte.split("(")[0]:
+            alias, parte = parte.split(":", 1)
+        if "(" in parte:
+            cabeca, sub = parte.split("(", 1)
+            nome, _, hint = cabeca.strip().partition("!")
+            itens.append((alias or nome, nome, hint or None, _parse_select(sub[:-1])))
+        else:
+            itens.append((alias or parte, parte, None, None))
+    return itens
+
+
+def _projetar(db: FakeDB, tabela: str, linha: dict, itens: list[tuple]) -> dict:
+    saida = {}
+    for alias, nome, hint, sub in itens:
+        if sub is None:
+            if nome == "*":
+                saida.update(linha)
+            else:
+                saida[alias] = linha.get(nome)
+            continue
+        saida[alias] = _embed(db, tabela, linha, nome, hint, sub)
+    return saida
+
+
+def _embed(db: FakeDB, pai: str, linha: dict, alvo: str, hint: Optional[str], sub: list[tuple]):
+    coluna_pai = coluna_filho = None
+    if hint and hint.endswith("_fkey"):
+        corpo = hint[: -len("_fkey")]
+        if corpo.startswith(pai + "_"):
+            coluna_pai = corpo[len(pai) + 1:]
+        elif corpo.startswith(alvo + "_"):
+            coluna_filho = corpo[len(alvo) + 1:]
+    if coluna_pai is None and coluna_filho is None:
+        fk = f"{SINGULAR.get(alvo, alvo)}_id"
+        if fk in linha:
+            coluna_pai = fk
+        else:
+            coluna_filho = f"{SINGULAR.get(pai, pai)}_id"
+
+    if coluna_pai is not None:
+        ref = db.por_id(alvo, linha.get(coluna_pai)) if linha.get(coluna_pai) is not None else None
+        return _projetar(db, alvo, ref, sub) if ref else None
+
+    filhos = db.indice(alvo, coluna_filho).get(_texto(linha.get("id")), [])
+    return [_projetar(db, alvo, f, sub) for f in filhos]
+
+
+# ------------------------------------------------------------
+# Transporte
+# ------------------------------------------------------------
+
+class FakePostgrest(httpx.BaseTransport):
+    """Transporte httpx que responde como um PostgREST sobre um FakeDB.
+
+    Args:
+        db: Banco em memória
+        latencia_ms: Latência simulada por requisição (rede + Postgres)
+    """
+
+    def __init__(self, db: FakeDB, latencia_ms: float = 0.0):
+        self.db = db
+        self.latencia = latencia_ms / 1000
+        self.requisicoes = 0
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        self.requisicoes += 1
+        if self.latencia:
+            time.sleep(self.latencia)
+        request.read()
+        caminho = request.url.path.split("/rest/v1/", 1)[-1].strip("/")
+        try:
+            with self.db._lock:
+                if caminho.startswith("rpc/"):
+                    return self._rpc(request, caminho[4:])
+                return self._tabela(request, caminho)
+        except (ValueError, KeyError) as e:
+            return _erro(400, "PGRST100", str(e))
+
+    def _rpc(self, request: httpx.Request, nome: str) -> httpx.Response:
+        fn = self.db.rpcs.get(nome)
+        if fn is None:
+            return _erro(404, "PGRST202", f"Could not find the function public.{nome} in the schema cache")
+        params = json.loads(request.content or b"{}") if request.method == "POST" else dict(request.url.params)
+        return _json(200, fn(self.db, params))
+
+    def _tabela(self, request: httpx.Request, tabela: str) -> httpx.Response:
+        params = request.url.params
+        prefer = request.headers.get("prefer", "")
+        metodo = request.method
+
+        if metodo == "POST":
+            return self._inserir(request, tabela, prefer)
+
+        filtros = []
+        for chave, valor in params.multi_items():
+            if chave in ("or", "and"):
+                filtros.append(_compilar_logico(valor, chave == "and"))
+            elif chave not in PARAMS_RESERVADOS:
+                filtros.append(_compilar_filtro(chave, valor))
+
+        linhas = self._candidatas(tabela, params)
+        linhas = [l for l in linhas if all(f(l) for f in filtros)]
+
+        if metodo == "PATCH":
+            dados = json.loads(request.content)
+            if tabela in COM_UPDATED_AT:
+                dados.setdefault("updated_at", datetime.now().isoformat())
+            for l in linhas:
+                l.update(dados)
+            self.db._invalidar(tabela, set(dados))
+            return _json(200, linhas)
+        if metodo == "DELETE":
+            ids = {id(l) for l in linhas}
+            self.db.tabelas[tabela] = [l for l in self.db.linhas(tabela) if id(l) not in ids]
+            self.db._invalidar(tabela)
+            return _json(200, linhas)
+
+        total = len(linhas)
+        for ordem in reversed(_dividir(params.get("order", ""))):
+            coluna, *mods = ordem.split(".")
+            desc = "desc" in mods
+            linhas = sorted(
+                linhas,
+                key=lambda l: (l.get(coluna) is None, l.get(coluna) if l.get(coluna) is not None else 0),
+                reverse=desc,
+            )
+        offset = int(params.get("offset", 0))
+        limite = params.get("limit")
+        linhas = linhas[offset: offset + int(limite)] if limite is not None else linhas[offset:]
+
+        itens = _parse_select(params.get("select", "*"))
+        corpo = [_projetar(self.db, tabela, l, itens) for l in linhas]
+
+        fim = offset + len(corpo) - 1
+        faixa = f"{offset}-{fim}" if corpo else "*"
+        contagem = str(total) if "count=exact" in prefer else "*"
+        headers = {"content-range": f"{faixa}/{contagem}"}
+
+        if "vnd.pgrst.object" in request.headers.get("accept", ""):
+            if len(corpo) != 1:
+                return _erro(406, "PGRST116", "JSON object requested, multiple (or no) rows returned",
+                             f"The result contains {len(corpo)} rows")
+            return _json(200, corpo[0], headers)
+        if metodo == "HEAD":
+            return httpx.Response(200, headers=headers)
+        return _json(200, corpo, headers)
+
+    def _candidatas(self, tabela: str, params) -> list[dict]:
+        """Usa o índice de igualdade mais seletivo disponível entre os filtros eq e in.
+
+        Um filtro por id (chave primária) é usado direto, sem montar os demais índices.
+        """
+        melhor = None
+        for chave, valor in params.multi_items():
+            if chave in PARAMS_RESERVADOS or chave in ("or", "and"):
+                continue
+            if valor.startswith("eq."):
+                achados = self.db.indice(tabela, chave).get(valor[3:], [])
+            elif valor.startswith("in."):
+                indice = self.db.indice(tabela, chave)
+                itens = {i.strip().strip('"') for i in valor[3:].strip("()").split(",") if i.strip()}
+                achados = [linha for item in itens for linha in indice.get(item, [])]
+            else:
+                continue
+            if chave == "id":
+                return list(achados)
+            if melhor is None or len(achados) < len(melhor):
+                melhor = achados
+        return list(melhor) if melhor is not None else list(self.db.linhas(tabela))
+
+    def _inserir(self, request: httpx.Request, tabela: str, prefer: str) -> httpx.Response:
+        dados = json.loads(request.content)
+        novos = dados if isinstance(dados, list) else [dados]
+        conflito = request.url.params.get("on_conflict", "id").split(",")
+        mesclar = "merge-duplicates" in prefer
+        ignorar = "ignore-duplicates" in prefer
+        agora = datetime.now().isoformat()
+
+        existentes = {}
+        if mesclar or ignorar:
+            existentes = {
+                tuple(_texto(l.get(c)) for c in conflito): l for l in self.db.linhas(tabela)
+            }
+
+        violacao = self._violacao_unica(tabela, novos, conflito, existentes, prefer)
+        if violacao:
+            return _erro(409, "23505", f'duplicate key value violates unique constraint "{tabela}_{violacao}_key"')
+
+        saida = []
+        for novo in novos:
+            chave = tuple(_texto(novo.get(c)) for c in conflito)
+            if ignorar and chave in existentes:
+                continue
+            if mesclar and chave in existentes:
+                existentes[chave].update(novo)
+                saida.append(existentes[chave])
+                continue
+            linha = {"id": str(uuid.uuid4()), "created_at": agora,
+                     **({"updated_at": agora} if tabela in COM_UPDATED_AT else {}), **novo}
+            self.db.tabelas.setdefault(tabela, []).append(linha)
+            saida.append(linha)
+        self.db._invalidar(tabela)
+        return _json(201, saida)
+
+    def _violacao_unica(
+        self, tabela: str, novos: list[dict], conflito: list[str], existentes: dict, prefer: str,
+    ) -> Optional[str]:
+        """Retorna a coluna UNIQUE violada pelo lote (contra o banco ou dentro do próprio lote)."""
+        for coluna in UNICOS.get(tabela, ()):
+            vistos = set()
+            indice = self.db.indice(tabela, coluna)
+            for novo in novos:
+                if coluna not in novo or novo[coluna] is None:
+                    continue
+                valor = _texto(novo[coluna])
+                if valor in vistos:
+                    return coluna
+                vistos.add(valor)
+                alvo = existentes.get(tuple(_texto(novo.get(c)) for c in conflito))
+                if alvo is not None and "ignore-duplicates" in prefer:
+                    continue
+                donos = indice.get(valor, [])
+                if any(dono is not alvo for dono in donos):
+                    return coluna
+        return None
+
+
+def _json(status: int, corpo: Any, headers: Optional[dict] = None) -> httpx.Response:
+    return httpx.Response(
+        status,
+        content=json.dumps(corpo, default=str, ensure_ascii=False).encode(),
+        headers={"content-type": "application/json", **(headers or {})},
+    )
+
+
+def _erro(status: int, codigo: str, mensagem: str, detalhes: Optional[str] = None) -> httpx.Response:
+    return _json(status, {"code": codigo, "message": mensagem, "details": detalhes, "hint": None})
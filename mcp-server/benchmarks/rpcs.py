@@ -0,0 +1,439 @@
+"""
+RPCs do banco no stand-in
+=========================
+Equivalentes em Python das functions SQL chamadas via `supabase.rpc()`,
+registrados no FakeDB para que as tools que dependem delas também sejam
+medidas. Cada função recebe o FakeDB e os parâmetros JSON da chamada.
+"""
+
+import re
+import secrets
+import unicodedata
+import uuid
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+from benchmarks.fake_postgrest import FakeDB
+
+
+def _dia(valor: str) -> date:
+    return datetime.fromisoformat(str(valor)).date()
+
+
+def relatorio_receita_mensal(db: FakeDB, params: dict) -> list[dict]:
+    meses = max(int(params.get("p_meses", 12)), 1)
+    hoje = date.today()
+    ano, mes = hoje.year, hoje.month - (meses - 1)
+    while mes <= 0:
+        ano, mes = ano - 1, mes + 12
+    inicio = f"{ano}-{mes:02d}"
+
+    grupos: dict[str, dict] = defaultdict(lambda: {"mensalidades": 0, "pagas": 0, "previsto": 0.0,
+                                                   "recebido": 0.0, "em_aberto": 0.0})
+    for m in db.linhas("mensalidades"):
+        if m["referencia"] < inicio or m["status"] == "cancelado":
+            continue
+        g = grupos[m["referencia"]]
+        g["mensalidades"] += 1
+        g["previsto"] += m["valor"]
+        if m["status"] == "pago":
+            g["pagas"] += 1
+            g["recebido"] += m.get("valor_pago") or m["valor"]
+        elif m["status"] in ("pendente", "atrasado"):
+            g["em_aberto"] += m["valor"]
+    return [
+        {"referencia": ref, **g, "taxa_recebimento": round(100 * g["pagas"] / g["mensalidades"], 1)}
+        for ref, g in sorted(grupos.items(), reverse=True)
+    ]
+
+
+def relatorio_entradas_por_local(db: FakeDB, params: dict) -> list[dict]:
+    inicio = _dia(params.get("p_data_inicio") or date.today())
+    fim = _dia(params.get("p_data_fim") or date.today())
+    grupos: dict[str, dict] = {}
+    pessoas: dict[str, set] = defaultdict(set)
+    for r in db.linhas("registros_acesso"):
+        if not inicio <= _dia(r["created_at"]) <= fim:
+            continue
+        ponto = db.por_id("pontos_acesso", r["ponto_acesso_id"])
+        g = grupos.setdefault(ponto["id"], {"local": ponto["tipo"], "ponto_acesso": ponto["nome"],
+                                            "entradas": 0, "saidas": 0})
+        g["entradas" if r["tipo"] == "entrada" else "saidas"] += 1
+        pessoas[ponto["id"]].add(r.get("associado_id") or r.get("dependente_id"))
+    return sorted(
+        ({**g, "pessoas_distintas": len(pessoas[pid])} for pid, g in grupos.items()),
+        key=lambda g: g["entradas"], reverse=True,
+    )
+
+
+def relatorio_inadimplencia_por_plano(db: FakeDB, params: dict) -> list[dict]:
+    atrasadas: dict[str, list[float]] = defaultdict(list)
+    for m in db.linhas("mensalidades"):
+        if m["status"] == "atrasado":
+            atrasadas[m["associado_id"]].append(m["valor"])
+    grupos: dict[str, dict] = defaultdict(lambda: {"associados_ativos": 0, "inadimplentes": 0,
+                                                   "mensalidades_atrasadas": 0, "valor_em_aberto": 0.0})
+    for a in db.linhas("associados"):
+        if a["status"] != "ativo":
+            continue
+        g = grupos[a["plano"]]
+        g["associados_ativos"] += 1
+        valores = atrasadas.get(a["id"])
+        if valores:
+            g["inadimplentes"] += 1
+            g["mensalidades_atrasadas"] += len(valores)
+            g["valor_em_aberto"] += sum(valores)
+    return sorted(
+        ({"plano": plano, **g, "percentual": round(100 * g["inadimplentes"] / g["associados_ativos"], 1)}
+         for plano, g in grupos.items()),
+        key=lambda g: g["valor_em_aberto"], reverse=True,
+    )
+
+
+def relatorio_frequencia_associados(db: FakeDB, params: dict) -> list[dict]:
+    desde = date.today() - timedelta(days=max(int(params.get("p_dias", 30)), 1))
+    limite = min(max(int(params.get("p_limite", 20)), 1), 500)
+    grupos: dict[str, dict] = {}
+    for r in db.linhas("registros_acesso"):
+        if r["tipo"] != "entrada" or not r.get("associado_id") or _dia(r["created_at"]) < desde:
+            continue
+        g = grupos.setdefault(r["associado_id"], {"entradas": 0, "dias": set(), "ultima_entrada": ""})
+        g["entradas"] += 1
+        g["dias"].add(_dia(r["created_at"]))
+        g["ultima_entrada"] = max(g["ultima_entrada"], r["created_at"])
+    ranking = sorted(grupos.items(), key=lambda kv: (kv[1]["entradas"], kv[1]["ultima_entrada"]), reverse=True)
+    resultado = []
+    for aid, g in ranking[:limite]:
+        a = db.por_id("associados", aid)
+        resultado.append({
+            "associado_id": aid, "nome": a["nome"], "numero_titulo": a["numero_titulo"],
+            "entradas": g["entradas"], "dias_distintos": len(g["dias"]), "ultima_entrada": g["ultima_entrada"],
+        })
+    return resultado
+
+
+STOPWORDS = {"a", "o", "as", "os", "de", "da", "do", "das", "dos", "e", "em", "no", "na", "um", "uma",
+             "que", "para", "com", "por", "se", "já", "ja", "é"}
+
+
+def _radicais(texto: str) -> list[str]:
+    """Aproximação do to_tsvector('portuguese'): minúsculas, sem stopwords, radical = 5 letras."""
+    palavras = re.findall(r"\w+", texto.lower())
+    return [unicodedata.normalize("NFKD", p).encode("ascii", "ignore").decode()[:5]
+            for p in palavras if p not in STOPWORDS]
+
+
+def buscar_texto_mensagens(db: FakeDB, params: dict) -> list[dict]:
+    termos = params["p_termos"]
+    excluir = {r for p in re.findall(r"-(\w+)", termos) for r in _radicais(p)}
+    exigir = set(_radicais(re.sub(r"-\w+", " ", termos))) - {"or"}
+    limite = min(max(int(params.get("p_limite", 20)), 1), 100)
+    offset = max(int(params.get("p_offset", 0)), 0)
+
+    achados = []
+    for m in db.linhas("mensagens_whatsapp"):
+        if params.get("p_direcao") and m["direcao"] != params["p_direcao"]:
+            continue
+        if params.get("p_desde") and m["created_at"] < params["p_desde"]:
+            continue
+        radicais = _radicais(m["conteudo"])
+        if not exigir or not exigir <= set(radicais) or excluir & set(radicais):
+            continue
+        relevancia = sum(r in exigir for r in radicais) / len(radicais)
+        achados.append((relevancia, m))
+    achados.sort(key=lambda a: (a[0], a[1]["created_at"], a[1]["id"]), reverse=True)
+
+    resultado = []
+    for relevancia, m in achados[offset:offset + limite]:
+        c = db.por_id("conversas_whatsapp", m["conversa_id"])
+        resultado.append({
+            "mensagem_id": m["id"], "conversa_id": c["id"], "telefone": c["telefone"],
+            "nome_contato": c["nome_contato"], "associado_id": c["associado_id"], "direcao": m["direcao"],
+            "created_at": m["created_at"], "relevancia": relevancia, "trecho": m["conteudo"],
+            "total": len(achados),
+        })
+    return resultado
+
+
+def _limite_arquivo(meses_retencao: int) -> str:
+    """Primeiro dia do mês mais antigo mantido em registros_acesso."""
+    hoje = date.today()
+    ano, mes = divmod(hoje.year * 12 + hoje.month - 1 - max(meses_retencao, 1), 12)
+    return date(ano, mes + 1, 1).isoformat()
+
+
+def arquivar_registros_acesso(db: FakeDB, params: dict) -> list[dict]:
+    """Sem partições no stand-in: os meses além da retenção saem da tabela em blocos de 5 mil."""
+    limite = _limite_arquivo(int(params.get("p_meses_retencao", 12)))
+    por_mes = defaultdict(list)
+    for r in db.linhas("registros_acesso"):
+        if str(r["created_at"]) < limite:
+            por_mes[str(r["created_at"])[:7]].append(r)
+    resultado = [{"mes": f"{mes}-01", "particao": f"registros_acesso_{mes.replace('-', '_')}", "registros": len(rs)}
+                 for mes, rs in sorted(por_mes.items())]
+    if params.get("p_simular"):
+        return resultado
+
+    blocos = []
+    for mes, rs in sorted(por_mes.items()):
+        rs.sort(key=lambda r: (str(r["created_at"]), r["id"]))
+        for i, inicio in enumerate(range(0, len(rs), 5000)):
+            bloco = rs[inicio:inicio + 5000]
+            blocos.append({"mes": f"{mes}-01", "bloco": i, "registros": len(bloco),
+                           "primeiro": bloco[0]["created_at"], "ultimo": bloco[-1]["created_at"], "dados": bloco})
+    with db._lock:
+        db.tabelas["registros_acesso"] = [r for r in db.linhas("registros_acesso") if str(r["created_at"]) >= limite]
+        db._invalidar("registros_acesso")
+    db.carregar("registros_acesso_arquivo", blocos)
+    return resultado
+
+
+def buscar_registros_arquivados(db: FakeDB, params: dict) -> list[dict]:
+    inicio, fim = params.get("p_inicio"), params.get("p_fim")
+    limite = min(max(int(params.get("p_limite", 50)), 1), 1000)
+    pontos = {p["id"] for p in db.linhas("pontos_acesso") if p["tipo"] == params.get("p_local")}
+
+    achados = []
+    for b in db.linhas("registros_acesso_arquivo"):
+        if (inicio and str(b["ultimo"]) < inicio) or (fim and str(b["primeiro"]) > fim):
+            continue
+        achados += [
+            r for r in b["dados"]
+            if (not inicio or str(r["created_at"]) >= inicio) and (not fim or str(r["created_at"]) <= fim)
+            and (not params.get("p_tipo") or r["tipo"] == params["p_tipo"])
+            and (not params.get("p_associado_id") or r.get("associado_id") == params["p_associado_id"])
+            and (not params.get("p_local") or r["ponto_acesso_id"] in pontos)
+        ]
+    achados.sort(key=lambda r: (str(r["created_at"]), r["id"]), reverse=True)
+
+    resultado = []
+    for r in achados[:limite]:
+        ponto = db.por_id("pontos_acesso", r["ponto_acesso_id"]) or {}
+        associado = db.por_id("associados", r.get("associado_id"))
+        dependente = db.por_id("dependentes", r.get("dependente_id"))
+        resultado.append({
+            **r,
+            "pontos_acesso": {"nome": ponto.get("nome"), "tipo": ponto.get("tipo")},
+            "associados": {"nome": associado["nome"], "numero_titulo": associado["numero_titulo"]} if associado else None,
+            "dependentes": {"nome": dependente["nome"]} if dependente else None,
+            "arquivado": True,
+        })
+    return resultado
+
+
+def limite_convites_mes(db: FakeDB, associado_id: str) -> int:
+    associado = db.por_id("associados", associado_id)
+    config = {c["chave"]: c["valor"] for c in db.linhas("configuracoes")}
+    base = config.get(f"convites_{associado['plano']}_mes")
+    limite = int(base) if base else (2 if associado["plano"] == "patrimonial" else 0)
+    hoje = date.today().isoformat()
+    return limite + sum(d.get("qtd_convites_mes") or 0 for d in db.linhas("diretoria")
+                        if d["associado_id"] == associado_id and d.get("ativo")
+                        and d["data_inicio"] <= hoje <= d["data_fim"])
+
+
+def convites_disponiveis_mes(db: FakeDB, params: dict) -> int:
+    emitidos = next((c["emitidos"] for c in db.indice("convites_cota", "associado_id").get(params["p_associado_id"], [])
+                     if c["mes_referencia"] == params["p_mes"]), 0)
+    return limite_convites_mes(db, params["p_associado_id"]) - emitidos
+
+
+def emitir_convites(db: FakeDB, params: dict) -> dict:
+    """Sem triggers no stand-in: gera o código e atualiza o contador aqui."""
+    associado = db.por_id("associados", params["p_associado_id"])
+    if associado is None:
+        raise ValueError(f"Associado {params['p_associado_id']} não encontrado")
+    if associado["status"] != "ativo":
+        raise ValueError(f"Associado com status {associado['status']}: só associados ativos emitem convites")
+    mes = date.today().strftime("%Y-%m")
+    limite = limite_convites_mes(db, associado["id"])
+    cota = next((c for c in db.indice("convites_cota", "associado_id").get(associado["id"], [])
+                 if c["mes_referencia"] == mes), None)
+    if cota is None:
+        cota = {"associado_id": associado["id"], "mes_referencia": mes, "emitidos": 0}
+        db.carregar("convites_cota", [cota])
+    emitidos = cota["emitidos"]
+    convidados = params["p_convidados"]
+    if emitidos + len(convidados) > limite:
+        return {"mes_referencia": mes, "limite": limite, "emitidos_mes": emitidos, "convites": []}
+
+    agora = datetime.now().isoformat()
+    novos = []
+    for c in convidados:
+        convite_id = str(uuid.uuid4())
+        novos.append({
+            "id": convite_id, "associado_id": associado["id"], "diretor_id": None,
+            "nome_convidado": c.get("nome") or "", "cpf_convidado": c.get("cpf"),
+            "telefone_convidado": c.get("telefone"), "data_validade": params["p_data_validade"],
+            "status": "disponivel", "data_uso": None, "mes_referencia": mes,
+            "qr_code": "CONV-" + secrets.token_hex(6).upper(), "created_at": agora, "updated_at": agora,
+        })
+    db.carregar("convites", novos)
+    cota["emitidos"] += len(novos)
+    campos = ("id", "qr_code", "nome_convidado", "cpf_convidado", "data_validade", "status")
+    return {"mes_referencia": mes, "limite": limite, "emitidos_mes": cota["emitidos"],
+            "convites": [{k: n[k] for k in campos} for n in novos]}
+
+
+def distribuicao_atrasos(db: FakeDB, params: dict) -> list[dict]:
+    desde, max_dias = _dia(params["p_desde"]), int(params.get("p_max_dias", 180))
+    limite = date.today() - timedelta(days=max_dias)
+    grupos: dict[tuple, list] = defaultdict(lambda: [0, 0.0])
+    for origem, campo in (("mensalidades", "data_pagamento"), ("contas_receber", "data_recebimento")):
+        for t in db.linhas(origem):
+            vencimento = _dia(t["data_vencimento"])
+            if not desde <= vencimento < limite or t["status"] == "cancelado":
+                continue
+            dias = None
+            if t["status"] == "pago":
+                atraso = ((_dia(t[campo]) if t.get(campo) else vencimento) - vencimento).days
+                dias = max(atraso, -max_dias) if atraso <= max_dias else None
+            g = grupos[(origem, dias)]
+            g[0] += 1
+            g[1] += t["valor"]
+    return [{"origem": o, "dias": d, "quantidade": q, "valor": v} for (o, d), (q, v) in grupos.items()]
+
+
+def titulos_em_aberto(db: FakeDB, params: dict) -> list[dict]:
+    hoje = date.today()
+    grupos: dict[tuple, list] = defaultdict(lambda: [0, 0.0])
+    for origem in ("mensalidades", "contas_pagar", "contas_receber"):
+        for t in db.linhas(origem):
+            if t["status"] in ("pendente", "atrasado"):
+                g = grupos[(origem, (_dia(t["data_vencimento"]) - hoje).days)]
+                g[0] += 1
+                g[1] += t["valor"]
+    resultado = [{"origem": o, "dias": d, "quantidade": q, "valor": v, "referencia": None}
+                 for (o, d), (q, v) in grupos.items()]
+    mensalidades = [m for m in db.linhas("mensalidades") if m["status"] != "cancelado"]
+    if mensalidades:
+        referencia = max(m["referencia"] for m in mensalidades)
+        ultimas = [m for m in mensalidades if m["referencia"] == referencia]
+        dias = defaultdict(int)
+        for m in ultimas:
+            dias[_dia(m["data_vencimento"]).day] += 1
+        resultado.append({"origem": "faturamento", "dias": max(dias, key=dias.get), "quantidade": len(ultimas),
+                          "valor": sum(m["valor"] for m in ultimas), "referencia": referencia})
+    return resultado
+
+
+PEDIDO_ABERTO = ("solicitado", "em_cotacao")
+
+
+def _chave_item(item: str) -> str:
+    return " ".join(item.lower().split())
+
+
+def _resumo_precos(grupo: list[tuple]) -> dict:
+    """Uma linha de historico_precos_fornecedores: grupo = [(proposta, preço, menor do pedido, propostas)]."""
+    relativos = [v / menor for _, v, menor, n in grupo if n > 1 and menor]
+    prazos = [p["prazo_entrega"] for p, *_ in grupo if p.get("prazo_entrega") is not None]
+    return {
+        "cotacoes": len(grupo),
+        "vencedoras": sum(bool(p.get("selecionada")) for p, *_ in grupo),
+        "preco_relativo_medio": round(sum(relativos) / len(relativos), 4) if relativos else None,
+        "prazo_medio": round(sum(prazos) / len(prazos), 1) if prazos else None,
+        "ultima_cotacao": max(str(p["created_at"]) for p, *_ in grupo),
+    }
+
+
+def atualizar_historico_precos(db: FakeDB, params: dict) -> list[dict]:
+    intervalo = int(params.get("p_intervalo_segundos", 0))
+    agora = datetime.now()
+    atual = db.linhas("historico_precos_fornecedores")
+    if atual and datetime.fromisoformat(atual[0]["atualizado_em"]) > agora - timedelta(seconds=intervalo):
+        return [{"atualizado_em": atual[0]["atualizado_em"], "linhas": len(atual), "recalculado": False}]
+
+    fechados = {s["id"] for s in db.linhas("solicitacoes_compra") if s["status"] not in PEDIDO_ABERTO}
+    cotacoes = {c["id"]: c for c in db.linhas("cotacoes") if c["solicitacao_id"] in fechados}
+    por_pedido = defaultdict(list)
+    for c in cotacoes.values():
+        por_pedido[c["solicitacao_id"]].append(c)
+    por_pedido_item = defaultdict(list)
+    for i in db.linhas("cotacao_itens"):
+        c = cotacoes.get(i["cotacao_id"])
+        if c:
+            por_pedido_item[(c["solicitacao_id"], _chave_item(i["item"]))].append((c, i))
+
+    grupos = defaultdict(list)
+    for propostas in por_pedido.values():
+        menor = min(c["valor"] for c in propostas)
+        for c in propostas:
+            grupos[(c["fornecedor_id"], "")].append((c, c["valor"], menor, len(propostas)))
+    for (_, chave), linhas in por_pedido_item.items():
+        menor = min(i["valor_unitario"] for _, i in linhas)
+        for c, i in linhas:
+            grupos[(c["fornecedor_id"], chave)].append((c, i["valor_unitario"], menor, len(linhas)))
+
+    resumo = []
+    for (fornecedor_id, chave), grupo in grupos.items():
+        linha = {"fornecedor_id": fornecedor_id, "item": chave, **_resumo_precos(grupo),
+                 "valor_unitario_medio": None, "valor_unitario_minimo": None, "valor_unitario_maximo": None,
+                 "ultimo_valor_unitario": None, "atualizado_em": agora.isoformat()}
+        if chave:
+            valores = [v for _, v, *_ in grupo]
+            linha.update(valor_unitario_medio=round(sum(valores) / len(valores), 2),
+                         valor_unitario_minimo=min(valores), valor_unitario_maximo=max(valores),
+                         ultimo_valor_unitario=max(grupo, key=lambda g: str(g[0]["created_at"]))[1])
+        resumo.append(linha)
+    with db._lock:
+        db.tabelas["historico_precos_fornecedores"] = []
+        db._invalidar("historico_precos_fornecedores")
+    db.carregar("historico_precos_fornecedores", resumo)
+    return [{"atualizado_em": agora.isoformat(), "linhas": len(resumo), "recalculado": True}]
+
+
+def cotacoes_para_comparacao(db: FakeDB, params: dict) -> list[dict]:
+    ids, limite = params.get("p_pedidos"), params.get("p_limite", 20)
+    if ids is None:
+        pedidos = sorted((s for s in db.linhas("solicitacoes_compra") if s["status"] in PEDIDO_ABERTO),
+                         key=lambda s: s["numero"])[:limite]
+    else:
+        pedidos = sorted((s for s in db.linhas("solicitacoes_compra") if s["id"] in set(ids)),
+                         key=lambda s: s["numero"])
+    historico = {(h["fornecedor_id"], h["item"]): {k: v for k, v in h.items()
+                                                   if k not in ("fornecedor_id", "item", "atualizado_em")}
+                 for h in db.linhas("historico_precos_fornecedores")}
+    itens = db.indice("cotacao_itens", "cotacao_id")
+    cotacoes = db.indice("cotacoes", "solicitacao_id")
+
+    resultado = []
+    for s in pedidos:
+        for c in cotacoes.get(s["id"], []):
+            f = db.por_id("fornecedores", c["fornecedor_id"]) or {}
+            resultado.append({
+                "origem": "cotacoes", "pedido_id": s["id"], "pedido_numero": s["numero"],
+                "pedido_descricao": s["descricao"], "pedido_status": s["status"],
+                "valor_estimado": s.get("valor_estimado"), "cotacao_id": c["id"], "fornecedor_id": c["fornecedor_id"],
+                "fornecedor": f.get("nome_fantasia") or f.get("razao_social"), "valor": c["valor"],
+                "prazo_entrega": c.get("prazo_entrega"), "condicao_pagamento": c.get("condicao_pagamento"),
+                "validade_proposta": c.get("validade_proposta"), "selecionada": bool(c.get("selecionada")),
+                "itens": [{"item": i["item"], "chave": _chave_item(i["item"]), "quantidade": i["quantidade"],
+                           "unidade": i.get("unidade"), "valor_unitario": i["valor_unitario"],
+                           "historico": historico.get((c["fornecedor_id"], _chave_item(i["item"])))}
+                          for i in sorted(itens.get(c["id"], []), key=lambda i: i["item"])] or None,
+                "historico": historico.get((c["fornecedor_id"], "")),
+            })
+    return resultado
+
+
+RPCS = {
+    "relatorio_receita_mensal": relatorio_receita_mensal,
+    "relatorio_entradas_por_local": relatorio_entradas_por_local,
+    "relatorio_inadimplencia_por_plano": relatorio_inadimplencia_por_plano,
+    "relatorio_frequencia_associados": relatorio_frequencia_associados,
+    "buscar_texto_mensagens": buscar_texto_mensagens,
+    "arquivar_registros_acesso": arquivar_registros_acesso,
+    "buscar_registros_arquivados": buscar_registros_arquivados,
+    "convites_disponiveis_mes": convites_disponiveis_mes,
+    "emitir_convites": emitir_convites,
+    "distribuicao_atrasos": distribuicao_atrasos,
+    "titulos_em_aberto": titulos_em_aberto,
+    "atualizar_historico_precos": atualizar_historico_precos,
+    "cotacoes_para_comparacao": cotacoes_para_comparacao,
+}
+
+
+def registrar(db: FakeDB) -> None:
+    """Registra todas as RPCs conhecidas no FakeDB."""
+    db.rpcs.update(RPCS)
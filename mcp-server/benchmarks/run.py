@@ -0,0 +1,166 @@
+"""
+Benchmark - Suíte completa de tools
+===================================
+Gera um clube sintético (1k/10k/100k associados), carrega no PostgREST falso
+em memória e executa cada tool sob carga concorrente. O relatório (latência
+p50/p95/p99, vazão, erros, round-trips) é salvo em JSON para comparação entre
+commits com `python -m benchmarks.comparar`.
+
+Uso:
+    python -m benchmarks.run --tamanho 10k --iteracoes 100 --concorrencia 8 --latencia-ms 5
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+
+import httpx
+
+from benchmarks.cenarios import CENARIOS, Contexto, preparar_arquivos
+from benchmarks.dados import TAMANHOS, gerar_clube
+from benchmarks.standin import carregar, conectar
+
+DIR_RESULTADOS = os.path.join(os.path.dirname(__file__), "resultados")
+
+
+def _commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(__file__), text=True,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "desconhecido"
+
+
+def _percentil(ordenadas: list[float], p: float) -> float:
+    if not ordenadas:
+        return 0.0
+    return round(ordenadas[min(len(ordenadas) - 1, int(round(p / 100 * (len(ordenadas) - 1))))], 2)
+
+
+async def _medir_tool(server, nome: str, ctx: Contexto, iteracoes: int, concorrencia: int) -> dict:
+    fn = getattr(server, nome)
+    cenario = CENARIOS[nome]
+    semaforo = asyncio.Semaphore(concorrencia)
+    latencias: list[float] = []
+    erros = 0
+
+    async def chamar(i: int):
+        nonlocal erros
+        async with semaforo:
+            inicio = time.perf_counter()
+            resposta = await fn(**cenario(ctx, i))
+            latencias.append((time.perf_counter() - inicio) * 1000)
+            erros += resposta.startswith("❌")
+
+    server._metricas_tools.clear()
+    server._micro_cache.limpar()
+    server.cache_sql.limpar()
+    inicio = time.perf_counter()
+    await asyncio.gather(*(chamar(i) for i in range(iteracoes)))
+    total = time.perf_counter() - inicio
+
+    ordenadas = sorted(latencias)
+    metricas = server.resumo_metricas().get(nome, {})
+    return {
+        "chamadas": iteracoes,
+        "erros": erros,
+        "p50_ms": _percentil(ordenadas, 50),
+        "p95_ms": _percentil(ordenadas, 95),
+        "p99_ms": _percentil(ordenadas, 99),
+        "max_ms": round(ordenadas[-1], 2) if ordenadas else 0,
+        "chamadas_por_segundo": round(iteracoes / total, 1) if total else 0,
+        "roundtrips_por_chamada": metricas.get("roundtrips_por_chamada", 0),
+    }
+
+
+async def executar(args) -> dict:
+    associados = TAMANHOS[args.tamanho]
+    inicio = time.perf_counter()
+    dados = gerar_clube(associados, meses=args.meses, acessos_por_associado=args.acessos, semente=args.semente)
+    db = carregar(dados)
+    geracao = time.perf_counter() - inicio
+
+    server, transporte = conectar(db, args.latencia_ms)
+    logging.getLogger("sistema-clube-mcp").setLevel(logging.CRITICAL)
+    server.http_client = httpx.AsyncClient(
+        base_url="http://next.local",
+        transport=httpx.MockTransport(lambda request: httpx.Response(200, json={"success": True})),
+    )
+
+    server.EXPORT_DIR = tempfile.mkdtemp(prefix="bench-exportacao-")
+    server.IMPORT_DIR = server.EXPORT_DIR
+
+    ctx = Contexto(dados)
+    preparar_arquivos(server.IMPORT_DIR, ctx)
+    nomes = sorted(t.name for t in await server.mcp.list_tools())
+    if args.tools:
+        nomes = [n for n in nomes if n in args.tools.split(",")]
+
+    relatorio = {
+        "meta": {
+            "commit": _commit(),
+            "data": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "tamanho": args.tamanho,
+            "linhas": {t: len(v) for t, v in dados.items()},
+            "geracao_segundos": round(geracao, 2),
+            "latencia_ms": args.latencia_ms,
+            "iteracoes": args.iteracoes,
+            "concorrencia": args.concorrencia,
+            "semente": args.semente,
+        },
+        "tools": {},
+        "sem_cenario": [],
+    }
+
+    for nome in nomes:
+        if nome not in CENARIOS:
+            relatorio["sem_cenario"].append(nome)
+            continue
+        relatorio["tools"][nome] = await _medir_tool(server, nome, ctx, args.iteracoes, args.concorrencia)
+        r = relatorio["tools"][nome]
+        print(f"{nome:32s} p50={r['p50_ms']:>9.2f}ms p95={r['p95_ms']:>9.2f}ms "
+              f"{r['chamadas_por_segundo']:>8.1f}/s rt={r['roundtrips_por_chamada']:>6.2f} erros={r['erros']}")
+
+    relatorio["meta"]["requisicoes_postgrest"] = transporte.requisicoes
+    return relatorio
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tamanho", choices=list(TAMANHOS), default="1k")
+    parser.add_argument("--iteracoes", type=int, default=50, help="Chamadas por tool")
+    parser.add_argument("--concorrencia", type=int, default=8)
+    parser.add_argument("--latencia-ms", type=float, default=5.0, help="Latência simulada por requisição")
+    parser.add_argument("--meses", type=int, default=6, help="Meses de mensalidades por associado")
+    parser.add_argument("--acessos", type=int, default=3, help="Registros de acesso por associado")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--tools", help="Lista de tools separadas por vírgula (padrão: todas)")
+    parser.add_argument("--saida", help="Arquivo JSON do relatório (padrão: benchmarks/resultados/)")
+    args = parser.parse_args()
+
+    relatorio = asyncio.run(executar(args))
+
+    saida = args.saida
+    if not saida:
+        os.makedirs(DIR_RESULTADOS, exist_ok=True)
+        carimbo = datetime.now().strftime("%Y%m%d-%H%M%S")
+        saida = os.path.join(DIR_RESULTADOS, f"{args.tamanho}-{relatorio['meta']['commit']}-{carimbo}.json")
+    with open(saida, "w", encoding="utf-8") as f:
+        json.dump(relatorio, f, ensure_ascii=False, indent=2)
+
+    if relatorio["sem_cenario"]:
+        print(f"\n⚠️ Tools sem cenário: {', '.join(relatorio['sem_cenario'])}")
+    print(f"\n📄 Relatório salvo em {saida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Stand-in local do Supabase
+==========================
+Conecta o server.py a um FakeDB em memória através do cliente supabase real,
+trocando apenas o transporte HTTP. Nenhuma requisição sai da máquina.
+"""
+
+import logging
+import os
+import sys
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("SUPABASE_URL", "http://supabase.local")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "bench.bench.bench")
+
+from benchmarks import rpcs  # noqa: E402
+from benchmarks.fake_postgrest import FakeDB, FakePostgrest  # noqa: E402
+
+
+def conectar(db: FakeDB, latencia_ms: float = 0.0):
+    """Importa o server.py e aponta seu cliente supabase para o FakeDB.
+
+    Args:
+        db: Banco em memória já carregado
+        latencia_ms: Latência simulada por requisição ao PostgREST
+
+    Returns:
+        (módulo server, transporte) — o transporte expõe o total de requisições.
+    """
+    from supabase import ClientOptions, create_client
+
+    import server
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    transporte = FakePostgrest(db, latencia_ms)
+    client = create_client(
+        os.environ["SUPABASE_URL"],
+        os.environ["SUPABASE_SERVICE_ROLE_KEY"],
+        options=ClientOptions(httpx_client=httpx.Client(transport=transporte)),
+    )
+    server.instalar_hooks_supabase(client)
+    server.supabase = client
+    return server, transporte
+
+
+def carregar(tabelas: dict[str, list[dict]]) -> FakeDB:
+    """Cria um FakeDB com as tabelas geradas e as RPCs do banco."""
+    db = FakeDB()
+    for nome, linhas in tabelas.items():
+        db.carregar(nome, linhas)
+    rpcs.registrar(db)
+    return db
@@ -8,13 +8,39 @@ Conexão híbrida: Supabase direto + APIs Next.js
 """
 
 import os
+import re
+import base64
+import csv
+import sys
 import json
+import time
+import asyncio
+import inspect
 import logging
-from datetime import datetime, date
-from typing import Any, Optional
+import functools
+import sqlite3
+import string
+import hashlib
+import secrets
+import shutil
+import signal
+import socket
+import multiprocessing
+import tempfile
+import unicodedata
+import uuid
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+import contextlib
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from datetime import datetime, date, timedelta, timezone
+from decimal import Decimal
+from typing import Any, AsyncIterator, Callable, Iterator, Optional
 
 from dotenv import load_dotenv
 from mcp.server.fastmcp import FastMCP
+from postgrest import APIError
 from supabase import create_client, Client
 import httpx
 
@@ -26,17 +52,252 @@ SUPABASE_URL = os.getenv("SUPABASE_URL", "")
 SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY", "")
 CLUBE_API_URL = os.getenv("CLUBE_API_URL", "https://clube.mindforge.dev.br")
 
+# Pool HTTP da API Next.js
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "50"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "50"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "30"))
+HTTP_POOL_TIMEOUT = float(os.getenv("HTTP_POOL_TIMEOUT", "10"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "false").lower() in ("1", "true", "sim")
+
+# Coalescência de leituras (single-flight + micro-cache)
+COALESCE_TTL = float(os.getenv("COALESCE_TTL", "2"))
+COALESCE_MAX = int(os.getenv("COALESCE_MAX", "512"))
+
+# Métricas por tool
+METRICS_AMOSTRAS = int(os.getenv("METRICS_AMOSTRAS", "1024"))
+METRICS_PROMETHEUS = os.getenv("METRICS_PROMETHEUS", "false").lower() in ("1", "true", "sim")
+
+# Limites da consulta_sql
+SQL_MAX_LINHAS = int(os.getenv("SQL_MAX_LINHAS", "1000"))
+SQL_TIMEOUT_MS = int(os.getenv("SQL_TIMEOUT_MS", "5000"))
+SQL_CUSTO_MAXIMO = float(os.getenv("SQL_CUSTO_MAXIMO", "100000"))
+
+# Cache de resultados da consulta_sql e dos relatórios
+SQL_CACHE_TTL = float(os.getenv("SQL_CACHE_TTL", "60"))
+SQL_CACHE_MAX = int(os.getenv("SQL_CACHE_MAX", "256"))
+
+# Conexão direta ao Postgres para leituras pesadas (opcional, requer asyncpg)
+DATABASE_URL = os.getenv("DATABASE_URL", "")
+PG_POOL_MIN = int(os.getenv("PG_POOL_MIN", "1"))
+PG_POOL_MAX = int(os.getenv("PG_POOL_MAX", "10"))
+PG_STATEMENT_CACHE = int(os.getenv("PG_STATEMENT_CACHE", "100"))
+
+# Importação em lote de associados (importar_associados)
+IMPORT_DIR = os.getenv("IMPORT_DIR", "imports")
+IMPORT_LOTE = int(os.getenv("IMPORT_LOTE", "500"))
+
+# Exportação de dados (exportar_dados)
+EXPORT_DIR = os.getenv("EXPORT_DIR", "exports")
+EXPORT_BUCKET = os.getenv("EXPORT_BUCKET", "exportacoes")
+EXPORT_PAGINA = int(os.getenv("EXPORT_PAGINA", "1000"))
+
+# max-rows padrão do PostgREST no Supabase: uma página maior volta cortada em silêncio
+POSTGREST_MAX_LINHAS = 1000
+
+# Envio de WhatsApp em massa (notificar_exames_vencendo)
+WHATSAPP_TAXA_MINUTO = float(os.getenv("WHATSAPP_TAXA_MINUTO", "60"))
+WHATSAPP_CONCORRENCIA = int(os.getenv("WHATSAPP_CONCORRENCIA", "4"))
+
+# Worker da fila_whatsapp (database/028): envia em segundo plano o que foi gravado na fila
+WHATSAPP_FILA_WORKER = os.getenv("WHATSAPP_FILA_WORKER", "false").lower() in ("1", "true", "sim")
+WHATSAPP_FILA_LOTE = int(os.getenv("WHATSAPP_FILA_LOTE", "50"))
+WHATSAPP_FILA_INTERVALO = float(os.getenv("WHATSAPP_FILA_INTERVALO", "5"))
+WHATSAPP_FILA_RESERVA_S = int(os.getenv("WHATSAPP_FILA_RESERVA_S", "300"))
+WHATSAPP_FILA_TENTATIVAS = int(os.getenv("WHATSAPP_FILA_TENTATIVAS", "3"))
+WHATSAPP_FILA_ESPERA_S = int(os.getenv("WHATSAPP_FILA_ESPERA_S", "60"))
+# Envios por minuto por tipo de provider, ex.: "wasender=20,meta=600" (os demais: WHATSAPP_TAXA_MINUTO)
+WHATSAPP_FILA_TAXAS = os.getenv("WHATSAPP_FILA_TAXAS", "")
+
+# Portaria offline: réplica SQLite para validar e registrar acessos sem o Supabase
+PORTARIA_OFFLINE = os.getenv("PORTARIA_OFFLINE", "false").lower() in ("1", "true", "sim")
+PORTARIA_REPLICA = os.getenv("PORTARIA_REPLICA", "portaria.sqlite3")
+PORTARIA_SYNC_SEGUNDOS = float(os.getenv("PORTARIA_SYNC_SEGUNDOS", "120"))
+PORTARIA_TIMEOUT = float(os.getenv("PORTARIA_TIMEOUT", "3"))
+PORTARIA_PAUSA_REMOTO = float(os.getenv("PORTARIA_PAUSA_REMOTO", "30"))
+
+# Gravação em lote dos acessos (write-behind): ACESSO_LOTE_MS=0 desativa
+ACESSO_LOTE_MS = float(os.getenv("ACESSO_LOTE_MS", "0"))
+ACESSO_LOTE_MAX = int(os.getenv("ACESSO_LOTE_MAX", "100"))
+ACESSO_SPOOL = os.getenv("ACESSO_SPOOL", "")
+# Teto da fila em memória enquanto o Supabase não responde
+ACESSO_FILA_MAX = int(os.getenv("ACESSO_FILA_MAX", "50000"))
+
+# Arquivo de registros_acesso (database/025): meses mantidos na tabela
+REGISTROS_RETENCAO_MESES = int(os.getenv("REGISTROS_RETENCAO_MESES", "12"))
+
+# Emissão de carteirinhas em lote (emitir_carteirinhas_lote)
+CARTEIRINHA_DIR = os.getenv("CARTEIRINHA_DIR", "carteirinhas")
+CARTEIRINHA_BUCKET = os.getenv("CARTEIRINHA_BUCKET", "carteirinhas")
+CARTEIRINHA_VALIDADE_DIAS = int(os.getenv("CARTEIRINHA_VALIDADE_DIAS", "730"))
+CARTEIRINHA_PROCESSOS = int(os.getenv("CARTEIRINHA_PROCESSOS", "0"))  # 0 = um por CPU
+CARTEIRINHA_UPLOADS = int(os.getenv("CARTEIRINHA_UPLOADS", "8"))
+CARTEIRINHA_FONTE = os.getenv("CARTEIRINHA_FONTE", "DejaVuSans.ttf")  # TTF com acentos; sem ela, a fonte embutida do Pillow
+
+# Convites (database/027): intervalo mínimo entre atualizações do índice de convites válidos
+CONVITES_ATUALIZAR_S = float(os.getenv("CONVITES_ATUALIZAR_S", "30"))
+
+# Projeção de fluxo de caixa (database/029): pagamentos com mais atraso que isso contam como não recebidos
+FLUXO_CAIXA_ATRASO_MAX_DIAS = int(os.getenv("FLUXO_CAIXA_ATRASO_MAX_DIAS", "180"))
+FLUXO_CAIXA_HISTORICO_TTL = float(os.getenv("FLUXO_CAIXA_HISTORICO_TTL", "3600"))
+
+# Risco de inadimplência: notas recalculadas quando mensalidades ou associados mudam (no máximo a cada TTL)
+RISCO_INADIMPLENCIA_TTL = float(os.getenv("RISCO_INADIMPLENCIA_TTL", "86400"))
+RISCO_INADIMPLENCIA_LOTE = int(os.getenv("RISCO_INADIMPLENCIA_LOTE", "50000"))
+
+# Comparação de cotações (database/031): intervalo mínimo entre recálculos do histórico de preços
+COTACOES_HISTORICO_INTERVALO_S = int(os.getenv("COTACOES_HISTORICO_INTERVALO_S", "3600"))
+
+# Tracing das consultas ao PostgREST
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "500"))
+SLOW_QUERY_LOG = os.getenv("SLOW_QUERY_LOG", "")
+OTEL_TRACES = os.getenv("OTEL_TRACES", "").lower()  # "", "otlp" ou "arquivo"
+OTEL_TRACES_ARQUIVO = os.getenv("OTEL_TRACES_ARQUIVO", "traces.jsonl")
+
 if not SUPABASE_URL or not SUPABASE_KEY:
     raise ValueError("SUPABASE_URL e SUPABASE_SERVICE_ROLE_KEY são obrigatórios no .env")
 
+logger = logging.getLogger("sistema-clube-mcp")
+
 # Clientes
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-http_client = httpx.AsyncClient(base_url=CLUBE_API_URL, timeout=30.0)
+http_client: Optional[httpx.AsyncClient] = None
+pg_pool: Any = None  # asyncpg.Pool quando DATABASE_URL está configurada
+_sessoes_ativas = 0
+
+
+def criar_http_client() -> httpx.AsyncClient:
+    """Cria o cliente HTTP da API Next.js com pool e timeouts configuráveis."""
+    http2 = HTTP2_ENABLED
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logger.warning("HTTP2_ENABLED=true mas o pacote 'h2' não está instalado; usando HTTP/1.1")
+            http2 = False
+
+    return httpx.AsyncClient(
+        base_url=CLUBE_API_URL,
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(
+            HTTP_READ_TIMEOUT,
+            connect=HTTP_CONNECT_TIMEOUT,
+            pool=HTTP_POOL_TIMEOUT,
+        ),
+    )
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Retorna o cliente HTTP compartilhado, abrindo-o se necessário."""
+    global http_client
+    if http_client is None or http_client.is_closed:
+        http_client = criar_http_client()
+    return http_client
+
+
+async def fechar_http_client() -> None:
+    """Fecha o cliente HTTP compartilhado e libera as conexões do pool."""
+    global http_client
+    if http_client is not None and not http_client.is_closed:
+        await http_client.aclose()
+    http_client = None
+
+
+async def _configurar_conexao_pg(conn: Any) -> None:
+    for tipo in ("json", "jsonb"):
+        await conn.set_type_codec(tipo, encoder=json.dumps, decoder=json.loads, schema="pg_catalog")
+
+
+async def abrir_pg_pool() -> Any:
+    """Abre o pool asyncpg usado pelas leituras pesadas, se DATABASE_URL estiver configurada.
+
+    Sem DATABASE_URL (ou sem o pacote asyncpg) retorna None e as tools
+    continuam usando o PostgREST.
+    """
+    global pg_pool
+    if pg_pool is not None or not DATABASE_URL:
+        return pg_pool
+    try:
+        import asyncpg
+    except ImportError:
+        logger.warning("DATABASE_URL definida mas o pacote 'asyncpg' não está instalado; usando PostgREST")
+        return None
+
+    pg_pool = await asyncpg.create_pool(
+        DATABASE_URL,
+        min_size=PG_POOL_MIN,
+        max_size=PG_POOL_MAX,
+        statement_cache_size=PG_STATEMENT_CACHE,
+        command_timeout=HTTP_READ_TIMEOUT,
+        init=_configurar_conexao_pg,
+    )
+    return pg_pool
+
+
+async def fechar_pg_pool() -> None:
+    """Fecha o pool asyncpg, se aberto."""
+    global pg_pool
+    if pg_pool is not None:
+        await pg_pool.close()
+    pg_pool = None
+
+
+@asynccontextmanager
+async def lifespan(server: FastMCP) -> AsyncIterator[dict]:
+    """Abre os recursos compartilhados no startup e fecha no shutdown.
+
+    No transporte SSE o lifespan roda por sessão, então os recursos só são
+    fechados quando a última sessão ativa termina.
+    """
+    global _sessoes_ativas
+    _sessoes_ativas += 1
+    get_http_client()
+    try:
+        await abrir_pg_pool()
+        if replica_portaria is not None:
+            replica_portaria.iniciar()
+        if fila_acessos is not None:
+            fila_acessos.iniciar()
+        if remetente_fila_whatsapp is not None:
+            remetente_fila_whatsapp.iniciar()
+        yield {}
+    finally:
+        _sessoes_ativas -= 1
+        if _sessoes_ativas == 0:
+            if remetente_fila_whatsapp is not None:
+                await remetente_fila_whatsapp.parar()
+            if fila_acessos is not None:
+                await fila_acessos.parar()
+            if replica_portaria is not None:
+                await replica_portaria.parar()
+            await fechar_http_client()
+            await fechar_pg_pool()
+
+
+class ClubeMCP(FastMCP):
+    """FastMCP que instrumenta automaticamente toda função registrada com @mcp.tool()."""
+
+    def tool(self, *args, **kwargs):
+        registrar = super().tool(*args, **kwargs)
+
+        def decorator(fn):
+            return registrar(instrumentar(fn))
+        return decorator
 
-# Criar servidor MCP
-mcp = FastMCP("Sistema Clube")
 
-logger = logging.getLogger("sistema-clube-mcp")
+# Criar servidor MCP
+mcp = ClubeMCP(
+    "Sistema Clube",
+    lifespan=lifespan,
+    host=os.getenv("MCP_HOST", "127.0.0.1"),
+    port=int(os.getenv("MCP_PORT", "8000")),
+)
 
 
 # ============================================================
@@ -48,6 +309,8 @@ def serialize(data: Any) -> str:
     def default(obj):
         if isinstance(obj, (datetime, date)):
             return obj.isoformat()
+        if isinstance(obj, Decimal):
+            return float(obj)
         return str(obj)
     return json.dumps(data, default=default, ensure_ascii=False, indent=2)
 
@@ -57,6 +320,17 @@ def format_cpf(cpf: str) -> str:
     return cpf.replace(".", "").replace("-", "").replace(" ", "")
 
 
+def validar_cpf(cpf: str) -> bool:
+    """Confere os dígitos verificadores de um CPF já sem pontuação."""
+    if len(cpf) != 11 or not cpf.isdigit() or cpf == cpf[0] * 11:
+        return False
+    for n in (9, 10):
+        soma = sum(int(cpf[i]) * (n + 1 - i) for i in range(n))
+        if (soma * 10 % 11) % 10 != int(cpf[n]):
+            return False
+    return True
+
+
 def ok(data: Any, msg: str = "") -> str:
     """Retorna resposta de sucesso."""
     if msg:
@@ -65,10 +339,570 @@ def ok(data: Any, msg: str = "") -> str:
 
 
 def err(msg: str) -> str:
-    """Retorna resposta de erro."""
+    """Retorna resposta de erro (e registra no log, com traceback se houver exceção ativa)."""
+    logger.error(msg, exc_info=sys.exc_info()[1] is not None)
     return f"❌ Erro: {msg}"
 
 
+async def executar(query: Any) -> Any:
+    """Executa uma query do supabase em thread, sem bloquear o event loop."""
+    return await asyncio.to_thread(query.execute)
+
+
+def codificar_cursor(*valores: Any) -> str:
+    """Cursor opaco (base64 de uma lista JSON) com os valores da última linha devolvida."""
+    return base64.urlsafe_b64encode(json.dumps(valores, default=str).encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor: str) -> list:
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        raise ValueError("cursor inválido") from None
+
+
+def apos_cursor(query: Any, coluna: str, cursor: str) -> Any:
+    """Filtra as linhas depois do cursor numa listagem ordenada por (coluna DESC, id DESC).
+
+    O `lte` separado deixa o Postgres posicionar o índice (coluna, id) direto
+    no cursor; o `or` só desempata linhas com o mesmo valor na coluna.
+    """
+    valor, ultimo_id = decodificar_cursor(cursor)
+    return query.lte(coluna, valor).or_(f'{coluna}.lt."{valor}",id.lt.{ultimo_id}')
+
+
+def paginar_keyset(montar: Callable[[], Any], tamanho: int = EXPORT_PAGINA) -> Iterator[list[dict]]:
+    """Percorre uma consulta por keyset (id > último id), uma página por vez.
+
+    `montar` devolve a query já filtrada; ordenação e limite são aplicados aqui.
+    O tamanho fica entre 1 e POSTGREST_MAX_LINHAS: acima disso o PostgREST
+    devolveria uma página curta e a paginação pararia antes do fim.
+    Roda de forma síncrona: use dentro de `asyncio.to_thread`.
+    """
+    tamanho = max(1, min(tamanho, POSTGREST_MAX_LINHAS))
+    ultimo_id = None
+    while True:
+        query = montar().order("id").limit(tamanho)
+        if ultimo_id is not None:
+            query = query.gt("id", ultimo_id)
+        pagina = query.execute().data or []
+        if not pagina:
+            return
+        yield pagina
+        if len(pagina) < tamanho:
+            return
+        ultimo_id = pagina[-1]["id"]
+
+
+async def consultar_pg(descricao: str, sql: str, *args) -> list:
+    """Executa uma leitura direto no Postgres pelo pool asyncpg (protocolo binário).
+
+    Só deve ser chamada com `pg_pool` aberto; a consulta entra nas métricas
+    de round-trips e no slow-query log como as do PostgREST.
+    """
+    inicio, inicio_ns = time.perf_counter(), time.time_ns()
+    async with pg_pool.acquire() as conn:
+        linhas = await conn.fetch(sql, *args)
+    registrar_consulta_pg(descricao, inicio, inicio_ns, len(linhas))
+    return linhas
+
+
+# ============================================================
+# INSTRUMENTAÇÃO (latência, erros e round-trips por tool)
+# ============================================================
+
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+INICIO_SERVIDOR = time.time()
+
+_roundtrips: ContextVar[Optional[list]] = ContextVar("roundtrips", default=None)
+_tool_atual: ContextVar[Optional[str]] = ContextVar("tool_atual", default=None)
+_metricas_tools: dict[str, dict] = {}
+
+
+def _nova_metrica() -> dict:
+    return {
+        "chamadas": 0,
+        "erros": 0,
+        "roundtrips": 0,
+        "soma_ms": 0.0,
+        "buckets": [0] * len(BUCKETS_MS),
+        "amostras": deque(maxlen=METRICS_AMOSTRAS),
+    }
+
+
+def contar_roundtrip(*_args) -> None:
+    """Conta um round-trip ao Supabase na tool em execução (hook de request do httpx)."""
+    contador = _roundtrips.get()
+    if contador is not None:
+        contador[0] += 1
+
+
+def instalar_hooks_supabase(client: Client) -> None:
+    """Registra os hooks de instrumentação e tracing na sessão HTTP do PostgREST."""
+    hooks = client.postgrest.session.event_hooks
+    hooks["request"] += [contar_roundtrip, _trace_inicio]
+    hooks["response"].append(_trace_fim)
+
+
+def instrumentar(fn):
+    """Mede latência, erros e round-trips ao Supabase de uma tool.
+
+    Respostas que começam com "❌" (geradas por `err`) contam como erro.
+    """
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        contador = [0]
+        token = _roundtrips.set(contador)
+        token_tool = _tool_atual.set(fn.__name__)
+        span = _tracer.start_as_current_span(f"tool {fn.__name__}") if _tracer else contextlib.nullcontext()
+        inicio = time.perf_counter()
+        erro = True
+        try:
+            with span:
+                resultado = await fn(*args, **kwargs)
+            erro = isinstance(resultado, str) and resultado.startswith("❌")
+            return resultado
+        finally:
+            _roundtrips.reset(token)
+            _tool_atual.reset(token_tool)
+            ms = (time.perf_counter() - inicio) * 1000
+            m = _metricas_tools.setdefault(fn.__name__, _nova_metrica())
+            m["chamadas"] += 1
+            m["erros"] += int(erro)
+            m["roundtrips"] += contador[0]
+            m["soma_ms"] += ms
+            m["amostras"].append(ms)
+            for i, limite in enumerate(BUCKETS_MS):
+                if ms <= limite:
+                    m["buckets"][i] += 1
+                    break
+            if erro:
+                logger.warning("tool %s falhou em %.1f ms", fn.__name__, ms)
+            else:
+                logger.debug("tool %s: %.1f ms, %d round-trip(s)", fn.__name__, ms, contador[0])
+    return wrapper
+
+
+def _percentil(ordenadas: list, p: float) -> float:
+    if not ordenadas:
+        return 0.0
+    idx = min(len(ordenadas) - 1, int(round(p / 100 * (len(ordenadas) - 1))))
+    return round(ordenadas[idx], 2)
+
+
+def resumo_metricas() -> dict:
+    """Resumo das métricas por tool, da mais lenta (p95) para a mais rápida."""
+    tools = {}
+    for nome, m in _metricas_tools.items():
+        ordenadas = sorted(m["amostras"])
+        tools[nome] = {
+            "chamadas": m["chamadas"],
+            "erros": m["erros"],
+            "media_ms": round(m["soma_ms"] / m["chamadas"], 2) if m["chamadas"] else 0,
+            "p50_ms": _percentil(ordenadas, 50),
+            "p95_ms": _percentil(ordenadas, 95),
+            "p99_ms": _percentil(ordenadas, 99),
+            "roundtrips_por_chamada": round(m["roundtrips"] / m["chamadas"], 2) if m["chamadas"] else 0,
+        }
+    return dict(sorted(tools.items(), key=lambda t: t[1]["p95_ms"], reverse=True))
+
+
+def metricas_prometheus() -> str:
+    """Exporta as métricas por tool no formato texto do Prometheus."""
+    linhas = [
+        "# HELP clube_mcp_tool_chamadas_total Chamadas por tool",
+        "# TYPE clube_mcp_tool_chamadas_total counter",
+    ]
+    for nome, m in _metricas_tools.items():
+        linhas.append(f'clube_mcp_tool_chamadas_total{{tool="{nome}"}} {m["chamadas"]}')
+    linhas += [
+        "# HELP clube_mcp_tool_erros_total Chamadas que retornaram erro",
+        "# TYPE clube_mcp_tool_erros_total counter",
+    ]
+    for nome, m in _metricas_tools.items():
+        linhas.append(f'clube_mcp_tool_erros_total{{tool="{nome}"}} {m["erros"]}')
+    linhas += [
+        "# HELP clube_mcp_supabase_roundtrips_total Requisições ao Supabase por tool",
+        "# TYPE clube_mcp_supabase_roundtrips_total counter",
+    ]
+    for nome, m in _metricas_tools.items():
+        linhas.append(f'clube_mcp_supabase_roundtrips_total{{tool="{nome}"}} {m["roundtrips"]}')
+    linhas += [
+        "# HELP clube_mcp_tool_latencia_ms Latência das tools em milissegundos",
+        "# TYPE clube_mcp_tool_latencia_ms histogram",
+    ]
+    for nome, m in _metricas_tools.items():
+        acumulado = 0
+        for limite, qtd in zip(BUCKETS_MS, m["buckets"]):
+            acumulado += qtd
+            linhas.append(f'clube_mcp_tool_latencia_ms_bucket{{tool="{nome}",le="{limite}"}} {acumulado}')
+        linhas.append(f'clube_mcp_tool_latencia_ms_bucket{{tool="{nome}",le="+Inf"}} {m["chamadas"]}')
+        linhas.append(f'clube_mcp_tool_latencia_ms_sum{{tool="{nome}"}} {m["soma_ms"]:.3f}')
+        linhas.append(f'clube_mcp_tool_latencia_ms_count{{tool="{nome}"}} {m["chamadas"]}')
+    cache = cache_sql.estatisticas()
+    linhas += [
+        "# HELP clube_mcp_cache_sql_total Consultas ao cache de resultados SQL/relatórios",
+        "# TYPE clube_mcp_cache_sql_total counter",
+        f'clube_mcp_cache_sql_total{{resultado="hit"}} {cache["hits"]}',
+        f'clube_mcp_cache_sql_total{{resultado="miss"}} {cache["misses"]}',
+        "# HELP clube_mcp_cache_sql_descartes_total Entradas descartadas por tamanho (LRU)",
+        "# TYPE clube_mcp_cache_sql_descartes_total counter",
+        f"clube_mcp_cache_sql_descartes_total {cache['descartes_lru']}",
+        "# HELP clube_mcp_cache_sql_entradas Entradas no cache",
+        "# TYPE clube_mcp_cache_sql_entradas gauge",
+        f"clube_mcp_cache_sql_entradas {cache['entradas']}",
+    ]
+    return "\n".join(linhas) + "\n"
+
+
+# ============================================================
+# TRACING DE CONSULTAS (PostgREST)
+# ============================================================
+
+slow_logger = logging.getLogger("sistema-clube-mcp.slow_query")
+consultas_lentas: deque = deque(maxlen=50)
+_PARAMS_NAO_FILTRO = {"select", "order", "limit", "offset", "columns", "on_conflict"}
+
+
+def _configurar_slow_log() -> None:
+    if SLOW_QUERY_LOG:
+        handler = logging.FileHandler(SLOW_QUERY_LOG, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        slow_logger.addHandler(handler)
+
+
+def _configurar_otel():
+    """Cria o tracer OpenTelemetry se OTEL_TRACES estiver definido e o SDK instalado."""
+    if not OTEL_TRACES:
+        return None
+    try:
+        from opentelemetry import trace
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+    except ImportError:
+        logger.warning("OTEL_TRACES definido mas o opentelemetry-sdk não está instalado; spans desativados")
+        return None
+
+    if OTEL_TRACES == "otlp":
+        try:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        except ImportError:
+            logger.warning("Exporter OTLP não instalado; spans desativados")
+            return None
+        exporter = OTLPSpanExporter()  # endpoint via OTEL_EXPORTER_OTLP_ENDPOINT
+    else:
+        arquivo = open(OTEL_TRACES_ARQUIVO, "a", encoding="utf-8")
+        exporter = ConsoleSpanExporter(out=arquivo, formatter=lambda span: span.to_json(indent=None) + "\n")
+
+    provider = TracerProvider(resource=Resource.create({"service.name": "sistema-clube-mcp"}))
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+    return trace.get_tracer("sistema-clube-mcp")
+
+
+# Operador PostgREST no início do filtro (eq., not.ilike.) e, dentro de or=(...), coluna.operador.valor
+_OPERADOR_FILTRO = re.compile(r"^(?:not\.)?[a-z]+\.")
+_CONDICAO_LOGICA = re.compile(r"(\w+\.(?:not\.)?[a-z]+\.)(?:\([^()]*\)|[^,()]+)")
+
+
+def _mascarar_filtro(coluna: str, valor: str) -> str:
+    """Troca o valor de um filtro por *** mantendo o operador (cpf=eq.123 -> eq.***).
+
+    Filtros carregam CPF, telefone e nome; o log e os spans só precisam
+    saber quais colunas e operadores a consulta usou.
+    """
+    if coluna in ("or", "and") or coluna.endswith((".or", ".and")):
+        return _CONDICAO_LOGICA.sub(r"\1***", valor)
+    operador = _OPERADOR_FILTRO.match(valor)
+    return (operador.group() if operador else "") + "***"
+
+
+def _descrever_request(request: httpx.Request) -> tuple[str, dict]:
+    """Extrai a tabela (ou rpc/<função>) e os filtros, com valores mascarados, de uma requisição PostgREST."""
+    caminho = request.url.path.split("/rest/v1/", 1)[-1].strip("/")
+    filtros = {
+        k: _mascarar_filtro(k, v)
+        for k, v in request.url.params.multi_items()
+        if k not in _PARAMS_NAO_FILTRO
+    }
+    return caminho or request.url.path, filtros
+
+
+def _contar_linhas(response: httpx.Response) -> Optional[int]:
+    """Conta as linhas retornadas pelo header Content-Range (ex: 0-24/310)."""
+    faixa = response.headers.get("content-range", "").split("/")[0]
+    if "-" not in faixa:
+        return 0 if faixa == "*" else None
+    inicio, fim = faixa.split("-", 1)
+    return int(fim) - int(inicio) + 1
+
+
+def _trace_inicio(request: httpx.Request) -> None:
+    request.extensions["clube_inicio"] = time.perf_counter()
+    request.extensions["clube_inicio_ns"] = time.time_ns()
+
+
+def _trace_fim(response: httpx.Response) -> None:
+    """Registra duração, linhas e bytes de cada requisição; loga as lentas e emite span."""
+    request = response.request
+    inicio = request.extensions.get("clube_inicio")
+    if inicio is None:
+        return
+    response.read()
+    ms = (time.perf_counter() - inicio) * 1000
+    tabela, filtros = _descrever_request(request)
+    registro = {
+        "tool": _tool_atual.get(),
+        "metodo": request.method,
+        "tabela": tabela,
+        "filtros": filtros,
+        "status": response.status_code,
+        "linhas": _contar_linhas(response),
+        "bytes": len(response.content),
+        "duracao_ms": round(ms, 2),
+    }
+
+    if ms >= SLOW_QUERY_MS:
+        registro["quando"] = datetime.now().isoformat()
+        consultas_lentas.append(registro)
+        slow_logger.warning(json.dumps(registro, ensure_ascii=False))
+
+    if _tracer:
+        span = _tracer.start_span(
+            f"postgrest {request.method} {tabela}",
+            start_time=request.extensions["clube_inicio_ns"],
+            attributes={
+                "db.system": "postgresql",
+                "db.sql.table": tabela,
+                "db.statement": json.dumps(filtros, ensure_ascii=False),
+                "http.method": request.method,
+                "http.status_code": response.status_code,
+                "clube.linhas": registro["linhas"] if registro["linhas"] is not None else -1,
+                "clube.bytes": registro["bytes"],
+            },
+        )
+        span.end()
+
+
+def registrar_consulta_pg(descricao: str, inicio: float, inicio_ns: int, linhas: int) -> None:
+    """Registra uma consulta feita pelo pool asyncpg (round-trip, slow log e span)."""
+    contar_roundtrip()
+    ms = (time.perf_counter() - inicio) * 1000
+    if ms >= SLOW_QUERY_MS:
+        registro = {
+            "tool": _tool_atual.get(),
+            "metodo": "SQL",
+            "tabela": descricao,
+            "filtros": {},
+            "status": None,
+            "linhas": linhas,
+            "bytes": None,
+            "duracao_ms": round(ms, 2),
+            "quando": datetime.now().isoformat(),
+        }
+        consultas_lentas.append(registro)
+        slow_logger.warning(json.dumps(registro, ensure_ascii=False))
+
+    if _tracer:
+        span = _tracer.start_span(
+            f"postgres {descricao}",
+            start_time=inicio_ns,
+            attributes={"db.system": "postgresql", "db.operation": descricao, "clube.linhas": linhas},
+        )
+        span.end()
+
+
+_configurar_slow_log()
+_tracer = _configurar_otel()
+instalar_hooks_supabase(supabase)
+
+
+# ============================================================
+# CACHE DE RESULTADOS (consulta_sql e relatórios)
+# ============================================================
+
+class CacheResultados:
+    """Cache LRU com expiração por TTL e tamanho máximo.
+
+    Guarda respostas já formatadas de consultas analíticas (ou os dados
+    intermediários delas). Ao atingir `maximo` entradas, descarta a usada há
+    mais tempo.
+    """
+
+    def __init__(self, ttl: float, maximo: int):
+        self.ttl = ttl
+        self.maximo = maximo
+        self._entradas: OrderedDict[tuple, tuple[float, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.descartes = 0
+        self.expiradas = 0
+
+    def obter(self, chave: tuple) -> Any:
+        entrada = self._entradas.get(chave)
+        if entrada is None:
+            self.misses += 1
+            return None
+        if entrada[0] <= time.monotonic():
+            del self._entradas[chave]
+            self.expiradas += 1
+            self.misses += 1
+            return None
+        self._entradas.move_to_end(chave)
+        self.hits += 1
+        return entrada[1]
+
+    def guardar(self, chave: tuple, valor: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0 or self.maximo <= 0:
+            return
+        self._entradas[chave] = (time.monotonic() + ttl, valor)
+        self._entradas.move_to_end(chave)
+        while len(self._entradas) > self.maximo:
+            self._entradas.popitem(last=False)
+            self.descartes += 1
+
+    def limpar(self) -> None:
+        self._entradas.clear()
+
+    def estatisticas(self) -> dict:
+        consultas = self.hits + self.misses
+        return {
+            "entradas": len(self._entradas),
+            "maximo": self.maximo,
+            "ttl_segundos": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "taxa_acerto": round(self.hits / consultas, 3) if consultas else 0,
+            "descartes_lru": self.descartes,
+            "expiradas": self.expiradas,
+        }
+
+
+cache_sql = CacheResultados(SQL_CACHE_TTL, SQL_CACHE_MAX)
+
+
+# Literais ('texto', $tag$texto$tag$), identificadores entre aspas ("Coluna") e comentários
+_TOKENS_SQL = re.compile(
+    r"(?P<texto>'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|\$(?P<tag>(?:[A-Za-z_]\w*)?)\$.*?\$(?P=tag)\$)"
+    r"|(?P<comentario>--[^\n]*|/\*.*?\*/)",
+    re.DOTALL,
+)
+
+
+def _partes_sql(query: str) -> list[tuple[str, str]]:
+    """Divide a consulta em trechos ("codigo", "texto" ou "comentario"), da esquerda para a direita.
+
+    O que aparece primeiro vence: `'a--b'` é um literal inteiro e `-- 'x` é
+    um comentário, não o início de um literal.
+    """
+    partes, pos = [], 0
+    for m in _TOKENS_SQL.finditer(query):
+        if m.start() > pos:
+            partes.append(("codigo", query[pos:m.start()]))
+        partes.append(("comentario" if m.group("comentario") is not None else "texto", m.group()))
+        pos = m.end()
+    if pos < len(query):
+        partes.append(("codigo", query[pos:]))
+    return partes
+
+
+def normalizar_sql(query: str) -> str:
+    """Normaliza uma consulta para uso como chave de cache.
+
+    Remove comentários e `;` final, colapsa espaços e converte para
+    minúsculas o código; literais e identificadores entre aspas ficam intactos.
+    """
+    normalizada, codigo = [], []
+    for tipo, trecho in _partes_sql(query):
+        if tipo == "texto":
+            normalizada.append(re.sub(r"\s+", " ", "".join(codigo)).lower())
+            normalizada.append(trecho)
+            codigo = []
+        else:
+            codigo.append(" " if tipo == "comentario" else trecho)
+    normalizada.append(re.sub(r"\s+", " ", "".join(codigo)).lower())
+    return "".join(normalizada).strip().rstrip(";").strip()
+
+
+# ============================================================
+# COALESCÊNCIA DE LEITURAS (single-flight)
+# ============================================================
+
+_em_voo: dict[tuple, asyncio.Future] = {}
+_micro_cache = CacheResultados(COALESCE_TTL, COALESCE_MAX)
+metricas_coalescencia = {"execucoes": 0, "coalescidas": 0, "cache_hits": 0}
+
+
+class _LiderCancelado(Exception):
+    """A execução compartilhada foi cancelada: quem aguardava tenta de novo."""
+
+
+def coalescer(ttl: Optional[float] = None):
+    """Une chamadas concorrentes idênticas de uma tool de leitura em uma só execução.
+
+    Enquanto a primeira chamada está em andamento, as demais com os mesmos
+    argumentos aguardam o mesmo resultado; se ela for cancelada, a primeira
+    que aguardava executa no lugar. Com `ttl` > 0 o resultado também fica num
+    micro-cache LRU (até COALESCE_MAX entradas) por alguns segundos. Respostas
+    de erro não são cacheadas.
+
+    Args:
+        ttl: Janela do micro-cache em segundos (padrão COALESCE_TTL; 0 desativa)
+    """
+    def decorator(fn):
+        assinatura = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            janela = COALESCE_TTL if ttl is None else ttl
+            bound = assinatura.bind(*args, **kwargs)
+            bound.apply_defaults()
+            chave = (fn.__name__, tuple(sorted(bound.arguments.items())))
+
+            if janela > 0:
+                cache = _micro_cache.obter(chave)
+                if cache is not None:
+                    metricas_coalescencia["cache_hits"] += 1
+                    return cache
+
+            aguardou = False
+            while (futuro := _em_voo.get(chave)) is not None:
+                if not aguardou:
+                    metricas_coalescencia["coalescidas"] += 1
+                    aguardou = True
+                try:
+                    return await asyncio.shield(futuro)
+                except _LiderCancelado:
+                    continue
+
+            futuro = asyncio.get_running_loop().create_future()
+            _em_voo[chave] = futuro
+            metricas_coalescencia["execucoes"] += 1
+            try:
+                resultado = await fn(*args, **kwargs)
+            except asyncio.CancelledError:
+                # Só quem foi cancelado desiste; o primeiro que aguardava executa de novo
+                futuro.set_exception(_LiderCancelado())
+                futuro.exception()
+                raise
+            except Exception as e:
+                futuro.set_exception(e)
+                futuro.exception()  # evita warning quando ninguém mais aguarda
+                raise
+            else:
+                futuro.set_result(resultado)
+                if janela > 0 and not resultado.startswith("❌"):
+                    _micro_cache.guardar(chave, resultado, janela)
+                return resultado
+            finally:
+                _em_voo.pop(chave, None)
+
+        return wrapper
+    return decorator
+
+
 # ============================================================
 # MÓDULO: ASSOCIADOS
 # ============================================================
@@ -242,6 +1076,264 @@ async def estatisticas_associados() -> str:
         return err(str(e))
 
 
+# ============================================================
+# MÓDULO: IMPORTAÇÃO DE ASSOCIADOS
+# ============================================================
+
+PLANOS = ("individual", "familiar", "patrimonial")
+STATUS_ASSOCIADO = ("ativo", "inativo", "suspenso", "expulso")
+CAMPOS_IMPORTACAO = (
+    "nome", "cpf", "plano", "numero_titulo", "status", "data_associacao", "data_nascimento",
+    "telefone", "email", "rg", "endereco", "bairro", "cidade", "estado", "cep",
+)
+# Cabeçalhos comuns em planilhas → coluna da tabela
+ALIASES_IMPORTACAO = {
+    "titulo": "numero_titulo", "n_titulo": "numero_titulo", "numero": "numero_titulo",
+    "nascimento": "data_nascimento", "data_de_nascimento": "data_nascimento",
+    "associacao": "data_associacao", "celular": "telefone", "e-mail": "email", "uf": "estado",
+}
+# Consultas com filtro IN são feitas em blocos para não estourar o tamanho da URL
+BLOCO_IN = 300
+
+
+def _caminho_importacao(arquivo: str) -> str:
+    """Resolve o arquivo dentro de IMPORT_DIR, recusando caminhos fora dele."""
+    base = os.path.realpath(IMPORT_DIR)
+    caminho = os.path.realpath(os.path.join(base, arquivo))
+    if not caminho.startswith(base + os.sep):
+        raise ValueError(f"O arquivo precisa estar dentro de {base}")
+    if not os.path.isfile(caminho):
+        raise ValueError(f"Arquivo não encontrado: {caminho}")
+    return caminho
+
+
+def _ler_csv(caminho: str, aliases: dict) -> list[dict]:
+    """Lê um CSV (separador , ; ou tab, com ou sem BOM) normalizando os cabeçalhos.
+
+    Cabeçalhos perdem acentos, viram minúsculas_com_underscore e passam pelos `aliases`.
+    """
+    with open(caminho, newline="", encoding="utf-8-sig") as f:
+        amostra = f.read(4096)
+        f.seek(0)
+        dialeto = csv.Sniffer().sniff(amostra, delimiters=",;\t")
+        linhas = list(csv.DictReader(f, dialect=dialeto))
+    return [{_cabecalho(k, aliases): v for k, v in linha.items() if k is not None} for linha in linhas]
+
+
+def _cabecalho(nome: str, aliases: dict) -> str:
+    sem_acento = unicodedata.normalize("NFKD", str(nome)).encode("ascii", "ignore").decode()
+    chave = sem_acento.strip().lower().replace(" ", "_")
+    return aliases.get(chave, chave)
+
+
+def _ler_arquivo_importacao(caminho: str) -> list[dict]:
+    """Lê um CSV ou JSON (lista de objetos) com cabeçalhos normalizados."""
+    if caminho.lower().endswith(".csv"):
+        return _ler_csv(caminho, ALIASES_IMPORTACAO)
+    if not caminho.lower().endswith(".json"):
+        raise ValueError("Formato não suportado: use .csv ou .json")
+    with open(caminho, encoding="utf-8-sig") as f:
+        linhas = json.load(f)
+    if not isinstance(linhas, list):
+        raise ValueError("O JSON deve ser uma lista de objetos")
+    return [{_cabecalho(k, ALIASES_IMPORTACAO): v for k, v in linha.items()} for linha in linhas]
+
+
+def _data_importacao(valor: str) -> str:
+    """Aceita YYYY-MM-DD ou DD/MM/YYYY."""
+    if "/" in valor:
+        return datetime.strptime(valor, "%d/%m/%Y").date().isoformat()
+    return date.fromisoformat(valor).isoformat()
+
+
+def _normalizar_associado(bruta: dict, colunas: list[str]) -> tuple[dict, list[str]]:
+    """Converte uma linha do arquivo no registro da tabela associados, acumulando os erros."""
+    erros = []
+    linha = {c: (str(bruta.get(c)).strip() if bruta.get(c) is not None else "") for c in colunas}
+    registro: dict[str, Any] = {c: (v or None) for c, v in linha.items()}
+
+    if not linha["nome"]:
+        erros.append("nome obrigatório")
+
+    registro["cpf"] = format_cpf(linha["cpf"])
+    if not validar_cpf(registro["cpf"]):
+        erros.append(f"CPF inválido: {linha['cpf'] or '(vazio)'}")
+
+    try:
+        registro["numero_titulo"] = int(linha["numero_titulo"])
+    except ValueError:
+        erros.append(f"numero_titulo inválido: {linha['numero_titulo'] or '(vazio)'}")
+
+    registro["plano"] = linha["plano"].lower()
+    if registro["plano"] not in PLANOS:
+        erros.append(f"plano inválido: {linha['plano'] or '(vazio)'} (use {', '.join(PLANOS)})")
+
+    if "status" in registro:
+        registro["status"] = (linha["status"] or "ativo").lower()
+        if registro["status"] not in STATUS_ASSOCIADO:
+            erros.append(f"status inválido: {linha['status']}")
+    if "data_associacao" in registro and not linha["data_associacao"]:
+        registro["data_associacao"] = date.today().isoformat()
+    for campo in ("data_nascimento", "data_associacao"):
+        if registro.get(campo):
+            try:
+                registro[campo] = _data_importacao(registro[campo])
+            except ValueError:
+                erros.append(f"{campo} inválida: {linha[campo]} (use AAAA-MM-DD ou DD/MM/AAAA)")
+    if registro.get("cep"):
+        registro["cep"] = re.sub(r"\D", "", registro["cep"])
+    return registro, erros
+
+
+def _buscar_existentes(coluna: str, valores: list) -> dict:
+    """Mapeia valor → (cpf, numero_titulo) dos associados já cadastrados, em blocos."""
+    encontrados = {}
+    for i in range(0, len(valores), BLOCO_IN):
+        result = supabase.table("associados").select("cpf, numero_titulo").in_(
+            coluna, valores[i:i + BLOCO_IN]
+        ).execute()
+        for a in result.data or []:
+            encontrados[str(a[coluna])] = (a["cpf"], a["numero_titulo"])
+    return encontrados
+
+
+def _gravar_lotes(registros: list[tuple[int, dict]], atualizar: bool, erros: list[dict]) -> int:
+    """Grava em lotes de IMPORT_LOTE; se um lote falhar, refaz linha a linha para apontar o erro."""
+    gravados = 0
+    for i in range(0, len(registros), IMPORT_LOTE):
+        lote = registros[i:i + IMPORT_LOTE]
+
+        def enviar(dados):
+            tabela = supabase.table("associados")
+            if atualizar:
+                return tabela.upsert(dados, on_conflict="cpf").execute()
+            return tabela.insert(dados).execute()
+
+        try:
+            gravados += len(enviar([r for _, r in lote]).data or [])
+        except Exception:
+            for numero, registro in lote:
+                try:
+                    gravados += len(enviar([registro]).data or [])
+                except Exception as e:
+                    erros.append({
+                        "linha": numero, "cpf": registro["cpf"], "nome": registro.get("nome"),
+                        "erros": [getattr(e, "message", None) or str(e)],
+                    })
+    return gravados
+
+
+def _importar(caminho: str, atualizar: bool, simular: bool) -> dict:
+    brutas = _ler_arquivo_importacao(caminho)
+    if not brutas:
+        raise ValueError("Arquivo vazio")
+    faltando = [c for c in ("nome", "cpf", "plano", "numero_titulo") if c not in brutas[0]]
+    if faltando:
+        raise ValueError(f"Coluna(s) obrigatória(s) ausente(s): {', '.join(faltando)}")
+    colunas = [c for c in CAMPOS_IMPORTACAO if c in brutas[0]]
+
+    erros: list[dict] = []
+    validos: list[tuple[int, dict]] = []
+    linha_do_cpf: dict[str, int] = {}
+    linha_do_titulo: dict[int, int] = {}
+    # No CSV a linha 1 é o cabeçalho; no JSON vale a posição na lista
+    inicio = 1 if caminho.lower().endswith(".json") else 2
+    for numero, bruta in enumerate(brutas, start=inicio):
+        registro, problemas = _normalizar_associado(bruta, colunas)
+        if registro["cpf"] in linha_do_cpf:
+            problemas.append(f"CPF repetido no arquivo (linha {linha_do_cpf[registro['cpf']]})")
+        titulo = registro.get("numero_titulo")
+        if isinstance(titulo, int) and titulo in linha_do_titulo:
+            problemas.append(f"numero_titulo {titulo} repetido no arquivo (linha {linha_do_titulo[titulo]})")
+        if problemas:
+            erros.append({"linha": numero, "cpf": registro["cpf"], "nome": registro.get("nome"), "erros": problemas})
+            continue
+        linha_do_cpf[registro["cpf"]] = numero
+        linha_do_titulo[titulo] = numero
+        validos.append((numero, registro))
+
+    cpfs_existentes = _buscar_existentes("cpf", [r["cpf"] for _, r in validos])
+    titulos_existentes = _buscar_existentes("numero_titulo", [r["numero_titulo"] for _, r in validos])
+
+    novos, atualizacoes = [], []
+    ignorados = 0
+    for numero, registro in validos:
+        dono = titulos_existentes.get(str(registro["numero_titulo"]))
+        if dono and dono[0] != registro["cpf"]:
+            erros.append({
+                "linha": numero, "cpf": registro["cpf"], "nome": registro.get("nome"),
+                "erros": [f"numero_titulo {registro['numero_titulo']} já pertence a outro associado"],
+            })
+        elif registro["cpf"] not in cpfs_existentes:
+            novos.append((numero, registro))
+        elif atualizar:
+            atualizacoes.append((numero, registro))
+        else:
+            ignorados += 1
+
+    inseridos = atualizados = 0
+    if not simular:
+        inseridos = _gravar_lotes(novos, False, erros)
+        atualizados = _gravar_lotes(atualizacoes, True, erros)
+
+    erros.sort(key=lambda e: e["linha"])
+    return {
+        "arquivo": caminho,
+        "linhas": len(brutas),
+        "validas": len(validos),
+        "novos": len(novos),
+        "existentes": len(atualizacoes) + ignorados,
+        "inseridos": inseridos,
+        "atualizados": atualizados,
+        "ignorados_ja_cadastrados": ignorados,
+        "com_erro": len(erros),
+        "erros": erros,
+    }
+
+
+@mcp.tool()
+async def importar_associados(arquivo: str, atualizar_existentes: bool = False, simular: bool = False) -> str:
+    """Importa associados em lote a partir de um arquivo CSV ou JSON.
+
+    Colunas obrigatórias: nome, cpf, plano, numero_titulo. Opcionais: status,
+    data_associacao, data_nascimento, telefone, email, rg, endereco, bairro,
+    cidade, estado, cep. Datas em AAAA-MM-DD ou DD/MM/AAAA. CPF com ou sem
+    pontuação (dígitos verificadores conferidos). Linhas com erro não
+    impedem as demais e são listadas com o número da linha.
+
+    Args:
+        arquivo: Nome do arquivo dentro da pasta de importação (IMPORT_DIR)
+        atualizar_existentes: Atualiza associados já cadastrados (mesmo CPF) com os dados do arquivo;
+            células vazias limpam o campo. Se False, eles são ignorados.
+        simular: Apenas valida e informa o que seria feito, sem gravar
+    """
+    try:
+        caminho = _caminho_importacao(arquivo)
+        resultado = await asyncio.to_thread(_importar, caminho, atualizar_existentes, simular)
+    except Exception as e:
+        return err(str(e))
+
+    erros = resultado.pop("erros")
+    if erros:
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        relatorio = os.path.abspath(os.path.join(
+            EXPORT_DIR, f"importacao-erros-{datetime.now().strftime('%Y%m%d-%H%M%S')}.csv"
+        ))
+        with open(relatorio, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["linha", "cpf", "nome", "erros"])
+            writer.writerows([e["linha"], e["cpf"], e["nome"], "; ".join(e["erros"])] for e in erros)
+        resultado["relatorio_erros"] = relatorio
+        resultado["primeiros_erros"] = erros[:50]
+
+    if simular:
+        msg = f"🔎 Simulação: {resultado['novos']} novo(s), {resultado['existentes']} já cadastrado(s), {len(erros)} com erro"
+    else:
+        msg = (f"✅ Importação concluída: {resultado['inseridos']} inserido(s), "
+               f"{resultado['atualizados']} atualizado(s), {len(erros)} com erro")
+    return ok(resultado, msg)
+
+
 # ============================================================
 # MÓDULO: DEPENDENTES
 # ============================================================
@@ -435,6 +1527,7 @@ async def gerar_mensalidades(
 
 
 @mcp.tool()
+@coalescer()
 async def estatisticas_financeiro(mes: Optional[str] = None) -> str:
     """Retorna estatísticas financeiras (recebido, a receber, inadimplentes).
 
@@ -444,9 +1537,11 @@ async def estatisticas_financeiro(mes: Optional[str] = None) -> str:
     try:
         ref = mes or date.today().strftime("%Y-%m")
 
-        pendentes = supabase.table("mensalidades").select("valor", count="exact").eq("referencia", ref).eq("status", "pendente").execute()
-        pagos = supabase.table("mensalidades").select("valor_pago", count="exact").eq("referencia", ref).eq("status", "pago").execute()
-        atrasados = supabase.table("mensalidades").select("valor", count="exact").eq("referencia", ref).eq("status", "atrasado").execute()
+        pendentes, pagos, atrasados = await asyncio.gather(
+            executar(supabase.table("mensalidades").select("valor", count="exact").eq("referencia", ref).eq("status", "pendente")),
+            executar(supabase.table("mensalidades").select("valor_pago", count="exact").eq("referencia", ref).eq("status", "pago")),
+            executar(supabase.table("mensalidades").select("valor", count="exact").eq("referencia", ref).eq("status", "atrasado")),
+        )
 
         total_receber = sum(m["valor"] for m in (pendentes.data or []))
         total_recebido = sum(m.get("valor_pago", 0) or 0 for m in (pagos.data or []))
@@ -466,6 +1561,22 @@ async def estatisticas_financeiro(mes: Optional[str] = None) -> str:
         return err(str(e))
 
 
+# Agrupa no banco; com DATABASE_URL evita trazer todas as mensalidades atrasadas pelo PostgREST
+SQL_INADIMPLENTES = """
+    SELECT a.nome, a.telefone, a.email, a.numero_titulo,
+           array_agg(m.referencia ORDER BY m.data_vencimento) AS referencias,
+           array_agg(m.valor ORDER BY m.data_vencimento) AS valores,
+           array_agg(m.data_vencimento ORDER BY m.data_vencimento) AS vencimentos,
+           sum(m.valor) AS total_devedor
+    FROM mensalidades m
+    JOIN associados a ON a.id = m.associado_id
+    WHERE m.status::text = 'atrasado'
+    GROUP BY a.id
+    HAVING count(*) >= $1
+    ORDER BY min(m.data_vencimento)
+"""
+
+
 @mcp.tool()
 async def listar_inadimplentes(meses_atrasados: int = 1) -> str:
     """Lista associados inadimplentes (com mensalidades atrasadas).
@@ -474,9 +1585,24 @@ async def listar_inadimplentes(meses_atrasados: int = 1) -> str:
         meses_atrasados: Mínimo de meses atrasados para considerar inadimplente (padrão 1)
     """
     try:
-        result = supabase.table("mensalidades").select(
+        if pg_pool is not None:
+            linhas = await consultar_pg("inadimplentes", SQL_INADIMPLENTES, meses_atrasados)
+            inadimplentes = [{
+                "associado": {
+                    "nome": r["nome"], "telefone": r["telefone"],
+                    "email": r["email"], "numero_titulo": r["numero_titulo"],
+                },
+                "mensalidades_atrasadas": [
+                    {"referencia": ref, "valor": valor, "vencimento": venc}
+                    for ref, valor, venc in zip(r["referencias"], r["valores"], r["vencimentos"])
+                ],
+                "total_devedor": r["total_devedor"],
+            } for r in linhas]
+            return ok(inadimplentes, f"⚠️ {len(inadimplentes)} associado(s) inadimplente(s)")
+
+        result = await executar(supabase.table("mensalidades").select(
             "associado_id, associados(nome, telefone, email, numero_titulo), referencia, valor, data_vencimento"
-        ).eq("status", "atrasado").order("data_vencimento").execute()
+        ).eq("status", "atrasado").order("data_vencimento"))
 
         inadimplentes = {}
         for m in (result.data or []):
@@ -504,9 +1630,950 @@ async def listar_inadimplentes(meses_atrasados: int = 1) -> str:
         return err(str(e))
 
 
+# ============================================================
+# MÓDULO: FLUXO DE CAIXA (projeção)
+# ============================================================
+# projecao_fluxo_caixa lê duas agregações do banco (database/029): a
+# distribuição histórica dos atrasos de pagamento e os títulos em aberto por
+# dia de vencimento. A projeção é feita em vetores NumPy com uma posição por
+# dia: o valor de cada dia de vencimento é espalhado pelos dias seguintes
+# conforme a probabilidade de ser pago com aquele atraso, dado que ainda não
+# foi pago até hoje. Requer pip install -e ".[analise]".
+
+# Distribuição dos atrasos: muda devagar, então é relida só a cada FLUXO_CAIXA_HISTORICO_TTL
+cache_atrasos = CacheResultados(FLUXO_CAIXA_HISTORICO_TTL, 16)
+ORIGENS_RECEBIMENTO = ("mensalidades", "contas_receber")
+MINIMO_HISTORICO = 30  # títulos; abaixo disso contas_receber usa a distribuição das mensalidades
+
+
+async def _consultar_funcao(nome: str, parametros: dict) -> list[dict]:
+    """Chama uma function do banco pela conexão direta, se houver, ou pelo PostgREST."""
+    if pg_pool is not None:
+        marcadores = ", ".join(f"${i}" for i in range(1, len(parametros) + 1))
+        return [dict(r) for r in await consultar_pg(nome, f"SELECT * FROM {nome}({marcadores})", *parametros.values())]
+    argumentos = {k: v.isoformat() if isinstance(v, date) else v for k, v in parametros.items()}
+    return (await executar(supabase.rpc(nome, argumentos))).data or []
+
+
+def _fim_do_mes(ano: int, mes: int) -> date:
+    ano, mes = ano + (mes - 1) // 12, (mes - 1) % 12 + 1
+    return date(ano + mes // 12, mes % 12 + 1, 1) - timedelta(days=1)
+
+
+def _distribuicao_atrasos(linhas: list[dict], max_dias: int) -> Optional[dict]:
+    """Probabilidade, ponderada pelo valor, de um título ser pago com d dias de atraso (d em ±max_dias).
+
+    O que não foi pago em até max_dias fica em `nunca`. None sem histórico.
+    """
+    import numpy as np
+
+    pagos = [l for l in linhas if l["dias"] is not None]
+    pmf = np.bincount(np.array([l["dias"] for l in pagos], dtype=np.int64) + max_dias,
+                      weights=np.array([float(l["valor"]) for l in pagos]), minlength=2 * max_dias + 1)
+    nunca = sum(float(l["valor"]) for l in linhas if l["dias"] is None)
+    total = pmf.sum() + nunca
+    if not total:
+        return None
+    dias = np.arange(-max_dias, max_dias + 1)
+    return {
+        "pmf": pmf / total,
+        "nunca": nunca / total,
+        "titulos": sum(int(l["quantidade"]) for l in linhas),
+        "pagos_ate_o_vencimento_pct": round(100 * pmf[dias <= 0].sum() / total, 1),
+        "atraso_medio_dias": round(float((pmf * dias).sum() / pmf.sum()), 1) if pmf.sum() else None,
+        "nao_pagos_pct": round(100 * nunca / total, 1),
+    }
+
+
+def _recebimentos_previstos(vencimentos, valores, distribuicao: dict, dias: int, max_dias: int):
+    """Recebimento esperado em cada um dos `dias` a partir de hoje.
+
+    `vencimentos` são dias até o vencimento (negativo: vencido). Quem está
+    vencido há `a` dias e não pagou só pode pagar com atraso >= a, então o
+    valor é dividido por P(atraso >= a); o resto é uma convolução do valor por
+    dia de vencimento com a distribuição dos atrasos.
+    """
+    import numpy as np
+
+    pmf, nunca = distribuicao["pmf"], distribuicao["nunca"]
+    # sobrevive[i] = P(atraso >= i - max_dias), com uma posição a mais para "vencido há mais de max_dias"
+    sobrevive = np.append(np.cumsum(pmf[::-1])[::-1] + nunca, nunca)
+    # Só contribuem os vencimentos em [-max_dias, dias + max_dias)
+    uteis = (vencimentos >= -max_dias) & (vencimentos < dias + max_dias)
+    vencimentos, valores = vencimentos[uteis], valores[uteis]
+    condicional = sobrevive[np.clip(max_dias - vencimentos, 0, 2 * max_dias + 1)]
+    pesos = np.divide(valores, condicional, out=np.zeros_like(valores), where=condicional > 0)
+    por_vencimento = np.bincount(vencimentos + max_dias, weights=pesos, minlength=dias + 2 * max_dias)
+    # Posição j da convolução = (vencimento + max_dias) + (atraso + max_dias) = dia + 2 * max_dias
+    return np.convolve(por_vencimento, pmf)[2 * max_dias:2 * max_dias + dias]
+
+
+def _projetar_fluxo(atrasos: list[dict], abertos: list[dict], hoje: date, fim: date, max_dias: int) -> dict:
+    """Séries diárias de entradas e saídas previstas de hoje até `fim`, e as premissas usadas."""
+    import numpy as np
+
+    dias = (fim - hoje).days + 1
+    distribuicoes = {o: _distribuicao_atrasos([l for l in atrasos if l["origem"] == o], max_dias)
+                     for o in ORIGENS_RECEBIMENTO}
+    padrao = {"pmf": np.eye(1, 2 * max_dias + 1, max_dias)[0], "nunca": 0.0, "titulos": 0}
+    if distribuicoes["mensalidades"] is None:
+        distribuicoes["mensalidades"] = padrao  # sem histórico: pagos no vencimento
+    recebimentos = distribuicoes["contas_receber"]
+    if recebimentos is None or recebimentos["titulos"] < MINIMO_HISTORICO:
+        distribuicoes["contas_receber"] = distribuicoes["mensalidades"]
+
+    por_origem = {o: [l for l in abertos if l["origem"] == o] for o in (*ORIGENS_RECEBIMENTO, "contas_pagar")}
+    em_aberto = {o: round(sum(float(l["valor"]) for l in linhas), 2) for o, linhas in por_origem.items()}
+
+    # Meses ainda não gerados: o último faturamento se repete, no mesmo dia de vencimento
+    faturamento = next((l for l in abertos if l["origem"] == "faturamento"), None)
+    a_faturar = []
+    if faturamento:
+        ano, mes = map(int, faturamento["referencia"].split("-"))
+        while True:
+            mes += 1
+            primeiro = date(ano + (mes - 1) // 12, (mes - 1) % 12 + 1, 1)
+            if primeiro > fim:
+                break
+            vencimento = min(_fim_do_mes(primeiro.year, primeiro.month), primeiro +
+                             timedelta(days=faturamento["dias"] - 1))
+            a_faturar.append({"dias": (vencimento - hoje).days, "valor": faturamento["valor"]})
+
+    series = {}
+    for origem in ORIGENS_RECEBIMENTO:
+        linhas = por_origem[origem] + (a_faturar if origem == "mensalidades" else [])
+        vencimentos = np.fromiter((l["dias"] for l in linhas), dtype=np.int64, count=len(linhas))
+        valores = np.fromiter((float(l["valor"]) for l in linhas), dtype=np.float64, count=len(linhas))
+        series[origem] = _recebimentos_previstos(vencimentos, valores, distribuicoes[origem], dias, max_dias)
+
+    # Contas a pagar saem no vencimento; as vencidas, hoje
+    pagar = por_origem["contas_pagar"]
+    vencimentos = np.clip(np.fromiter((l["dias"] for l in pagar), dtype=np.int64, count=len(pagar)), 0, None)
+    valores = np.fromiter((float(l["valor"]) for l in pagar), dtype=np.float64, count=len(pagar))
+    no_periodo = vencimentos < dias
+    series["contas_pagar"] = np.bincount(vencimentos[no_periodo], weights=valores[no_periodo], minlength=dias)
+
+    a_receber = {o: em_aberto[o] + (sum(float(l["valor"]) for l in a_faturar) if o == "mensalidades" else 0)
+                 for o in ORIGENS_RECEBIMENTO}
+    premissas = {
+        o: {k: v for k, v in d.items() if k not in ("pmf", "nunca")} | (
+            {"distribuicao": "mensalidades"} if o == "contas_receber" and d is distribuicoes["mensalidades"] else {})
+        for o, d in distribuicoes.items()
+    }
+    if distribuicoes["mensalidades"] is padrao:
+        premissas["mensalidades"] = {"titulos": 0, "distribuicao": "sem histórico: pagamento no vencimento"}
+    premissas["faturamento_mensal"] = {
+        "referencia_base": faturamento["referencia"], "valor": float(faturamento["valor"]),
+        "dia_vencimento": faturamento["dias"], "meses_projetados": len(a_faturar),
+    } if faturamento else None
+    return {
+        "series": series,
+        "em_aberto": em_aberto,
+        "nao_recebido_no_periodo": {o: round(a_receber[o] - float(series[o].sum()), 2) for o in ORIGENS_RECEBIMENTO},
+        "premissas": premissas,
+    }
+
+
+@mcp.tool()
+async def projecao_fluxo_caixa(
+    meses: int = 6,
+    granularidade: str = "mensal",
+    saldo_inicial: float = 0.0,
+    historico_anos: int = 3,
+    usar_cache: bool = True,
+) -> str:
+    """Projeta entradas, saídas e saldo do caixa para os próximos meses.
+
+    Entradas: mensalidades e contas a receber em aberto (e as mensalidades dos
+    meses ainda não gerados, repetindo o último faturamento), distribuídas
+    pelos dias conforme o atraso histórico de pagamento. Saídas: contas a
+    pagar em aberto, no vencimento (as vencidas, hoje). Requer
+    database/029_fluxo_caixa.sql e pip install -e ".[analise]".
+
+    Args:
+        meses: Meses projetados, contando o atual (1 a 36)
+        granularidade: "mensal" ou "diaria"
+        saldo_inicial: Saldo em caixa hoje, somado ao saldo projetado
+        historico_anos: Anos de histórico usados para a distribuição dos atrasos
+        usar_cache: Reaproveitar resultado recente da mesma projeção (padrão True)
+    """
+    try:
+        import numpy as np
+    except ImportError:
+        return err("A projeção de fluxo de caixa requer o pacote numpy: pip install -e \".[analise]\"")
+    if granularidade not in ("mensal", "diaria"):
+        return err('granularidade deve ser "mensal" ou "diaria"')
+    meses = min(max(meses, 1), 36)
+    historico_anos = max(historico_anos, 1)
+
+    chave = ("fluxo_caixa", meses, granularidade, saldo_inicial, historico_anos)
+    if usar_cache:
+        resposta = cache_sql.obter(chave)
+        if resposta is not None:
+            return resposta
+
+    try:
+        hoje = date.today()
+        fim = _fim_do_mes(hoje.year, hoje.month + meses - 1)
+        desde = date(hoje.year - historico_anos, hoje.month, 1)
+        chave_atrasos = (desde, FLUXO_CAIXA_ATRASO_MAX_DIAS)
+        atrasos = cache_atrasos.obter(chave_atrasos)
+        if atrasos is None:
+            atrasos, abertos = await asyncio.gather(
+                _consultar_funcao("distribuicao_atrasos", {"p_desde": desde, "p_max_dias": FLUXO_CAIXA_ATRASO_MAX_DIAS}),
+                _consultar_funcao("titulos_em_aberto", {}),
+            )
+            cache_atrasos.guardar(chave_atrasos, atrasos)
+        else:
+            abertos = await _consultar_funcao("titulos_em_aberto", {})
+
+        projecao = await asyncio.to_thread(_projetar_fluxo, atrasos, abertos, hoje, fim,
+                                           FLUXO_CAIXA_ATRASO_MAX_DIAS)
+        series = projecao.pop("series")
+        saldo = saldo_inicial + np.cumsum(series["mensalidades"] + series["contas_receber"] - series["contas_pagar"])
+        if granularidade == "mensal":
+            inicios, periodos, dia = [], [], hoje
+            while dia <= fim:
+                inicios.append((dia - hoje).days)
+                periodos.append(dia.strftime("%Y-%m"))
+                dia = _fim_do_mes(dia.year, dia.month) + timedelta(days=1)
+            series = {o: np.add.reduceat(v, inicios) for o, v in series.items()}
+            saldo = saldo[[*[i - 1 for i in inicios[1:]], len(saldo) - 1]]
+        else:
+            periodos = [(hoje + timedelta(days=i)).isoformat() for i in range(len(saldo))]
+
+        resultado = {
+            "inicio": hoje.isoformat(),
+            "fim": fim.isoformat(),
+            "granularidade": granularidade,
+            "saldo_inicial": saldo_inicial,
+            "periodos": periodos,
+            "entradas_mensalidades": np.round(series["mensalidades"], 2).tolist(),
+            "entradas_contas_receber": np.round(series["contas_receber"], 2).tolist(),
+            "saidas_contas_pagar": np.round(series["contas_pagar"], 2).tolist(),
+            "saldo": np.round(saldo, 2).tolist(),
+            "totais": {
+                "entradas": round(float(series["mensalidades"].sum() + series["contas_receber"].sum()), 2),
+                "saidas": round(float(series["contas_pagar"].sum()), 2),
+                "saldo_final": round(float(saldo[-1]), 2),
+            },
+            **projecao,
+        }
+        resposta = ok(resultado, f"📈 Fluxo de caixa projetado até {fim.strftime('%m/%Y')}: "
+                                 f"saldo final R$ {resultado['totais']['saldo_final']:,.2f}")
+        cache_sql.guardar(chave, resposta)
+        return resposta
+    except Exception as e:
+        error_msg = str(e)
+        if "PGRST202" in error_msg or "could not find" in error_msg.lower() or "does not exist" in error_msg:
+            return err(
+                "As functions 'distribuicao_atrasos' e 'titulos_em_aberto' não existem no Supabase. "
+                "Execute o script database/029_fluxo_caixa.sql no SQL Editor para habilitar a projeção."
+            )
+        return err(error_msg)
+
+
+# ============================================================
+# MÓDULO: RISCO DE INADIMPLÊNCIA
+# ============================================================
+# risco_inadimplencia lê em lotes as mensalidades vencidas de todos os
+# associados ativos e soma cada lote em vetores NumPy com uma posição por
+# associado: só esses acumuladores e um lote ficam em memória. A nota (0 a
+# 100) é uma soma de pontos com os pesos fixos de PESOS_RISCO, devolvida
+# indicador a indicador. As notas ficam em cache até a próxima alteração em
+# mensalidades ou associados (maior updated_at; índices em database/030).
+
+PESOS_RISCO = {
+    "meses_em_aberto": 35,   # mensalidades vencidas sem pagamento (3 ou mais: pontuação cheia)
+    "atraso_recente": 20,    # atraso médio nos últimos RISCO_JANELA_RECENTE dias, contando as em aberto (30+: cheia)
+    "atraso_medio": 20,      # atraso médio dos pagamentos do período (30 dias ou mais: cheia)
+    "pagos_com_atraso": 15,  # parte dos pagamentos feitos com mais de RISCO_TOLERANCIA_DIAS de atraso
+    "plano": 5,              # taxa de mensalidades em aberto do plano, relativa à do plano com a maior taxa
+    "tempo_associacao": 5,   # cai de cheia (1 mês de clube) a zero (2 anos)
+}
+RISCO_TOLERANCIA_DIAS = 5
+RISCO_JANELA_RECENTE = 90
+ACUMULADORES_RISCO = ("vencidos", "pagos", "soma_atraso", "pagos_com_atraso", "em_aberto",
+                      "valor_em_aberto", "recentes", "soma_atraso_recente")
+
+cache_risco = CacheResultados(RISCO_INADIMPLENCIA_TTL, 4)
+_calculo_risco = asyncio.Lock()
+
+SQL_RISCO_ASSOCIADOS = """
+    SELECT id, plano::text AS plano, CURRENT_DATE - COALESCE(data_associacao, created_at::date) AS dias_associado
+    FROM associados
+    WHERE status = 'ativo'
+    ORDER BY id
+"""
+
+# Lido por COPY binário: todas as colunas têm tamanho fixo e nunca são nulas,
+# então cada linha do fluxo tem o mesmo formato (CAMPOS_COPY_RISCO)
+SQL_RISCO_HISTORICO = """
+    SELECT associado_id, data_vencimento - CURRENT_DATE AS vencimento,
+           COALESCE(data_pagamento::date - data_vencimento, 0) AS atraso,
+           COALESCE(status = 'pago', false) AS pago, valor::float8 AS valor
+    FROM mensalidades
+    WHERE data_vencimento >= $1 AND data_vencimento < CURRENT_DATE
+      AND status <> 'cancelado'
+"""
+
+SQL_RISCO_VERSAO = """
+    SELECT (SELECT max(updated_at) FROM mensalidades) AS mensalidades,
+           (SELECT max(updated_at) FROM associados) AS associados
+"""
+
+TIPOS_LOTE_RISCO = [("i", "i8"), ("vencimento", "i8"), ("atraso", "i8"), ("pago", "?"), ("valor", "f8")]
+
+
+def _acumular_risco(acumulado: dict, i, vencimento, atraso, pago, valor) -> None:
+    """Soma um lote de mensalidades vencidas nos acumuladores de cada associado (posição `i`).
+
+    `vencimento` são dias até o vencimento (negativo) e `atraso`, dias entre
+    o vencimento e o pagamento (0 se não pago).
+    """
+    import numpy as np
+
+    n = len(acumulado["vencidos"])
+    aberto = ~pago
+    recente = vencimento >= -RISCO_JANELA_RECENTE
+    atraso_pago = np.where(pago, np.maximum(atraso, 0), 0)
+    # Em aberto: o atraso é o tempo desde o vencimento
+    atraso_efetivo = np.where(pago, atraso_pago, -vencimento)
+    for chave, pesos in (
+        ("vencidos", None),
+        ("pagos", pago),
+        ("soma_atraso", atraso_pago),
+        ("pagos_com_atraso", pago & (atraso > RISCO_TOLERANCIA_DIAS)),
+        ("em_aberto", aberto),
+        ("valor_em_aberto", np.where(aberto, valor, 0)),
+        ("recentes", recente),
+        ("soma_atraso_recente", np.where(recente, atraso_efetivo, 0)),
+    ):
+        acumulado[chave] += np.bincount(i, weights=None if pesos is None else pesos.astype(np.float64), minlength=n)
+
+
+# Linha do COPY binário de SQL_RISCO_HISTORICO (big-endian): quantidade de
+# campos e, para cada campo, o tamanho em bytes seguido do valor
+CAMPOS_COPY_RISCO = [
+    ("campos", ">i2"),
+    ("_", ">i4"), ("associado_id", "S16"),
+    ("_v", ">i4"), ("vencimento", ">i4"),
+    ("_a", ">i4"), ("atraso", ">i4"),
+    ("_p", ">i4"), ("pago", "?"),
+    ("_r", ">i4"), ("valor", ">f8"),
+]
+CABECALHO_COPY = 19  # assinatura PGCOPY, flags e extensão vazia
+
+
+async def _historico_risco_pg(desde: date) -> tuple[list[str], list[str], list[int], dict]:
+    """Associados ativos e acumuladores, lendo as mensalidades por COPY binário.
+
+    O fluxo é convertido com np.frombuffer a cada RISCO_INADIMPLENCIA_LOTE
+    linhas, sem criar um objeto Python por mensalidade. O associado de cada
+    linha é localizado por busca binária nos ids ordenados.
+    """
+    import numpy as np
+
+    linha = np.dtype(CAMPOS_COPY_RISCO)
+    inicio, inicio_ns = time.perf_counter(), time.time_ns()
+    async with pg_pool.acquire() as conn:
+        # repeatable_read: associados e mensalidades do mesmo snapshot
+        async with conn.transaction(isolation="repeatable_read", readonly=True):
+            associados = await conn.fetch(SQL_RISCO_ASSOCIADOS)
+            ids = np.array([a["id"].bytes for a in associados], dtype="S16")
+            acumulado = {k: np.zeros(len(associados)) for k in ACUMULADORES_RISCO}
+            pendente = bytearray()
+            lidas = 0
+
+            def processar(dados: bytes) -> None:
+                lote = np.frombuffer(dados, dtype=linha)
+                if (lote["campos"] != 5).any():
+                    raise ValueError("Formato inesperado no COPY de mensalidades")
+                posicao = np.minimum(np.searchsorted(ids, lote["associado_id"]), len(ids) - 1)
+                ativo = ids[posicao] == lote["associado_id"]
+                _acumular_risco(acumulado, posicao[ativo], lote["vencimento"][ativo].astype(np.int64),
+                                lote["atraso"][ativo].astype(np.int64), lote["pago"][ativo],
+                                lote["valor"][ativo].astype(np.float64))
+
+            async def receber(parte: bytes, minimo: int = RISCO_INADIMPLENCIA_LOTE) -> None:
+                nonlocal lidas
+                if not lidas and not pendente:
+                    parte = parte[CABECALHO_COPY:]
+                pendente.extend(parte)
+                completas = len(pendente) // linha.itemsize
+                if completas >= minimo:
+                    tamanho = completas * linha.itemsize
+                    await asyncio.to_thread(processar, bytes(pendente[:tamanho]))
+                    del pendente[:tamanho]
+                    lidas += completas
+
+            if len(ids):
+                await conn.copy_from_query(SQL_RISCO_HISTORICO, desde, output=receber, format="binary")
+                # Sobra o último lote e o marcador de fim (2 bytes)
+                await receber(b"", minimo=1)
+    registrar_consulta_pg("risco_inadimplencia", inicio, inicio_ns, len(associados) + lidas)
+    return ([str(a["id"]) for a in associados], [a["plano"] for a in associados],
+            [a["dias_associado"] for a in associados], acumulado)
+
+
+def _historico_risco_postgrest(desde: date, hoje: date) -> tuple[list[str], list[str], list[int], dict]:
+    """Mesmo resultado de `_historico_risco_pg` pelo PostgREST, por keyset.
+
+    Roda de forma síncrona: use dentro de `asyncio.to_thread`.
+    """
+    import numpy as np
+
+    ids, planos, dias_associado = [], [], []
+    montar = lambda: supabase.table("associados").select("id, plano, data_associacao, created_at").eq("status", "ativo")
+    for pagina in paginar_keyset(montar):
+        for a in pagina:
+            ids.append(a["id"])
+            planos.append(a["plano"])
+            dias_associado.append((hoje - date.fromisoformat((a.get("data_associacao") or a["created_at"])[:10])).days)
+    posicao = {aid: i for i, aid in enumerate(ids)}
+    acumulado = {k: np.zeros(len(ids)) for k in ACUMULADORES_RISCO}
+
+    montar = lambda: supabase.table("mensalidades").select(
+        "id, associado_id, data_vencimento, data_pagamento, status, valor"
+    ).gte("data_vencimento", desde.isoformat()).lt("data_vencimento", hoje.isoformat()).neq("status", "cancelado")
+    for pagina in paginar_keyset(montar):
+        lote = []
+        for m in pagina:
+            i = posicao.get(m["associado_id"])
+            if i is None:
+                continue
+            vencimento = date.fromisoformat(m["data_vencimento"])
+            pagamento = date.fromisoformat(m["data_pagamento"][:10]) if m.get("data_pagamento") else vencimento
+            lote.append((i, (vencimento - hoje).days, (pagamento - vencimento).days, m["status"] == "pago",
+                         float(m["valor"])))
+        if lote:
+            lote = np.array(lote, dtype=TIPOS_LOTE_RISCO)
+            _acumular_risco(acumulado, lote["i"], lote["vencimento"], lote["atraso"], lote["pago"], lote["valor"])
+    return ids, planos, dias_associado, acumulado
+
+
+def _notas_risco(planos: list[str], dias_associado: list[int], acumulado: dict) -> dict:
+    """Indicadores, pontos por indicador e nota de cada associado."""
+    import numpy as np
+
+    def razao(a, b):
+        return np.divide(a, b, out=np.zeros_like(a), where=b > 0)
+
+    nomes, codigos = np.unique(np.array(planos, dtype=object).astype(str), return_inverse=True)
+    abertos_plano = np.bincount(codigos, weights=acumulado["em_aberto"], minlength=len(nomes))
+    vencidos_plano = np.bincount(codigos, weights=acumulado["vencidos"], minlength=len(nomes))
+    taxa_plano = razao(abertos_plano, vencidos_plano)
+    maior_taxa = taxa_plano.max() if len(nomes) and taxa_plano.max() > 0 else 1.0
+
+    indicadores = {
+        "meses_em_aberto": acumulado["em_aberto"],
+        "valor_em_aberto": acumulado["valor_em_aberto"],
+        "atraso_medio_dias": razao(acumulado["soma_atraso"], acumulado["pagos"]),
+        "pagos_com_atraso_pct": 100 * razao(acumulado["pagos_com_atraso"], acumulado["pagos"]),
+        "atraso_recente_dias": razao(acumulado["soma_atraso_recente"], acumulado["recentes"]),
+        "meses_associado": np.array(dias_associado, dtype=np.float64) / 30.44,
+    }
+    fracoes = {
+        "meses_em_aberto": np.minimum(indicadores["meses_em_aberto"] / 3, 1),
+        "atraso_recente": np.minimum(indicadores["atraso_recente_dias"] / 30, 1),
+        "atraso_medio": np.minimum(indicadores["atraso_medio_dias"] / 30, 1),
+        "pagos_com_atraso": indicadores["pagos_com_atraso_pct"] / 100,
+        "plano": (taxa_plano / maior_taxa)[codigos],
+        "tempo_associacao": np.clip((24 - indicadores["meses_associado"]) / 23, 0, 1),
+    }
+    pontos = {k: PESOS_RISCO[k] * f for k, f in fracoes.items()}
+    return {
+        "nota": np.sum(list(pontos.values()), axis=0),
+        "pontos": pontos,
+        "indicadores": indicadores,
+        "planos": nomes[codigos],
+        "taxa_em_aberto_por_plano": {p: round(100 * float(t), 1) for p, t in zip(nomes.tolist(), taxa_plano)},
+    }
+
+
+async def _versao_risco() -> tuple:
+    """Maior updated_at de mensalidades e associados: muda a cada pagamento, mensalidade gerada ou cadastro alterado."""
+    if pg_pool is not None:
+        linha = (await consultar_pg("risco_versao", SQL_RISCO_VERSAO))[0]
+        return str(linha["mensalidades"]), str(linha["associados"])
+    respostas = await asyncio.gather(*(
+        executar(supabase.table(t).select("updated_at").order("updated_at", desc=True, nullsfirst=False).limit(1))
+        for t in ("mensalidades", "associados")
+    ))
+    return tuple((r.data or [{}])[0].get("updated_at") for r in respostas)
+
+
+async def _calcular_risco(historico_meses: int) -> dict:
+    hoje = date.today()
+    mes = hoje.month - historico_meses
+    desde = date(hoje.year + (mes - 1) // 12, (mes - 1) % 12 + 1, 1)
+    if pg_pool is not None:
+        ids, planos, dias_associado, acumulado = await _historico_risco_pg(desde)
+    else:
+        ids, planos, dias_associado, acumulado = await asyncio.to_thread(_historico_risco_postgrest, desde, hoje)
+    notas = await asyncio.to_thread(_notas_risco, planos, dias_associado, acumulado)
+    return {"ids": ids, "desde": desde.isoformat(), "calculado_em": datetime.now().isoformat(timespec="seconds"),
+            **notas}
+
+
+async def _dados_associados(ids: list[str]) -> dict[str, dict]:
+    if not ids:
+        return {}
+    if pg_pool is not None:
+        linhas = await consultar_pg(
+            "risco_associados",
+            "SELECT id::text AS id, nome, numero_titulo, telefone FROM associados WHERE id = ANY($1::uuid[])", ids,
+        )
+        return {r["id"]: dict(r) for r in linhas}
+    result = await executar(supabase.table("associados").select("id, nome, numero_titulo, telefone").in_("id", ids))
+    return {r["id"]: r for r in (result.data or [])}
+
+
+@mcp.tool()
+async def risco_inadimplencia(
+    limite: int = 20,
+    plano: Optional[str] = None,
+    incluir_inadimplentes: bool = True,
+    historico_meses: int = 24,
+) -> str:
+    """Lista os associados ativos com maior risco de inadimplência.
+
+    A nota (0 a 100) soma pontos por mensalidades em aberto, atraso recente,
+    atraso médio, pagamentos com atraso, plano e tempo de clube, calculados
+    sobre as mensalidades vencidas do período. Cada associado vem com os
+    pontos de cada indicador. Requer pip install -e ".[analise]".
+
+    Args:
+        limite: Quantos associados devolver, do maior risco para o menor (1 a 500)
+        plano: Filtrar por plano (individual, familiar, patrimonial)
+        incluir_inadimplentes: False para só quem não tem mensalidade vencida em aberto
+        historico_meses: Meses de mensalidades considerados (3 a 120, padrão 24)
+    """
+    try:
+        import numpy as np
+    except ImportError:
+        return err("O risco de inadimplência requer o pacote numpy: pip install -e \".[analise]\"")
+    limite = min(max(limite, 1), 500)
+    historico_meses = min(max(historico_meses, 3), 120)
+
+    try:
+        chave = ("risco", historico_meses, await _versao_risco())
+        notas = cache_risco.obter(chave)
+        if notas is None:
+            async with _calculo_risco:
+                # Outra chamada pode ter calculado enquanto esta esperava
+                notas = cache_risco.obter(chave)
+                if notas is None:
+                    notas = await _calcular_risco(historico_meses)
+                    cache_risco.guardar(chave, notas)
+
+        nota, indicadores = notas["nota"], notas["indicadores"]
+        candidatos = np.ones(len(nota), dtype=bool)
+        if plano:
+            candidatos &= notas["planos"] == plano
+        if not incluir_inadimplentes:
+            candidatos &= indicadores["meses_em_aberto"] == 0
+        posicoes = np.flatnonzero(candidatos)
+        if len(posicoes) > limite:
+            posicoes = posicoes[np.argpartition(-nota[posicoes], limite - 1)[:limite]]
+        posicoes = posicoes[np.argsort(-nota[posicoes], kind="stable")]
+
+        dados = await _dados_associados([notas["ids"][i] for i in posicoes])
+        associados = []
+        for i in posicoes.tolist():
+            aid = notas["ids"][i]
+            cadastro = dados.get(aid, {})
+            associados.append({
+                "associado_id": aid,
+                "nome": cadastro.get("nome"),
+                "numero_titulo": cadastro.get("numero_titulo"),
+                "telefone": cadastro.get("telefone"),
+                "plano": str(notas["planos"][i]),
+                "nota": round(float(nota[i]), 1),
+                "pontos": {k: round(float(v[i]), 1) for k, v in notas["pontos"].items()},
+                "indicadores": {k: round(float(v[i]), 1) for k, v in indicadores.items()},
+            })
+
+        resultado = {
+            "calculado_em": notas["calculado_em"],
+            "historico_desde": notas["desde"],
+            "associados_avaliados": len(nota),
+            "faixas": {
+                "alto": int((nota >= 60).sum()),
+                "medio": int(((nota >= 30) & (nota < 60)).sum()),
+                "baixo": int((nota < 30).sum()),
+            },
+            "taxa_em_aberto_por_plano_pct": notas["taxa_em_aberto_por_plano"],
+            "modelo": {"pesos": PESOS_RISCO, "tolerancia_dias": RISCO_TOLERANCIA_DIAS,
+                       "janela_recente_dias": RISCO_JANELA_RECENTE},
+            "associados": associados,
+        }
+        return ok(resultado, f"⚠️ {len(associados)} associado(s) com maior risco de inadimplência "
+                             f"({resultado['faixas']['alto']} em risco alto)")
+    except Exception as e:
+        return err(str(e))
+
+
+# ============================================================
+# MÓDULO: CONCILIAÇÃO BANCÁRIA (extratos OFX / CSV)
+# ============================================================
+
+# Cabeçalhos comuns nos CSVs exportados pelos bancos → campo do lançamento
+ALIASES_EXTRATO = {
+    "data_lancamento": "data", "data_movimento": "data", "dt_lancamento": "data",
+    "valor_r$": "valor", "valor_(r$)": "valor", "credito": "valor",
+    "historico": "descricao", "memo": "descricao", "lancamento": "descricao", "complemento": "descricao",
+    "documento": "cpf", "cpf_cnpj": "cpf", "cpf/cnpj": "cpf", "cpf_pagador": "cpf",
+    "fitid": "identificador", "id": "identificador", "id_transacao": "identificador",
+}
+RE_CPF_TEXTO = re.compile(r"(?<!\d)(\d{3}\.?\d{3}\.?\d{3}-?\d{2})(?!\d)")
+RE_REFERENCIA = re.compile(r"(?<!\d)(?:(20\d{2})[-/.](0[1-9]|1[0-2])|(0[1-9]|1[0-2])[-/.](20\d{2}))(?!\d)")
+RE_OFX_TAG = re.compile(r"<(\w+)>([^<\r\n]*)")
+# PATCH com id=in.(...) em blocos: 150 UUIDs mantêm a URL abaixo de ~6 KB
+BLOCO_IDS = 150
+
+
+def _valor_extrato(texto: str) -> float:
+    """Aceita 1.234,56 / 1234,56 / 1234.56 / R$ -120,00."""
+    limpo = re.sub(r"[^\d,.\-]", "", str(texto))
+    if "," in limpo:
+        limpo = limpo.replace(".", "").replace(",", ".")
+    return float(limpo)
+
+
+def _data_extrato(texto: str) -> str:
+    """Aceita DD/MM/AAAA, AAAA-MM-DD e o AAAAMMDD[hhmmss] do OFX."""
+    texto = str(texto).strip()
+    if re.fullmatch(r"\d{8}.*", texto):
+        return datetime.strptime(texto[:8], "%Y%m%d").date().isoformat()
+    return _data_importacao(texto[:10])
+
+
+def _ler_ofx(caminho: str) -> list[dict]:
+    """Extrai os <STMTTRN> de um OFX (SGML 1.x ou XML 2.x) sem dependências extras."""
+    with open(caminho, encoding="latin-1") as f:
+        conteudo = f.read()
+    lancamentos = []
+    for bloco in re.split(r"<STMTTRN>", conteudo, flags=re.IGNORECASE)[1:]:
+        bloco = re.split(r"</STMTTRN>", bloco, flags=re.IGNORECASE)[0]
+        tags = {t.upper(): v.strip() for t, v in RE_OFX_TAG.findall(bloco)}
+        lancamentos.append({
+            "data": tags.get("DTPOSTED", ""),
+            "valor": tags.get("TRNAMT", ""),
+            "descricao": " ".join(filter(None, (tags.get("NAME"), tags.get("MEMO")))),
+            "identificador": tags.get("FITID", ""),
+            "tipo": tags.get("TRNTYPE", ""),
+        })
+    return lancamentos
+
+
+def _ler_extrato(caminho: str) -> list[dict]:
+    if caminho.lower().endswith(".ofx"):
+        return _ler_ofx(caminho)
+    if not caminho.lower().endswith(".csv"):
+        raise ValueError("Formato não suportado: use .ofx ou .csv")
+    linhas = _ler_csv(caminho, ALIASES_EXTRATO)
+    if linhas and not {"data", "valor"} <= linhas[0].keys():
+        raise ValueError("O CSV precisa das colunas data e valor (e, de preferência, descricao e cpf)")
+    return linhas
+
+
+def _forma_extrato(descricao: str, padrao: str) -> str:
+    texto = descricao.upper()
+    if "PIX" in texto:
+        return "pix"
+    if "BOLETO" in texto or "TITULO" in texto or "COBRANCA" in texto:
+        return "boleto"
+    if re.search(r"\b(TED|DOC|TRANSF)", texto):
+        return "transferencia"
+    return padrao
+
+
+def _interpretar_lancamento(bruto: dict, padrao_forma: str) -> tuple[Optional[dict], Optional[str]]:
+    """Converte uma linha do extrato em crédito; débitos e linhas ilegíveis voltam com o motivo."""
+    try:
+        valor = _valor_extrato(bruto.get("valor") or "")
+        data_pagamento = _data_extrato(bruto.get("data") or "")
+    except ValueError:
+        return None, "data ou valor ilegível"
+    if valor <= 0:
+        return None, None  # débito: não entra na conciliação
+    descricao = str(bruto.get("descricao") or "").strip()
+
+    cpf = format_cpf(str(bruto.get("cpf") or ""))
+    if not validar_cpf(cpf):
+        cpf = next((c for c in map(format_cpf, RE_CPF_TEXTO.findall(descricao)) if validar_cpf(c)), None)
+    ref = RE_REFERENCIA.search(descricao)
+    referencia = None
+    if ref:
+        ano, mes = (ref.group(1), ref.group(2)) if ref.group(1) else (ref.group(4), ref.group(3))
+        referencia = f"{ano}-{mes}"
+
+    return {
+        "data": data_pagamento,
+        "valor": round(valor, 2),
+        "centavos": round(valor * 100),
+        "descricao": descricao,
+        "cpf": cpf,
+        "referencia": referencia,
+        "identificador": str(bruto.get("identificador") or "").strip() or None,
+        "forma_pagamento": _forma_extrato(descricao, padrao_forma),
+    }, None
+
+
+def _carregar_em_aberto() -> list[dict]:
+    """Todas as mensalidades pendentes/atrasadas com o CPF do associado, por keyset."""
+    em_aberto = []
+    for pagina in paginar_keyset(lambda: supabase.table("mensalidades").select(
+        "id, referencia, valor, data_vencimento, associados(cpf, nome, numero_titulo)"
+    ).in_("status", ["pendente", "atrasado"])):
+        em_aberto.extend(pagina)
+    return em_aberto
+
+
+class _IndiceMensalidades:
+    """Índices em memória das mensalidades em aberto: por CPF e por valor (centavos).
+
+    Cada mensalidade só pode ser baixada uma vez; as já usadas são puladas.
+    """
+
+    def __init__(self, mensalidades: list[dict]):
+        self.por_cpf: dict[str, list[dict]] = defaultdict(list)
+        self.por_valor: dict[int, list[dict]] = defaultdict(list)
+        self.usadas: set[str] = set()
+        for m in sorted(mensalidades, key=lambda m: (m["data_vencimento"], m["referencia"])):
+            m["centavos"] = round(float(m["valor"]) * 100)
+            cpf = format_cpf((m.get("associados") or {}).get("cpf") or "")
+            if cpf:
+                self.por_cpf[cpf].append(m)
+            self.por_valor[m["centavos"]].append(m)
+
+    def casar(self, credito: dict, tolerancia: int) -> tuple[list[dict], str]:
+        """Retorna (mensalidades, regra) ou ([], motivo) — da regra mais forte para a mais fraca."""
+        def bate(m):
+            return abs(m["centavos"] - credito["centavos"]) <= tolerancia
+
+        if credito["cpf"]:
+            do_cpf = [m for m in self.por_cpf.get(credito["cpf"], []) if m["id"] not in self.usadas]
+            if not do_cpf:
+                return [], "CPF sem mensalidade em aberto"
+            if credito["referencia"]:
+                achadas = [m for m in do_cpf if m["referencia"] == credito["referencia"] and bate(m)]
+                if achadas:
+                    return achadas[:1], "cpf_referencia"
+            achadas = [m for m in do_cpf if bate(m)]
+            if achadas:
+                return achadas[:1], "cpf_valor"  # a mais antiga primeiro
+            # Pagamento de várias mensalidades atrasadas de uma vez (as mais antigas)
+            soma = 0
+            for n, m in enumerate(do_cpf, start=1):
+                soma += m["centavos"]
+                if n > 1 and abs(soma - credito["centavos"]) <= tolerancia:
+                    return do_cpf[:n], "cpf_soma"
+                if soma > credito["centavos"] + tolerancia:
+                    break
+            return [], "valor não corresponde às mensalidades em aberto do CPF"
+
+        # Sem CPF só vale se o valor for único: basta achar a segunda candidata para desistir
+        candidatas = []
+        for m in self.por_valor.get(credito["centavos"], []):
+            if m["id"] not in self.usadas and credito["referencia"] in (None, m["referencia"]):
+                candidatas.append(m)
+                if len(candidatas) > 1:
+                    return [], "ambíguo: mais de uma mensalidade em aberto com esse valor e sem CPF no lançamento"
+        if candidatas:
+            return candidatas, "valor_unico"
+        return [], "nenhuma mensalidade em aberto com esse valor"
+
+
+def _aplicar_baixas(baixas: list[dict], observacao: str, erros: list[dict]) -> int:
+    """Baixa as mensalidades com um PATCH por grupo de dados idênticos (id=in.(...)).
+
+    O PostgREST não atualiza linhas com valores diferentes numa só requisição;
+    agrupando por (valor pago, data, forma) um extrato de milhares de créditos
+    vira poucas dezenas de requisições.
+    """
+    agora = datetime.now().isoformat()
+    grupos: dict[tuple, list[str]] = defaultdict(list)
+    for b in baixas:
+        grupos[(b["valor_pago"], b["data_pagamento"], b["forma_pagamento"])].append(b["mensalidade_id"])
+
+    baixadas = 0
+    for (valor_pago, data_pagamento, forma), ids in grupos.items():
+        dados = {
+            "status": "pago", "valor_pago": valor_pago, "data_pagamento": data_pagamento,
+            "forma_pagamento": forma, "observacao": observacao, "updated_at": agora,
+        }
+        for i in range(0, len(ids), BLOCO_IDS):
+            bloco = ids[i:i + BLOCO_IDS]
+            try:
+                # O filtro de status evita baixar duas vezes se outra baixa entrou no meio
+                result = supabase.table("mensalidades").update(dados).in_("id", bloco).in_(
+                    "status", ["pendente", "atrasado"]
+                ).execute()
+                baixadas += len(result.data or [])
+            except Exception as e:
+                erros.append({"mensalidades": bloco, "erro": getattr(e, "message", None) or str(e)})
+    return baixadas
+
+
+def _resumo_credito(credito: dict) -> dict:
+    return {k: credito[k] for k in ("data", "valor", "descricao", "cpf")}
+
+
+def _conciliar(caminho: str, forma_pagamento: str, tolerancia: float, simular: bool) -> dict:
+    brutas = _ler_extrato(caminho)
+    indice = _IndiceMensalidades(_carregar_em_aberto())
+    tolerancia_centavos = round(tolerancia * 100)
+
+    conciliadas, nao_conciliadas, baixas = [], [], []
+    identificadores = set()
+    debitos = 0
+    por_regra: dict[str, int] = defaultdict(int)
+    inicio = 1 if caminho.lower().endswith(".ofx") else 2
+    for numero, bruta in enumerate(brutas, start=inicio):
+        credito, motivo = _interpretar_lancamento(bruta, forma_pagamento)
+        if credito is None:
+            if motivo:
+                nao_conciliadas.append({"linha": numero, "data": bruta.get("data"), "valor": bruta.get("valor"),
+                                        "descricao": bruta.get("descricao"), "cpf": None, "motivo": motivo})
+            else:
+                debitos += 1
+            continue
+        if credito["identificador"]:
+            if credito["identificador"] in identificadores:
+                nao_conciliadas.append({"linha": numero, **_resumo_credito(credito), "motivo": "lançamento repetido"})
+                continue
+            identificadores.add(credito["identificador"])
+
+        mensalidades, regra = indice.casar(credito, tolerancia_centavos)
+        if not mensalidades:
+            nao_conciliadas.append({"linha": numero, **_resumo_credito(credito), "motivo": regra})
+            continue
+
+        por_regra[regra] += 1
+        for m in mensalidades:
+            indice.usadas.add(m["id"])
+            # Um crédito que quita várias mensalidades é repartido pelo valor de cada uma
+            valor_pago = credito["valor"] if len(mensalidades) == 1 else float(m["valor"])
+            baixas.append({
+                "mensalidade_id": m["id"], "valor_pago": valor_pago,
+                "data_pagamento": credito["data"], "forma_pagamento": credito["forma_pagamento"],
+            })
+        associado = mensalidades[0].get("associados") or {}
+        conciliadas.append({
+            "linha": numero, **_resumo_credito(credito), "regra": regra,
+            "associado": associado.get("nome"), "numero_titulo": associado.get("numero_titulo"),
+            "referencias": [m["referencia"] for m in mensalidades],
+        })
+
+    erros: list[dict] = []
+    baixadas = 0
+    if not simular and baixas:
+        baixadas = _aplicar_baixas(baixas, f"Conciliação do extrato {os.path.basename(caminho)}", erros)
+
+    return {
+        "arquivo": caminho,
+        "lancamentos": len(brutas),
+        "debitos_ignorados": debitos,
+        "creditos": len(brutas) - debitos,
+        "mensalidades_em_aberto": sum(len(v) for v in indice.por_valor.values()),
+        "conciliados": len(conciliadas),
+        "por_regra": dict(por_regra),
+        "valor_conciliado": round(sum(c["valor"] for c in conciliadas), 2),
+        "mensalidades_a_baixar": len(baixas),
+        "mensalidades_baixadas": baixadas,
+        "nao_conciliados": len(nao_conciliadas),
+        "valor_nao_conciliado": round(sum(n["valor"] for n in nao_conciliadas if isinstance(n["valor"], float)), 2),
+        "erros_gravacao": erros,
+        "conciliadas": conciliadas,
+        "pendencias": nao_conciliadas,
+    }
+
+
+@mcp.tool()
+async def conciliar_pagamentos(
+    arquivo: str,
+    forma_pagamento: str = "pix",
+    tolerancia: float = 0.0,
+    simular: bool = False,
+) -> str:
+    """Concilia um extrato bancário (OFX ou CSV) com as mensalidades em aberto e dá baixa em lote.
+
+    Cada crédito é casado, nesta ordem, por: CPF do pagador + mês de referência
+    + valor; CPF + valor (a mensalidade mais antiga); CPF + soma das mensalidades
+    mais antigas (pagamento de atrasados de uma vez); e, sem CPF, pelo valor
+    quando só uma mensalidade em aberto o tem. O CPF e a referência (AAAA-MM ou
+    MM/AAAA) vêm da coluna cpf ou são procurados na descrição do lançamento.
+    Débitos são ignorados. Os créditos não conciliados são devolvidos com o motivo.
+
+    CSV: colunas data e valor obrigatórias; descricao (ou historico), cpf e
+    identificador opcionais. Valores em 1.234,56 ou 1234.56.
+
+    Args:
+        arquivo: Nome do extrato dentro da pasta de importação (IMPORT_DIR)
+        forma_pagamento: Forma registrada quando a descrição não indica PIX/boleto/TED
+        tolerancia: Diferença aceita entre o crédito e a mensalidade, em reais (ex: 0.05)
+        simular: Apenas casa e informa o que seria baixado, sem gravar
+    """
+    try:
+        caminho = _caminho_importacao(arquivo)
+        resultado = await asyncio.to_thread(_conciliar, caminho, forma_pagamento, max(tolerancia, 0.0), simular)
+    except Exception as e:
+        return err(str(e))
+
+    pendencias = resultado.pop("pendencias")
+    conciliadas = resultado.pop("conciliadas")
+    if pendencias:
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        relatorio = os.path.abspath(os.path.join(
+            EXPORT_DIR, f"conciliacao-pendencias-{datetime.now().strftime('%Y%m%d-%H%M%S')}.csv"
+        ))
+        with open(relatorio, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["linha", "data", "valor", "cpf", "descricao", "motivo"])
+            writer.writerows([p["linha"], p["data"], p["valor"], p["cpf"], p["descricao"], p["motivo"]]
+                             for p in pendencias)
+        resultado["relatorio_pendencias"] = relatorio
+        resultado["primeiras_pendencias"] = pendencias[:50]
+    resultado["primeiras_conciliadas"] = conciliadas[:20]
+
+    if simular:
+        msg = (f"🔎 Simulação: {resultado['conciliados']} crédito(s) conciliado(s), "
+               f"{resultado['mensalidades_a_baixar']} mensalidade(s) a baixar, {len(pendencias)} pendência(s)")
+    else:
+        msg = (f"✅ Conciliação concluída: {resultado['mensalidades_baixadas']} mensalidade(s) baixada(s), "
+               f"{len(pendencias)} pendência(s)")
+    return ok(resultado, msg)
+
+
 # ============================================================
 # MÓDULO: PORTARIA (corrigido - usa created_at, ponto_acesso_id)
 # ============================================================
+# Com a database/025 os meses além da retenção saem de registros_acesso e vão
+# para registros_acesso_arquivo; registros_acesso busca lá quando data_inicio
+# cai num período já arquivado.
+
+TTL_ARQUIVO_ACESSOS = 300
+_arquivo_acessos: dict[str, Any] = {"ate": None, "validade": 0.0}
+
+
+async def arquivo_acessos_ate() -> Optional[str]:
+    """created_at do registro mais recente já arquivado, renovado a cada TTL_ARQUIVO_ACESSOS.
+
+    None se nada foi arquivado ou se a database/025 não foi aplicada.
+    """
+    if time.monotonic() >= _arquivo_acessos["validade"]:
+        try:
+            result = await executar(
+                supabase.table("registros_acesso_arquivo").select("ultimo").order("ultimo", desc=True).limit(1)
+            )
+            ate = result.data[0]["ultimo"] if result.data else None
+        except APIError:
+            ate = None
+        _arquivo_acessos.update(ate=ate, validade=time.monotonic() + TTL_ARQUIVO_ACESSOS)
+    return _arquivo_acessos["ate"]
+
 
 @mcp.tool()
 async def registros_acesso(
@@ -519,6 +2586,9 @@ async def registros_acesso(
 ) -> str:
     """Lista registros de acesso na portaria.
 
+    Se data_inicio cai num mês já arquivado, completa a lista com os
+    registros do arquivo (marcados com "arquivado": true).
+
     Args:
         local: Local de acesso (clube, piscina, academia) - filtra pelo ponto de acesso
         tipo: Tipo de registro (entrada, saida)
@@ -541,23 +2611,160 @@ async def registros_acesso(
         if data_fim:
             query = query.lte("created_at", f"{data_fim}T23:59:59")
 
-        result = query.execute()
+        result = await executar(query)
 
         # Filtrar por local (tipo do ponto de acesso) em memória se necessário
         data = result.data or []
         if local:
             data = [r for r in data if r.get("pontos_acesso", {}).get("tipo") == local]
 
-        return ok(data, f"✅ {len(data)} registro(s) de acesso")
+        # A tabela acabou antes do limite: o resto do período pode estar no arquivo
+        arquivados = []
+        if data_inicio and len(result.data or []) < limite:
+            ate = await arquivo_acessos_ate()
+            if ate and data_inicio <= ate[:10]:
+                arquivo = await executar(supabase.rpc("buscar_registros_arquivados", {
+                    "p_inicio": f"{data_inicio}T00:00:00",
+                    "p_fim": f"{data_fim}T23:59:59" if data_fim else None,
+                    "p_tipo": tipo,
+                    "p_associado_id": associado_id,
+                    "p_local": local,
+                    "p_limite": limite - len(data),
+                }))
+                arquivados = arquivo.data or []
+
+        msg = f"✅ {len(data) + len(arquivados)} registro(s) de acesso"
+        if arquivados:
+            msg += f" ({len(arquivados)} do arquivo)"
+        return ok(data + arquivados, msg)
     except Exception as e:
         return err(str(e))
 
 
+@mcp.tool()
+async def arquivar_registros_acesso(meses_retencao: int = REGISTROS_RETENCAO_MESES, simular: bool = False) -> str:
+    """Arquiva os meses de registros de acesso além da retenção (database/025).
+
+    Cada mês vira blocos comprimidos em registros_acesso_arquivo e a
+    partição sai da tabela. Também cria as partições dos próximos meses.
+    Os registros arquivados continuam aparecendo em registros_acesso.
+
+    Args:
+        meses_retencao: Meses mantidos em registros_acesso, além do atual (padrão REGISTROS_RETENCAO_MESES)
+        simular: Se True, só lista as partições que seriam arquivadas
+    """
+    try:
+        result = await executar(supabase.rpc("arquivar_registros_acesso", {
+            "p_meses_retencao": meses_retencao, "p_simular": simular,
+        }))
+        particoes = result.data or []
+        if not simular:
+            _arquivo_acessos["validade"] = 0.0
+        meses = [p for p in particoes if "mes" in p]
+        total = sum(p["registros"] for p in meses)
+        acao = "seriam arquivados" if simular else "arquivados"
+        return ok(particoes, f"🗄️ {len(meses)} mês(es), {total} registro(s) {acao}")
+    except Exception as e:
+        error_msg = str(e)
+        if "PGRST202" in error_msg or "could not find" in error_msg.lower():
+            return err(
+                "A function RPC 'arquivar_registros_acesso' não existe no Supabase. Execute o script "
+                "database/025_registros_acesso_particionado.sql no SQL Editor para particionar registros_acesso."
+            )
+        return err(error_msg)
+
+
+LOCAIS_COM_EXAME = ("academia", "piscina")
+
+
+def veredito_acesso(
+    pessoa: dict,
+    local: str,
+    atrasadas: int,
+    exame: Optional[dict],
+    titular: Optional[dict] = None,
+) -> dict:
+    """Aplica as regras de acesso da portaria a dados já carregados.
+
+    Usada por validar_acesso (uma pessoa, um local) e por perfil_completo
+    (titular e dependentes em todos os locais), para que as duas decidam igual.
+
+    Args:
+        pessoa: Linha de associados ou dependentes (usa o status)
+        local: Local de acesso (clube, piscina, academia)
+        atrasadas: Mensalidades atrasadas do titular
+        exame: Último exame ainda válido da pessoa (ultimo_exame_valido) ou None
+        titular: Para dependentes, o associado titular (usa o status)
+    """
+    if titular is not None and titular.get("status") != "ativo":
+        return {"permitido": False, "motivo": f"Titular com status '{titular.get('status')}' - acesso negado"}
+    if pessoa.get("status") != "ativo":
+        return {"permitido": False, "motivo": f"Status '{pessoa.get('status')}' - acesso negado"}
+    if atrasadas > 0:
+        return {
+            "permitido": False,
+            "motivo": "Associado inadimplente",
+            "alertas": [f"⚠️ {atrasadas} mensalidade(s) atrasada(s)"],
+        }
+
+    alertas = []
+    if local in LOCAIS_COM_EXAME:
+        if not exame:
+            return {"permitido": False, "motivo": f"Exame médico obrigatório para {local} não encontrado ou vencido"}
+        if exame.get("resultado") not in RESULTADOS_APTOS:
+            return {
+                "permitido": False,
+                "motivo": f"Último exame médico com resultado '{exame.get('resultado')}' - acesso negado",
+                "exame": exame,
+            }
+        if exame.get("resultado") == "apto_restricao":
+            alertas.append(f"⚠️ Exame apto com restrição (válido até {exame['data_validade']})")
+    return {"permitido": True, "alertas": alertas}
+
+
+async def _validar_acesso_remoto(pessoa_id: str, tipo_pessoa: str, local: str) -> dict:
+    if tipo_pessoa == "associado":
+        pessoa = await executar(supabase.table("associados").select("*").eq("id", pessoa_id).single())
+        dados, titular = pessoa.data, None
+        titular_id = pessoa_id
+    else:
+        pessoa = await executar(
+            supabase.table("dependentes").select("*, associados(id, status)").eq("id", pessoa_id).single()
+        )
+        dados = pessoa.data
+        titular_id = dados.get("associado_id")
+        titular = dados.get("associados") or {}
+
+    atrasadas, exame = 0, None
+    if (titular is None or titular.get("status") == "ativo") and dados.get("status") == "ativo":
+        # Adimplência e exame são independentes: as duas consultas saem juntas
+        consultas = [executar(
+            supabase.table("mensalidades").select("*", count="exact", head=True)
+            .eq("associado_id", titular_id).eq("status", "atrasado")
+        )]
+        if local in LOCAIS_COM_EXAME:
+            consultas.append(asyncio.to_thread(
+                ultimo_exame_valido, "associado" if tipo_pessoa == "associado" else "dependente", pessoa_id,
+            ))
+        respostas = await asyncio.gather(*consultas)
+        atrasadas = respostas[0].count or 0
+        exame = respostas[1] if len(respostas) > 1 else None
+
+    return {**veredito_acesso(dados, local, atrasadas, exame, titular), "pessoa": dados}
+
+
+def _resposta_acesso(resultado: dict, local: str) -> str:
+    if not resultado["permitido"]:
+        return ok(resultado)
+    return ok(resultado, f"✅ Acesso PERMITIDO ao(à) {local}")
+
+
 @mcp.tool()
 async def validar_acesso(pessoa_id: str, tipo_pessoa: str, local: str = "clube") -> str:
     """Valida se uma pessoa pode acessar determinado local do clube.
 
     Verifica: status ativo, adimplência, exame médico (para academia/piscina).
+    Com PORTARIA_OFFLINE, usa a réplica local se o Supabase não responder.
 
     Args:
         pessoa_id: UUID da pessoa (associado ou dependente)
@@ -565,69 +2772,96 @@ async def validar_acesso(pessoa_id: str, tipo_pessoa: str, local: str = "clube")
         local: Local de acesso (clube, piscina, academia)
     """
     try:
-        alertas = []
-        
-        if tipo_pessoa == "associado":
-            pessoa = supabase.table("associados").select("*").eq("id", pessoa_id).single().execute()
-            dados = pessoa.data
-            titular_id = pessoa_id
-        else:
-            pessoa = supabase.table("dependentes").select("*, associados(id, status)").eq("id", pessoa_id).single().execute()
-            dados = pessoa.data
-            titular_id = dados.get("associado_id")
-            titular = dados.get("associados", {})
-            if titular.get("status") != "ativo":
-                return ok({
-                    "permitido": False,
-                    "motivo": f"Titular com status '{titular.get('status')}' - acesso negado",
-                    "pessoa": dados,
-                })
-
-        if dados.get("status") != "ativo":
-            return ok({
-                "permitido": False,
-                "motivo": f"Status '{dados.get('status')}' - acesso negado",
-                "pessoa": dados,
-            })
+        resultado = await na_portaria(
+            lambda: _validar_acesso_remoto(pessoa_id, tipo_pessoa, local),
+            lambda: replica_portaria.validar(pessoa_id, tipo_pessoa, local),
+        )
+        return _resposta_acesso(resultado, local)
+    except Exception as e:
+        return err(str(e))
 
-        # Verificar adimplência
-        atrasados = supabase.table("mensalidades").select("*", count="exact", head=True)\
-            .eq("associado_id", titular_id).eq("status", "atrasado").execute()
 
-        if (atrasados.count or 0) > 0:
-            alertas.append(f"⚠️ {atrasados.count} mensalidade(s) atrasada(s)")
-            return ok({
-                "permitido": False,
-                "motivo": "Associado inadimplente",
-                "alertas": alertas,
-                "pessoa": dados,
-            })
+async def _validar_carteirinha_remoto(qrcode_hash: str, local: str) -> dict:
+    result = await executar(
+        supabase.table("carteirinhas").select("associado_id, dependente_id, data_validade, ativa")
+        .eq("qrcode_hash", qrcode_hash).limit(1)
+    )
+    carteirinha = result.data[0] if result.data else None
+    motivo = _carteirinha_invalida(carteirinha)
+    if motivo:
+        return {"permitido": False, "motivo": motivo}
+    if carteirinha["associado_id"]:
+        return await _validar_acesso_remoto(carteirinha["associado_id"], "associado", local)
+    return await _validar_acesso_remoto(carteirinha["dependente_id"], "dependente", local)
+
+
+def _carteirinha_invalida(carteirinha: Optional[dict]) -> Optional[str]:
+    if not carteirinha:
+        return "Carteirinha não encontrada"
+    if not carteirinha.get("ativa", True):
+        return "Carteirinha cancelada (há uma via mais nova ou foi bloqueada)"
+    if carteirinha["data_validade"] < date.today().isoformat():
+        return f"Carteirinha vencida em {carteirinha['data_validade']}"
+    if not (carteirinha.get("associado_id") or carteirinha.get("dependente_id")):
+        return "Carteirinha de agregado: valide pelo cadastro do agregado"
+    return None
 
-        # Verificar exame médico para academia/piscina
-        if local in ("academia", "piscina"):
-            exame_field = "associado_id" if tipo_pessoa == "associado" else "dependente_id"
-            exame = supabase.table("exames_medicos").select("*")\
-                .eq(exame_field, pessoa_id).eq("resultado", "apto")\
-                .gte("data_validade", date.today().isoformat())\
-                .order("data_validade", desc=True).limit(1).execute()
-
-            if not exame.data:
-                return ok({
-                    "permitido": False,
-                    "motivo": f"Exame médico obrigatório para {local} não encontrado ou vencido",
-                    "pessoa": dados,
-                })
-
-        return ok({
-            "permitido": True,
-            "alertas": alertas,
-            "pessoa": dados,
-        }, f"✅ Acesso PERMITIDO ao(à) {local}")
 
+@mcp.tool()
+async def validar_carteirinha(qrcode_hash: str, local: str = "clube") -> str:
+    """Valida o acesso a partir do QR code lido na carteirinha.
+
+    Confere a carteirinha (ativa e dentro da validade) e aplica as mesmas
+    regras de validar_acesso ao titular ou dependente dono dela. Com
+    PORTARIA_OFFLINE, usa a réplica local se o Supabase não responder.
+
+    Args:
+        qrcode_hash: Hash lido do QR code (carteirinhas.qrcode_hash)
+        local: Local de acesso (clube, piscina, academia)
+    """
+    try:
+        resultado = await na_portaria(
+            lambda: _validar_carteirinha_remoto(qrcode_hash, local),
+            lambda: replica_portaria.validar_carteirinha(qrcode_hash, local),
+        )
+        return _resposta_acesso(resultado, local)
     except Exception as e:
         return err(str(e))
 
 
+def _registro_acesso(pessoa_id: str, tipo_pessoa: str, tipo: str, observacao: Optional[str]) -> dict:
+    """Linha de registros_acesso sem o ponto de acesso.
+
+    O id e o horário da leitura já saem daqui: se a gravação online estourar
+    o tempo depois de chegar ao banco, o diário offline reusa o mesmo id e o
+    reenvio não duplica o acesso.
+    """
+    if tipo_pessoa not in ("associado", "dependente", "convidado"):
+        raise ValueError(f"tipo_pessoa inválido: {tipo_pessoa} (use associado, dependente ou convidado)")
+    dados = {
+        "id": str(uuid.uuid4()),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "tipo": tipo,
+        f"{tipo_pessoa}_id": pessoa_id,
+    }
+    if observacao:
+        dados["observacoes"] = observacao
+    return dados
+
+
+async def _registrar_acesso_remoto(dados: dict, local: str) -> dict:
+    ponto = await executar(
+        supabase.table("pontos_acesso").select("id").eq("tipo", local).eq("ativo", True).limit(1)
+    )
+    if not ponto.data:
+        raise ValueError(f"Ponto de acesso '{local}' não encontrado ou inativo. Cadastre um ponto de acesso primeiro.")
+
+    # Upsert pelo id: repetir a gravação (ou reenviá-la pelo diário offline) não duplica
+    registro = novo_registro(dados, ponto.data[0]["id"])
+    await asyncio.to_thread(enviar_registros, [registro])
+    return registro
+
+
 @mcp.tool()
 async def registrar_acesso(
     pessoa_id: str,
@@ -638,6 +2872,10 @@ async def registrar_acesso(
 ) -> str:
     """Registra uma entrada ou saída na portaria.
 
+    Com ACESSO_LOTE_MS, responde na hora e o registro é gravado no próximo
+    lote. Com PORTARIA_OFFLINE, se o Supabase não responder o registro vai
+    para o diário local e é enviado quando a conexão voltar.
+
     Args:
         pessoa_id: UUID da pessoa
         tipo_pessoa: Tipo (associado, dependente, convidado)
@@ -646,31 +2884,17 @@ async def registrar_acesso(
         observacao: Observação opcional
     """
     try:
-        # Buscar ponto de acesso pelo tipo/local
-        ponto = supabase.table("pontos_acesso").select("id")\
-            .eq("tipo", local).eq("ativo", True).limit(1).execute()
-
-        if not ponto.data:
-            return err(f"Ponto de acesso '{local}' não encontrado ou inativo. Cadastre um ponto de acesso primeiro.")
-
-        dados = {
-            "ponto_acesso_id": ponto.data[0]["id"],
-            "tipo": tipo,
-        }
-
-        # Definir campo correto baseado no tipo de pessoa
-        if tipo_pessoa == "associado":
-            dados["associado_id"] = pessoa_id
-        elif tipo_pessoa == "dependente":
-            dados["dependente_id"] = pessoa_id
-        elif tipo_pessoa == "convidado":
-            dados["convidado_id"] = pessoa_id
-
-        if observacao:
-            dados["observacoes"] = observacao
-
-        result = supabase.table("registros_acesso").insert(dados).execute()
-        return ok(result.data[0], f"✅ {tipo.capitalize()} registrada no(a) {local}")
+        dados = _registro_acesso(pessoa_id, tipo_pessoa, tipo, observacao)
+        if fila_acessos is not None:
+            registro = await fila_acessos.registrar(dados, local)
+        else:
+            registro = await na_portaria(
+                lambda: _registrar_acesso_remoto(dados, local),
+                lambda: replica_portaria.registrar(dados, local),
+            )
+        if registro.get("offline"):
+            return ok(registro, f"📴 {tipo.capitalize()} registrada offline no(a) {local} (será enviada ao Supabase)")
+        return ok(registro, f"✅ {tipo.capitalize()} registrada no(a) {local}")
     except Exception as e:
         return err(str(e))
 
@@ -688,8 +2912,8 @@ async def estatisticas_portaria(local: Optional[str] = None) -> str:
         # Buscar ponto de acesso se local especificado
         ponto_id = None
         if local:
-            ponto = supabase.table("pontos_acesso").select("id")\
-                .eq("tipo", local).eq("ativo", True).limit(1).execute()
+            ponto = await executar(supabase.table("pontos_acesso").select("id")
+                                   .eq("tipo", local).eq("ativo", True).limit(1))
             if ponto.data:
                 ponto_id = ponto.data[0]["id"]
 
@@ -702,8 +2926,8 @@ async def estatisticas_portaria(local: Optional[str] = None) -> str:
             query_entradas = query_entradas.eq("ponto_acesso_id", ponto_id)
             query_saidas = query_saidas.eq("ponto_acesso_id", ponto_id)
 
-        entradas = query_entradas.execute()
-        saidas = query_saidas.execute()
+        # Com registros_acesso particionada, cada contagem só lê a partição do mês
+        entradas, saidas = await asyncio.gather(executar(query_entradas), executar(query_saidas))
 
         stats = {
             "data": hoje,
@@ -717,54 +2941,1402 @@ async def estatisticas_portaria(local: Optional[str] = None) -> str:
         return err(str(e))
 
 
+# ============================================================
+# MÓDULO: PORTARIA OFFLINE (réplica SQLite)
+# ============================================================
+# Com PORTARIA_OFFLINE o servidor guarda em disco uma cópia do que a portaria
+# precisa para decidir (pessoas, inadimplência, último exame válido,
+# carteirinhas, pontos de acesso). Se o Supabase não responder em
+# PORTARIA_TIMEOUT, validar_acesso, validar_carteirinha e registrar_acesso
+# usam a réplica, e os registros vão para um diário local. O id de cada
+# registro é gerado aqui, então reenviar o diário é idempotente.
+
+SCHEMA_REPLICA = """
+CREATE TABLE IF NOT EXISTS pessoas (
+  id TEXT PRIMARY KEY, tipo TEXT NOT NULL, titular_id TEXT NOT NULL, nome TEXT, status TEXT);
+CREATE TABLE IF NOT EXISTS atrasadas (associado_id TEXT PRIMARY KEY, quantidade INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS exames (
+  pessoa_id TEXT PRIMARY KEY, data_validade TEXT NOT NULL, resultado TEXT, data_exame TEXT);
+CREATE TABLE IF NOT EXISTS carteirinhas (
+  qrcode_hash TEXT PRIMARY KEY, associado_id TEXT, dependente_id TEXT, data_validade TEXT NOT NULL,
+  ativa INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS pontos_acesso (tipo TEXT PRIMARY KEY, id TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS meta (chave TEXT PRIMARY KEY, valor TEXT);
+"""
+
+
+def remoto_indisponivel(erro: BaseException) -> bool:
+    """Falha de rede, timeout ou gateway fora do ar (não um erro da consulta em si)."""
+    if isinstance(erro, (httpx.TransportError, TimeoutError)):
+        return True
+    return isinstance(erro, APIError) and str(erro.code) in ("502", "503", "504", "520")
+
+
+@contextlib.contextmanager
+def conectar_sqlite(caminho: str) -> Iterator[sqlite3.Connection]:
+    """Conexão SQLite numa transação (commit ao sair, rollback se der erro)."""
+    conn = sqlite3.connect(caminho, timeout=10)
+    conn.row_factory = sqlite3.Row
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def novo_registro(dados: dict, ponto_acesso_id: str) -> dict:
+    """Registro de acesso com id e horário gerados aqui (o horário é o da leitura, não o da gravação).
+
+    Mantém o id e o horário que `dados` já tiver (ver _registro_acesso).
+    """
+    return {
+        "id": str(uuid.uuid4()),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        **dados,
+        "ponto_acesso_id": ponto_acesso_id,
+    }
+
+
+# Chave de registros_acesso: (id, created_at) com a tabela particionada (database/025), só id antes dela
+_conflito_registros = "id,created_at"
+
+
+def enviar_registros(registros: list[dict]) -> None:
+    """Grava registros_acesso com id gerado no servidor; ids que já existem são ignorados."""
+    global _conflito_registros
+    try:
+        supabase.table("registros_acesso").upsert(
+            registros, on_conflict=_conflito_registros, ignore_duplicates=True, returning="minimal",
+        ).execute()
+    except APIError as e:
+        # 42P10: não há chave única (id, created_at) - database/025 ainda não aplicada
+        if str(e.code) != "42P10" or _conflito_registros == "id":
+            raise
+        _conflito_registros = "id"
+        enviar_registros(registros)
+
+
+class DiarioAcessos:
+    """Registros de acesso guardados em SQLite até o Supabase confirmar a gravação.
+
+    Cada registro já tem id e created_at, então reenviar um lote cuja
+    confirmação se perdeu não duplica nada. Os métodos fazem I/O e são
+    chamados via asyncio.to_thread.
+    """
+
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        with conectar_sqlite(caminho) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS diario ("
+                         "id TEXT PRIMARY KEY, registro TEXT NOT NULL, criado_em TEXT NOT NULL)")
+
+    def gravar(self, registros: list[dict]) -> None:
+        with conectar_sqlite(self.caminho) as conn:
+            conn.executemany("INSERT OR IGNORE INTO diario VALUES (?, ?, ?)",
+                             [(r["id"], json.dumps(r), r["created_at"]) for r in registros])
+
+    def pendentes(self, limite: int = -1) -> list[dict]:
+        with conectar_sqlite(self.caminho) as conn:
+            linhas = conn.execute("SELECT registro FROM diario ORDER BY criado_em, id LIMIT ?", (limite,)).fetchall()
+        return [json.loads(linha["registro"]) for linha in linhas]
+
+    def confirmar(self, ids: list[str]) -> None:
+        with conectar_sqlite(self.caminho) as conn:
+            conn.executemany("DELETE FROM diario WHERE id = ?", [(i,) for i in ids])
+
+    def contar(self) -> int:
+        with conectar_sqlite(self.caminho) as conn:
+            return conn.execute("SELECT COUNT(*) FROM diario").fetchone()[0]
+
+    def enviar(self) -> int:
+        """Envia o diário ao Supabase em lotes de IMPORT_LOTE e apaga os confirmados."""
+        enviados = 0
+        while lote := self.pendentes(IMPORT_LOTE):
+            enviar_registros(lote)
+            self.confirmar([r["id"] for r in lote])
+            enviados += len(lote)
+        return enviados
+
+
+class ReplicaPortaria:
+    """Réplica local da elegibilidade da portaria e diário dos acessos registrados offline.
+
+    Os métodos síncronos fazem I/O (SQLite ou PostgREST) e são chamados via
+    asyncio.to_thread. Cada chamada abre a sua conexão; em modo WAL as
+    leituras da portaria não esperam a sincronização terminar.
+    """
+
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        self.pausa_ate = 0.0
+        self.diario = DiarioAcessos(caminho)
+        self._tarefa: Optional[asyncio.Task] = None
+        with self._conectar() as conn:
+            conn.executescript(SCHEMA_REPLICA)
+
+    def _conectar(self) -> contextlib.AbstractContextManager[sqlite3.Connection]:
+        return conectar_sqlite(self.caminho)
+
+    # --- Supabase fora do ar ---
+
+    def remoto_pausado(self) -> bool:
+        return time.monotonic() < self.pausa_ate
+
+    def pausar(self, erro: BaseException) -> None:
+        """Depois de uma falha, vai direto à réplica por PORTARIA_PAUSA_REMOTO segundos."""
+        if not self.remoto_pausado():
+            logger.warning(f"Supabase indisponível ({type(erro).__name__}: {erro}); portaria usando a réplica local")
+        self.pausa_ate = time.monotonic() + PORTARIA_PAUSA_REMOTO
+
+    # --- Sincronização ---
+
+    def sincronizar(self) -> dict:
+        """Baixa um retrato novo da elegibilidade e troca a réplica numa transação."""
+        hoje = date.today().isoformat()
+
+        def tudo(montar: Callable[[], Any]) -> list[dict]:
+            return [linha for pagina in paginar_keyset(montar) for linha in pagina]
+
+        associados = tudo(lambda: supabase.table("associados").select("id, nome, status"))
+        dependentes = tudo(lambda: supabase.table("dependentes").select("id, associado_id, nome, status"))
+        atrasadas = tudo(lambda: supabase.table("mensalidades").select("id, associado_id").eq("status", "atrasado"))
+        exames = tudo(lambda: supabase.table("exames_medicos")
+                      .select("id, associado_id, dependente_id, data_validade, resultado, data_exame")
+                      .gte("data_validade", hoje))
+        # Também as canceladas e vencidas, para a portaria offline dizer o motivo certo
+        carteirinhas = tudo(lambda: supabase.table("carteirinhas")
+                            .select("id, associado_id, dependente_id, qrcode_hash, data_validade, ativa"))
+        pontos = tudo(lambda: supabase.table("pontos_acesso").select("id, tipo").eq("ativo", True))
+
+        por_associado: dict[str, int] = defaultdict(int)
+        for m in atrasadas:
+            por_associado[m["associado_id"]] += 1
+        # Mesmo critério de ultimo_exame_valido: a maior data_validade ainda válida
+        ultimo_exame: dict[str, dict] = {}
+        for e in exames:
+            pessoa = e.get("associado_id") or e.get("dependente_id")
+            if pessoa and e["data_validade"] > ultimo_exame.get(pessoa, {}).get("data_validade", ""):
+                ultimo_exame[pessoa] = e
+
+        with self._conectar() as conn:
+            for tabela in ("pessoas", "atrasadas", "exames", "carteirinhas", "pontos_acesso"):
+                conn.execute(f"DELETE FROM {tabela}")
+            conn.executemany("INSERT INTO pessoas VALUES (?, 'associado', ?, ?, ?)",
+                             [(a["id"], a["id"], a["nome"], a["status"]) for a in associados])
+            conn.executemany("INSERT INTO pessoas VALUES (?, 'dependente', ?, ?, ?)",
+                             [(d["id"], d["associado_id"], d["nome"], d["status"]) for d in dependentes])
+            conn.executemany("INSERT INTO atrasadas VALUES (?, ?)", por_associado.items())
+            conn.executemany("INSERT INTO exames VALUES (?, ?, ?, ?)", [
+                (pessoa, e["data_validade"], e.get("resultado"), e.get("data_exame"))
+                for pessoa, e in ultimo_exame.items()
+            ])
+            conn.executemany("INSERT OR REPLACE INTO carteirinhas VALUES (?, ?, ?, ?, ?)", [
+                (c["qrcode_hash"], c.get("associado_id"), c.get("dependente_id"), c["data_validade"],
+                 c.get("ativa", True))
+                for c in carteirinhas
+            ])
+            # registrar_acesso usa o primeiro ponto ativo de cada tipo
+            conn.executemany("INSERT OR IGNORE INTO pontos_acesso VALUES (?, ?)",
+                             [(p["tipo"], p["id"]) for p in pontos])
+            conn.execute("INSERT OR REPLACE INTO meta VALUES ('sincronizado_em', ?)",
+                         (datetime.now(timezone.utc).isoformat(timespec="seconds"),))
+        return {
+            "pessoas": len(associados) + len(dependentes),
+            "inadimplentes": len(por_associado),
+            "exames_validos": len(ultimo_exame),
+            "carteirinhas": len(carteirinhas),
+        }
+
+    def enviar_diario(self) -> int:
+        """Envia ao Supabase os acessos registrados offline (ver DiarioAcessos.enviar)."""
+        return self.diario.enviar()
+
+    async def manter(self) -> None:
+        """Laço do lifespan: esvazia o diário e renova a réplica a cada PORTARIA_SYNC_SEGUNDOS."""
+        while True:
+            try:
+                enviados = await asyncio.to_thread(self.enviar_diario)
+                if enviados:
+                    logger.info(f"Portaria offline: {enviados} acesso(s) do diário enviados ao Supabase")
+                await asyncio.to_thread(self.sincronizar)
+                self.pausa_ate = 0.0
+            except Exception as e:
+                if not remoto_indisponivel(e):
+                    logger.exception("Falha ao sincronizar a réplica da portaria")
+                else:
+                    self.pausar(e)
+            await asyncio.sleep(PORTARIA_SYNC_SEGUNDOS)
+
+    def iniciar(self) -> None:
+        if self._tarefa is None:
+            self._tarefa = asyncio.create_task(self.manter())
+
+    async def parar(self) -> None:
+        """Para o laço e tenta uma última vez esvaziar o diário (o que sobrar fica em disco)."""
+        if self._tarefa is not None:
+            self._tarefa.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._tarefa
+            self._tarefa = None
+        try:
+            await asyncio.wait_for(asyncio.to_thread(self.enviar_diario), PORTARIA_TIMEOUT * 3)
+        except Exception as e:
+            logger.warning(f"Diário da portaria não enviado no shutdown ({e}); será reenviado no próximo start")
+
+    # --- Portaria sem o Supabase ---
+
+    def _sincronizado_em(self, conn: sqlite3.Connection) -> Optional[str]:
+        linha = conn.execute("SELECT valor FROM meta WHERE chave = 'sincronizado_em'").fetchone()
+        return linha["valor"] if linha else None
+
+    def validar(self, pessoa_id: str, tipo_pessoa: str, local: str) -> dict:
+        """validar_acesso sobre a réplica (mesmas regras, via veredito_acesso)."""
+        coluna_exame(tipo_pessoa)
+        with self._conectar() as conn:
+            sincronizado_em = self._sincronizado_em(conn)
+            if sincronizado_em is None:
+                raise RuntimeError("Supabase indisponível e a réplica da portaria ainda não foi sincronizada")
+            linha = conn.execute(
+                "SELECT p.id, p.nome, p.status, p.titular_id, t.status AS status_titular "
+                "FROM pessoas p LEFT JOIN pessoas t ON t.id = p.titular_id WHERE p.id = ? AND p.tipo = ?",
+                (pessoa_id, tipo_pessoa),
+            ).fetchone()
+            aviso = f"⚠️ Validado offline (réplica de {sincronizado_em})"
+            if linha is None:
+                return {"permitido": False, "motivo": f"{tipo_pessoa.capitalize()} não encontrado na réplica offline",
+                        "alertas": [aviso], "offline": True}
+            atrasadas = conn.execute(
+                "SELECT quantidade FROM atrasadas WHERE associado_id = ?", (linha["titular_id"],)
+            ).fetchone()
+            exame = conn.execute(
+                "SELECT data_validade, resultado, data_exame FROM exames WHERE pessoa_id = ? AND data_validade >= ?",
+                (pessoa_id, date.today().isoformat()),
+            ).fetchone()
+
+        pessoa = {"id": linha["id"], "nome": linha["nome"], "status": linha["status"]}
+        titular = {"status": linha["status_titular"]} if tipo_pessoa == "dependente" else None
+        veredito = veredito_acesso(
+            pessoa, local, atrasadas["quantidade"] if atrasadas else 0, dict(exame) if exame else None, titular,
+        )
+        veredito["alertas"] = veredito.get("alertas", []) + [aviso]
+        return {**veredito, "pessoa": pessoa, "offline": True}
+
+    def validar_carteirinha(self, qrcode_hash: str, local: str) -> dict:
+        with self._conectar() as conn:
+            linha = conn.execute("SELECT * FROM carteirinhas WHERE qrcode_hash = ?", (qrcode_hash,)).fetchone()
+        carteirinha = {**dict(linha), "ativa": bool(linha["ativa"])} if linha else None
+        motivo = _carteirinha_invalida(carteirinha)
+        if motivo:
+            return {"permitido": False, "motivo": motivo, "offline": True}
+        if linha["associado_id"]:
+            return self.validar(linha["associado_id"], "associado", local)
+        return self.validar(linha["dependente_id"], "dependente", local)
+
+    def registrar(self, dados: dict, local: str) -> dict:
+        """Grava o acesso no diário, com id e horário gerados aqui."""
+        with self._conectar() as conn:
+            ponto = conn.execute("SELECT id FROM pontos_acesso WHERE tipo = ?", (local,)).fetchone()
+            if ponto is None:
+                raise ValueError(f"Ponto de acesso '{local}' não está na réplica offline")
+        registro = novo_registro(dados, ponto["id"])
+        self.diario.gravar([registro])
+        return {**registro, "offline": True}
+
+    def pontos_acesso(self) -> dict[str, str]:
+        """Pontos de acesso ativos da última sincronização (local → id)."""
+        with self._conectar() as conn:
+            return {linha["tipo"]: linha["id"] for linha in conn.execute("SELECT tipo, id FROM pontos_acesso")}
+
+    def estado(self) -> dict:
+        with self._conectar() as conn:
+            sincronizado_em = self._sincronizado_em(conn)
+            pessoas = conn.execute("SELECT COUNT(*) FROM pessoas").fetchone()[0]
+        return {
+            "replica": self.caminho,
+            "sincronizado_em": sincronizado_em,
+            "pessoas": pessoas,
+            "acessos_pendentes": self.diario.contar(),
+            "supabase_em_pausa": self.remoto_pausado(),
+        }
+
+
+replica_portaria: Optional[ReplicaPortaria] = ReplicaPortaria(PORTARIA_REPLICA) if PORTARIA_OFFLINE else None
+
+
+async def na_portaria(remoto: Callable[[], Any], offline: Callable[[], Any]) -> Any:
+    """Executa a consulta remota da portaria; com a réplica ativa, cai para ela se o Supabase não responder.
+
+    Args:
+        remoto: Função async que consulta o Supabase
+        offline: Função síncrona equivalente sobre a réplica (roda numa thread)
+    """
+    if replica_portaria is None:
+        return await remoto()
+    if not replica_portaria.remoto_pausado():
+        try:
+            return await asyncio.wait_for(remoto(), PORTARIA_TIMEOUT)
+        except Exception as e:
+            if not remoto_indisponivel(e):
+                raise
+            replica_portaria.pausar(e)
+    return await asyncio.to_thread(offline)
+
+
+@mcp.tool()
+async def sincronizar_portaria() -> str:
+    """Envia os acessos registrados offline e renova a réplica local da portaria agora.
+
+    Só disponível com PORTARIA_OFFLINE=true. O servidor já faz isso sozinho
+    a cada PORTARIA_SYNC_SEGUNDOS.
+    """
+    try:
+        if replica_portaria is None:
+            return err("Portaria offline desativada (defina PORTARIA_OFFLINE=true)")
+        enviados = await asyncio.to_thread(replica_portaria.enviar_diario)
+        copiados = await asyncio.to_thread(replica_portaria.sincronizar)
+        replica_portaria.pausa_ate = 0.0
+        estado = await asyncio.to_thread(replica_portaria.estado)
+        return ok({**estado, "acessos_enviados": enviados, "copiados": copiados},
+                  f"🔄 Réplica sincronizada, {enviados} acesso(s) offline enviados")
+    except Exception as e:
+        return err(str(e))
+
+
+# ============================================================
+# MÓDULO: PORTARIA - GRAVAÇÃO EM LOTE (write-behind)
+# ============================================================
+# Com ACESSO_LOTE_MS > 0, registrar_acesso responde assim que o registro
+# entra na fila, sem ir ao Supabase (o ponto de acesso vem de um cache; com
+# o Supabase fora do ar, do cache vencido ou da réplica da portaria).
+# Uma tarefa do lifespan grava a fila em registros_acesso com um insert de
+# várias linhas a cada ACESSO_LOTE_MS, ou antes, ao juntar ACESSO_LOTE_MAX
+# registros, e esvazia a fila no shutdown. Se o processo morrer, perde-se
+# no máximo o que chegou depois do último lote gravado; com ACESSO_SPOOL
+# cada registro é antes gravado num diário SQLite e reenviado no próximo start.
+
+TTL_PONTOS_ACESSO = 300
+
+
+class FilaAcessos:
+    """Fila write-behind dos registros de acesso."""
+
+    def __init__(self, intervalo_ms: float, maximo: int, spool: Optional[DiarioAcessos] = None):
+        self.intervalo = intervalo_ms / 1000
+        self.maximo = maximo
+        self.spool = spool
+        # O que ficou no spool numa execução anterior volta para a fila
+        self.pendentes: list[dict] = spool.pendentes() if spool else []
+        self.gravado_ate: Optional[str] = None
+        self.metricas = {"lotes": 0, "gravados": 0, "descartados": 0, "falhas": 0, "desviados": 0}
+        self._cheia = asyncio.Event()
+        self._enviando = asyncio.Lock()
+        self._tarefa: Optional[asyncio.Task] = None
+        self._pontos: dict[str, str] = {}
+        self._pontos_ate = 0.0
+        self._spool_espera: list[tuple[dict, asyncio.Future]] = []
+        self._spool_tarefa: Optional[asyncio.Task] = None
+
+    async def _ponto(self, local: str) -> str:
+        """id do ponto de acesso ativo do local, de um cache renovado a cada TTL_PONTOS_ACESSO.
+
+        Se o Supabase não responder, a portaria segue com o cache vencido ou,
+        sem ele, com os pontos da réplica offline; a renovação é tentada de
+        novo depois de PORTARIA_PAUSA_REMOTO segundos.
+        """
+        if local not in self._pontos or time.monotonic() >= self._pontos_ate:
+            try:
+                pontos = await asyncio.wait_for(
+                    executar(supabase.table("pontos_acesso").select("id, tipo").eq("ativo", True)),
+                    PORTARIA_TIMEOUT,
+                )
+            except Exception as e:
+                if not remoto_indisponivel(e):
+                    raise
+                if local not in self._pontos and replica_portaria is not None:
+                    self._pontos.update(await asyncio.to_thread(replica_portaria.pontos_acesso))
+                self._pontos_ate = time.monotonic() + PORTARIA_PAUSA_REMOTO
+                logger.warning(f"Fila de acessos: pontos de acesso não renovados ({e}); usando o cache anterior")
+            else:
+                self._pontos = {}
+                for p in pontos.data:
+                    self._pontos.setdefault(p["tipo"], p["id"])
+                self._pontos_ate = time.monotonic() + TTL_PONTOS_ACESSO
+        if local not in self._pontos:
+            raise ValueError(f"Ponto de acesso '{local}' não encontrado ou inativo. Cadastre um ponto de acesso primeiro.")
+        return self._pontos[local]
+
+    async def _gravar_no_spool(self, registro: dict) -> None:
+        """Grava no spool antes de confirmar a leitura.
+
+        Uma tarefa só grava: as leituras que chegam enquanto ela grava um
+        commit entram juntas no próximo (group commit).
+        """
+        futuro = asyncio.get_running_loop().create_future()
+        self._spool_espera.append((registro, futuro))
+        if self._spool_tarefa is None or self._spool_tarefa.done():
+            self._spool_tarefa = asyncio.create_task(self._esvaziar_spool())
+        await futuro
+
+    async def _esvaziar_spool(self) -> None:
+        while self._spool_espera:
+            lote, self._spool_espera = self._spool_espera, []
+            try:
+                await asyncio.to_thread(self.spool.gravar, [r for r, _ in lote])
+            except Exception as e:
+                for _, futuro in lote:
+                    if not futuro.done():
+                        futuro.set_exception(e)
+            else:
+                for _, futuro in lote:
+                    if not futuro.done():
+                        futuro.set_result(None)
+
+    async def registrar(self, dados: dict, local: str) -> dict:
+        if len(self.pendentes) >= ACESSO_FILA_MAX:
+            # Supabase fora do ar há muito tempo: o diário da réplica (em disco) assume
+            if replica_portaria is None:
+                raise RuntimeError(
+                    f"Fila de acessos cheia ({len(self.pendentes)} registros aguardando o Supabase). "
+                    "Ative PORTARIA_OFFLINE para guardar os acessos em disco."
+                )
+            self.metricas["desviados"] += 1
+            return await asyncio.to_thread(replica_portaria.registrar, dados, local)
+        registro = novo_registro(dados, await self._ponto(local))
+        if self.spool is not None:
+            await self._gravar_no_spool(registro)
+        self.pendentes.append(registro)
+        if len(self.pendentes) >= self.maximo:
+            self._cheia.set()
+        return registro
+
+    def _enviar_lote(self, lote: list[dict]) -> None:
+        """Grava o lote; se o Supabase recusar (ex.: pessoa_id inexistente), tenta linha a linha.
+
+        Linhas recusadas são descartadas com log, para não travar a fila.
+        Falhas de rede são propagadas e o lote inteiro fica na fila (reenviar
+        as linhas já gravadas não as duplica).
+        """
+        try:
+            enviar_registros(lote)
+            return
+        except Exception as e:
+            if remoto_indisponivel(e):
+                raise
+        for registro in lote:
+            try:
+                enviar_registros([registro])
+            except Exception as e:
+                if remoto_indisponivel(e):
+                    raise
+                self.metricas["descartados"] += 1
+                logger.error(f"Registro de acesso recusado pelo Supabase e descartado ({e}): {registro}")
+
+    async def descarregar(self) -> int:
+        """Grava a fila em registros_acesso, em inserts de até ACESSO_LOTE_MAX linhas."""
+        gravados = 0
+        async with self._enviando:
+            while self.pendentes:
+                lote = self.pendentes[:self.maximo]
+                descartados = self.metricas["descartados"]
+                await asyncio.to_thread(self._enviar_lote, lote)
+                if self.spool is not None:
+                    await asyncio.to_thread(self.spool.confirmar, [r["id"] for r in lote])
+                del self.pendentes[:len(lote)]
+                self.gravado_ate = lote[-1]["created_at"]
+                self.metricas["lotes"] += 1
+                aceitos = len(lote) - (self.metricas["descartados"] - descartados)
+                self.metricas["gravados"] += aceitos
+                gravados += aceitos
+        return gravados
+
+    async def manter(self) -> None:
+        """Laço do lifespan: grava a fila a cada intervalo ou quando ela enche."""
+        while True:
+            with contextlib.suppress(TimeoutError):
+                await asyncio.wait_for(self._cheia.wait(), self.intervalo)
+            self._cheia.clear()
+            try:
+                await self.descarregar()
+            except Exception as e:
+                self.metricas["falhas"] += 1
+                if not remoto_indisponivel(e):
+                    logger.exception("Falha ao gravar a fila de acessos")
+                else:
+                    logger.warning(f"Fila de acessos: Supabase indisponível ({e}); "
+                                   f"{len(self.pendentes)} registro(s) aguardando")
+                await asyncio.sleep(self.intervalo)
+
+    def iniciar(self) -> None:
+        if self._tarefa is None:
+            self._tarefa = asyncio.create_task(self.manter())
+
+    async def parar(self) -> None:
+        """Para o laço e grava o que ainda está na fila."""
+        if self._tarefa is not None:
+            self._tarefa.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._tarefa
+            self._tarefa = None
+        try:
+            await asyncio.wait_for(self.descarregar(), PORTARIA_TIMEOUT * 3)
+        except Exception as e:
+            if self.spool is not None:
+                logger.warning(f"Fila de acessos: {len(self.pendentes)} registro(s) ficam no spool ({e})")
+            else:
+                logger.error(f"Fila de acessos: {len(self.pendentes)} registro(s) perdidos no shutdown ({e})")
+
+    def estado(self) -> dict:
+        return {
+            "pendentes": len(self.pendentes),
+            "gravado_ate": self.gravado_ate,
+            "spool": self.spool.caminho if self.spool else None,
+            **self.metricas,
+        }
+
+
+fila_acessos: Optional[FilaAcessos] = FilaAcessos(
+    ACESSO_LOTE_MS, ACESSO_LOTE_MAX, DiarioAcessos(ACESSO_SPOOL) if ACESSO_SPOOL else None,
+) if ACESSO_LOTE_MS > 0 else None
+
+
+# ============================================================
+# MÓDULO: CARTEIRINHAS (emissão em lote)
+# ============================================================
+# O hash de cada carteirinha é gerado aqui: é o que o QR code carrega e o que
+# validar_carteirinha recebe. As imagens (cartão CR80 com o QR code, em PNG)
+# são desenhadas num pool de processos enquanto as linhas são gravadas no
+# Supabase em lotes. Requer database/026 (o trigger mantém o hash enviado);
+# as imagens requerem pip install -e ".[carteirinhas]".
+
+CARTAO_PX = (1012, 638)  # CR80 a 300 dpi
+CARTEIRINHA_LOTE_IMAGENS = 50
+COLUNAS_CARTEIRINHA = ("id", "associado_id", "dependente_id", "qrcode_data", "qrcode_hash",
+                       "data_emissao", "data_validade", "via", "ativa")
+
+
+def hash_carteirinha(qrcode_data: str) -> str:
+    """SHA-256 dos dados da carteirinha com um sal aleatório: único e impossível de deduzir."""
+    return hashlib.sha256(f"{qrcode_data}:{secrets.token_hex(16)}".encode()).hexdigest()
+
+
+def _desenhar_carteirinhas(cartoes: list[dict], pasta: str, clube: str) -> list[int]:
+    """Grava o PNG de cada carteirinha em pasta/<id>.png e devolve o tamanho de cada arquivo.
+
+    Roda num processo do pool: recebe só dados, sem acessar o Supabase.
+    """
+    import qrcode
+    from PIL import Image, ImageDraw, ImageFont
+
+    def fonte(tamanho: int):
+        try:
+            return ImageFont.truetype(CARTEIRINHA_FONTE, tamanho)
+        except OSError:
+            return ImageFont.load_default(tamanho)  # não tem acentos: "título" sai com um quadrado
+
+    fonte_titulo, fonte_nome, fonte_texto = fonte(46), fonte(40), fonte(28)
+    largura_texto = CARTAO_PX[0] - 480
+    tamanhos = []
+    for c in cartoes:
+        # Máscara fixa: escolher a melhor das 8 custa 5x o resto do QR code, e qualquer uma é lida
+        qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_M, box_size=10, border=2, mask_pattern=2)
+        qr.add_data(c["qrcode_hash"])
+        imagem_qr = qr.make_image().get_image()
+
+        # Em tons de cinza: o PNG sai com um terço dos bytes e é gravado 3x mais rápido que em RGB
+        cartao = Image.new("L", CARTAO_PX, 255)
+        desenho = ImageDraw.Draw(cartao)
+        desenho.rectangle((0, 0, CARTAO_PX[0], 120), fill=40)
+        desenho.text((40, 34), clube, font=fonte_titulo, fill=255)
+        nome = c["nome"]
+        while desenho.textlength(nome, font=fonte_nome) > largura_texto and len(nome) > 4:
+            nome = nome[:-2].rstrip() + "…"
+        validade = date.fromisoformat(c["data_validade"]).strftime("%d/%m/%Y")
+        desenho.text((40, 180), nome, font=fonte_nome, fill=0)
+        for i, linha in enumerate((c["descricao"], f"Validade: {validade}", f"Via {c['via']}")):
+            desenho.text((40, 260 + i * 56), linha, font=fonte_texto, fill=60)
+        cartao.paste(imagem_qr, (CARTAO_PX[0] - imagem_qr.width - 40, 140 + (460 - imagem_qr.height) // 2))
+
+        caminho = os.path.join(pasta, f"{c['id']}.png")
+        cartao.save(caminho, "PNG", compress_level=1)
+        tamanhos.append(os.path.getsize(caminho))
+    return tamanhos
+
+
+async def _desenhar_em_processos(cartoes: list[dict], pasta: str, clube: str) -> int:
+    """Desenha as carteirinhas em lotes de CARTEIRINHA_LOTE_IMAGENS num pool de processos; devolve os bytes gravados."""
+    processos = CARTEIRINHA_PROCESSOS or os.cpu_count() or 1
+    loop = asyncio.get_running_loop()
+    # spawn: os processos não herdam as threads e conexões abertas do servidor
+    pool = ProcessPoolExecutor(max_workers=processos, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        lotes = [cartoes[i:i + CARTEIRINHA_LOTE_IMAGENS] for i in range(0, len(cartoes), CARTEIRINHA_LOTE_IMAGENS)]
+        tamanhos = await asyncio.gather(*(
+            loop.run_in_executor(pool, _desenhar_carteirinhas, lote, pasta, clube) for lote in lotes
+        ))
+        return sum(sum(t) for t in tamanhos)
+    finally:
+        await asyncio.to_thread(pool.shutdown, True, cancel_futures=True)
+
+
+def _pessoas_para_carteirinha(associado_ids: Optional[list[str]], incluir_dependentes: bool) -> list[dict]:
+    """Associados ativos (todos ou os pedidos) e seus dependentes ativos, com as carteirinhas ativas de cada um."""
+    def tudo(montar: Callable[[], Any]) -> list[dict]:
+        return [linha for pagina in paginar_keyset(montar) for linha in pagina]
+
+    def em_blocos(tabela: str, select: str, coluna: str, valores: list, **iguais) -> list[dict]:
+        linhas = []
+        for i in range(0, len(valores), BLOCO_IDS):
+            query = supabase.table(tabela).select(select).in_(coluna, valores[i:i + BLOCO_IDS])
+            for campo, valor in iguais.items():
+                query = query.eq(campo, valor)
+            linhas += query.execute().data or []
+        return linhas
+
+    if associado_ids is None:
+        associados = tudo(lambda: supabase.table("associados").select("id, nome, numero_titulo")
+                          .eq("status", "ativo"))
+    else:
+        associados = em_blocos("associados", "id, nome, numero_titulo", "id", list(dict.fromkeys(associado_ids)),
+                               status="ativo")
+    titulares = {a["id"]: a for a in associados}
+    dependentes = []
+    if incluir_dependentes and titulares:
+        if associado_ids is None:
+            dependentes = tudo(lambda: supabase.table("dependentes").select("id, nome, associado_id")
+                               .eq("status", "ativo"))
+        else:
+            dependentes = em_blocos("dependentes", "id, nome, associado_id", "associado_id", list(titulares),
+                                    status="ativo")
+        dependentes = [d for d in dependentes if d["associado_id"] in titulares]
+
+    select = "id, associado_id, dependente_id, via"
+    if associado_ids is None:
+        ativas = tudo(lambda: supabase.table("carteirinhas").select(select).eq("ativa", True))
+    else:
+        ativas = em_blocos("carteirinhas", select, "associado_id", list(titulares), ativa=True) + \
+            em_blocos("carteirinhas", select, "dependente_id", [d["id"] for d in dependentes], ativa=True)
+    por_pessoa: dict[str, list[dict]] = defaultdict(list)
+    for c in ativas:
+        por_pessoa[c["associado_id"] or c["dependente_id"]].append(c)
+
+    pessoas = []
+    for a in associados:
+        pessoas.append({"tipo": "associado", "id": a["id"], "nome": a["nome"],
+                        "descricao": f"Titular - título {a['numero_titulo']}", "anteriores": por_pessoa[a["id"]]})
+    for d in dependentes:
+        titular = titulares[d["associado_id"]]
+        pessoas.append({"tipo": "dependente", "id": d["id"], "nome": d["nome"],
+                        "descricao": f"Dependente - título {titular['numero_titulo']}",
+                        "anteriores": por_pessoa[d["id"]]})
+    return pessoas
+
+
+def _gravar_carteirinhas(cartoes: list[dict], erros: list[dict]) -> list[dict]:
+    """Insere em lotes de IMPORT_LOTE; se um lote for recusado, refaz linha a linha. Devolve as gravadas."""
+    gravadas = []
+
+    def inserir(lote: list[dict]) -> None:
+        supabase.table("carteirinhas").insert(
+            [{k: c[k] for k in COLUNAS_CARTEIRINHA} for c in lote], returning="minimal",
+        ).execute()
+
+    for i in range(0, len(cartoes), IMPORT_LOTE):
+        lote = cartoes[i:i + IMPORT_LOTE]
+        try:
+            inserir(lote)
+            gravadas += lote
+        except APIError:
+            for cartao in lote:
+                try:
+                    inserir([cartao])
+                    gravadas.append(cartao)
+                except APIError as e:
+                    erros.append({"pessoa_id": cartao["associado_id"] or cartao["dependente_id"],
+                                  "nome": cartao["nome"], "erro": e.message or str(e)})
+    return gravadas
+
+
+def _desativar_carteirinhas(ids: list[str]) -> None:
+    for i in range(0, len(ids), BLOCO_IDS):
+        supabase.table("carteirinhas").update({"ativa": False}, returning="minimal")\
+            .in_("id", ids[i:i + BLOCO_IDS]).execute()
+
+
+def _enviar_imagem(caminho_local: str, caminho: str) -> None:
+    with open(caminho_local, "rb") as f:
+        supabase.storage.from_(CARTEIRINHA_BUCKET).upload(caminho, f.read(), {"content-type": "image/png"})
+
+
+@mcp.tool()
+async def emitir_carteirinhas_lote(
+    associado_ids: Optional[list[str]] = None,
+    incluir_dependentes: bool = True,
+    data_validade: Optional[str] = None,
+    imagens: bool = True,
+    destino: str = "local",
+    simular: bool = False,
+) -> str:
+    """Emite carteirinhas novas (com QR code) para o clube inteiro ou para uma lista de associados.
+
+    Use na renovação anual: cada pessoa ativa recebe uma nova via e as
+    carteirinhas ativas anteriores são desativadas depois que a nova é gravada.
+    As imagens (PNG pronto para impressão, uma por carteirinha) são desenhadas
+    em paralelo, em vários processos.
+
+    Args:
+        associado_ids: Associados que recebem carteirinha (padrão: todos os ativos)
+        incluir_dependentes: Emitir também para os dependentes ativos desses associados
+        data_validade: Validade YYYY-MM-DD (padrão: hoje + CARTEIRINHA_VALIDADE_DIAS)
+        imagens: Gerar os PNGs das carteirinhas
+        destino: local (pasta CARTEIRINHA_DIR) ou storage (bucket CARTEIRINHA_BUCKET do Supabase)
+        simular: Se True, só conta quem receberia carteirinha, sem gravar nada
+    """
+    if destino not in ("local", "storage"):
+        return err("Destino deve ser 'local' ou 'storage'")
+    hoje = date.today()
+    validade = data_validade or (hoje + timedelta(days=CARTEIRINHA_VALIDADE_DIAS)).isoformat()
+    try:
+        if date.fromisoformat(validade) <= hoje:
+            return err("data_validade deve ser uma data futura")
+    except ValueError:
+        return err("data_validade deve estar no formato YYYY-MM-DD")
+    if imagens and not simular:
+        try:
+            import qrcode  # noqa: F401
+            from PIL import Image  # noqa: F401
+        except ImportError:
+            return err("As imagens das carteirinhas requerem qrcode e Pillow: pip install -e \".[carteirinhas]\"")
+
+    try:
+        inicio = time.perf_counter()
+        pessoas = await asyncio.to_thread(_pessoas_para_carteirinha, associado_ids, incluir_dependentes)
+        cartoes = []
+        for p in pessoas:
+            via = max((c.get("via") or 1 for c in p["anteriores"]), default=0) + 1
+            dados = f"{p['tipo']}:{p['id']}:{via}:{validade}"
+            cartoes.append({
+                "id": str(uuid.uuid4()),
+                "associado_id": p["id"] if p["tipo"] == "associado" else None,
+                "dependente_id": p["id"] if p["tipo"] == "dependente" else None,
+                "qrcode_data": dados,
+                "qrcode_hash": hash_carteirinha(dados),
+                "data_emissao": hoje.isoformat(),
+                "data_validade": validade,
+                "via": via,
+                "ativa": True,
+                "nome": p["nome"],
+                "descricao": p["descricao"],
+                "anteriores": [c["id"] for c in p["anteriores"]],
+            })
+        resumo = {
+            "carteirinhas": len(cartoes),
+            "associados": sum(1 for c in cartoes if c["associado_id"]),
+            "dependentes": sum(1 for c in cartoes if c["dependente_id"]),
+            "data_validade": validade,
+        }
+        if simular:
+            resumo["a_desativar"] = sum(len(c["anteriores"]) for c in cartoes)
+            resumo["exemplos"] = [{"nome": c["nome"], "via": c["via"]} for c in cartoes[:10]]
+            return ok(resumo, f"🪪 {len(cartoes)} carteirinha(s) seriam emitidas (simulação)")
+
+        lote = datetime.now().strftime("%Y%m%d-%H%M%S")
+        pasta = os.path.abspath(os.path.join(CARTEIRINHA_DIR, lote))
+        if imagens:
+            os.makedirs(pasta, exist_ok=True)
+        clube = "Clube"
+        if imagens:
+            config = await executar(supabase.table("configuracoes").select("valor").eq("chave", "clube_nome").limit(1))
+            clube = (config.data[0]["valor"] if config.data else None) or clube
+
+        # Gravação (rede, numa thread) e desenho (CPU, nos processos) ao mesmo tempo
+        erros: list[dict] = []
+        tarefas = [asyncio.to_thread(_gravar_carteirinhas, cartoes, erros)]
+        if imagens:
+            tarefas.append(_desenhar_em_processos(cartoes, pasta, clube))
+        gravadas, *desenho = await asyncio.gather(*tarefas, return_exceptions=True)
+        if isinstance(gravadas, BaseException):
+            raise gravadas
+        # As novas já valem na portaria: as anteriores saem mesmo que as imagens tenham falhado
+        anteriores = [i for c in gravadas for i in c["anteriores"]]
+        await asyncio.to_thread(_desativar_carteirinhas, anteriores)
+        resumo.update({"carteirinhas": len(gravadas), "desativadas": len(anteriores), "erros": erros[:50]})
+
+        if imagens and isinstance(desenho[0], BaseException):
+            shutil.rmtree(pasta, ignore_errors=True)
+            resumo["imagens"] = {"erro": f"{type(desenho[0]).__name__}: {desenho[0]}"}
+        elif imagens:
+            bytes_imagens = desenho[0]
+            ids_gravados = {c["id"] for c in gravadas}
+            for c in cartoes:
+                if c["id"] not in ids_gravados:
+                    os.remove(os.path.join(pasta, f"{c['id']}.png"))
+            resumo["imagens"] = {"arquivos": len(gravadas), "mb": round(bytes_imagens / 2**20, 1)}
+            if destino == "storage":
+                semaforo = asyncio.Semaphore(CARTEIRINHA_UPLOADS)
+
+                async def enviar(cartao: dict) -> None:
+                    async with semaforo:
+                        await asyncio.to_thread(_enviar_imagem, os.path.join(pasta, f"{cartao['id']}.png"),
+                                                f"{lote}/{cartao['id']}.png")
+
+                # As carteirinhas já estão gravadas e as anteriores desativadas: uma falha de
+                # upload vira erro no resumo, e os PNGs ficam na pasta para reenviar
+                envios = await asyncio.gather(*(enviar(c) for c in gravadas), return_exceptions=True)
+                falhas = [e for e in envios if isinstance(e, BaseException)]
+                resumo["imagens"].update({"bucket": CARTEIRINHA_BUCKET, "prefixo": lote,
+                                          "enviadas": len(envios) - len(falhas)})
+                if falhas:
+                    resumo["imagens"].update({
+                        "falhas_upload": len(falhas),
+                        "erro": f"{type(falhas[0]).__name__}: {falhas[0]}",
+                        "pasta": pasta,
+                    })
+                else:
+                    shutil.rmtree(pasta, ignore_errors=True)
+            else:
+                resumo["imagens"]["pasta"] = pasta
+
+        resumo["segundos"] = round(time.perf_counter() - inicio, 1)
+        msg = f"🪪 {len(gravadas)} carteirinha(s) emitidas, {len(anteriores)} anterior(es) desativada(s)"
+        if erros:
+            msg += f", {len(erros)} com erro"
+        if resumo.get("imagens", {}).get("erro"):
+            msg += "\n⚠️ Falha nas imagens: " + resumo["imagens"]["erro"]
+        return ok(resumo, msg)
+    except Exception as e:
+        return err(str(e))
+
+
+# ============================================================
+# MÓDULO: CONVITES
+# ============================================================
+# Os convites são emitidos pela function emitir_convites (database/027), que
+# confere a cota do mês num contador mantido por trigger (convites_cota) e
+# grava todos os convites do pedido ou nenhum. Na portaria, validar_convite
+# procura o código num índice em memória dos convites disponíveis e dentro da
+# validade. O índice é carregado uma vez por dia e, a cada
+# CONVITES_ATUALIZAR_S, recebe só os convites alterados desde a última leitura
+# (updated_at). Código fora do índice (emitido há instantes, já usado ou
+# vencido) é conferido direto no banco, e a entrada só é registrada se o
+# UPDATE condicional (status = 'disponivel') marcar o convite como usado.
+
+COLUNAS_CONVITE = (
+    "id, associado_id, nome_convidado, cpf_convidado, data_validade, status, data_uso, qr_code, updated_at"
+)
+# updated_at é o início da transação: relê um pouco antes da última marca para
+# não perder o que foi gravado por uma transação que terminou depois
+FOLGA_CONVITES = timedelta(seconds=60)
+
+
+def _convite_invalido(convite: Optional[dict], hoje: str) -> Optional[str]:
+    if not convite:
+        return "Convite não encontrado"
+    if convite["status"] == "usado":
+        return f"Convite já utilizado em {convite.get('data_uso') or 'data não registrada'}"
+    if convite["status"] != "disponivel":
+        return f"Convite {convite['status']}"
+    if convite["data_validade"] < hoje:
+        return f"Convite vencido em {convite['data_validade']}"
+    return None
+
+
+class IndiceConvites:
+    """Convites disponíveis e dentro da validade, por código (qr_code)."""
+
+    def __init__(self):
+        self.por_codigo: dict[str, dict] = {}
+        self.dia: Optional[str] = None
+        self.marca: Optional[datetime] = None
+        self.atualizado_em = 0.0
+        self.metricas = {"cargas": 0, "atualizacoes": 0, "alterados": 0, "acertos": 0, "consultas_banco": 0}
+        self._lock = asyncio.Lock()
+
+    def aplicar(self, convites: list[dict]) -> None:
+        """Inclui os convites válidos hoje e tira os que deixaram de ser."""
+        for c in convites:
+            if not c.get("qr_code"):
+                continue
+            if _convite_invalido(c, self.dia or "") is None:
+                self.por_codigo[c["qr_code"]] = c
+            else:
+                self.por_codigo.pop(c["qr_code"], None)
+            if c.get("updated_at"):
+                alterado = datetime.fromisoformat(c["updated_at"])
+                if self.marca is None or alterado > self.marca:
+                    self.marca = alterado
+
+    def _carregar(self, hoje: str) -> None:
+        ultimo = supabase.table("convites").select("updated_at").order("updated_at", desc=True).limit(1).execute()
+        self.por_codigo, self.dia, self.marca = {}, hoje, None
+        for pagina in paginar_keyset(lambda: supabase.table("convites").select(COLUNAS_CONVITE)
+                                     .eq("status", "disponivel").gte("data_validade", hoje)):
+            self.aplicar(pagina)
+        if ultimo.data and ultimo.data[0]["updated_at"]:
+            self.marca = datetime.fromisoformat(ultimo.data[0]["updated_at"])
+        self.metricas["cargas"] += 1
+
+    def _atualizar(self) -> None:
+        desde = (self.marca - FOLGA_CONVITES).isoformat()
+        for pagina in paginar_keyset(lambda: supabase.table("convites").select(COLUNAS_CONVITE)
+                                     .gte("updated_at", desde)):
+            self.aplicar(pagina)
+            self.metricas["alterados"] += len(pagina)
+        self.metricas["atualizacoes"] += 1
+
+    async def atualizar(self) -> None:
+        """Carga completa na virada do dia; depois, só o que mudou, no máximo a cada CONVITES_ATUALIZAR_S."""
+        hoje = date.today().isoformat()
+        if self.dia == hoje and time.monotonic() - self.atualizado_em < CONVITES_ATUALIZAR_S:
+            return
+        async with self._lock:
+            if self.dia == hoje and time.monotonic() - self.atualizado_em < CONVITES_ATUALIZAR_S:
+                return
+            if self.dia != hoje or self.marca is None:
+                await asyncio.to_thread(self._carregar, hoje)
+            else:
+                await asyncio.to_thread(self._atualizar)
+            self.atualizado_em = time.monotonic()
+
+    async def buscar(self, codigo: str) -> Optional[dict]:
+        """Convite pelo código: do índice se estiver lá, senão do banco."""
+        await self.atualizar()
+        convite = self.por_codigo.get(codigo)
+        if convite is not None:
+            self.metricas["acertos"] += 1
+            return convite
+        self.metricas["consultas_banco"] += 1
+        result = await executar(supabase.table("convites").select(COLUNAS_CONVITE).eq("qr_code", codigo).limit(1))
+        return result.data[0] if result.data else None
+
+    def estado(self) -> dict:
+        return {"dia": self.dia, "convites": len(self.por_codigo),
+                "marca": self.marca.isoformat() if self.marca else None, **self.metricas}
+
+
+indice_convites = IndiceConvites()
+
+
+def _normalizar_convidados(convidados: Optional[list], quantidade: Optional[int]) -> list[dict]:
+    if convidados:
+        if quantidade:
+            raise ValueError("Informe convidados ou quantidade, não os dois")
+        lista = []
+        for c in convidados:
+            c = {"nome": c} if isinstance(c, str) else dict(c)
+            nome = (c.get("nome") or "").strip()
+            if not nome:
+                raise ValueError("Todo convidado precisa de nome (ou use quantidade para convites sem nome)")
+            cpf = format_cpf(c.get("cpf") or "")
+            if cpf and not validar_cpf(cpf):
+                raise ValueError(f"CPF inválido para {nome}: {c['cpf']}")
+            lista.append({"nome": nome.upper(), "cpf": cpf or None, "telefone": c.get("telefone")})
+        return lista
+    if not quantidade or quantidade < 1:
+        raise ValueError("Informe a lista de convidados ou a quantidade de convites")
+    return [{"nome": ""} for _ in range(quantidade)]
+
+
+@mcp.tool()
+async def emitir_convites(
+    associado_id: str,
+    convidados: Optional[list] = None,
+    quantidade: Optional[int] = None,
+    data_validade: Optional[str] = None,
+) -> str:
+    """Emite convites de um associado, dentro da cota do mês.
+
+    A cota vem da configuração convites_<plano>_mes (padrão: 2 no plano
+    patrimonial) mais os convites extras de quem está na diretoria. O pedido
+    é atendido inteiro ou recusado: emissões simultâneas não passam da cota.
+
+    Args:
+        associado_id: UUID do associado que convida
+        convidados: Nomes ou objetos {nome, cpf, telefone}, um convite por convidado
+        quantidade: Sem `convidados`, emite esta quantidade de convites sem nome
+        data_validade: Último dia em que o convite vale, YYYY-MM-DD (padrão: fim do mês)
+    """
+    try:
+        lista = _normalizar_convidados(convidados, quantidade)
+    except ValueError as e:
+        return err(str(e))
+    hoje = date.today()
+    fim_do_mes = (hoje.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+    validade = data_validade or fim_do_mes.isoformat()
+    try:
+        if date.fromisoformat(validade) < hoje:
+            return err("data_validade não pode ser no passado")
+    except ValueError:
+        return err("data_validade deve estar no formato YYYY-MM-DD")
+
+    try:
+        result = await executar(supabase.rpc("emitir_convites", {
+            "p_associado_id": associado_id, "p_convidados": lista, "p_data_validade": validade,
+        }))
+        resultado = result.data
+        if not resultado["convites"]:
+            return err(
+                f"Cota de convites de {resultado['mes_referencia']} insuficiente: {resultado['emitidos_mes']} de "
+                f"{resultado['limite']} já emitidos, {len(lista)} pedido(s)"
+            )
+        if indice_convites.dia == hoje.isoformat():
+            indice_convites.aplicar([{**c, "associado_id": associado_id} for c in resultado["convites"]])
+        resultado["disponiveis_mes"] = resultado["limite"] - resultado["emitidos_mes"]
+        return ok(resultado, f"🎟️ {len(resultado['convites'])} convite(s) emitido(s), válidos até {validade}; "
+                             f"{resultado['disponiveis_mes']} disponível(is) no mês")
+    except Exception as e:
+        error_msg = str(e)
+        if "PGRST202" in error_msg or "could not find" in error_msg.lower():
+            return err(
+                "A function RPC 'emitir_convites' não existe no Supabase. Execute o script "
+                "database/027_convites_emissao.sql no SQL Editor."
+            )
+        return err(error_msg)
+
+
+@mcp.tool()
+async def buscar_convites(
+    associado_id: Optional[str] = None,
+    codigo: Optional[str] = None,
+    status: Optional[str] = None,
+    validos_em: Optional[str] = None,
+    limite: int = 50,
+) -> str:
+    """Busca convites por associado, código ou situação.
+
+    Com associado_id, mostra também a cota do mês (emitidos e disponíveis).
+
+    Args:
+        associado_id: UUID do associado que convidou
+        codigo: Código do convite (CONV-...)
+        status: disponivel, usado ou expirado
+        validos_em: Só convites que valem nesta data, YYYY-MM-DD (disponíveis e não vencidos)
+        limite: Máximo de resultados
+    """
+    try:
+        query = supabase.table("convites").select(
+            f"{COLUNAS_CONVITE}, mes_referencia, created_at, associados(nome, numero_titulo)"
+        ).order("created_at", desc=True).limit(limite)
+        if associado_id:
+            query = query.eq("associado_id", associado_id)
+        if codigo:
+            query = query.eq("qr_code", codigo.strip().upper())
+        if status:
+            query = query.eq("status", status)
+        if validos_em:
+            query = query.eq("status", "disponivel").gte("data_validade", validos_em)
+
+        if not associado_id:
+            result = await executar(query)
+            return ok(result.data, f"🎟️ {len(result.data)} convite(s)")
+
+        mes = date.today().strftime("%Y-%m")
+        result, cota, disponiveis = await asyncio.gather(
+            executar(query),
+            executar(supabase.table("convites_cota").select("emitidos")
+                     .eq("associado_id", associado_id).eq("mes_referencia", mes).limit(1)),
+            executar(supabase.rpc("convites_disponiveis_mes", {"p_associado_id": associado_id, "p_mes": mes})),
+        )
+        resumo = {
+            "cota": {
+                "mes_referencia": mes,
+                "emitidos": cota.data[0]["emitidos"] if cota.data else 0,
+                "disponiveis": max(disponiveis.data or 0, 0),
+            },
+            "convites": result.data,
+        }
+        return ok(resumo, f"🎟️ {len(result.data)} convite(s), {resumo['cota']['disponiveis']} disponível(is) no mês")
+    except Exception as e:
+        return err(str(e))
+
+
+@mcp.tool()
+async def validar_convite(codigo: str, local: str = "clube", registrar_entrada: bool = True) -> str:
+    """Valida um convite pelo código lido na portaria e, se válido, registra a entrada do convidado.
+
+    O convite vale uma entrada: com registrar_entrada ele é marcado como
+    usado e a entrada vai para registros_acesso. A consulta usa o índice em
+    memória dos convites válidos, sem ida ao banco na maioria das leituras.
+
+    Args:
+        codigo: Código do convite (CONV-...)
+        local: Local de acesso (clube, piscina, academia)
+        registrar_entrada: Marcar o convite como usado e registrar a entrada (False só consulta)
+    """
+    codigo = codigo.strip().upper()
+    hoje = date.today().isoformat()
+    try:
+        convite = await indice_convites.buscar(codigo)
+        motivo = _convite_invalido(convite, hoje)
+        if motivo:
+            return ok({"permitido": False, "motivo": motivo, "codigo": codigo})
+
+        resultado = {
+            "permitido": True,
+            "codigo": codigo,
+            "convite_id": convite["id"],
+            "nome_convidado": convite["nome_convidado"],
+            "associado_id": convite["associado_id"],
+            "data_validade": convite["data_validade"],
+        }
+        if not registrar_entrada:
+            return ok(resultado, f"✅ Convite válido: {convite['nome_convidado'] or 'convidado'}")
+
+        # Só um leitor consegue marcar o convite: os outros (ou um índice desatualizado) caem na recusa
+        usado = await executar(
+            supabase.table("convites").update({"status": "usado", "data_uso": datetime.now(timezone.utc).isoformat()})
+            .eq("id", convite["id"]).eq("status", "disponivel")
+        )
+        indice_convites.por_codigo.pop(codigo, None)
+        if not usado.data:
+            atual = await executar(supabase.table("convites").select(COLUNAS_CONVITE).eq("id", convite["id"]))
+            motivo = _convite_invalido(atual.data[0] if atual.data else None, hoje) or "Convite já utilizado"
+            return ok({"permitido": False, "motivo": motivo, "codigo": codigo})
+
+        dados = _registro_acesso(convite["id"], "convidado", "entrada", f"Convite {codigo}")
+        try:
+            if fila_acessos is not None:
+                registro = await fila_acessos.registrar(dados, local)
+            else:
+                registro = await _registrar_acesso_remoto(dados, local)
+        except Exception:
+            # Sem o registro da entrada o convite volta a valer
+            await executar(supabase.table("convites").update({"status": "disponivel", "data_uso": None})
+                           .eq("id", convite["id"]))
+            raise
+        resultado["registro_id"] = registro["id"]
+        return ok(resultado, f"✅ {convite['nome_convidado'] or 'Convidado(a)'} liberado(a) no(a) {local}")
+    except Exception as e:
+        return err(str(e))
+
+
 # ============================================================
 # MÓDULO: CRM / WHATSAPP (corrigido - usa conversas_whatsapp, mensagens_whatsapp)
 # ============================================================
 
+# Só as colunas comuns a sql/crm_whatsapp.sql (web app) e database/EXECUTAR_SUPABASE.sql,
+# e sem a coluna `busca` (tsvector da database/024), que só serve ao índice de texto
+COLUNAS_MENSAGEM = "id, conversa_id, direcao, conteudo, tipo, created_at"
+
+
 @mcp.tool()
 async def buscar_contatos_crm(
     busca: Optional[str] = None,
     status: Optional[str] = None,
     limite: int = 30,
 ) -> str:
-    """Busca conversas no CRM do WhatsApp.
+    """Busca conversas no CRM do WhatsApp.
+
+    Args:
+        busca: Buscar por nome ou telefone
+        status: Status da conversa (aberta, aguardando, resolvida, arquivada)
+        limite: Máximo de resultados
+    """
+    try:
+        query = supabase.table("conversas_whatsapp").select(
+            "*, associados(nome, numero_titulo), usuarios!conversas_whatsapp_atendente_id_fkey(nome)"
+        ).order("ultimo_contato", desc=True).limit(limite)
+
+        if busca:
+            query = query.or_(f"nome_contato.ilike.%{busca}%,telefone.ilike.%{busca}%")
+        if status:
+            query = query.eq("status", status)
+
+        result = query.execute()
+        return ok(result.data, f"✅ {len(result.data)} conversa(s) encontrada(s)")
+    except Exception as e:
+        return err(str(e))
+
+
+@mcp.tool()
+async def buscar_mensagens_crm(
+    contato_id: str,
+    limite: int = 50,
+    cursor: Optional[str] = None,
+) -> str:
+    """Lista mensagens de uma conversa no CRM, da mais recente para a mais antiga.
+
+    Para voltar no histórico, passe o `proximo_cursor` da resposta anterior.
+
+    Args:
+        contato_id: UUID da conversa (conversas_whatsapp.id)
+        limite: Máximo de mensagens por página
+        cursor: Cursor devolvido pela página anterior (proximo_cursor)
+    """
+    try:
+        query = supabase.table("mensagens_whatsapp").select(COLUNAS_MENSAGEM).eq("conversa_id", contato_id)\
+            .order("created_at", desc=True).order("id", desc=True).limit(limite + 1)
+        if cursor:
+            query = apos_cursor(query, "created_at", cursor)
+
+        result = await executar(query)
+        mensagens = (result.data or [])[:limite]
+        proximo = None
+        if len(result.data or []) > limite:
+            proximo = codificar_cursor(mensagens[-1]["created_at"], mensagens[-1]["id"])
+        return ok({"mensagens": mensagens, "proximo_cursor": proximo}, f"✅ {len(mensagens)} mensagem(ns)")
+    except Exception as e:
+        return err(str(e))
+
+
+@mcp.tool()
+async def caixa_entrada_crm(
+    status: Optional[str] = None,
+    apenas_nao_lidas: bool = False,
+    limite: int = 20,
+    cursor: Optional[str] = None,
+) -> str:
+    """Conversas do WhatsApp com atividade mais recente, com não lidas e a última mensagem.
+
+    Lê o resumo mantido por trigger em conversas_whatsapp (uma consulta
+    indexada, sem juntar nem contar mensagens); nao_lidas é o contador do
+    web app. Requer database/023_crm_resumo_conversas.sql.
 
     Args:
-        busca: Buscar por nome ou telefone
         status: Status da conversa (aberta, aguardando, resolvida, arquivada)
-        limite: Máximo de resultados
+        apenas_nao_lidas: Só conversas com mensagens recebidas ainda não lidas
+        limite: Máximo de conversas por página
+        cursor: Cursor devolvido pela página anterior (proximo_cursor)
     """
     try:
         query = supabase.table("conversas_whatsapp").select(
-            "*, associados(nome, numero_titulo), usuarios!conversas_whatsapp_atendente_id_fkey(nome)"
-        ).order("ultimo_contato", desc=True).limit(limite)
-
-        if busca:
-            query = query.or_(f"nome_contato.ilike.%{busca}%,telefone.ilike.%{busca}%")
+            "id, telefone, nome_contato, associado_id, status, atendente_id, "
+            "nao_lidas, total_mensagens, ultima_mensagem_em, ultima_mensagem, ultima_direcao"
+        ).not_.is_("ultima_mensagem_em", "null")\
+            .order("ultima_mensagem_em", desc=True).order("id", desc=True).limit(limite + 1)
         if status:
             query = query.eq("status", status)
-
-        result = query.execute()
-        return ok(result.data, f"✅ {len(result.data)} conversa(s) encontrada(s)")
+        if apenas_nao_lidas:
+            query = query.gt("nao_lidas", 0)
+        if cursor:
+            query = apos_cursor(query, "ultima_mensagem_em", cursor)
+
+        result = await executar(query)
+        conversas = (result.data or [])[:limite]
+        proximo = None
+        if len(result.data or []) > limite:
+            proximo = codificar_cursor(conversas[-1]["ultima_mensagem_em"], conversas[-1]["id"])
+        nao_lidas = sum(c["nao_lidas"] for c in conversas)
+        return ok(
+            {"conversas": conversas, "proximo_cursor": proximo},
+            f"📥 {len(conversas)} conversa(s), {nao_lidas} mensagem(ns) não lida(s) nesta página",
+        )
     except Exception as e:
         return err(str(e))
 
 
+class LimitadorTaxa:
+    """Limita liberações a `por_minuto`, com rajada de até `rajada` (GCRA / token bucket).
+
+    Sem locks: o horário teórico da próxima liberação é reservado antes do
+    primeiro `await`, o que basta num único event loop.
+    """
+
+    def __init__(self, por_minuto: float, rajada: int = 1):
+        self.intervalo = 60.0 / max(por_minuto, 0.001)
+        self.tolerancia = (max(rajada, 1) - 1) * self.intervalo
+        self._proxima = 0.0
+
+    async def aguardar(self) -> None:
+        agora = time.monotonic()
+        prevista = max(self._proxima, agora)
+        self._proxima = prevista + self.intervalo
+        espera = prevista - self.tolerancia - agora
+        if espera > 0:
+            await asyncio.sleep(espera)
+
+
+# Compartilhado entre chamadas: o limite é do provider, não de cada tool
+limitador_whatsapp = LimitadorTaxa(WHATSAPP_TAXA_MINUTO)
+
+
+def normalizar_telefone(telefone: Optional[str]) -> Optional[str]:
+    """Só dígitos, com DDI 55 quando vier apenas DDD + número. None se não for um celular/fixo válido."""
+    digitos = re.sub(r"\D", "", telefone or "")
+    if len(digitos) in (10, 11):
+        digitos = "55" + digitos
+    return digitos if len(digitos) in (12, 13) else None
+
+
+async def _enviar_whatsapp_api(telefone: str, mensagem: str, provider_id: Optional[str] = None,
+                               tipo: Optional[str] = None, arquivo_url: Optional[str] = None) -> Any:
+    corpo = {"telefone": telefone, "mensagem": mensagem}
+    if provider_id:
+        corpo["providerId"] = provider_id
+    if arquivo_url:
+        corpo.update(tipo=tipo, arquivo_url=arquivo_url)
+    response = await get_http_client().post("/api/whatsapp/send", json=corpo)
+    response.raise_for_status()
+    return response.json()
+
+
 @mcp.tool()
-async def buscar_mensagens_crm(
-    contato_id: str,
-    limite: int = 50,
+async def buscar_texto_mensagens(
+    termos: str,
+    direcao: Optional[str] = None,
+    desde: Optional[str] = None,
+    limite: int = 20,
+    offset: int = 0,
 ) -> str:
-    """Lista mensagens de uma conversa no CRM.
+    """Busca palavras ou frases em todo o histórico de mensagens do WhatsApp.
+
+    Responde perguntas como "quem perguntou sobre a reabertura da piscina"
+    sem percorrer conversa por conversa. Os resultados vêm da mensagem mais
+    relevante para a menos, com a conversa, o contato e um trecho com os
+    termos em **negrito**. Requer database/024_crm_busca_mensagens.sql.
 
     Args:
-        contato_id: UUID da conversa (conversas_whatsapp.id)
-        limite: Máximo de mensagens
+        termos: Palavras (todas precisam aparecer; plurais e conjugações contam), "frase exata",
+            `or` entre alternativas e -palavra para excluir
+        direcao: entrada (enviadas pelos contatos) ou saida (enviadas pelo clube)
+        desde: Só mensagens a partir desta data (YYYY-MM-DD)
+        limite: Resultados por página (máx. 100)
+        offset: Resultados a pular (use o proximo_offset da resposta anterior)
     """
     try:
-        result = supabase.table("mensagens_whatsapp").select("*")\
-            .eq("conversa_id", contato_id).order("created_at", desc=True).limit(limite).execute()
-        return ok(result.data, f"✅ {len(result.data)} mensagem(ns)")
+        if not termos.strip():
+            return err("Informe os termos da busca")
+        if direcao and direcao not in ("entrada", "saida"):
+            return err("direcao deve ser 'entrada' ou 'saida'")
+        limite = min(max(limite, 1), 100)
+
+        inicio = None
+        if desde:
+            # Data sem fuso é meia-noite UTC, como no caminho por RPC
+            inicio = datetime.fromisoformat(desde)
+            if inicio.tzinfo is None:
+                inicio = inicio.replace(tzinfo=timezone.utc)
+
+        async def pagina(tamanho: int, pular: int) -> list[dict]:
+            if pg_pool is not None:
+                linhas = await consultar_pg(
+                    "busca_mensagens", "SELECT * FROM buscar_texto_mensagens($1, $2, $3, $4, $5)",
+                    termos, direcao, inicio, tamanho, pular,
+                )
+                return [dict(r) for r in linhas]
+            result = await executar(supabase.rpc("buscar_texto_mensagens", {
+                "p_termos": termos, "p_direcao": direcao, "p_desde": inicio.isoformat() if inicio else None,
+                "p_limite": tamanho, "p_offset": pular,
+            }))
+            return result.data or []
+
+        achados = await pagina(limite, offset)
+        if achados:
+            total = achados[0]["total"]
+        elif offset > 0:
+            # Offset além do fim: o total vem numa página de 1 a partir do início
+            primeira = await pagina(1, 0)
+            total = primeira[0]["total"] if primeira else 0
+        else:
+            total = 0
+        for a in achados:
+            del a["total"]
+            a["relevancia"] = round(a["relevancia"], 4)
+        proximo = offset + len(achados) if offset + len(achados) < total else None
+        return ok(
+            {"total": total, "resultados": achados, "proximo_offset": proximo},
+            f"🔎 {total} mensagem(ns) encontrada(s)",
+        )
     except Exception as e:
         return err(str(e))
 
@@ -783,12 +4355,7 @@ async def enviar_whatsapp(
         mensagem: Texto da mensagem
     """
     try:
-        response = await http_client.post(
-            "/api/whatsapp/send",
-            json={"telefone": telefone, "mensagem": mensagem},
-        )
-        response.raise_for_status()
-        data = response.json()
+        data = await _enviar_whatsapp_api(telefone, mensagem)
         return ok(data, f"✅ Mensagem enviada para {telefone}")
     except httpx.HTTPStatusError as e:
         return err(f"Erro ao enviar WhatsApp ({e.response.status_code}): {e.response.text}")
@@ -802,13 +4369,15 @@ async def estatisticas_crm() -> str:
     try:
         hoje = date.today().isoformat()
 
-        total = supabase.table("conversas_whatsapp").select("*", count="exact", head=True).execute()
-        abertas = supabase.table("conversas_whatsapp").select("*", count="exact", head=True)\
-            .eq("status", "aberta").execute()
-        aguardando = supabase.table("conversas_whatsapp").select("*", count="exact", head=True)\
-            .eq("status", "aguardando").execute()
-        msgs_hoje = supabase.table("mensagens_whatsapp").select("*", count="exact", head=True)\
-            .gte("created_at", f"{hoje}T00:00:00").execute()
+        total, abertas, aguardando, msgs_hoje = await asyncio.gather(
+            executar(supabase.table("conversas_whatsapp").select("*", count="exact", head=True)),
+            executar(supabase.table("conversas_whatsapp").select("*", count="exact", head=True)
+                     .eq("status", "aberta")),
+            executar(supabase.table("conversas_whatsapp").select("*", count="exact", head=True)
+                     .eq("status", "aguardando")),
+            executar(supabase.table("mensagens_whatsapp").select("*", count="exact", head=True)
+                     .gte("created_at", f"{hoje}T00:00:00")),
+        )
 
         stats = {
             "total_conversas": total.count or 0,
@@ -821,6 +4390,219 @@ async def estatisticas_crm() -> str:
         return err(str(e))
 
 
+# ============================================================
+# MÓDULO: FILA DO WHATSAPP (worker)
+# ============================================================
+# Com WHATSAPP_FILA_WORKER=true (ou `sistema-clube-mcp --fila-whatsapp`, sem o
+# MCP), o servidor envia o que foi gravado em fila_whatsapp pelo painel, pelas
+# automações ou por notificar_exames_vencendo com modo="agendar". As mensagens
+# são reservadas em lotes por reservar_fila_whatsapp (FOR UPDATE SKIP LOCKED):
+# vários servidores podem rodar o worker ao mesmo tempo sem pegar a mesma
+# mensagem. Os resultados voltam num único UPDATE por lote
+# (concluir_fila_whatsapp). Com DATABASE_URL as duas functions são chamadas
+# pela conexão direta. Requer database/028.
+
+TTL_PROVIDERS_WHATSAPP = 300
+
+
+def _taxas_por_tipo(config: str) -> dict[str, float]:
+    """"wasender=20,meta=600" -> {"wasender": 20.0, "meta": 600.0}."""
+    taxas = {}
+    for item in filter(None, (i.strip() for i in config.split(","))):
+        tipo, _, taxa = item.partition("=")
+        taxas[tipo.strip()] = float(taxa)
+    return taxas
+
+
+def _falha_definitiva(e: Exception) -> bool:
+    """Recusas que não mudam numa nova tentativa (número inválido, mensagem recusada pelo provider)."""
+    return (isinstance(e, httpx.HTTPStatusError) and 400 <= e.response.status_code < 500
+            and e.response.status_code not in (408, 425, 429))
+
+
+class RemetenteFilaWhatsapp:
+    """Worker da fila_whatsapp: reserva lotes, envia com limite de taxa por provider e conclui em lote."""
+
+    def __init__(self, lote: int = WHATSAPP_FILA_LOTE, intervalo: float = WHATSAPP_FILA_INTERVALO,
+                 taxas: Optional[dict[str, float]] = None):
+        self.id = f"{socket.gethostname()}-{os.getpid()}-{secrets.token_hex(3)}"[-100:]
+        self.lote = max(lote, 1)
+        self.intervalo = intervalo
+        self.taxas = _taxas_por_tipo(WHATSAPP_FILA_TAXAS) if taxas is None else taxas
+        # Sem provider_id a mensagem sai pelo provider padrão, no mesmo limite dos envios diretos
+        self.limitadores: dict[Optional[str], LimitadorTaxa] = {None: limitador_whatsapp}
+        self.tipos: dict[str, str] = {}
+        self._tipos_ate = 0.0
+        self.em_envio: dict[str, bool] = {}  # id -> requisição ao provider já em andamento
+        self.resultados: list[dict] = []
+        self.metricas = {"reservadas": 0, "enviadas": 0, "falhas": 0, "definitivas": 0, "concluidas": 0,
+                         "reservas_perdidas": 0, "falhas_banco": 0}
+        self._envios = asyncio.Semaphore(WHATSAPP_CONCORRENCIA)
+        self._andou = asyncio.Event()
+        self._providers = asyncio.Lock()
+        self._tarefas: dict[str, asyncio.Task] = {}
+        self._tarefa: Optional[asyncio.Task] = None
+        mais_lenta = min([*self.taxas.values(), WHATSAPP_TAXA_MINUTO])
+        if self.lote / mais_lenta * 60 > WHATSAPP_FILA_RESERVA_S:
+            logger.warning(f"Fila do WhatsApp: um lote de {self.lote} a {mais_lenta:g}/min passa de "
+                           f"WHATSAPP_FILA_RESERVA_S ({WHATSAPP_FILA_RESERVA_S}s); mensagens podem sair duas vezes")
+
+    async def reservar(self, limite: int) -> list[dict]:
+        if pg_pool is not None:
+            linhas = [dict(r) for r in await consultar_pg(
+                "fila_whatsapp", "SELECT * FROM reservar_fila_whatsapp($1, $2, $3)",
+                self.id, limite, WHATSAPP_FILA_RESERVA_S,
+            )]
+        else:
+            linhas = (await executar(supabase.rpc("reservar_fila_whatsapp", {
+                "p_worker": self.id, "p_limite": limite, "p_reserva_segundos": WHATSAPP_FILA_RESERVA_S,
+            }))).data or []
+        for m in linhas:
+            m["id"] = str(m["id"])
+            m["provider_id"] = str(m["provider_id"]) if m.get("provider_id") else None
+        self.metricas["reservadas"] += len(linhas)
+        return linhas
+
+    async def concluir(self) -> int:
+        """Grava os resultados acumulados num único UPDATE; se falhar, eles ficam para a próxima vez."""
+        if not self.resultados:
+            return 0
+        lote, self.resultados = self.resultados, []
+        try:
+            if pg_pool is not None:
+                linhas = await consultar_pg(
+                    "fila_whatsapp", "SELECT concluir_fila_whatsapp($1, $2, $3, $4)",
+                    self.id, lote, WHATSAPP_FILA_TENTATIVAS, WHATSAPP_FILA_ESPERA_S,
+                )
+                concluidas = linhas[0][0]
+            else:
+                concluidas = (await executar(supabase.rpc("concluir_fila_whatsapp", {
+                    "p_worker": self.id, "p_resultados": lote,
+                    "p_max_tentativas": WHATSAPP_FILA_TENTATIVAS, "p_espera_segundos": WHATSAPP_FILA_ESPERA_S,
+                }))).data
+        except Exception:
+            self.resultados[:0] = lote
+            raise
+        self.metricas["concluidas"] += concluidas
+        # Reserva vencida e retomada por outro worker, que também vai enviar a mensagem
+        self.metricas["reservas_perdidas"] += len(lote) - concluidas
+        return concluidas
+
+    async def _limitador(self, provider_id: Optional[str]) -> LimitadorTaxa:
+        if provider_id not in self.limitadores:
+            async with self._providers:
+                if provider_id not in self.tipos and time.monotonic() >= self._tipos_ate:
+                    if pg_pool is not None:
+                        providers = [dict(r) for r in await consultar_pg(
+                            "fila_whatsapp", "SELECT id::TEXT, tipo FROM whatsapp_providers")]
+                    else:
+                        providers = (await executar(supabase.table("whatsapp_providers").select("id, tipo"))).data
+                    self.tipos = {p["id"]: p["tipo"] for p in providers}
+                    self._tipos_ate = time.monotonic() + TTL_PROVIDERS_WHATSAPP
+                if provider_id not in self.limitadores:
+                    taxa = self.taxas.get(self.tipos.get(provider_id), WHATSAPP_TAXA_MINUTO)
+                    self.limitadores[provider_id] = LimitadorTaxa(taxa)
+        return self.limitadores[provider_id]
+
+    async def _enviar(self, mensagem: dict) -> None:
+        resultado = {"id": mensagem["id"], "enviado": True}
+        try:
+            await (await self._limitador(mensagem["provider_id"])).aguardar()
+            async with self._envios:
+                self.em_envio[mensagem["id"]] = True
+                await _enviar_whatsapp_api(mensagem["telefone"], mensagem["mensagem"], mensagem["provider_id"],
+                                           mensagem.get("tipo"), mensagem.get("arquivo_url"))
+            self.metricas["enviadas"] += 1
+        except Exception as e:
+            detalhe = e.response.text if isinstance(e, httpx.HTTPStatusError) else str(e)
+            resultado.update(enviado=False, erro=detalhe[:500] or type(e).__name__, definitivo=_falha_definitiva(e))
+            self.metricas["falhas"] += 1
+            self.metricas["definitivas"] += resultado["definitivo"]
+        finally:
+            del self.em_envio[mensagem["id"]]
+            self._tarefas.pop(mensagem["id"], None)
+            if len(self.em_envio) == self.lote // 2:
+                self._andou.set()
+        self.resultados.append(resultado)
+
+    async def manter(self) -> None:
+        """Laço do worker: conclui o que já saiu e reserva mais quando meio lote estiver livre."""
+        while True:
+            reservadas: list[dict] = []
+            try:
+                await self.concluir()
+                vagas = self.lote - len(self.em_envio)
+                if vagas * 2 >= self.lote:
+                    reservadas = await self.reservar(vagas)
+            except Exception as e:
+                self.metricas["falhas_banco"] += 1
+                if remoto_indisponivel(e):
+                    logger.warning(f"Fila do WhatsApp: Supabase indisponível ({e})")
+                else:
+                    logger.exception("Falha ao consumir a fila_whatsapp")
+            for m in reservadas:
+                self.em_envio[m["id"]] = False
+                self._tarefas[m["id"]] = asyncio.create_task(self._enviar(m))
+            self._andou.clear()
+            with contextlib.suppress(TimeoutError):
+                await asyncio.wait_for(self._andou.wait(), self.intervalo)
+
+    def iniciar(self) -> None:
+        if self._tarefa is None:
+            self._tarefa = asyncio.create_task(self.manter())
+
+    async def parar(self) -> None:
+        """Para o laço, devolve à fila o que ainda não foi enviado e conclui o resto."""
+        if self._tarefa is not None:
+            self._tarefa.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._tarefa
+            self._tarefa = None
+        # Quem já está falando com o provider termina; quem espera a vez volta para a fila
+        devolvidas = [i for i, enviando in self.em_envio.items() if not enviando]
+        for i in devolvidas:
+            self._tarefas[i].cancel()
+        await asyncio.gather(*self._tarefas.values(), return_exceptions=True)
+        self.resultados.extend({"id": i, "devolvida": True} for i in devolvidas)
+        try:
+            await asyncio.wait_for(self.concluir(), PORTARIA_TIMEOUT * 3)
+        except Exception as e:
+            logger.error(f"Fila do WhatsApp: {len(self.resultados)} resultado(s) não gravados no shutdown ({e}); "
+                         "as mensagens voltam para a fila quando a reserva vencer")
+
+    def estado(self) -> dict:
+        return {
+            "worker": self.id,
+            "ativo": self._tarefa is not None,
+            "em_envio": len(self.em_envio),
+            "resultados_pendentes": len(self.resultados),
+            **self.metricas,
+        }
+
+
+remetente_fila_whatsapp: Optional[RemetenteFilaWhatsapp] = RemetenteFilaWhatsapp() if WHATSAPP_FILA_WORKER else None
+
+
+async def rodar_fila_whatsapp() -> None:
+    """Roda só o worker da fila_whatsapp, sem o MCP, até receber SIGINT/SIGTERM."""
+    global remetente_fila_whatsapp
+    remetente_fila_whatsapp = remetente_fila_whatsapp or RemetenteFilaWhatsapp()
+    encerrar = asyncio.Event()
+    for sinal in (signal.SIGINT, signal.SIGTERM):
+        with contextlib.suppress(NotImplementedError):
+            asyncio.get_running_loop().add_signal_handler(sinal, encerrar.set)
+    get_http_client()
+    await abrir_pg_pool()
+    try:
+        remetente_fila_whatsapp.iniciar()
+        logger.info(f"Worker da fila_whatsapp {remetente_fila_whatsapp.id} iniciado")
+        await encerrar.wait()
+    finally:
+        await remetente_fila_whatsapp.parar()
+        await fechar_pg_pool()
+        await fechar_http_client()
+
+
 # ============================================================
 # MÓDULO: COMPRAS
 # ============================================================
@@ -911,6 +4693,220 @@ async def criar_compra(
         return err(str(e))
 
 
+# ============================================================
+# MÓDULO: COMPARAÇÃO DE COTAÇÕES
+# ============================================================
+# comparar_cotacoes lê as propostas de vários pedidos numa única chamada à
+# function cotacoes_para_comparacao (database/031). A function já traz os
+# itens de cada proposta e o histórico do fornecedor, e os rankings são
+# montados em memória. O histórico vem da tabela de resumo
+# historico_precos_fornecedores, recalculada no banco no máximo a cada
+# COTACOES_HISTORICO_INTERVALO_S. Assim o custo da comparação não cresce com
+# o número de compras antigas.
+
+MINIMO_COTACOES = 3  # propostas exigidas por pedido (database/005: "3 obrigatórias")
+_historico_precos = {"conferido": None, "atualizado_em": None}
+_atualizacao_precos = asyncio.Lock()
+
+
+async def _atualizar_historico_precos(forcar: bool = False) -> Optional[str]:
+    """Pede ao banco o recálculo do resumo de preços, no máximo uma vez por intervalo.
+
+    O banco só recalcula se o resumo for mais antigo que o intervalo, então
+    vários processos do MCP não repetem o trabalho. Devolve quando o resumo
+    foi calculado.
+    """
+    async with _atualizacao_precos:
+        conferido = _historico_precos["conferido"]
+        if forcar or conferido is None or time.monotonic() - conferido > COTACOES_HISTORICO_INTERVALO_S:
+            linhas = await _consultar_funcao(
+                "atualizar_historico_precos", {"p_intervalo_segundos": 0 if forcar else COTACOES_HISTORICO_INTERVALO_S}
+            )
+            _historico_precos["conferido"] = time.monotonic()
+            _historico_precos["atualizado_em"] = str(linhas[0]["atualizado_em"]) if linhas else None
+    return _historico_precos["atualizado_em"]
+
+
+def _acima_pct(valor: float, referencia: Optional[float]) -> Optional[float]:
+    return round(100 * (valor / referencia - 1), 1) if referencia else None
+
+
+def _historico_fornecedor(historico: Optional[dict]) -> Optional[dict]:
+    if not historico:
+        return None
+    return {
+        "cotacoes": historico["cotacoes"],
+        "vencedoras": historico["vencedoras"],
+        "taxa_vitoria_pct": round(100 * historico["vencedoras"] / historico["cotacoes"], 1),
+        "preco_relativo_medio": historico["preco_relativo_medio"],
+        "prazo_medio": historico["prazo_medio"],
+        "ultima_cotacao": historico["ultima_cotacao"],
+    }
+
+
+def _comparar_itens(propostas: list[dict]) -> tuple[list[dict], Optional[dict]]:
+    """Ranking de preço unitário por item e quanto custaria comprar cada item do mais barato."""
+    por_item: dict[str, dict] = {}
+    for p in propostas:
+        for i in p["itens"] or []:
+            item = por_item.setdefault(i["chave"], {"item": i["item"], "unidade": i["unidade"], "precos": []})
+            valor_unitario, quantidade = float(i["valor_unitario"]), float(i["quantidade"])
+            historico = i.get("historico") or {}
+            media = historico.get("valor_unitario_medio")
+            item["precos"].append({
+                "fornecedor": p["fornecedor"],
+                "cotacao_id": p["cotacao_id"],
+                "quantidade": quantidade,
+                "valor_unitario": valor_unitario,
+                "total": round(valor_unitario * quantidade, 2),
+                "media_historica": media,
+                "acima_da_media_historica_pct": _acima_pct(valor_unitario, media),
+            })
+    if not por_item:
+        return [], None
+
+    fornecedores = [p["fornecedor"] for p in propostas]
+    itens, divisao = [], 0.0
+    for item in por_item.values():
+        precos = sorted(item["precos"], key=lambda x: x["valor_unitario"])
+        for preco in precos:
+            preco["acima_do_menor_pct"] = _acima_pct(preco["valor_unitario"], precos[0]["valor_unitario"])
+        cotaram = {preco["fornecedor"] for preco in precos}
+        itens.append({
+            **{k: item[k] for k in ("item", "unidade")},
+            "melhor_fornecedor": precos[0]["fornecedor"],
+            "precos": precos,
+            "sem_cotacao": [f for f in fornecedores if f not in cotaram],
+        })
+        divisao += precos[0]["total"]
+
+    menor = min(float(p["valor"]) for p in propostas)
+    vencedores = {i["melhor_fornecedor"] for i in itens}
+    return itens, {
+        "valor": round(divisao, 2),
+        "fornecedores": len(vencedores),
+        "economia_vs_menor_proposta": round(menor - divisao, 2),
+    }
+
+
+def _comparar_pedido(propostas: list[dict], hoje: str) -> dict:
+    """Ranking das propostas de um pedido pelo valor total (empate: menor prazo)."""
+    propostas = sorted(propostas, key=lambda p: (float(p["valor"]), p["prazo_entrega"] is None,
+                                                 p["prazo_entrega"] or 0))
+    menor, maior = float(propostas[0]["valor"]), float(propostas[-1]["valor"])
+    pedido = propostas[0]
+    estimado = float(pedido["valor_estimado"]) if pedido["valor_estimado"] is not None else None
+
+    ranking = []
+    for posicao, p in enumerate(propostas, 1):
+        validade = str(p["validade_proposta"])[:10] if p["validade_proposta"] else None
+        ranking.append({
+            "posicao": posicao,
+            "cotacao_id": p["cotacao_id"],
+            "fornecedor_id": p["fornecedor_id"],
+            "fornecedor": p["fornecedor"],
+            "valor": float(p["valor"]),
+            "acima_do_menor_pct": _acima_pct(float(p["valor"]), menor),
+            "prazo_entrega": p["prazo_entrega"],
+            "condicao_pagamento": p["condicao_pagamento"],
+            "validade_proposta": validade,
+            "vencida": validade is not None and validade < hoje,
+            "selecionada": p["selecionada"],
+            "historico": _historico_fornecedor(p["historico"]),
+        })
+    itens, divisao = _comparar_itens(propostas)
+
+    alertas = []
+    if len(ranking) < MINIMO_COTACOES:
+        alertas.append(f"Só {len(ranking)} proposta(s); o mínimo é {MINIMO_COTACOES}")
+    vencidas = sum(r["vencida"] for r in ranking)
+    if vencidas:
+        alertas.append(f"{vencidas} proposta(s) com validade vencida")
+    selecionada = next((r for r in ranking if r["selecionada"]), None)
+    if selecionada and selecionada["posicao"] > 1:
+        alertas.append(f"A proposta selecionada ({selecionada['fornecedor']}) está "
+                       f"{selecionada['acima_do_menor_pct']}% acima da menor")
+    if estimado and menor > estimado:
+        alertas.append(f"A menor proposta está {_acima_pct(menor, estimado)}% acima do valor estimado")
+    if divisao and divisao["economia_vs_menor_proposta"] > 0 and divisao["fornecedores"] > 1:
+        alertas.append(f"Comprar cada item do fornecedor mais barato economiza "
+                       f"R$ {divisao['economia_vs_menor_proposta']:,.2f}")
+
+    return {
+        "pedido_id": pedido["pedido_id"],
+        "origem": pedido["origem"],
+        "numero": pedido["pedido_numero"],
+        "descricao": pedido["pedido_descricao"],
+        "status": pedido["pedido_status"],
+        "valor_estimado": estimado,
+        "propostas": len(ranking),
+        "menor_valor": menor,
+        "maior_valor": maior,
+        "diferenca_menor_maior": round(maior - menor, 2),
+        "economia_vs_estimado": round(estimado - menor, 2) if estimado is not None else None,
+        "ranking": ranking,
+        "itens": itens,
+        "divisao_por_item": divisao,
+        "alertas": alertas,
+    }
+
+
+@mcp.tool()
+async def comparar_cotacoes(
+    solicitacao_ids: Optional[list[str]] = None,
+    limite: int = 20,
+    atualizar_historico: bool = False,
+) -> str:
+    """Compara as cotações (ou orçamentos) de uma ou várias solicitações de compra.
+
+    Ranqueia os fornecedores pelo valor total e, quando as cotações têm itens,
+    pelo preço unitário de cada item. Cada fornecedor vem com o histórico das
+    compras já decididas: quantas cotações mandou, quantas venceu, quanto
+    costuma ficar acima do menor preço e o preço médio de cada item. Sem
+    solicitacao_ids, compara os pedidos em cotação.
+
+    Args:
+        solicitacao_ids: UUIDs das solicitações de compra (ou das compras, nas instalações com orçamentos)
+        limite: Sem solicitacao_ids, quantos pedidos em cotação comparar, dos mais antigos (1 a 100)
+        atualizar_historico: True para recalcular agora o histórico de preços dos fornecedores
+    """
+    limite = min(max(limite, 1), 100)
+    try:
+        historico_em = await _atualizar_historico_precos(atualizar_historico)
+        linhas = await _consultar_funcao(
+            "cotacoes_para_comparacao",
+            {"p_pedidos": [str(i) for i in solicitacao_ids] if solicitacao_ids else None, "p_limite": limite},
+        )
+
+        por_pedido: dict[str, list[dict]] = {}
+        for linha in linhas:
+            linha = {k: str(v) if isinstance(v, uuid.UUID) else v for k, v in linha.items()}
+            por_pedido.setdefault(linha["pedido_id"], []).append(linha)
+        hoje = date.today().isoformat()
+        pedidos = [_comparar_pedido(propostas, hoje) for propostas in por_pedido.values()]
+
+        resultado = {
+            "historico_atualizado_em": historico_em,
+            "pedidos": pedidos,
+        }
+        if solicitacao_ids:
+            resultado["sem_propostas"] = [str(i) for i in solicitacao_ids if str(i) not in por_pedido]
+        alertas = sum(len(p["alertas"]) for p in pedidos)
+        return ok(resultado, f"🧾 {len(pedidos)} pedido(s) comparado(s), "
+                             f"{sum(p['propostas'] for p in pedidos)} proposta(s), {alertas} alerta(s)")
+    except Exception as e:
+        error_msg = str(e)
+        # Só a function ausente (PostgREST PGRST202 ou "function ... does not exist" do asyncpg);
+        # uma tabela ou coluna que falte dentro dela sobe com a mensagem original
+        if "PGRST202" in error_msg or "could not find the function" in error_msg.lower() \
+                or re.search(r"function [\w.]+\(.*\) does not exist", error_msg):
+            return err(
+                "As functions 'cotacoes_para_comparacao' e 'atualizar_historico_precos' não existem no Supabase. "
+                "Execute o script database/031_comparacao_cotacoes.sql no SQL Editor para habilitar a comparação."
+            )
+        return err(error_msg)
+
+
 # ============================================================
 # MÓDULO: ELEIÇÕES (corrigido - usa chapas intermediárias)
 # ============================================================
@@ -936,6 +4932,27 @@ async def buscar_eleicoes(status: Optional[str] = None) -> str:
         return err(str(e))
 
 
+# Com DATABASE_URL os votos são contados no banco em vez de trafegar um por um
+SQL_CHAPAS_ELEICAO = """
+    SELECT to_jsonb(ch) || jsonb_build_object(
+        'candidatos', COALESCE((
+            SELECT jsonb_agg(to_jsonb(c) || jsonb_build_object('associados', jsonb_build_object('nome', a.nome)))
+            FROM candidatos c
+            LEFT JOIN associados a ON a.id = c.associado_id
+            WHERE c.chapa_id = ch.id
+        ), '[]'::jsonb),
+        'votos', (SELECT count(*) FROM votos v WHERE v.eleicao_id = ch.eleicao_id AND v.chapa_id = ch.id)
+    ) AS chapa
+    FROM chapas ch
+    WHERE ch.eleicao_id = $1
+"""
+SQL_TOTAIS_ELEICAO = """
+    SELECT count(*) AS total, count(*) FILTER (WHERE chapa_id IS NULL) AS brancos
+    FROM votos
+    WHERE eleicao_id = $1
+"""
+
+
 @mcp.tool()
 async def resultado_eleicao(eleicao_id: str) -> str:
     """Obtém o resultado detalhado de uma eleição.
@@ -944,6 +4961,27 @@ async def resultado_eleicao(eleicao_id: str) -> str:
         eleicao_id: UUID da eleição
     """
     try:
+        if pg_pool is not None:
+            eleicoes, chapas, totais = await asyncio.gather(
+                consultar_pg("eleicoes", "SELECT * FROM eleicoes WHERE id = $1", eleicao_id),
+                consultar_pg("chapas", SQL_CHAPAS_ELEICAO, eleicao_id),
+                consultar_pg("votos", SQL_TOTAIS_ELEICAO, eleicao_id),
+            )
+            if not eleicoes:
+                return err(f"Eleição {eleicao_id} não encontrada")
+            total_votos = totais[0]["total"]
+            resultado_chapas = [
+                {**r["chapa"], "percentual": round(r["chapa"]["votos"] / total_votos * 100, 2) if total_votos else 0}
+                for r in chapas
+            ]
+            resultado_chapas.sort(key=lambda x: x["votos"], reverse=True)
+            return ok({
+                "eleicao": dict(eleicoes[0]),
+                "chapas": resultado_chapas,
+                "total_votos": total_votos,
+                "votos_brancos": totais[0]["brancos"],
+            }, "🗳️ Resultado da Eleição")
+
         eleicao = supabase.table("eleicoes").select("*").eq("id", eleicao_id).single().execute()
         chapas = supabase.table("chapas").select(
             "*, candidatos(*, associados(nome))"
@@ -988,9 +5026,37 @@ async def resultado_eleicao(eleicao_id: str) -> str:
 # MÓDULO: EXAMES MÉDICOS
 # ============================================================
 
+# Exames de associados ficam em associado_id e os de dependentes em dependente_id;
+# cada coluna tem um índice (coluna, data_validade DESC) - database/022_exames_indices.sql
+COLUNA_EXAME = {"associado": "associado_id", "dependente": "dependente_id"}
+RESULTADOS_APTOS = ("apto", "apto_restricao")
+
+
+def coluna_exame(tipo_pessoa: str) -> str:
+    """Coluna de exames_medicos que identifica a pessoa do tipo informado."""
+    try:
+        return COLUNA_EXAME[tipo_pessoa]
+    except KeyError:
+        raise ValueError(f"tipo_pessoa inválido: {tipo_pessoa} (use associado ou dependente)") from None
+
+
+def ultimo_exame_valido(tipo_pessoa: str, pessoa_id: str) -> Optional[dict]:
+    """Exame mais recente ainda dentro da validade, ou None.
+
+    Lê só as colunas incluídas no índice parcial da pessoa: o Postgres
+    responde com um único index-only scan, sem visitar a tabela.
+    """
+    result = supabase.table("exames_medicos").select("data_validade, resultado, data_exame")\
+        .eq(coluna_exame(tipo_pessoa), pessoa_id)\
+        .gte("data_validade", date.today().isoformat())\
+        .order("data_validade", desc=True).limit(1).execute()
+    return result.data[0] if result.data else None
+
+
 @mcp.tool()
 async def buscar_exames(
     pessoa_id: Optional[str] = None,
+    tipo_pessoa: Optional[str] = None,
     status: Optional[str] = None,
     vencidos: bool = False,
     a_vencer_dias: Optional[int] = None,
@@ -1000,7 +5066,8 @@ async def buscar_exames(
 
     Args:
         pessoa_id: Filtrar por pessoa (associado ou dependente)
-        status: Resultado do exame (apto, inapto, pendente)
+        tipo_pessoa: Tipo da pessoa (associado ou dependente). Sem ele, procura o id nos dois.
+        status: Resultado do exame (apto, apto_restricao, inapto, pendente)
         vencidos: Se True, retorna apenas exames vencidos
         a_vencer_dias: Retorna exames que vencem nos próximos X dias
         limite: Máximo de resultados
@@ -1008,14 +5075,17 @@ async def buscar_exames(
     try:
         query = supabase.table("exames_medicos").select("*").order("data_validade", desc=True).limit(limite)
 
-        if pessoa_id:
-            query = query.eq("associado_id", pessoa_id)
+        if pessoa_id and tipo_pessoa:
+            query = query.eq(coluna_exame(tipo_pessoa), pessoa_id)
+        elif pessoa_id:
+            query = query.or_(f"associado_id.eq.{pessoa_id},dependente_id.eq.{pessoa_id}")
+        elif tipo_pessoa:
+            query = query.not_.is_(coluna_exame(tipo_pessoa), "null")
         if status:
             query = query.eq("resultado", status)
         if vencidos:
             query = query.lt("data_validade", date.today().isoformat())
         if a_vencer_dias:
-            from datetime import timedelta
             limite_data = (date.today() + timedelta(days=a_vencer_dias)).isoformat()
             query = query.gte("data_validade", date.today().isoformat()).lte("data_validade", limite_data)
 
@@ -1046,11 +5116,11 @@ async def registrar_exame(
         medico_nome: Nome do médico
         crm_medico: CRM do médico
         clinica: Nome da clínica
-        resultado: Resultado do exame (apto, inapto)
+        resultado: Resultado do exame (apto, apto_restricao, inapto)
     """
     try:
         dados = {
-            "associado_id": pessoa_id,
+            coluna_exame(tipo_pessoa): pessoa_id,
             "data_exame": data_exame,
             "data_validade": data_validade,
             "resultado": resultado or "apto",
@@ -1065,6 +5135,189 @@ async def registrar_exame(
         return err(str(e))
 
 
+MODELO_AVISO_EXAME = (
+    "Olá! O exame médico de {nome} no clube vence {prazo} ({data_validade}). "
+    "Renove para continuar usando a piscina e a academia sem interrupção."
+)
+CAMPOS_AVISO_EXAME = ("nome", "primeiro_nome", "titular", "data_validade", "dias", "prazo")
+
+
+def _validar_modelo(modelo: str, campos: tuple) -> None:
+    usados = {campo for _, campo, _, _ in string.Formatter().parse(modelo) if campo is not None}
+    desconhecidos = usados - set(campos)
+    if desconhecidos:
+        raise ValueError(f"Campo(s) desconhecido(s) no modelo: {', '.join(sorted(desconhecidos))} "
+                         f"(disponíveis: {', '.join(campos)})")
+
+
+def _prazo(dias: int) -> str:
+    return "hoje" if dias == 0 else "amanhã" if dias == 1 else f"em {dias} dias"
+
+
+async def _em_blocos(tabela: str, select: str, coluna: str, valores: list, **filtros) -> list[dict]:
+    """SELECT ... WHERE coluna IN (...) em blocos de BLOCO_IDS, todos em paralelo."""
+    consultas = []
+    for i in range(0, len(valores), BLOCO_IDS):
+        query = supabase.table(tabela).select(select).in_(coluna, valores[i:i + BLOCO_IDS])
+        for campo, (operador, valor) in filtros.items():
+            query = getattr(query, operador)(campo, valor)
+        consultas.append(executar(query))
+    return [linha for result in await asyncio.gather(*consultas) for linha in (result.data or [])]
+
+
+async def _avisos_da_pagina(exames: list[dict], fim: str, modelo: str, vistos: set, resumo: dict) -> list[dict]:
+    """Transforma uma página de exames no período em mensagens, com 3 a 5 consultas por página.
+
+    Descarta quem já renovou (tem outro exame válido além do período) e
+    busca telefones de associados e dependentes (com o do titular como
+    reserva) em lote, nunca pessoa a pessoa.
+    """
+    pessoas: dict[tuple[str, str], str] = {}
+    for e in exames:
+        chave = ("dependente", e["dependente_id"]) if e.get("dependente_id") else ("associado", e["associado_id"])
+        if chave[1] and chave not in vistos:
+            vistos.add(chave)
+            pessoas[chave] = e["data_validade"]
+    ids = {tipo: [pid for t, pid in pessoas if t == tipo] for tipo in ("associado", "dependente")}
+
+    renovados_a, renovados_d, dependentes = await asyncio.gather(
+        _em_blocos("exames_medicos", "associado_id", "associado_id", ids["associado"], data_validade=("gt", fim)),
+        _em_blocos("exames_medicos", "dependente_id", "dependente_id", ids["dependente"], data_validade=("gt", fim)),
+        _em_blocos("dependentes", "id, nome, telefone, associado_id", "id", ids["dependente"]),
+    )
+    ja_renovou = {("associado", e["associado_id"]) for e in renovados_a}
+    ja_renovou |= {("dependente", e["dependente_id"]) for e in renovados_d}
+    dependentes = {d["id"]: d for d in dependentes}
+    titulares = set(ids["associado"]) | {d["associado_id"] for d in dependentes.values() if d.get("associado_id")}
+    associados = {a["id"]: a for a in await _em_blocos("associados", "id, nome, telefone", "id", list(titulares))}
+
+    hoje = date.today()
+    avisos = []
+    for (tipo, pid), validade in pessoas.items():
+        if (tipo, pid) in ja_renovou:
+            resumo["ja_renovados"] += 1
+            continue
+        pessoa = (dependentes if tipo == "dependente" else associados).get(pid)
+        if not pessoa:
+            resumo["sem_cadastro"] += 1
+            continue
+        titular = associados.get(pessoa.get("associado_id")) if tipo == "dependente" else pessoa
+        telefone = normalizar_telefone(pessoa.get("telefone")) or normalizar_telefone((titular or {}).get("telefone"))
+        if not telefone:
+            resumo["sem_telefone"] += 1
+            continue
+        dias = (date.fromisoformat(validade[:10]) - hoje).days
+        avisos.append({
+            "tipo_pessoa": tipo, "pessoa_id": pid, "telefone": telefone,
+            "mensagem": modelo.format(
+                nome=pessoa["nome"], primeiro_nome=pessoa["nome"].split()[0],
+                titular=(titular or pessoa)["nome"], data_validade=date.fromisoformat(validade[:10]).strftime("%d/%m/%Y"),
+                dias=dias, prazo=_prazo(dias),
+            ),
+        })
+    return avisos
+
+
+@mcp.tool()
+async def notificar_exames_vencendo(
+    dias: int = 15,
+    modelo: Optional[str] = None,
+    modo: str = "enviar",
+    simular: bool = False,
+) -> str:
+    """Avisa por WhatsApp, numa só execução, todos que têm exame médico vencendo no período.
+
+    Percorre os exames que vencem entre hoje e hoje + `dias` página a página,
+    ignora quem já tem um exame mais novo, busca os telefones em lote
+    (dependente sem telefone recebe no do titular), monta uma mensagem por
+    pessoa e envia respeitando WHATSAPP_TAXA_MINUTO. Cada envio fica
+    registrado em fila_whatsapp.
+
+    Args:
+        dias: Janela de vencimento em dias a partir de hoje
+        modelo: Texto da mensagem com os campos {nome}, {primeiro_nome}, {titular},
+            {data_validade}, {dias} e {prazo} ("hoje", "amanhã", "em N dias")
+        modo: "enviar" (envia agora) ou "agendar" (só grava em fila_whatsapp para envio posterior)
+        simular: Apenas monta as mensagens e informa os totais, sem enviar nem gravar
+    """
+    try:
+        if modo not in ("enviar", "agendar"):
+            return err('modo deve ser "enviar" ou "agendar"')
+        modelo = modelo or MODELO_AVISO_EXAME
+        _validar_modelo(modelo, CAMPOS_AVISO_EXAME)
+
+        inicio = date.today().isoformat()
+        fim = (date.today() + timedelta(days=max(dias, 0))).isoformat()
+        resumo = {"periodo": {"inicio": inicio, "fim": fim}, "exames_no_periodo": 0, "pessoas": 0,
+                  "ja_renovados": 0, "sem_cadastro": 0, "sem_telefone": 0, "mensagens": 0}
+        registros: list[dict] = []
+        falhas: list[dict] = []
+        exemplos: list[dict] = []
+        fila: asyncio.Queue = asyncio.Queue(maxsize=WHATSAPP_CONCORRENCIA * 50)
+
+        async def remetente():
+            while (aviso := await fila.get()) is not None:
+                await limitador_whatsapp.aguardar()
+                registro = {"telefone": aviso["telefone"], "mensagem": aviso["mensagem"],
+                            "data_envio": datetime.now().isoformat()}
+                try:
+                    await _enviar_whatsapp_api(aviso["telefone"], aviso["mensagem"])
+                    registro["enviado"] = True
+                except Exception as e:
+                    detalhe = e.response.text if isinstance(e, httpx.HTTPStatusError) else str(e)
+                    registro.update(enviado=False, erro=detalhe[:500])
+                    falhas.append({"tipo_pessoa": aviso["tipo_pessoa"], "pessoa_id": aviso["pessoa_id"],
+                                   "telefone": aviso["telefone"], "erro": detalhe[:200]})
+                registros.append(registro)
+
+        enviando = modo == "enviar" and not simular
+        remetentes = [asyncio.create_task(remetente()) for _ in range(WHATSAPP_CONCORRENCIA if enviando else 0)]
+        vistos: set = set()
+        try:
+            paginas = paginar_keyset(lambda: supabase.table("exames_medicos").select(
+                "id, associado_id, dependente_id, data_validade"
+            ).gte("data_validade", inicio).lte("data_validade", fim))
+            while (pagina := await asyncio.to_thread(next, paginas, None)) is not None:
+                resumo["exames_no_periodo"] += len(pagina)
+                avisos = await _avisos_da_pagina(pagina, fim, modelo, vistos, resumo)
+                resumo["mensagens"] += len(avisos)
+                exemplos.extend(avisos[:5 - len(exemplos)])
+                for aviso in avisos:
+                    if enviando:
+                        await fila.put(aviso)
+                    elif modo == "agendar" and not simular:
+                        registros.append({"telefone": aviso["telefone"], "mensagem": aviso["mensagem"],
+                                          "agendado_para": datetime.now().isoformat(), "enviado": False})
+        finally:
+            for _ in remetentes:
+                await fila.put(None)
+            await asyncio.gather(*remetentes)
+        resumo["pessoas"] = len(vistos)
+
+        try:
+            for i in range(0, len(registros), IMPORT_LOTE):
+                await executar(supabase.table("fila_whatsapp").insert(registros[i:i + IMPORT_LOTE]))
+        except Exception as e:
+            if modo == "agendar":
+                raise
+            # As mensagens já saíram: a falha do registro não pode virar erro do envio
+            logger.warning("Envios de aviso de exame não registrados em fila_whatsapp: %s", e)
+            resumo["erro_registro"] = getattr(e, "message", None) or str(e)
+
+        resumo["exemplos"] = exemplos
+        if simular:
+            return ok(resumo, f"🔎 Simulação: {resumo['mensagens']} aviso(s) de exame seriam enviados")
+        if modo == "agendar":
+            resumo["agendados"] = len(registros)
+            return ok(resumo, f"🗓️ {len(registros)} aviso(s) de exame gravados em fila_whatsapp")
+        resumo["enviados"] = len(registros) - len(falhas)
+        resumo["falhas"] = len(falhas)
+        resumo["primeiras_falhas"] = falhas[:20]
+        return ok(resumo, f"✅ {resumo['enviados']} aviso(s) de exame enviado(s), {len(falhas)} falha(s)")
+    except Exception as e:
+        return err(str(e))
+
+
 # ============================================================
 # MÓDULO: PUNIÇÕES E RECLAMAÇÕES (corrigido - era "infrações")
 # ============================================================
@@ -1162,15 +5415,128 @@ async def registrar_infracao(
         return err(str(e))
 
 
+# ============================================================
+# MÓDULO: PERFIL COMPLETO (visão 360 do associado)
+# ============================================================
+
+LOCAIS_ACESSO = ("clube", "piscina", "academia")
+RE_UUID = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$", re.I)
+
+
+def _filtro_associado(query: Any, associado: str) -> Any:
+    """Localiza o associado por UUID, CPF, número do título ou parte do nome."""
+    if RE_UUID.match(associado):
+        return query.eq("id", associado)
+    digitos = associado.replace(".", "").replace("-", "")
+    if digitos.isdigit():
+        if len(digitos) == 11:
+            return query.eq("cpf", format_cpf(digitos))
+        return query.eq("numero_titulo", int(digitos))
+    return query.ilike("nome", f"%{associado}%")
+
+
+def _exames_por_pessoa(exames: list[dict]) -> dict[str, dict]:
+    """Último exame de cada pessoa (linhas já ordenadas por data_validade DESC)."""
+    ultimos: dict[str, dict] = {}
+    for e in exames:
+        pessoa = e.get("associado_id") or e.get("dependente_id")
+        ultimos.setdefault(pessoa, {k: e.get(k) for k in ("data_exame", "data_validade", "resultado")})
+    return ultimos
+
+
+@mcp.tool()
+async def perfil_completo(associado: str) -> str:
+    """Situação completa de um associado e seus dependentes numa só chamada.
+
+    Traz o cadastro, os dependentes, as mensalidades em aberto, o último exame
+    de cada pessoa, punições, reclamações e o resultado de validar_acesso em
+    cada local (clube, piscina, academia) para o titular e cada dependente.
+    São cinco requisições em duas rodadas: o associado com os dependentes e,
+    depois, mensalidades, exames, punições e reclamações em paralelo. A
+    latência é a de duas idas ao banco, em vez de uma dúzia de chamadas a
+    tools separadas.
+
+    Args:
+        associado: UUID, CPF, número do título ou parte do nome do associado
+    """
+    try:
+        encontrados = await executar(_filtro_associado(
+            supabase.table("associados").select(
+                "id, numero_titulo, nome, cpf, telefone, email, plano, status, data_associacao, "
+                "dependentes(id, nome, parentesco, status, data_nascimento)"
+            ), associado.strip(),
+        ).order("nome").limit(10))
+        if not encontrados.data:
+            return err(f"Associado '{associado}' não encontrado")
+        if len(encontrados.data) > 1:
+            candidatos = [{k: a[k] for k in ("id", "numero_titulo", "nome", "status")} for a in encontrados.data]
+            return ok(candidatos, f"🔎 {len(candidatos)} associados encontrados - chame de novo com o id de um deles")
+
+        titular = encontrados.data[0]
+        dependentes = titular.pop("dependentes") or []
+        associado_id = titular["id"]
+        filtro_exames = f"associado_id.eq.{associado_id}"
+        if dependentes:
+            filtro_exames += f",dependente_id.in.({','.join(d['id'] for d in dependentes)})"
+
+        mensalidades, exames, punicoes, reclamacoes = await asyncio.gather(
+            executar(supabase.table("mensalidades").select("id, referencia, valor, data_vencimento, status")
+                     .eq("associado_id", associado_id).in_("status", ["pendente", "atrasado"])
+                     .order("data_vencimento")),
+            executar(supabase.table("exames_medicos")
+                     .select("associado_id, dependente_id, data_exame, data_validade, resultado")
+                     .or_(filtro_exames).order("data_validade", desc=True)),
+            executar(supabase.table("punicoes").select("id, tipo, descricao, data_inicio, data_fim, created_at")
+                     .eq("associado_id", associado_id).order("created_at", desc=True).limit(10)),
+            executar(supabase.table("reclamacoes")
+                     .select("id, descricao, local_ocorrencia, data_ocorrencia, status, created_at")
+                     .eq("reclamado_id", associado_id).order("created_at", desc=True).limit(10)),
+        )
+
+        em_aberto = mensalidades.data or []
+        atrasadas = sum(m["status"] == "atrasado" for m in em_aberto)
+        ultimos = _exames_por_pessoa(exames.data or [])
+        hoje = date.today().isoformat()
+
+        def situacao(pessoa: dict, titular_da_pessoa: Optional[dict]) -> dict:
+            exame = ultimos.get(pessoa["id"])
+            valido = exame if exame and exame["data_validade"] >= hoje else None
+            acesso = {}
+            for local in LOCAIS_ACESSO:
+                veredito = veredito_acesso(pessoa, local, atrasadas, valido, titular_da_pessoa)
+                veredito.pop("exame", None)
+                if not veredito.get("alertas"):
+                    veredito.pop("alertas", None)
+                acesso[local] = veredito
+            return {"ultimo_exame": exame, "exame_valido": valido is not None, "acesso": acesso}
+
+        perfil = {
+            "associado": {**titular, **situacao(titular, None)},
+            "dependentes": [{**d, **situacao(d, titular)} for d in dependentes],
+            "financeiro": {
+                "mensalidades_em_aberto": em_aberto,
+                "atrasadas": atrasadas,
+                "total_em_aberto": round(sum(m["valor"] or 0 for m in em_aberto), 2),
+            },
+            "punicoes": punicoes.data or [],
+            "reclamacoes": reclamacoes.data or [],
+        }
+        liberado = perfil["associado"]["acesso"]["clube"]["permitido"]
+        return ok(perfil, f"{'✅' if liberado else '⛔'} {titular['nome']} (título {titular['numero_titulo']})")
+    except Exception as e:
+        return err(str(e))
+
+
 # ============================================================
 # MÓDULO: CONFIGURAÇÕES (corrigido - planos_valores)
 # ============================================================
 
 @mcp.tool()
+@coalescer()
 async def listar_planos() -> str:
     """Lista os planos disponíveis no clube com seus valores."""
     try:
-        result = supabase.table("planos_valores").select("*").eq("ativo", True).order("tipo").execute()
+        result = await executar(supabase.table("planos_valores").select("*").eq("ativo", True).order("tipo"))
         return ok(result.data, f"✅ {len(result.data)} plano(s)")
     except Exception as e:
         return err(str(e))
@@ -1200,6 +5566,7 @@ async def listar_usuarios_sistema(setor: Optional[str] = None) -> str:
 # ============================================================
 
 @mcp.tool()
+@coalescer()
 async def resumo_geral() -> str:
     """Retorna um resumo geral do clube com dados de todos os módulos.
 
@@ -1209,27 +5576,29 @@ async def resumo_geral() -> str:
         hoje = date.today().isoformat()
         mes_atual = date.today().strftime("%Y-%m")
 
-        # Associados
-        assoc_total = supabase.table("associados").select("*", count="exact", head=True).execute()
-        assoc_ativos = supabase.table("associados").select("*", count="exact", head=True).eq("status", "ativo").execute()
-
-        # Financeiro
-        mens_pagas = supabase.table("mensalidades").select("*", count="exact", head=True)\
-            .eq("referencia", mes_atual).eq("status", "pago").execute()
-        mens_atrasadas = supabase.table("mensalidades").select("*", count="exact", head=True)\
-            .eq("status", "atrasado").execute()
-
-        # Portaria (usando created_at)
-        entradas_hoje = supabase.table("registros_acesso").select("*", count="exact", head=True)\
-            .eq("tipo", "entrada").gte("created_at", f"{hoje}T00:00:00").execute()
-
-        # CRM (tabela correta: conversas_whatsapp)
-        crm_abertas = supabase.table("conversas_whatsapp").select("*", count="exact", head=True)\
-            .eq("status", "aberta").execute()
-
-        # Exames vencidos
-        exames_vencidos = supabase.table("exames_medicos").select("*", count="exact", head=True)\
-            .lt("data_validade", hoje).eq("resultado", "apto").execute()
+        (
+            assoc_total, assoc_ativos,
+            mens_pagas, mens_atrasadas,
+            entradas_hoje, crm_abertas, exames_vencidos,
+        ) = await asyncio.gather(
+            # Associados
+            executar(supabase.table("associados").select("*", count="exact", head=True)),
+            executar(supabase.table("associados").select("*", count="exact", head=True).eq("status", "ativo")),
+            # Financeiro
+            executar(supabase.table("mensalidades").select("*", count="exact", head=True)
+                     .eq("referencia", mes_atual).eq("status", "pago")),
+            executar(supabase.table("mensalidades").select("*", count="exact", head=True)
+                     .eq("status", "atrasado")),
+            # Portaria (usando created_at)
+            executar(supabase.table("registros_acesso").select("*", count="exact", head=True)
+                     .eq("tipo", "entrada").gte("created_at", f"{hoje}T00:00:00")),
+            # CRM (tabela correta: conversas_whatsapp)
+            executar(supabase.table("conversas_whatsapp").select("*", count="exact", head=True)
+                     .eq("status", "aberta")),
+            # Exames vencidos
+            executar(supabase.table("exames_medicos").select("*", count="exact", head=True)
+                     .lt("data_validade", hoje).eq("resultado", "apto")),
+        )
 
         resumo = {
             "data": hoje,
@@ -1257,54 +5626,526 @@ async def resumo_geral() -> str:
 
 
 # ============================================================
-# MÓDULO: CONSULTAS SQL (informativo - requer RPC)
+# MÓDULO: MÉTRICAS DO SERVIDOR
+# ============================================================
+
+@mcp.tool()
+async def metricas_servidor(tool: Optional[str] = None) -> str:
+    """Retorna métricas de desempenho das tools (chamadas, erros, latência p50/p95/p99, round-trips ao Supabase).
+
+    Args:
+        tool: Nome de uma tool específica. Se não informado, retorna todas (mais lentas primeiro).
+    """
+    tools = resumo_metricas()
+    if tool:
+        if tool not in tools:
+            return err(f"Nenhuma métrica registrada para a tool '{tool}'")
+        tools = {tool: tools[tool]}
+
+    return ok({
+        "uptime_segundos": round(time.time() - INICIO_SERVIDOR),
+        "tools": tools,
+        "coalescencia": metricas_coalescencia,
+        "cache_sql": cache_sql.estatisticas(),
+        "fila_acessos": fila_acessos.estado() if fila_acessos is not None else None,
+        "indice_convites": indice_convites.estado(),
+        "fila_whatsapp": remetente_fila_whatsapp.estado() if remetente_fila_whatsapp is not None else None,
+        "consultas_lentas": {
+            "limite_ms": SLOW_QUERY_MS,
+            "ultimas": [c for c in consultas_lentas if not tool or c["tool"] == tool][-10:],
+        },
+    }, "📈 Métricas do Servidor")
+
+
+if METRICS_PROMETHEUS:
+    from starlette.requests import Request
+    from starlette.responses import PlainTextResponse
+
+    @mcp.custom_route("/metrics", methods=["GET"])
+    async def endpoint_metricas(request: Request) -> PlainTextResponse:
+        """Endpoint Prometheus (disponível nos transportes SSE/HTTP)."""
+        return PlainTextResponse(metricas_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+# ============================================================
+# MÓDULO: CONSULTAS SQL (requer RPC - database/019_consulta_sql_segura.sql)
 # ============================================================
 
+SQL_BLOQUEADOS = re.compile(
+    r"\b(INSERT|UPDATE|DELETE|MERGE|DROP|ALTER|CREATE|TRUNCATE|GRANT|REVOKE|COPY|CALL|DO|"
+    r"EXECUTE|PREPARE|VACUUM|ANALYZE|CLUSTER|REINDEX|LOCK|LISTEN|NOTIFY|SET|RESET|"
+    r"PG_SLEEP|PG_READ_FILE|PG_READ_BINARY_FILE|PG_LS_DIR|PG_TERMINATE_BACKEND|PG_CANCEL_BACKEND|"
+    r"SET_CONFIG|DBLINK|LO_IMPORT|LO_EXPORT)\b"
+)
+
+
+def validar_sql(query: str) -> Optional[str]:
+    """Valida uma consulta somente-leitura. Retorna a mensagem de erro ou None se for válida.
+
+    Comentários, literais e identificadores entre aspas são ignorados na
+    checagem de palavras-chave, então colunas como `created_at` ou textos como
+    'update' não são bloqueados. Um `--` dentro de um literal não esconde o
+    resto da consulta.
+    """
+    limpa = "".join(
+        trecho if tipo == "codigo" else " " if tipo == "comentario" else "''"
+        for tipo, trecho in _partes_sql(query)
+    )
+    upper = limpa.strip().rstrip(";").strip().upper()
+
+    if not re.match(r"^(SELECT|WITH)\b", upper):
+        return "Apenas consultas SELECT (ou WITH ... SELECT) são permitidas por segurança."
+    if ";" in upper:
+        return "Apenas uma instrução por consulta."
+    bloqueado = SQL_BLOQUEADOS.search(upper)
+    if bloqueado:
+        return f"Comando '{bloqueado.group(1)}' não é permitido."
+    return None
+
+
+async def consulta_sql_pg(query: str, limite: int, offset: int) -> dict:
+    """Executa a consulta pelo pool asyncpg com as mesmas garantias da RPC execute_readonly_query.
+
+    Transação somente-leitura com statement_timeout, rejeição por custo
+    (EXPLAIN) e leitura por cursor no servidor: pula `offset` linhas e busca
+    só `limite` + 1, sem materializar o resultado inteiro.
+    """
+    sql = query.strip().rstrip(";")
+    inicio, inicio_ns = time.perf_counter(), time.time_ns()
+    async with pg_pool.acquire() as conn:
+        async with conn.transaction(readonly=True):
+            await conn.execute(f"SET LOCAL statement_timeout = {int(SQL_TIMEOUT_MS)}")
+            # A quebra de linha antes do ")" encerra um comentário "--" no fim da consulta
+            plano = await conn.fetchval(
+                f"EXPLAIN (FORMAT JSON) SELECT * FROM ({sql}\n) q LIMIT {offset + limite + 1}"
+            )
+            custo = plano[0]["Plan"]["Total Cost"]
+            if custo > SQL_CUSTO_MAXIMO:
+                raise ValueError(
+                    f"Consulta rejeitada: custo estimado {round(custo)} acima do limite {SQL_CUSTO_MAXIMO:g}. "
+                    "Adicione filtros (WHERE) ou agregue os dados antes de consultar"
+                )
+            cursor = await conn.cursor(sql)
+            if offset:
+                await cursor.forward(offset)
+            linhas = await cursor.fetch(limite + 1)
+    registrar_consulta_pg("consulta_sql", inicio, inicio_ns, len(linhas))
+
+    truncado = len(linhas) > limite
+    linhas = [dict(r) for r in linhas[:limite]]
+    return {
+        "linhas": linhas,
+        "quantidade": len(linhas),
+        "offset": offset,
+        "truncado": truncado,
+        "proximo_offset": offset + len(linhas) if truncado else None,
+        "custo_estimado": round(custo),
+    }
+
+
 @mcp.tool()
-async def consulta_sql(query: str) -> str:
+async def consulta_sql(query: str, limite: int = 200, offset: int = 0, usar_cache: bool = True) -> str:
     """Executa uma consulta SQL somente-leitura no banco de dados do clube.
 
     ⚠️ APENAS SELECT é permitido. Consultas INSERT/UPDATE/DELETE serão bloqueadas.
-    ⚠️ Requer a function RPC 'execute_readonly_query' no Supabase.
+    ⚠️ Requer a function RPC 'execute_readonly_query' no Supabase (ou DATABASE_URL configurada).
+
+    O resultado é paginado: se vier truncado, repita a consulta com o
+    `offset` indicado em `proximo_offset` (a consulta precisa de ORDER BY
+    para as páginas serem estáveis). Consultas com custo estimado
+    muito alto são rejeitadas antes de executar. Para relatórios comuns
+    (receita mensal, entradas por local, inadimplência por plano) prefira
+    `executar_relatorio`.
 
     Args:
         query: Consulta SQL (apenas SELECT)
+        limite: Máximo de linhas por página (padrão 200)
+        offset: Linhas a pular (paginação)
+        usar_cache: Reaproveitar resultado recente da mesma consulta (padrão True)
     """
-    query_upper = query.strip().upper()
-    if not query_upper.startswith("SELECT"):
-        return err("Apenas consultas SELECT são permitidas por segurança.")
-
-    blocked = ["INSERT", "UPDATE", "DELETE", "DROP", "ALTER", "CREATE", "TRUNCATE", "GRANT", "REVOKE"]
-    for word in blocked:
-        if word in query_upper:
-            return err(f"Comando '{word}' não é permitido.")
+    erro = validar_sql(query)
+    if erro:
+        return err(erro)
+
+    limite = max(1, min(limite, SQL_MAX_LINHAS))
+    offset = max(offset, 0)
+    normalizada = normalizar_sql(query)
+    if offset and not re.search(r"\border\s+by\b", normalizada):
+        return err("Paginação com offset exige ORDER BY na consulta: sem ele as páginas podem se repetir ou pular linhas.")
+    chave = ("sql", normalizada, limite, offset)
+    if usar_cache:
+        resposta = cache_sql.obter(chave)
+        if resposta is not None:
+            return resposta
 
     try:
-        # Tentar via RPC function (deve existir no Supabase)
-        result = supabase.rpc("execute_readonly_query", {"query_text": query}).execute()
-        return ok(result.data, "✅ Consulta executada")
+        if pg_pool is not None:
+            dados = await consulta_sql_pg(query, limite, offset)
+        else:
+            result = await executar(supabase.rpc("execute_readonly_query", {
+                "query_text": query,
+                "max_linhas": limite,
+                "pagina_offset": offset,
+                "timeout_ms": SQL_TIMEOUT_MS,
+                "custo_maximo": SQL_CUSTO_MAXIMO,
+            }))
+            dados = result.data
+        msg = f"✅ Consulta executada ({dados['quantidade']} linha(s))"
+        if dados.get("truncado"):
+            msg += (
+                f"\n⚠️ Resultado truncado em {dados['quantidade']} linhas. "
+                f"Use offset={dados['proximo_offset']} para a próxima página"
+                + (" (com ORDER BY na consulta)." if not re.search(r"\border\s+by\b", normalizada) else ".")
+            )
+        resposta = ok(dados, msg)
+        cache_sql.guardar(chave, resposta)
+        return resposta
     except Exception as e:
         error_msg = str(e)
         if "PGRST202" in error_msg or "could not find" in error_msg.lower():
             return err(
-                "A function RPC 'execute_readonly_query' não existe no Supabase. "
-                "Para habilitar consultas SQL raw, crie a seguinte function no Supabase:\n\n"
-                "CREATE OR REPLACE FUNCTION execute_readonly_query(query_text TEXT)\n"
-                "RETURNS JSON AS $$\n"
-                "BEGIN\n"
-                "  IF query_text !~* '^\\s*SELECT' THEN\n"
-                "    RAISE EXCEPTION 'Apenas SELECT permitido';\n"
-                "  END IF;\n"
-                "  RETURN (SELECT json_agg(row_to_json(t)) FROM (\n"
-                "    EXECUTE query_text\n"
-                "  ) t);\n"
-                "END;\n"
-                "$$ LANGUAGE plpgsql SECURITY DEFINER;\n\n"
+                "A function RPC 'execute_readonly_query' (com limites de linhas, custo e timeout) "
+                "não existe no Supabase. Execute o script database/019_consulta_sql_segura.sql "
+                "no SQL Editor para habilitar consultas SQL.\n\n"
                 "Por enquanto, use as tools específicas do MCP."
             )
         return err(error_msg)
 
 
+# ============================================================
+# MÓDULO: RELATÓRIOS (requer RPCs - database/020_relatorios_mcp.sql)
+# ============================================================
+
+RELATORIOS: dict[str, dict] = {
+    "receita_mensal": {
+        "rpc": "relatorio_receita_mensal",
+        "descricao": "Receita prevista x recebida por mês de referência",
+        "parametros": {
+            "meses": {"tipo": "int", "padrao": 12, "descricao": "Quantidade de meses (a partir do atual)"},
+        },
+    },
+    "entradas_por_local": {
+        "rpc": "relatorio_entradas_por_local",
+        "descricao": "Entradas, saídas e pessoas distintas por ponto de acesso no período",
+        "parametros": {
+            "data_inicio": {"tipo": "date", "padrao": None, "descricao": "Data inicial YYYY-MM-DD (padrão hoje)"},
+            "data_fim": {"tipo": "date", "padrao": None, "descricao": "Data final YYYY-MM-DD (padrão hoje)"},
+        },
+    },
+    "inadimplencia_por_plano": {
+        "rpc": "relatorio_inadimplencia_por_plano",
+        "descricao": "Associados ativos com mensalidades atrasadas e valor em aberto por plano",
+        "parametros": {},
+    },
+    "frequencia_associados": {
+        "rpc": "relatorio_frequencia_associados",
+        "descricao": "Associados com mais entradas no clube nos últimos dias",
+        "parametros": {
+            "dias": {"tipo": "int", "padrao": 30, "descricao": "Janela em dias"},
+            "limite": {"tipo": "int", "padrao": 20, "descricao": "Máximo de associados (até 500)"},
+        },
+    },
+}
+
+
+def preparar_parametros_relatorio(nome: str, parametros: dict) -> dict:
+    """Valida e converte os parâmetros de um relatório para os argumentos da RPC.
+
+    Raises:
+        ValueError: Parâmetro desconhecido ou com tipo inválido.
+    """
+    definicao = RELATORIOS[nome]["parametros"]
+    desconhecidos = set(parametros) - set(definicao)
+    if desconhecidos:
+        raise ValueError(
+            f"Parâmetro(s) desconhecido(s) para '{nome}': {', '.join(sorted(desconhecidos))}. "
+            f"Aceitos: {', '.join(definicao) or 'nenhum'}"
+        )
+
+    argumentos = {}
+    for param, spec in definicao.items():
+        valor = parametros.get(param, spec["padrao"])
+        if valor is None:
+            continue
+        try:
+            if spec["tipo"] == "int":
+                valor = int(valor)
+            elif spec["tipo"] == "date":
+                valor = date.fromisoformat(str(valor)).isoformat()
+        except (TypeError, ValueError):
+            raise ValueError(f"Parâmetro '{param}' inválido: esperado {spec['tipo']}, recebido {valor!r}")
+        argumentos[f"p_{param}"] = valor
+    return argumentos
+
+
+@mcp.tool()
+async def executar_relatorio(nome: str, parametros: Optional[dict] = None, usar_cache: bool = True) -> str:
+    """Executa um relatório analítico pré-definido (mais rápido e seguro que montar SQL).
+
+    Relatórios disponíveis: receita_mensal, entradas_por_local,
+    inadimplencia_por_plano, frequencia_associados. Os parâmetros de cada um
+    estão no resource clube://relatorios.
+
+    Args:
+        nome: Nome do relatório
+        parametros: Parâmetros do relatório, ex: {"meses": 6}
+        usar_cache: Reaproveitar resultado recente do mesmo relatório (padrão True)
+    """
+    if nome not in RELATORIOS:
+        return err(f"Relatório '{nome}' não existe. Disponíveis: {', '.join(RELATORIOS)}")
+    try:
+        argumentos = preparar_parametros_relatorio(nome, parametros or {})
+    except ValueError as e:
+        return err(str(e))
+
+    chave = ("relatorio", nome, tuple(sorted(argumentos.items())))
+    if usar_cache:
+        resposta = cache_sql.obter(chave)
+        if resposta is not None:
+            return resposta
+
+    rpc = RELATORIOS[nome]["rpc"]
+    try:
+        result = await executar(supabase.rpc(rpc, argumentos))
+        linhas = result.data or []
+        resposta = ok(linhas, f"📊 {RELATORIOS[nome]['descricao']} ({len(linhas)} linha(s))")
+        cache_sql.guardar(chave, resposta)
+        return resposta
+    except Exception as e:
+        error_msg = str(e)
+        if "PGRST202" in error_msg or "could not find" in error_msg.lower():
+            return err(
+                f"A function RPC '{rpc}' não existe no Supabase. Execute o script "
+                "database/020_relatorios_mcp.sql no SQL Editor para habilitar os relatórios."
+            )
+        return err(error_msg)
+
+
+# ============================================================
+# MÓDULO: EXPORTAÇÃO (CSV / Parquet)
+# ============================================================
+
+# Tabelas exportáveis e a coluna de data usada por data_inicio/data_fim
+EXPORTAVEIS: dict[str, Optional[str]] = {
+    "associados": "data_associacao",
+    "dependentes": "created_at",
+    "mensalidades": "data_vencimento",
+    "registros_acesso": "created_at",
+    "exames_medicos": "data_exame",
+    "conversas_whatsapp": "created_at",
+    "mensagens_whatsapp": "created_at",
+    "reclamacoes": "data_ocorrencia",
+    "punicoes": "created_at",
+    "compras": "data_compra",
+    "fornecedores": None,
+}
+COLUNA_VALIDA = re.compile(r"^[a-z_][a-z0-9_]*$")
+
+
+def _valor_exportacao(valor: Any) -> Any:
+    """Achata listas/objetos (tags, embeds) em JSON para caber numa célula."""
+    if isinstance(valor, (dict, list)):
+        return json.dumps(valor, ensure_ascii=False)
+    return valor
+
+
+class _EscritorCSV:
+    """O cabeçalho vem das colunas pedidas ou, sem elas, da primeira página."""
+
+    def __init__(self, arquivo: str, colunas: Optional[list[str]] = None):
+        self._arquivo = open(arquivo, "w", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._arquivo)
+        self._colunas = colunas
+        if colunas:
+            self._writer.writerow(colunas)
+
+    def escrever(self, linhas: list[dict]) -> None:
+        if self._colunas is None:
+            self._colunas = list(linhas[0])
+            self._writer.writerow(self._colunas)
+        self._writer.writerows([_valor_exportacao(linha.get(c)) for c in self._colunas] for linha in linhas)
+
+    def fechar(self) -> None:
+        self._arquivo.close()
+
+
+class _EscritorParquet:
+    """Grava um row group por página; o schema vem da primeira página.
+
+    Sem nenhuma linha, o arquivo sai vazio com as colunas pedidas como texto
+    (ou sem colunas, quando não foram informadas).
+    """
+
+    def __init__(self, arquivo: str, colunas: Optional[list[str]] = None):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._pa, self._pq = pa, pq
+        self._arquivo = arquivo
+        self._colunas = colunas
+        self._writer = None
+        self._schema = None
+
+    def escrever(self, linhas: list[dict]) -> None:
+        pa = self._pa
+        linhas = [{c: _valor_exportacao(v) for c, v in linha.items()} for linha in linhas]
+        if self._schema is None:
+            inferido = pa.Table.from_pylist(linhas).schema
+            # Colunas todas nulas na primeira página viram texto
+            self._schema = pa.schema([
+                pa.field(f.name, pa.string()) if pa.types.is_null(f.type) else f for f in inferido
+            ])
+            self._writer = self._pq.ParquetWriter(self._arquivo, self._schema)
+        try:
+            tabela = pa.Table.from_pylist(linhas, schema=self._schema)
+        except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+            raise ValueError(f"Tipos inconsistentes entre páginas ({e}). Exporte em CSV.") from e
+        self._writer.write_table(tabela)
+
+    def fechar(self) -> None:
+        if self._writer is None:
+            pa = self._pa
+            self._schema = pa.schema([pa.field(c, pa.string()) for c in self._colunas or []])
+            self._writer = self._pq.ParquetWriter(self._arquivo, self._schema)
+        self._writer.close()
+
+
+def _exportar_paginas(
+    tabela: str,
+    arquivo: str,
+    formato: str,
+    colunas: Optional[list[str]],
+    filtros: dict,
+    data_inicio: Optional[str],
+    data_fim: Optional[str],
+    tamanho_pagina: int,
+) -> dict:
+    """Lê a tabela por keyset (id > último id) e grava página a página no arquivo.
+
+    Só uma página fica em memória por vez, qualquer que seja o tamanho da tabela.
+    """
+    select = "*" if not colunas else ",".join(dict.fromkeys(["id", *colunas]))
+    escritor = (_EscritorParquet if formato == "parquet" else _EscritorCSV)(arquivo, colunas)
+    coluna_data = EXPORTAVEIS[tabela]
+    linhas = paginas = 0
+
+    def montar():
+        query = supabase.table(tabela).select(select)
+        for coluna, valor in filtros.items():
+            query = query.is_(coluna, "null") if valor is None else query.eq(coluna, valor)
+        if data_inicio:
+            query = query.gte(coluna_data, data_inicio)
+        if data_fim:
+            query = query.lte(coluna_data, f"{data_fim}T23:59:59" if coluna_data == "created_at" else data_fim)
+        return query
+
+    try:
+        for pagina in paginar_keyset(montar, tamanho_pagina):
+            if colunas and "id" not in colunas:
+                pagina = [{c: linha.get(c) for c in colunas} for linha in pagina]
+            escritor.escrever(pagina)
+            linhas += len(pagina)
+            paginas += 1
+    finally:
+        escritor.fechar()
+    return {"linhas": linhas, "paginas": paginas}
+
+
+@mcp.tool()
+async def exportar_dados(
+    tabela: str,
+    formato: str = "csv",
+    filtros: Optional[dict] = None,
+    colunas: Optional[str] = None,
+    data_inicio: Optional[str] = None,
+    data_fim: Optional[str] = None,
+    destino: str = "local",
+) -> str:
+    """Exporta uma tabela inteira (ou filtrada) para um arquivo CSV ou Parquet.
+
+    Use para listas grandes (todos os associados, um ano de mensalidades,
+    registros de acesso): os dados vão direto para o arquivo, página a página,
+    e a resposta traz apenas o caminho e a contagem de linhas.
+
+    Args:
+        tabela: associados, dependentes, mensalidades, registros_acesso, exames_medicos,
+            conversas_whatsapp, mensagens_whatsapp, reclamacoes, punicoes, compras, fornecedores
+        formato: csv ou parquet
+        filtros: Igualdades coluna → valor, ex: {"status": "atrasado"}
+        colunas: Colunas separadas por vírgula (padrão: todas)
+        data_inicio: Data inicial YYYY-MM-DD (coluna de data da tabela)
+        data_fim: Data final YYYY-MM-DD
+        destino: local (pasta EXPORT_DIR) ou storage (bucket EXPORT_BUCKET do Supabase)
+    """
+    if tabela not in EXPORTAVEIS:
+        return err(f"Tabela '{tabela}' não pode ser exportada. Disponíveis: {', '.join(EXPORTAVEIS)}")
+    if formato not in ("csv", "parquet"):
+        return err("Formato deve ser 'csv' ou 'parquet'")
+    if destino not in ("local", "storage"):
+        return err("Destino deve ser 'local' ou 'storage'")
+    if (data_inicio or data_fim) and not EXPORTAVEIS[tabela]:
+        return err(f"A tabela '{tabela}' não tem coluna de data para filtrar por período")
+
+    lista_colunas = [c.strip() for c in colunas.split(",") if c.strip()] if colunas else None
+    filtros = filtros or {}
+    invalidas = [c for c in [*(lista_colunas or []), *filtros] if not COLUNA_VALIDA.match(c)]
+    if invalidas:
+        return err(f"Nome de coluna inválido: {', '.join(invalidas)}")
+    if formato == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            return err("Exportação em Parquet requer o pacote pyarrow: pip install -e \".[parquet]\"")
+
+    nome = f"{tabela}-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}.{formato}"
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    if destino == "local":
+        arquivo = os.path.abspath(os.path.join(EXPORT_DIR, nome))
+    else:
+        fd, arquivo = tempfile.mkstemp(suffix=f".{formato}", dir=EXPORT_DIR)
+        os.close(fd)
+
+    try:
+        contagem = await asyncio.to_thread(
+            _exportar_paginas, tabela, arquivo, formato, lista_colunas, filtros,
+            data_inicio, data_fim, EXPORT_PAGINA,
+        )
+        resultado = {
+            "tabela": tabela,
+            "formato": formato,
+            **contagem,
+            "bytes": os.path.getsize(arquivo),
+        }
+
+        if destino == "storage":
+            caminho = f"{tabela}/{nome}"
+            tipo = "text/csv" if formato == "csv" else "application/vnd.apache.parquet"
+            with open(arquivo, "rb") as f:
+                await asyncio.to_thread(
+                    supabase.storage.from_(EXPORT_BUCKET).upload, caminho, f, {"content-type": tipo},
+                )
+            assinada = await asyncio.to_thread(
+                supabase.storage.from_(EXPORT_BUCKET).create_signed_url, caminho, 3600,
+            )
+            resultado.update({
+                "bucket": EXPORT_BUCKET,
+                "caminho": caminho,
+                "url_assinada": assinada.get("signedURL") or assinada.get("signedUrl"),
+                "url_expira_em_segundos": 3600,
+            })
+        else:
+            resultado["arquivo"] = arquivo
+
+        return ok(resultado, f"📦 {resultado['linhas']} linha(s) de {tabela} exportadas em {formato.upper()}")
+    except Exception as e:
+        if destino == "local" and os.path.exists(arquivo):
+            os.remove(arquivo)
+        return err(str(e))
+    finally:
+        if destino == "storage" and os.path.exists(arquivo):
+            os.remove(arquivo)
+
+
 # ============================================================
 # RESOURCES (Contexto estático)
 # ============================================================
@@ -1463,14 +6304,14 @@ def regras_negocio() -> str:
     - Associado deve estar com status 'ativo' para entrar
     - Status 'suspenso', 'inativo' ou 'expulso' → acesso negado
     - Verificar adimplência (mensalidades em dia)
-    - Academia e Piscina exigem exame médico válido (apto e não vencido)
+    - Academia e Piscina exigem exame médico válido: vale o mais recente não vencido (apto ou apto_restricao)
     - Registro via pontos_acesso (cada local tem seu ponto)
     - Identificação por QR Code, CPF ou nome
 
     ## Dependentes
     - Dependente herda status de adimplência do titular
     - Se titular inativo/suspenso → dependente bloqueado
-    - Exame médico é individual (dependente tem próprio exame)
+    - Exame médico é individual (dependente tem próprio exame, em exames_medicos.dependente_id)
 
     ## Financeiro
     - Planos em planos_valores (individual, familiar, patrimonial)
@@ -1495,6 +6336,35 @@ def regras_negocio() -> str:
     """
 
 
+@mcp.resource("clube://metricas/coalescencia")
+def recurso_metricas_coalescencia() -> str:
+    """Contadores da coalescência de leituras (execuções reais, chamadas unidas, hits do micro-cache)."""
+    return json.dumps({
+        **metricas_coalescencia,
+        "em_voo": len(_em_voo),
+        "entradas_cache": _micro_cache.estatisticas()["entradas"],
+        "maximo_cache": COALESCE_MAX,
+        "ttl_segundos": COALESCE_TTL,
+    }, ensure_ascii=False, indent=2)
+
+
+@mcp.resource("clube://relatorios")
+def recurso_relatorios() -> str:
+    """Relatórios disponíveis em executar_relatorio, com seus parâmetros."""
+    return json.dumps({
+        nome: {"descricao": r["descricao"], "parametros": r["parametros"]}
+        for nome, r in RELATORIOS.items()
+    }, ensure_ascii=False, indent=2)
+
+
+@mcp.resource("clube://relatorios/{nome}")
+def recurso_relatorio(nome: str) -> str:
+    """Definição de um relatório (descrição, parâmetros e RPC executada)."""
+    if nome not in RELATORIOS:
+        raise ValueError(f"Relatório '{nome}' não existe. Disponíveis: {', '.join(RELATORIOS)}")
+    return json.dumps({"nome": nome, **RELATORIOS[nome]}, ensure_ascii=False, indent=2)
+
+
 # ============================================================
 # PROMPTS (Templates úteis)
 # ============================================================
@@ -1539,11 +6409,10 @@ def verificar_acesso_completo(pessoa_nome: str) -> str:
     return f"""
     Preciso verificar o acesso de "{pessoa_nome}" ao clube:
 
-    1. Use `buscar_associados` com busca="{pessoa_nome}" para encontrar a pessoa
-    2. Se encontrado, use `validar_acesso` para cada local (clube, academia, piscina)
-    3. Use `buscar_exames` para verificar exames médicos
-    4. Use `buscar_mensalidades` para verificar situação financeira
-    5. Use `buscar_infracoes` para verificar punições/reclamações
+    1. Use `perfil_completo` com associado="{pessoa_nome}". Ele traz cadastro, dependentes,
+       mensalidades em aberto, exames, punições/reclamações e o acesso a cada local
+       (clube, academia, piscina) numa só chamada
+    2. Se vierem vários associados, escolha o certo pelo nome/título e chame de novo com o id
 
     Apresente um resumo completo da situação da pessoa.
     """
@@ -1554,8 +6423,16 @@ def verificar_acesso_completo(pessoa_nome: str) -> str:
 # ============================================================
 
 def main():
-    """Inicia o servidor MCP."""
-    mcp.run()
+    """Inicia o servidor MCP (transporte via MCP_TRANSPORT: stdio, sse ou streamable-http).
+
+    Com --fila-whatsapp roda só o worker da fila_whatsapp, sem o MCP.
+    """
+    if "--fila-whatsapp" in sys.argv[1:]:
+        logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+        logging.getLogger("httpx").setLevel(logging.WARNING)  # o log INFO do httpx traz a URL com os filtros
+        asyncio.run(rodar_fila_whatsapp())
+        return
+    mcp.run(transport=os.getenv("MCP_TRANSPORT", "stdio"))
 
 
 if __name__ == "__main__":
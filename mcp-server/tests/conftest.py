@@ -0,0 +1,116 @@
+"""
+Fixtures compartilhadas dos testes
+==================================
+O server.py é importado com credenciais falsas do Supabase: nenhum teste
+fala com o PostgREST. Os testes que precisam de Postgres usam a
+DATABASE_URL (não use a de produção) num schema descartável e são pulados
+quando ela ou o pacote asyncpg não estão disponíveis.
+"""
+
+import asyncio
+import os
+import re
+import sys
+from pathlib import Path
+from urllib.parse import urlencode, urlparse
+
+import pytest
+
+RAIZ = Path(__file__).resolve().parents[1]
+MIGRACOES = RAIZ.parent / "database"
+
+sys.path.insert(0, str(RAIZ))
+os.environ.setdefault("SUPABASE_URL", "http://supabase.local")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "teste.teste.teste")
+
+import server  # noqa: E402
+
+SCHEMA = "mcp_testes"
+
+
+def aplicar_migracao(sql: str) -> str:
+    """Adapta uma migração ao schema de teste.
+
+    Os GRANT/REVOKE são ignorados (os papéis do Supabase não existem num
+    Postgres local) e as functions passam a procurar as tabelas no schema de teste.
+    """
+    sql = "\n".join(l for l in sql.splitlines() if not re.match(r"\s*(GRANT|REVOKE)\b", l))
+    return sql.replace("SET search_path = public", f"SET search_path = {SCHEMA}, public")
+
+
+@pytest.fixture(scope="session")
+def banco() -> str:
+    """DATABASE_URL com o schema de teste já carregado (tabela `itens` e migrações)."""
+    url = os.getenv("DATABASE_URL")
+    if not url:
+        pytest.skip("DATABASE_URL não definida")
+    asyncpg = pytest.importorskip("asyncpg")
+
+    async def preparar():
+        conn = await asyncpg.connect(url)
+        try:
+            await conn.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE; CREATE SCHEMA {SCHEMA}")
+            await conn.execute(f"SET search_path = {SCHEMA}")
+            await conn.execute(
+                "CREATE TABLE itens (id INTEGER PRIMARY KEY, nome TEXT NOT NULL);"
+                "INSERT INTO itens SELECT g, 'item ' || g FROM generate_series(1, 50) g;"
+            )
+            await conn.execute(aplicar_migracao((MIGRACOES / "019_consulta_sql_segura.sql").read_text("utf-8")))
+        finally:
+            await conn.close()
+
+    async def remover():
+        conn = await asyncpg.connect(url)
+        try:
+            await conn.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        finally:
+            await conn.close()
+
+    asyncio.run(preparar())
+    separador = "&" if urlparse(url).query else "?"
+    yield f"{url}{separador}{urlencode({'search_path': SCHEMA})}"
+    asyncio.run(remover())
+
+
+@pytest.fixture
+def com_pool(banco, monkeypatch):
+    """Roda uma corrotina com o pool asyncpg do server.py aberto no schema de teste."""
+    monkeypatch.setattr(server, "DATABASE_URL", banco)
+
+    def rodar(corrotina):
+        async def principal():
+            await server.abrir_pg_pool()
+            try:
+                return await corrotina
+            finally:
+                await server.fechar_pg_pool()
+
+        return asyncio.run(principal())
+
+    return rodar
+
+
+@pytest.fixture
+def rpc(banco):
+    """Chama a RPC execute_readonly_query direto no Postgres, como o PostgREST faria."""
+    import asyncpg
+
+    def chamar(query: str, **parametros):
+        async def principal():
+            conn = await asyncpg.connect(banco)
+            try:
+                await server._configurar_conexao_pg(conn)
+                return await conn.fetchval(
+                    "SELECT execute_readonly_query($1, $2, $3, $4, $5)",
+                    query,
+                    parametros.get("max_linhas", 200),
+                    parametros.get("pagina_offset", 0),
+                    parametros.get("timeout_ms", 5000),
+                    parametros.get("custo_maximo", 100000),
+                )
+            finally:
+                await conn.close()
+
+        return asyncio.run(principal())
+
+    return chamar
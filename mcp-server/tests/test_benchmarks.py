@@ -0,0 +1,34 @@
+"""
+Smoke test do runner de benchmarks
+==================================
+Roda `benchmarks.run` no menor tamanho, com uma chamada por tool, e
+compara o relatório com ele mesmo. Não mede nada: só garante que mudanças
+nos internos do server.py não quebram o runner nem o comparar.
+"""
+
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+from benchmarks.cenarios import CENARIOS
+
+RAIZ = Path(__file__).resolve().parents[1]
+
+
+def _rodar(*args: str) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, "-m", *args], cwd=RAIZ, capture_output=True, text=True, timeout=300)
+
+
+def test_run_gera_relatorio_e_comparar_le(tmp_path):
+    saida = tmp_path / "1k.json"
+    execucao = _rodar("benchmarks.run", "--tamanho", "1k", "--iteracoes", "1",
+                      "--concorrencia", "1", "--latencia-ms", "0", "--saida", str(saida))
+    assert execucao.returncode == 0, execucao.stderr
+
+    relatorio = json.loads(saida.read_text("utf-8"))
+    assert set(relatorio["tools"]) == set(CENARIOS)
+    assert all(r["chamadas"] == 1 for r in relatorio["tools"].values())
+
+    comparacao = _rodar("benchmarks.comparar", str(saida), str(saida))
+    assert comparacao.returncode == 0, comparacao.stdout + comparacao.stderr
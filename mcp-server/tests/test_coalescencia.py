@@ -0,0 +1,56 @@
+"""
+Coalescência de leituras (single-flight)
+========================================
+N chamadas concorrentes idênticas chegam ao backend uma única vez e
+recebem a mesma resposta. Roda no stand-in (FakeDB em memória) com
+latência simulada, para que as chamadas se sobreponham de fato.
+"""
+
+import asyncio
+
+import pytest
+
+import server
+from benchmarks.dados import gerar_clube
+from benchmarks.standin import carregar, conectar
+
+
+@pytest.fixture(scope="module")
+def transporte():
+    original = server.supabase
+    _, transporte = conectar(carregar(gerar_clube(200, semente=3)), latencia_ms=20)
+    yield transporte
+    server.supabase = original
+
+
+@pytest.mark.parametrize("tool, queries_por_execucao", [
+    (server.resumo_geral, 7),
+    (server.estatisticas_financeiro, 3),
+    (server.listar_planos, 1),
+])
+def test_uma_execucao_por_rajada(transporte, tool, queries_por_execucao):
+    server._micro_cache.limpar()
+    antes = transporte.requisicoes
+
+    async def rajada():
+        return await asyncio.gather(*(tool() for _ in range(30)))
+
+    respostas = asyncio.run(rajada())
+    assert len(set(respostas)) == 1
+    assert not respostas[0].startswith("❌"), respostas[0]
+    assert transporte.requisicoes - antes == queries_por_execucao
+
+
+def test_cancelar_o_lider_nao_derruba_quem_espera(transporte):
+    server._micro_cache.limpar()
+
+    async def rajada():
+        lider = asyncio.create_task(server.listar_planos())
+        await asyncio.sleep(0)
+        seguidores = [asyncio.create_task(server.listar_planos()) for _ in range(5)]
+        await asyncio.sleep(0)
+        lider.cancel()
+        return await asyncio.gather(*seguidores)
+
+    respostas = asyncio.run(rajada())
+    assert len(set(respostas)) == 1 and not respostas[0].startswith("❌")
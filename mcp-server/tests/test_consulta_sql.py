@@ -0,0 +1,167 @@
+"""
+consulta_sql: validação no servidor e garantias do banco
+========================================================
+As mesmas entradas hostis passam pelas três camadas: `validar_sql` (sem
+banco), o caminho asyncpg (`consulta_sql_pg`) e a RPC execute_readonly_query
+da database/019. As do banco são chamadas direto, sem `validar_sql`, para
+provar que cada garantia vale sozinha.
+"""
+
+import asyncio
+import json
+import time
+
+import pytest
+
+import server
+
+CTE_COM_ESCRITA = "WITH apagados AS (DELETE FROM itens RETURNING *) SELECT * FROM apagados"
+CUSTO_ALTO = "SELECT * FROM generate_series(1, 10000000) a CROSS JOIN itens ORDER BY 1"
+
+
+def _escrita_recusada():
+    """Dentro da subconsulta o parser recusa a CTE; se passar, a transação somente-leitura recusa."""
+    import asyncpg
+
+    return pytest.raises((asyncpg.FeatureNotSupportedError, asyncpg.ReadOnlySQLTransactionError))
+
+
+def _dados(resposta: str) -> dict:
+    assert not resposta.startswith("❌"), resposta
+    return json.loads(resposta.split("\n\n", 1)[1])
+
+
+# --- normalizar_sql (chave do cache) -----------------------------------------
+
+@pytest.mark.parametrize("query, esperada", [
+    ("SELECT  'a--b' FROM itens", "select 'a--b' from itens"),
+    ('SELECT "Nome", Id FROM "Itens"', 'select "Nome", id from "Itens"'),
+    ("SELECT $$ A -- b $$, X /* c */  FROM T;", "select $$ A -- b $$, x from t"),
+    ("SELECT 1 -- 'x\n, 'Y'", "select 1 , 'Y'"),
+    ("select 'it''s' -- fim", "select 'it''s'"),
+])
+def test_normalizar_sql(query, esperada):
+    assert server.normalizar_sql(query) == esperada
+
+
+def test_normalizar_sql_distingue_literais_e_identificadores():
+    assert server.normalizar_sql("SELECT 'A'") != server.normalizar_sql("SELECT 'a'")
+    assert server.normalizar_sql('SELECT "A" FROM t') != server.normalizar_sql('SELECT "a" FROM t')
+    assert server.normalizar_sql("SELECT 'a--b' FROM t") != server.normalizar_sql("SELECT 'a--c' FROM t")
+
+
+# --- validar_sql -------------------------------------------------------------
+
+@pytest.mark.parametrize("query", [
+    "SELECT id FROM itens -- update no fim",
+    "SELECT id /* delete */ FROM itens",
+    "SELECT 'a--b; drop' AS texto",
+    "SELECT created_at, updated_at FROM itens;",
+    'SELECT "delete" FROM itens',
+])
+def test_validar_sql_aceita_comentarios_e_literais(query):
+    assert server.validar_sql(query) is None
+
+
+@pytest.mark.parametrize("query, erro", [
+    ("SELECT 1; SELECT 2", "Apenas uma instrução"),
+    ("SELECT 1; -- só um\nDROP TABLE itens", "Apenas uma instrução"),
+    ("SELECT '--', id FROM itens; DELETE FROM itens", "Apenas uma instrução"),
+    ("SELECT $$ -- $$, id FROM itens; DELETE FROM itens", "Apenas uma instrução"),
+    (CTE_COM_ESCRITA, "DELETE"),
+    ("SELECT pg_sleep(10)", "PG_SLEEP"),
+    ("UPDATE itens SET nome = 'x'", "Apenas consultas SELECT"),
+])
+def test_validar_sql_rejeita(query, erro):
+    assert erro in server.validar_sql(query)
+
+
+def test_offset_sem_order_by_e_rejeitado():
+    resposta = asyncio.run(server.consulta_sql("SELECT id FROM itens", offset=10, usar_cache=False))
+    assert resposta.startswith("❌") and "ORDER BY" in resposta
+
+
+# --- caminho asyncpg ---------------------------------------------------------
+
+def test_pg_comentario_no_fim(com_pool):
+    dados = _dados(com_pool(server.consulta_sql("SELECT id FROM itens ORDER BY id -- fim", limite=5, usar_cache=False)))
+    assert [l["id"] for l in dados["linhas"]] == [1, 2, 3, 4, 5]
+    assert dados["truncado"] and dados["proximo_offset"] == 5
+
+
+def test_pg_paginas_com_order_by(com_pool):
+    query = "SELECT id FROM itens ORDER BY id DESC"
+    dados = _dados(com_pool(server.consulta_sql(query, limite=20, offset=40, usar_cache=False)))
+    assert [l["id"] for l in dados["linhas"]] == list(range(10, 0, -1))
+    assert not dados["truncado"] and dados["proximo_offset"] is None
+
+
+def test_pg_varias_instrucoes(com_pool):
+    import asyncpg
+
+    with pytest.raises(asyncpg.PostgresError):
+        com_pool(server.consulta_sql_pg("SELECT 1; SELECT 2", 10, 0))
+
+
+def test_pg_cte_com_escrita(com_pool, rpc):
+    with _escrita_recusada():
+        com_pool(server.consulta_sql_pg(CTE_COM_ESCRITA, 10, 0))
+    assert rpc("SELECT count(*) AS n FROM itens")["linhas"][0]["n"] == 50
+
+
+def test_pg_sleep_respeita_timeout(com_pool, monkeypatch):
+    import asyncpg
+
+    monkeypatch.setattr(server, "SQL_TIMEOUT_MS", 200)
+    inicio = time.perf_counter()
+    with pytest.raises(asyncpg.QueryCanceledError):
+        com_pool(server.consulta_sql_pg("SELECT pg_sleep(5)", 10, 0))
+    assert time.perf_counter() - inicio < 3
+
+
+def test_pg_custo_alto(com_pool):
+    with pytest.raises(ValueError, match="custo estimado"):
+        com_pool(server.consulta_sql_pg(CUSTO_ALTO, 10, 0))
+
+
+# --- RPC execute_readonly_query (database/019) -------------------------------
+
+def test_rpc_comentario_no_fim(rpc):
+    dados = rpc("SELECT id FROM itens ORDER BY id -- fim;", max_linhas=5)
+    assert [l["id"] for l in dados["linhas"]] == [1, 2, 3, 4, 5]
+    assert dados["truncado"] and dados["proximo_offset"] == 5
+
+
+def test_rpc_offset_exige_order_by(rpc):
+    import asyncpg
+
+    with pytest.raises(asyncpg.PostgresError, match="ORDER BY"):
+        rpc("SELECT id FROM itens", pagina_offset=5)
+    assert [l["id"] for l in rpc("SELECT id FROM itens ORDER BY id", max_linhas=3, pagina_offset=5)["linhas"]] == [6, 7, 8]
+
+
+def test_rpc_varias_instrucoes(rpc):
+    import asyncpg
+
+    with pytest.raises(asyncpg.PostgresError, match="Apenas uma instrução"):
+        rpc("SELECT 1; DELETE FROM itens")
+
+
+def test_rpc_cte_com_escrita(rpc):
+    with _escrita_recusada():
+        rpc(CTE_COM_ESCRITA)
+    assert rpc("SELECT count(*) AS n FROM itens")["linhas"][0]["n"] == 50
+
+
+def test_rpc_sleep_respeita_timeout(rpc):
+    import asyncpg
+
+    with pytest.raises(asyncpg.PostgresError, match="Tempo limite"):
+        rpc("SELECT pg_sleep(0.5)", timeout_ms=100)
+
+
+def test_rpc_custo_alto(rpc):
+    import asyncpg
+
+    with pytest.raises(asyncpg.PostgresError, match="custo estimado"):
+        rpc(CUSTO_ALTO)
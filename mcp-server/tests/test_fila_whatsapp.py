@@ -0,0 +1,218 @@
+"""
+Worker da fila_whatsapp (database/028) num Postgres local
+=========================================================
+Dois `RemetenteFilaWhatsapp` consomem a mesma fila pela conexão direta e
+enviam para um stub de /api/whatsapp/send (transporte httpx em memória).
+Confere que nenhuma mensagem sai duas vezes, que a reserva de um worker que
+morreu volta para a fila, que recusas 4xx não são reenviadas e que cada
+worker respeita o limite de taxa de cada provider.
+"""
+
+import asyncio
+import json
+import time
+from collections import Counter, defaultdict
+
+import httpx
+import pytest
+
+import server
+from conftest import MIGRACOES, aplicar_migracao
+
+WASENDER = "00000000-0000-0000-0000-00000000000a"
+META = "00000000-0000-0000-0000-00000000000b"
+
+
+class StubProviders:
+    """Imita /api/whatsapp/send: responde conforme o roteiro da mensagem e registra cada envio."""
+
+    def __init__(self, roteiro: dict[str, list[int]] | None = None):
+        self.roteiro = roteiro or {}  # mensagem -> status das tentativas, em ordem (depois, 200)
+        self.tentativas: Counter = Counter()
+        self.entregas: Counter = Counter()
+        self.instantes: dict[str, list[float]] = defaultdict(list)  # provider -> instante de cada entrega
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        corpo = json.loads(request.content)
+        mensagem = corpo["mensagem"]
+        self.tentativas[mensagem] += 1
+        await asyncio.sleep(0.005)
+        statuses = self.roteiro.get(mensagem, [])
+        if self.tentativas[mensagem] <= len(statuses):
+            return httpx.Response(statuses[self.tentativas[mensagem] - 1], json={"error": "recusada"})
+        self.entregas[mensagem] += 1
+        self.instantes[corpo.get("providerId")].append(time.monotonic())
+        return httpx.Response(200, json={"success": True})
+
+    def pico(self, provider: str, janela_s: float) -> int:
+        """Maior número de entregas do provider numa janela deslizante de `janela_s`."""
+        instantes, maior, inicio = self.instantes[provider], 0, 0
+        for fim, t in enumerate(instantes):
+            while t - instantes[inicio] > janela_s:
+                inicio += 1
+            maior = max(maior, fim - inicio + 1)
+        return maior
+
+
+@pytest.fixture(scope="module")
+def fila_schema(banco):
+    """Tabelas da fila no schema de teste, com a database/028 aplicada."""
+    import asyncpg
+
+    async def preparar():
+        conn = await asyncpg.connect(banco)
+        try:
+            await conn.execute("""
+                DROP TABLE IF EXISTS fila_whatsapp, whatsapp_providers CASCADE;
+                CREATE TABLE whatsapp_providers (
+                  id UUID PRIMARY KEY, nome VARCHAR(100) NOT NULL, tipo VARCHAR(20) NOT NULL);
+                CREATE TABLE fila_whatsapp (
+                  id UUID PRIMARY KEY DEFAULT gen_random_uuid(), telefone VARCHAR(20) NOT NULL,
+                  mensagem TEXT NOT NULL, tipo VARCHAR(50) DEFAULT 'texto', arquivo_url TEXT,
+                  agendado_para TIMESTAMPTZ, enviado BOOLEAN DEFAULT false, data_envio TIMESTAMPTZ,
+                  erro TEXT, automacao_id UUID, created_at TIMESTAMPTZ DEFAULT NOW());
+            """)
+            await conn.executemany("INSERT INTO whatsapp_providers VALUES ($1, $2, $3)",
+                                   [(WASENDER, "WaSender", "wasender"), (META, "Meta", "meta")])
+            await conn.execute(aplicar_migracao((MIGRACOES / "028_fila_whatsapp_worker.sql").read_text("utf-8")))
+        finally:
+            await conn.close()
+
+    asyncio.run(preparar())
+    return banco
+
+
+@pytest.fixture
+def fila(fila_schema, monkeypatch):
+    """Carrega as mensagens (texto, provider_id) e roda o cenário com o pool asyncpg aberto e o stub no lugar do Next.js.
+
+    O cenário recebe uma conexão própria para conferir a fila.
+    """
+    import asyncpg
+
+    monkeypatch.setattr(server, "DATABASE_URL", fila_schema)
+    monkeypatch.setattr(server, "WHATSAPP_FILA_ESPERA_S", 0)  # reenvio imediato
+
+    def rodar(cenario, mensagens: list[tuple[str, str]], stub: StubProviders):
+        async def principal():
+            conn = await asyncpg.connect(fila_schema)
+            monkeypatch.setattr(server, "http_client", httpx.AsyncClient(
+                base_url="http://next.local", transport=httpx.MockTransport(stub)))
+            await server.abrir_pg_pool()
+            try:
+                await conn.execute("TRUNCATE fila_whatsapp")
+                await conn.executemany(
+                    "INSERT INTO fila_whatsapp (telefone, mensagem, provider_id) VALUES ('5516999990000', $1, $2)",
+                    mensagens,
+                )
+                return await cenario(conn)
+            finally:
+                await server.fechar_pg_pool()
+                await server.fechar_http_client()
+                await conn.close()
+
+        return asyncio.run(principal())
+
+    return rodar
+
+
+def _worker(taxas: dict[str, float] | None = None) -> server.RemetenteFilaWhatsapp:
+    w = server.RemetenteFilaWhatsapp(lote=10, intervalo=0.05, taxas=taxas or {"wasender": 6000, "meta": 6000})
+    w.limitadores[None] = server.LimitadorTaxa(6000)
+    return w
+
+
+async def _esvaziar(conn, workers: list, timeout: float = 20) -> None:
+    """Espera a fila acabar (incluindo reenvios) e para os workers."""
+    limite = time.monotonic() + timeout
+    while await conn.fetchval("SELECT count(*) FROM fila_whatsapp WHERE data_envio IS NULL") or any(
+        w.em_envio or w.resultados for w in workers
+    ):
+        assert time.monotonic() < limite, "fila não esvaziou"
+        await asyncio.sleep(0.05)
+    for w in workers:
+        await w.parar()
+
+
+async def _linhas(conn) -> dict[str, dict]:
+    return {r["mensagem"]: dict(r) for r in await conn.fetch(
+        "SELECT mensagem, enviado, data_envio, erro, tentativas, reservado_por FROM fila_whatsapp")}
+
+
+def test_dois_workers_sem_envio_duplicado(fila):
+    stub = StubProviders()
+    mensagens = [(f"Mensagem {i}", (WASENDER, META, None)[i % 3]) for i in range(150)]
+
+    async def cenario(conn):
+        workers = [_worker(), _worker()]
+        for w in workers:
+            w.iniciar()
+        await _esvaziar(conn, workers)
+        return workers, await _linhas(conn)
+
+    workers, linhas = fila(cenario, mensagens, stub)
+    assert set(stub.entregas) == {m for m, _ in mensagens}
+    assert set(stub.entregas.values()) == {1}
+    assert all(l["enviado"] and l["reservado_por"] is None for l in linhas.values())
+    assert all(w.metricas["enviadas"] for w in workers), "um worker não pegou nada da fila"
+
+
+def test_reserva_de_worker_morto_volta_para_a_fila(fila, monkeypatch):
+    monkeypatch.setattr(server, "WHATSAPP_FILA_RESERVA_S", 1)
+    stub = StubProviders()
+    mensagens = [(f"Mensagem {i}", META) for i in range(20)]
+
+    async def cenario(conn):
+        # Reserva um lote e morre sem enviar nem concluir
+        mortas = {m["mensagem"] for m in await _worker().reservar(8)}
+        vivo = _worker()
+        vivo.iniciar()
+        await asyncio.sleep(0.5)
+        assert not mortas & set(stub.entregas), "mensagem reservada saiu antes de a reserva vencer"
+        await _esvaziar(conn, [vivo])
+        return mortas, await _linhas(conn)
+
+    mortas, linhas = fila(cenario, mensagens, stub)
+    assert len(mortas) == 8
+    assert set(stub.entregas) == {m for m, _ in mensagens} and set(stub.entregas.values()) == {1}
+    assert all(linhas[m]["enviado"] and linhas[m]["tentativas"] == 2 for m in mortas)
+
+
+def test_recusa_4xx_nao_e_reenviada(fila):
+    stub = StubProviders({"Número inválido": [400], "Instável": [500, 503], "Sempre fora": [500, 500, 500]})
+    mensagens = [("Número inválido", META), ("Instável", META), ("Sempre fora", META), ("Normal", META)]
+
+    async def cenario(conn):
+        worker = _worker()
+        worker.iniciar()
+        await _esvaziar(conn, [worker])
+        return await _linhas(conn)
+
+    linhas = fila(cenario, mensagens, stub)
+    assert stub.tentativas["Número inválido"] == 1
+    assert not linhas["Número inválido"]["enviado"] and "recusada" in linhas["Número inválido"]["erro"]
+    assert stub.tentativas["Instável"] == 3 and linhas["Instável"]["enviado"]
+    assert stub.tentativas["Sempre fora"] == server.WHATSAPP_FILA_TENTATIVAS
+    assert not linhas["Sempre fora"]["enviado"] and linhas["Sempre fora"]["data_envio"]
+    assert linhas["Normal"]["enviado"] and stub.entregas["Normal"] == 1
+
+
+def test_limite_de_taxa_por_provider(fila):
+    stub = StubProviders()
+    mensagens = [(f"WaSender {i}", WASENDER) for i in range(24)] + [(f"Meta {i}", META) for i in range(60)]
+    por_worker = {"wasender": 240, "meta": 6000}  # WaSender: 4 por segundo em cada worker
+
+    async def cenario(conn):
+        workers = [_worker(por_worker), _worker(por_worker)]
+        inicio = time.monotonic()
+        for w in workers:
+            w.iniciar()
+        await _esvaziar(conn, workers)
+        return time.monotonic() - inicio
+
+    segundos = fila(cenario, mensagens, stub)
+    # Em 1s cabem 4 envios por worker, mais a rajada de 1 de cada um
+    assert stub.pico(WASENDER, 1.0) <= 2 * (4 + 1)
+    assert segundos >= 24 / 8 - 1
+    # A Meta, com folga no limite, não espera o WaSender
+    assert stub.instantes[META][-1] < stub.instantes[WASENDER][-1]
@@ -0,0 +1,51 @@
+"""
+perfil_completo x tools individuais
+===================================
+No stand-in (FakeDB em memória), o perfil de uma amostra variada de
+associados precisa dizer o mesmo que validar_acesso, buscar_mensalidades
+e buscar_infracoes. A conferência é a do benchmarks/bench_perfil_completo.py.
+"""
+
+import asyncio
+
+import pytest
+
+import server
+from benchmarks.bench_perfil_completo import _json, amostrar, cadeia_do_prompt, conferir
+from benchmarks.dados import gerar_clube
+from benchmarks.standin import carregar, conectar
+
+
+@pytest.fixture(scope="module")
+def clube():
+    dados = gerar_clube(300, semente=7)
+    original = server.supabase
+    _, transporte = conectar(carregar(dados))
+    yield dados, transporte
+    server.supabase = original
+
+
+def test_perfil_igual_as_tools_individuais(clube):
+    dados, _ = clube
+
+    async def conferir_amostra():
+        for associado in amostrar(dados, 40, semente=7):
+            perfil = _json(await server.perfil_completo(associado["id"]))
+            conferir(perfil, await cadeia_do_prompt(server, associado))
+
+    asyncio.run(conferir_amostra())
+
+
+def test_perfil_por_cpf_e_titulo(clube):
+    dados, _ = clube
+    associado = dados["associados"][0]
+    for chave in (associado["cpf"], str(associado["numero_titulo"])):
+        perfil = _json(asyncio.run(server.perfil_completo(chave)))
+        assert perfil["associado"]["id"] == associado["id"], chave
+
+
+def test_perfil_faz_cinco_requisicoes(clube):
+    dados, transporte = clube
+    antes = transporte.requisicoes
+    asyncio.run(server.perfil_completo(dados["associados"][1]["id"]))
+    assert transporte.requisicoes - antes == 5
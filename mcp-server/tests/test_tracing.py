@@ -0,0 +1,23 @@
+"""
+Tracing de consultas: o slow log e os spans não carregam dados pessoais
+=======================================================================
+Os filtros do PostgREST trazem CPF, telefone e nome nos valores; só a
+coluna e o operador podem chegar ao log.
+"""
+
+import httpx
+import pytest
+
+import server
+
+
+@pytest.mark.parametrize("query, filtros", [
+    ("cpf=eq.123.456.789-00&select=*&limit=1", {"cpf": "eq.***"}),
+    ("nome=ilike.*Maria*&status=in.(ativo,suspenso)", {"nome": "ilike.***", "status": "in.***"}),
+    ("telefone=not.eq.5511999990000", {"telefone": "not.eq.***"}),
+    ("or=(nome.ilike.*ana*,cpf.eq.12345678900,titulo.in.(1,2))",
+     {"or": "(nome.ilike.***,cpf.eq.***,titulo.in.***)"}),
+])
+def test_filtros_mascarados(query, filtros):
+    request = httpx.Request("GET", f"http://supabase.local/rest/v1/associados?{query}")
+    assert server._descrever_request(request) == ("associados", filtros)